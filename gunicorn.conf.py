@@ -0,0 +1,32 @@
+"""
+Hooks gunicorn (chargé automatiquement depuis le répertoire courant)
+Métriques Prometheus partagées entre workers: chaque worker écrit ses valeurs dans des
+fichiers mmap de PROMETHEUS_MULTIPROC_DIR, agrégés par /metrics (voir src/services/metrics.py)
+Workers gthread: un flux SSE (/api/events/stream) occupe un thread et non un worker entier,
+et le --timeout ne s'applique pas à la durée d'une requête
+"""
+
+import os
+import shutil
+
+# Doit être défini avant le premier import de prometheus_client (dans les workers)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/padelvar-metrics')
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '32'))
+
+
+def on_starting(server):
+    # Valeurs d'un démarrage précédent: à effacer avant de lancer les workers
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Les jauges 'live*' du worker arrêté ne sont plus comptées
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
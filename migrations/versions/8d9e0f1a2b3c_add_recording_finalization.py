@@ -0,0 +1,52 @@
+"""add_recording_finalization
+
+Revision ID: 8d9e0f1a2b3c
+Revises: 16fd90a3a998
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d9e0f1a2b3c'
+down_revision = '16fd90a3a998'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # File de finalisation des enregistrements arrêtés (worker en arrière-plan)
+    op.create_table(
+        'recording_finalization',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recording_id', sa.String(length=100), nullable=False),
+        sa.Column('recording_session_id', sa.Integer(), nullable=False),
+        sa.Column('stopped_by', sa.String(length=20), nullable=True),
+        sa.Column('performed_by_id', sa.Integer(), nullable=True),
+        sa.Column('state', sa.String(length=20), nullable=False, server_default='stopping'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='8'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('owner', sa.String(length=100), nullable=True),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('local_path', sa.String(length=500), nullable=True),
+        sa.Column('video_id', sa.Integer(), nullable=True),
+        sa.Column('upload_id', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('recording_id'),
+        sa.ForeignKeyConstraint(['recording_session_id'], ['recording_session.id'], ),
+        sa.ForeignKeyConstraint(['video_id'], ['video.id'], )
+    )
+    op.create_index('ix_recording_finalization_state', 'recording_finalization', ['state'])
+
+
+def downgrade():
+    op.drop_index('ix_recording_finalization_state', table_name='recording_finalization')
+    op.drop_table('recording_finalization')
@@ -0,0 +1,27 @@
+"""add_video_feed_indexes
+
+Revision ID: 9e0f1a2b3c4d
+Revises: 8d9e0f1a2b3c
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e0f1a2b3c4d'
+down_revision = '8d9e0f1a2b3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fil "mes vidéos" paginé par curseur (vidéos possédées et partagées, triées par date)
+    op.create_index('ix_video_user_recorded_at', 'video', ['user_id', 'recorded_at'])
+    op.create_index('ix_shared_videos_recipient_shared_at', 'shared_videos', ['shared_with_user_id', 'shared_at'])
+
+
+def downgrade():
+    op.drop_index('ix_shared_videos_recipient_shared_at', table_name='shared_videos')
+    op.drop_index('ix_video_user_recorded_at', table_name='video')
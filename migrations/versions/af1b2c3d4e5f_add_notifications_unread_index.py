@@ -0,0 +1,25 @@
+"""add_notifications_unread_index
+
+Revision ID: af1b2c3d4e5f
+Revises: 9e0f1a2b3c4d
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'af1b2c3d4e5f'
+down_revision = '9e0f1a2b3c4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Liste des notifications et comptage des non lues par utilisateur
+    op.create_index('ix_notifications_user_read_created', 'notifications', ['user_id', 'is_read', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_read_created', table_name='notifications')
@@ -0,0 +1,146 @@
+"""add_credit_ledger
+
+Revision ID: b2c3d4e5f6a7
+Revises: af1b2c3d4e5f
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2c3d4e5f6a7'
+down_revision = 'af1b2c3d4e5f'
+branch_labels = None
+depends_on = None
+
+
+def _amount(details, key):
+    value = details.get(key)
+    return int(value) if isinstance(value, (int, float)) else 0
+
+
+def _legacy_movements(action_type, details, user_id, club_id):
+    """Mouvements (type de compte, id, delta, motif, référence) d'une action historique"""
+    if action_type == 'buy_credits':
+        if 'credits_purchased' in details:
+            return [('user', user_id, _amount(details, 'credits_purchased'), 'purchase', None)]
+        return [('club', club_id, _amount(details, 'credits_bought'), 'purchase', None)]
+    if action_type == 'unlock_video':
+        reference = f"video:{details['video_id']}" if details.get('video_id') else None
+        return [('user', user_id, -_amount(details, 'credits_spent'), 'unlock_video', reference)]
+    if action_type == 'start_recording':
+        return [('user', user_id, -_amount(details, 'credits_used'), 'recording', None)]
+    if action_type == 'admin_add_credits':
+        return [('user', user_id, _amount(details, 'credits_added'), 'admin_grant', None)]
+    if action_type == 'club_add_credits':
+        amount = _amount(details, 'credits_added')
+        return [('club', club_id, -amount, 'club_grant', f"club:{club_id}"),
+                ('user', user_id, amount, 'club_grant', f"club:{club_id}")]
+    if action_type == 'receive_credits_from_admin':
+        return [('club', club_id, _amount(details, 'credits_received'), 'admin_grant', None)]
+    if action_type == 'admin_set_credits':
+        return [('club', club_id, _amount(details, 'diff'), 'admin_adjustment', None)]
+    if action_type == 'bulk_update_credits':
+        delta = _amount(details, 'new_balance') - _amount(details, 'old_balance')
+        return [('user', user_id, delta, 'admin_adjustment', None)]
+    return []
+
+
+def upgrade():
+    ledger = op.create_table(
+        'credit_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_type', sa.String(length=10), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('balance_after', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.String(length=40), nullable=False),
+        sa.Column('reference', sa.String(length=100), nullable=True),
+        sa.Column('performed_by_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_credit_ledger_account', 'credit_ledger', ['account_type', 'account_id', 'id'])
+
+    op.create_table(
+        'credit_balance_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('account_type', sa.String(length=10), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('ledger_id', sa.Integer(), nullable=False),
+        sa.Column('balance', sa.Integer(), nullable=False),
+        sa.Column('total_credited', sa.Integer(), nullable=False),
+        sa.Column('total_debited', sa.Integer(), nullable=False),
+        sa.Column('drift', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_credit_snapshots_account', 'credit_balance_snapshots',
+                    ['account_type', 'account_id', 'ledger_id'])
+
+    # Reprise unique de l'historique JSON de club_action_history; le mouvement
+    # 'opening_balance' complète pour retomber sur le solde actuel des comptes
+    bind = op.get_bind()
+    movements = {}
+    history = bind.execute(sa.text(
+        "SELECT user_id, club_id, action_type, action_details, performed_by_id, performed_at "
+        "FROM club_action_history WHERE action_type IN ('buy_credits', 'unlock_video', 'start_recording', "
+        "'admin_add_credits', 'club_add_credits', 'receive_credits_from_admin', 'admin_set_credits', "
+        "'bulk_update_credits') ORDER BY performed_at, id"
+    ).columns(performed_at=sa.DateTime))
+    for user_id, club_id, action_type, action_details, performed_by_id, performed_at in history:
+        try:
+            details = json.loads(action_details) if action_details else {}
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(details, dict):
+            continue
+        for account_type, account_id, delta, reason, reference in _legacy_movements(
+                action_type, details, user_id, club_id):
+            if account_id and delta:
+                movements.setdefault((account_type, account_id), []).append(
+                    (delta, reason, reference, performed_by_id, performed_at))
+
+    balances = {}
+    for account_id, balance in bind.execute(sa.text('SELECT id, credits_balance FROM "user"')):
+        balances[('user', account_id)] = balance or 0
+    for account_id, balance in bind.execute(sa.text('SELECT id, credits_balance FROM club')):
+        balances[('club', account_id)] = balance or 0
+
+    now = datetime.utcnow()
+    rows = []
+    for key, balance in balances.items():
+        account_movements = movements.get(key, [])
+        opening = balance - sum(m[0] for m in account_movements)
+        running = opening
+        if opening:
+            rows.append({
+                'account_type': key[0], 'account_id': key[1], 'delta': opening,
+                'balance_after': opening, 'reason': 'opening_balance', 'reference': None,
+                'performed_by_id': None,
+                'created_at': account_movements[0][4] if account_movements else now,
+            })
+        for delta, reason, reference, performed_by_id, performed_at in account_movements:
+            running += delta
+            rows.append({
+                'account_type': key[0], 'account_id': key[1], 'delta': delta,
+                'balance_after': running, 'reason': reason, 'reference': reference,
+                'performed_by_id': performed_by_id, 'created_at': performed_at or now,
+            })
+        if len(rows) >= 1000:
+            op.bulk_insert(ledger, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(ledger, rows)
+
+
+def downgrade():
+    op.drop_index('ix_credit_snapshots_account', table_name='credit_balance_snapshots')
+    op.drop_table('credit_balance_snapshots')
+    op.drop_index('ix_credit_ledger_account', table_name='credit_ledger')
+    op.drop_table('credit_ledger')
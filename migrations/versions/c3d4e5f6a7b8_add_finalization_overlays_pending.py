@@ -0,0 +1,26 @@
+"""add_finalization_overlays_pending
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b2c3d4e5f6a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Incrustation des overlays différés: étape du worker de finalisation
+    op.add_column('recording_finalization',
+                  sa.Column('overlays_pending', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('recording_finalization', 'overlays_pending')
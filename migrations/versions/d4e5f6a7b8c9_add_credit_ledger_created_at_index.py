@@ -0,0 +1,25 @@
+"""add_credit_ledger_created_at_index
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Borne des instantanés de soldes: premier mouvement récent du grand livre
+    op.create_index('ix_credit_ledger_created_at', 'credit_ledger', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_credit_ledger_created_at', table_name='credit_ledger')
@@ -0,0 +1,32 @@
+"""backfill_video_recorded_at
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fil "mes vidéos" trié sur recorded_at seul (index user_id, recorded_at) au lieu
+    # de coalesce(recorded_at, created_at): la colonne ne doit plus être NULL
+    op.execute(
+        "UPDATE video SET recorded_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+        "WHERE recorded_at IS NULL"
+    )
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.alter_column('recorded_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('video', schema=None) as batch_op:
+        batch_op.alter_column('recorded_at', existing_type=sa.DateTime(), nullable=True)
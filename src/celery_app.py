@@ -9,6 +9,7 @@ import os
 from celery import Celery
 from celery.schedules import crontab
 from .config import Config
+from .services.metrics import instrument_celery
 
 def create_celery_app(app=None):
     """
@@ -70,10 +71,10 @@ def create_celery_app(app=None):
                 'options': {'queue': 'maintenance'}
             },
             
-            # Nettoyage des clés d'idempotence expirées chaque heure
+            # Purge du journal d'idempotence (les clés actives vivent dans Redis) chaque jour à 4h
             'cleanup-expired-idempotency-keys': {
                 'task': 'src.tasks.maintenance_tasks.cleanup_expired_idempotency_keys',
-                'schedule': crontab(minute=0),
+                'schedule': crontab(hour=4, minute=0),
                 'options': {'queue': 'maintenance'}
             },
             
@@ -103,10 +104,20 @@ def create_celery_app(app=None):
                 'task': 'src.tasks.maintenance_tasks.cleanup_uploaded_videos',
                 'schedule': crontab(minute=0),
                 'options': {'queue': 'maintenance'}
+            },
+
+            # Instantané des soldes de crédits (grand livre) chaque jour à 3h
+            'snapshot-credit-balances': {
+                'task': 'src.tasks.maintenance_tasks.snapshot_credit_balances',
+                'schedule': crontab(hour=3, minute=0),
+                'options': {'queue': 'maintenance'}
             }
         }
     )
     
+    # Métriques Prometheus des tâches (serveur /metrics du worker)
+    instrument_celery(celery)
+    
     # Intégration avec Flask
     if app:
         class ContextTask(celery.Task):
@@ -55,6 +55,8 @@ class HighlightsConfig:
     OUTPUT_CODEC = 'libx264'
     OUTPUT_BITRATE = '8000k'
     OUTPUT_PRESET = 'medium'  # fast, medium, slow
+    # Montage simple: 'encode' (filtre concat, un encodage) ou 'copy' (coupes sur keyframes, sans encodage)
+    RENDER_MODE = os.getenv('HIGHLIGHTS_RENDER_MODE', 'encode')
     
     # Effects
     ENABLE_SLOW_MOTION = True
@@ -71,6 +73,8 @@ class HighlightsConfig:
     SIMPLE_MODE = not ENABLE_AI_DETECTION
     SIMPLE_INTERVAL_SECONDS = 30  # Extract clip every N seconds
     SIMPLE_CLIPS_COUNT = 6  # Number of clips to extract
+    # Choix des extraits: 'activity' (mouvement + audio) ou 'interval' (réguliers)
+    DETECTION_MODE = os.getenv('HIGHLIGHTS_DETECTION', 'activity')
 
 # Export configuration
 HIGHLIGHTS_CONFIG = {
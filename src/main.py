@@ -13,6 +13,8 @@ from flask_jwt_extended import JWTManager
 from .config import DevelopmentConfig, ProductionConfig, Config
 from .models.database import db
 from .extensions import cache
+from .services.query_profiler import query_profiler
+from .services import metrics
 from .models.user import User, UserRole
 from .routes.auth import auth_bp
 from .routes.super_admin_auth import super_admin_auth_bp  # 🆕 Authentification super admin avec 2FA
@@ -52,6 +54,8 @@ from .routes.tutorial_routes import tutorial_bp  # 🆕 Tutorial system for new
 from .routes.player_interests import player_interests_bp  # 🆕 Player interests dashboard
 from .routes.arbitre_routes import arbitre_bp  # 🆕 Tableau de bord arbitre
 from .routes.live_routes import live_bp  # 🆕 Live streaming padel
+from .routes.bunny_webhook import bunny_webhook_bp  # 🆕 Webhook statut d'encodage Bunny Stream
+from .routes.events import events_bp  # 🆕 Flux SSE (notifications, enregistrements, statuts vidéo)
 
 def create_app(config_name=None):
     """
@@ -112,6 +116,12 @@ def create_app(config_name=None):
         print(f"⚠️ Redis indisponible, basculement vers SimpleCache local. Erreur: {e}")
         cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
     
+    # Métriques Prometheus (/metrics): latence, requêtes en cours et codes de statut par endpoint
+    metrics.init_app(app)
+    
+    # Profilage SQL par endpoint (en-têtes X-DB-* en debug, agrégats sur /api/system/db-profile)
+    query_profiler.init_app(app)
+    
     # 🍪 Configuration des cookies de session pour OVH (HTTP temporaire)
     # Pour HTTP (IPV4 access), il faut SameSite='Lax' et Secure=False
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'   # Permet le fonctionnement en HTTP
@@ -252,6 +262,8 @@ def create_app(config_name=None):
     app.register_blueprint(player_interests_bp, url_prefix='/api')  # 🆕 Player interests
     app.register_blueprint(arbitre_bp)  # 🆕 Tableau de bord arbitre (/arbitre + /api/arbitre/*)
     app.register_blueprint(live_bp)     # 🆕 Live streaming (/live + /watch/<code> + /api/live/*)
+    app.register_blueprint(bunny_webhook_bp)  # 🆕 Webhook Bunny Stream (/api/webhooks/bunny)
+    app.register_blueprint(events_bp)  # 🆕 Flux SSE (/api/events/stream)
     app.register_blueprint(password_reset_bp)
     
     # 🆕 Video Recovery System
@@ -505,6 +517,15 @@ def _init_recording_scheduler(app):
     thread = threading.Thread(target=run_scheduler, daemon=True, name="RecordingCleanupScheduler")
     thread.start()
     
+    # 🆕 Finalisation des enregistrements arrêtés (FFmpeg, vidéo, upload, notification)
+    try:
+        from src.services.recording_finalizer import recording_finalizer
+
+        recording_finalizer.start(app)
+        print("✅ Worker de finalisation des enregistrements démarré")
+    except Exception as e:
+        print(f"⚠️  Erreur démarrage worker de finalisation: {e}")
+
     # 🆕 Démarrer le service de mise à jour du statut Bunny CDN
     try:
         from src.services.bunny_status_updater import BunnyStatusUpdater
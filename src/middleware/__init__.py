@@ -5,7 +5,7 @@ Middleware pour PadelVar
 Gère l'idempotence, le rate limiting, et autres aspects transversaux
 """
 
-from .idempotence import IdempotenceMiddleware, with_idempotence, require_idempotence_key
+from .idempotence import IdempotenceMiddleware, idempotent, with_idempotence, require_idempotence_key
 from .rate_limiting import RateLimitMiddleware, rate_limit
 
 __all__ = [
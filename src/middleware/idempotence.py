@@ -1,7 +1,9 @@
-
 # Export for import in __init__.py
 __all__ = [
     "IdempotenceMiddleware",
+    "IdempotencyStore",
+    "idempotency_store",
+    "idempotent",
     "with_idempotence",
     "require_idempotence_key"
 ]
@@ -9,16 +11,32 @@ __all__ = [
 """
 Middleware d'idempotence pour les requêtes critiques
 Évite les doublons lors de requêtes sensibles (paiements, enregistrements, etc.)
+
+Redis d'abord (aucune requête SQL sur le chemin de la requête):
+- Réservation atomique de la clé: SET NX avec un marqueur "en cours" (TTL court:
+  un worker tué ne bloque pas la clé au-delà de IDEMPOTENCY_LOCK_SECONDS)
+- Un doublon concurrent attend la fin du premier (IDEMPOTENCY_WAIT_SECONDS) puis rejoue
+  sa réponse, au lieu d'exécuter une seconde fois; au-delà: 409 + Retry-After
+- Réponse réussie (< 400) gardée ttl_hours dans Redis; échec: clé libérée, la requête
+  peut être rejouée
+- Table idempotency_key: simple journal d'audit, écrit en différé par un thread
+  (IDEMPOTENCY_DB_AUDIT=false pour le désactiver)
+Sans Redis: repli sur la table (lecture puis écriture, sans marqueur "en cours").
 """
 
 import json
 import logging
+import os
+import queue
+import threading
+import time
 import uuid
 import hashlib
 from datetime import datetime, timedelta
 from functools import wraps
+from typing import Optional
 
-from flask import request, jsonify, g
+from flask import current_app, make_response, request, jsonify, g, session
 from sqlalchemy.exc import IntegrityError
 
 from ..models.database import db
@@ -26,6 +44,27 @@ from ..models.user import IdempotencyKey
 
 logger = logging.getLogger(__name__)
 
+KEY_PREFIX = 'padel:idempotency:'
+_PENDING_PREFIX = 'pending:'
+
+# Enregistre la réponse si la clé est toujours réservée par ce worker (ou a expiré)
+_COMPLETE = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+return 1
+"""
+
+# Libère la clé si elle est toujours réservée par ce worker
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 class IdempotenceMiddleware:
     """
     Middleware pour gérer l'idempotence des requêtes
@@ -126,6 +165,7 @@ class IdempotenceMiddleware:
     def get_stored_response(key):
         """
         Récupère la réponse stockée pour une clé d'idempotence
+        Les clés expirées sont ignorées (supprimées par cleanup_expired_keys, pas ici)
         
         Args:
             key (str): Clé d'idempotence
@@ -134,19 +174,14 @@ class IdempotenceMiddleware:
             dict|None: Réponse stockée ou None si non trouvée/expirée
         """
         try:
-            record = IdempotencyKey.query.filter_by(key=key).first()
+            record = IdempotencyKey.query.filter(
+                IdempotencyKey.key == key,
+                IdempotencyKey.expires_at >= datetime.utcnow()
+            ).first()
             
             if not record:
                 return None
             
-            # Vérifier si la clé a expiré
-            if record.is_expired():
-                # Nettoyer la clé expirée
-                db.session.delete(record)
-                db.session.commit()
-                logger.debug(f"Clé d'idempotence expirée supprimée: {key}")
-                return None
-            
             headers = {}
             if record.response_headers:
                 try:
@@ -187,13 +222,297 @@ class IdempotenceMiddleware:
             db.session.rollback()
             return 0
 
+
+class IdempotencyStore:
+    """Réservations et réponses d'idempotence dans Redis, audit différé en base"""
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url
+        self.lock_seconds = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+        self.wait_seconds = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+        self.audit_enabled = os.getenv('IDEMPOTENCY_DB_AUDIT', 'true').lower() == 'true'
+        self._redis = None
+        self._redis_checked_at = 0.0
+        self._complete_script = None
+        self._release_script = None
+        self._audit_queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._audit_thread: Optional[threading.Thread] = None
+        self._audit_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Redis
+
+    def _client(self):
+        """Client Redis, ou None (nouvel essai de connexion au plus toutes les 30 s)"""
+        if self._redis is not None or not self.redis_url:
+            return self._redis
+        if time.time() - self._redis_checked_at < 30:
+            return None
+        self._redis_checked_at = time.time()
+        try:
+            import redis
+            client = redis.from_url(self.redis_url, decode_responses=True, socket_timeout=2)
+            client.ping()
+            self._complete_script = client.register_script(_COMPLETE)
+            self._release_script = client.register_script(_RELEASE)
+            self._redis = client
+        except Exception as e:
+            logger.warning(f"⚠️ Redis indisponible pour l'idempotence, repli sur la base: {e}")
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"⚠️ Idempotence: erreur Redis, repli sur la base: {e}")
+        self._redis = None
+        self._redis_checked_at = time.time()
+
+    # ------------------------------------------------------------------
+    # Exécution idempotente
+
+    def run(self, key: str, user_id: Optional[int], endpoint: str, ttl_hours: int, view):
+        """Exécuter view() une seule fois pour key et rejouer sa réponse aux doublons"""
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        client = self._client()
+        if client is not None:
+            try:
+                return self._run_redis(client, key, user_id, endpoint, ttl_hours, fingerprint, view)
+            except _RedisUnavailable as e:
+                self._redis_failed(e.__cause__)
+        return self._run_db(key, user_id, endpoint, ttl_hours, fingerprint, view)
+
+    def _run_redis(self, client, key, user_id, endpoint, ttl_hours, fingerprint, view):
+        redis_key = f"{KEY_PREFIX}{key}"
+        token = f"{_PENDING_PREFIX}{uuid.uuid4().hex}"
+        try:
+            claimed = client.set(redis_key, token, nx=True, px=self.lock_seconds * 1000)
+        except Exception as e:
+            raise _RedisUnavailable() from e
+
+        if not claimed:
+            return self._wait_for_response(client, redis_key, key, fingerprint)
+
+        try:
+            response = make_response(view())
+        except Exception:
+            self._release(client, redis_key, token)
+            raise
+
+        if response.status_code >= 400 or response.direct_passthrough:
+            # Échec (ou flux): rien n'est mémorisé, un nouvel essai réexécutera la requête
+            self._release(client, redis_key, token)
+            return response
+
+        record = _record(response, fingerprint)
+        try:
+            self._complete_script(keys=[redis_key],
+                                  args=[token, json.dumps(record), ttl_hours * 3600 * 1000],
+                                  client=client)
+        except Exception as e:
+            self._redis_failed(e)
+            IdempotenceMiddleware.store_response(key, user_id, endpoint, response.status_code,
+                                                 record['body'], record['headers'], ttl_hours)
+        else:
+            self._audit(key, user_id, endpoint, record, ttl_hours)
+        response.headers['X-Idempotent-Key'] = key
+        return response
+
+    def _wait_for_response(self, client, redis_key, key, fingerprint):
+        """Doublon: attendre la réponse de la requête en cours"""
+        deadline = time.monotonic() + self.wait_seconds
+        delay = 0.05
+        while True:
+            try:
+                value = client.get(redis_key)
+            except Exception as e:
+                raise _RedisUnavailable() from e
+            if value is None:
+                # La requête d'origine a échoué: le client peut réessayer
+                return _conflict(key, 'La requête d\'origine a échoué, réessayez', retry_after=1)
+            if not value.startswith(_PENDING_PREFIX):
+                return _replay(key, json.loads(value), fingerprint)
+            if time.monotonic() >= deadline:
+                return _conflict(key, 'Requête identique en cours de traitement',
+                                 retry_after=max(1, int(self.wait_seconds)))
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def _release(self, client, redis_key, token):
+        try:
+            self._release_script(keys=[redis_key], args=[token], client=client)
+        except Exception as e:
+            # Le marqueur expirera de lui-même après lock_seconds
+            self._redis_failed(e)
+
+    def _run_db(self, key, user_id, endpoint, ttl_hours, fingerprint, view):
+        stored = IdempotenceMiddleware.get_stored_response(key)
+        if stored:
+            headers = stored['headers'] or {}
+            return _replay(key, {
+                'status': stored['status_code'],
+                'body': stored['response_body'],
+                'headers': {'Content-Type': headers.get('Content-Type', 'application/json')},
+                'fingerprint': headers.get('X-Request-Fingerprint'),
+            }, fingerprint)
+
+        response = make_response(view())
+        if response.status_code < 400 and not response.direct_passthrough:
+            record = _record(response, fingerprint)
+            IdempotenceMiddleware.store_response(key, user_id, endpoint, response.status_code,
+                                                 record['body'], record['headers'], ttl_hours)
+            response.headers['X-Idempotent-Key'] = key
+        return response
+
+    # ------------------------------------------------------------------
+    # Journal d'audit en base (différé)
+
+    def _audit(self, key, user_id, endpoint, record, ttl_hours):
+        if not self.audit_enabled:
+            return
+        try:
+            self._audit_queue.put_nowait((current_app._get_current_object(), {
+                'key': key,
+                'user_id': user_id,
+                'endpoint': endpoint[:100],
+                'response_status_code': record['status'],
+                'response_body': record['body'],
+                'response_headers': json.dumps(record['headers']),
+                'created_at': datetime.utcnow(),
+                'expires_at': datetime.utcnow() + timedelta(hours=ttl_hours),
+            }))
+        except queue.Full:
+            logger.warning(f"⚠️ Journal d'idempotence saturé, clé {key} non archivée")
+            return
+        with self._audit_lock:
+            if self._audit_thread is None or not self._audit_thread.is_alive():
+                self._audit_thread = threading.Thread(target=self._audit_loop, name='idempotency-audit',
+                                                      daemon=True)
+                self._audit_thread.start()
+
+    def _audit_loop(self):
+        while True:
+            app, row = self._audit_queue.get()
+            batch = [row]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._audit_queue.get_nowait()[1])
+                except queue.Empty:
+                    break
+            try:
+                with app.app_context():
+                    self._write_audit(batch)
+            except Exception as e:
+                logger.error(f"❌ Journal d'idempotence: écriture impossible ({len(batch)} clé(s)): {e}")
+            finally:
+                for _ in batch:
+                    self._audit_queue.task_done()
+
+    @staticmethod
+    def _write_audit(rows):
+        try:
+            db.session.execute(IdempotencyKey.__table__.insert(), rows)
+            db.session.commit()
+        except IntegrityError:
+            # Clé déjà archivée (repli base, ou rejouée après expiration): ligne par ligne
+            db.session.rollback()
+            for row in rows:
+                try:
+                    db.session.execute(IdempotencyKey.__table__.insert(), [row])
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+        finally:
+            db.session.remove()
+
+    def flush_audit(self):
+        """Attendre l'écriture du journal en attente (tests, arrêt propre)"""
+        self._audit_queue.join()
+
+
+class _RedisUnavailable(Exception):
+    pass
+
+
+def _record(response, fingerprint):
+    return {
+        'status': response.status_code,
+        'body': response.get_data(as_text=True),
+        'headers': {'Content-Type': response.headers.get('Content-Type'),
+                    'X-Request-Fingerprint': fingerprint},
+        'fingerprint': fingerprint,
+    }
+
+
+def _replay(key, record, fingerprint):
+    """Rejouer une réponse mémorisée (422 si la clé a servi pour un autre contenu)"""
+    if record.get('fingerprint') and record['fingerprint'] != fingerprint:
+        response = jsonify({
+            'error': 'Idempotency-Key reused',
+            'message': 'Cette clé d\'idempotence a déjà été utilisée pour une requête différente'
+        })
+        response.status_code = 422
+        return response
+
+    logger.info(f"Réponse idempotente retournée pour clé: {key}")
+    response = current_app.response_class(
+        record['body'], status=record['status'],
+        content_type=record['headers'].get('Content-Type') or 'application/json'
+    )
+    # Ajouter un header pour indiquer que c'est une réponse idempotente
+    response.headers['X-Idempotent'] = 'true'
+    response.headers['X-Idempotent-Key'] = key
+    return response
+
+
+def _conflict(key, message, retry_after):
+    response = jsonify({'error': 'Idempotency conflict', 'message': message})
+    response.status_code = 409
+    response.headers['Retry-After'] = str(retry_after)
+    response.headers['X-Idempotent-Key'] = key
+    return response
+
+
+def _scoped_key(user_id, endpoint, key):
+    """Clé propre à l'utilisateur et à l'endpoint (une même clé client ne croise pas deux comptes)"""
+    digest = hashlib.sha256(f"{endpoint}:{key}".encode('utf-8')).hexdigest()[:40]
+    return f"{user_id or 'anon'}:{digest}"
+
+
+def idempotent(ttl_hours=IdempotenceMiddleware.DEFAULT_TTL_HOURS):
+    """
+    Décorateur: requête idempotente si le client envoie un header Idempotency-Key
+    (sans header, la vue s'exécute normalement)
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            client_key = request.headers.get('Idempotency-Key')
+            if not client_key or request.method not in ['POST', 'PUT', 'PATCH']:
+                return f(*args, **kwargs)
+            if len(client_key) > 64:
+                return jsonify({
+                    'error': 'Invalid Idempotency-Key format',
+                    'message': 'La clé d\'idempotence ne doit pas dépasser 64 caractères'
+                }), 400
+
+            user_id = session.get('user_id')
+            endpoint = f"{request.method}:{request.endpoint}"
+            g.idempotence_key = client_key
+            return idempotency_store.run(_scoped_key(user_id, endpoint, client_key), user_id, endpoint,
+                                         ttl_hours, lambda: f(*args, **kwargs))
+
+        return decorated_function
+    return decorator
+
+
 def with_idempotence(ttl_hours=24, key_fields=None):
     """
-    Décorateur pour rendre un endpoint idempotent
+    Décorateur pour rendre un endpoint idempotent (header Idempotency-Key explicite)
+    Sans header, la vue s'exécute normalement: deux requêtes identiques et légitimes
+    (ex. deux achats successifs du même pack) ne sont jamais confondues
     
     Args:
         ttl_hours (int): Durée de vie de la clé en heures
-        key_fields (list): Champs de la requête à inclure dans la génération de clé
+        key_fields (list): Champs JSON ajoutés à la clé client (la même clé pour un
+            autre montant désigne une autre opération)
         
     Usage:
         @with_idempotence(ttl_hours=1, key_fields=['amount', 'package_id'])
@@ -204,84 +523,27 @@ def with_idempotence(ttl_hours=24, key_fields=None):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Vérifier si c'est une méthode qui nécessite l'idempotence
-            if request.method not in ['POST', 'PUT', 'PATCH']:
+            client_key = request.headers.get('Idempotency-Key')
+            if not client_key or request.method not in ['POST', 'PUT', 'PATCH']:
                 return f(*args, **kwargs)
+            if len(client_key) > 64:
+                return jsonify({
+                    'error': 'Invalid Idempotency-Key format',
+                    'message': 'La clé d\'idempotence ne doit pas dépasser 64 caractères'
+                }), 400
             
-            # Extraire l'utilisateur actuel s'il existe
-            user_id = getattr(g, 'current_user_id', None) if hasattr(g, 'current_user_id') else None
-            
-            # Données pour la génération de clé
+            # Champs de la requête rattachés à la clé client
             key_data = {}
             if key_fields and request.is_json:
-                request_data = request.get_json() or {}
+                request_data = request.get_json(silent=True) or {}
                 key_data = {field: request_data.get(field) for field in key_fields if field in request_data}
             
-            # Générer la clé d'idempotence
+            user_id = session.get('user_id')
             endpoint = f"{request.method}:{request.endpoint}"
-            idempotence_key = IdempotenceMiddleware.generate_key(
-                user_id=user_id,
-                endpoint=endpoint,
-                data=key_data
-            )
-            
-            return f"{idempotence_key}:{str(uuid.uuid4())[:8]}"
-            
-            # Vérifier si une réponse existe déjà
-            stored_response = IdempotenceMiddleware.get_stored_response(idempotence_key)
-            
-            if stored_response:
-                logger.info(f"Réponse idempotente retournée pour clé: {idempotence_key}")
-                
-                # Retourner la réponse stockée
-                response_body = stored_response['response_body']
-                status_code = stored_response['status_code']
-                
-                try:
-                    # Essayer de parser le JSON
-                    json_response = json.loads(response_body)
-                    response = jsonify(json_response)
-                except:
-                    # Si ce n'est pas du JSON, retourner tel quel
-                    response = response_body
-                
-                response.status_code = status_code
-                
-                # Ajouter un header pour indiquer que c'est une réponse idempotente
-                response.headers['X-Idempotent'] = 'true'
-                response.headers['X-Idempotent-Key'] = idempotence_key
-                
-                return response
-            
-            # Stocker la clé pour traçabilité
-            g.idempotence_key = idempotence_key
-            
-            # Exécuter la fonction originale
-            try:
-                result = f(*args, **kwargs)
-                
-                # Stocker la réponse si elle est réussie
-                if hasattr(result, 'status_code') and result.status_code < 400:
-                    response_body = result.get_data(as_text=True)
-                    
-                    IdempotenceMiddleware.store_response(
-                        key=idempotence_key,
-                        user_id=user_id,
-                        endpoint=endpoint,
-                        status_code=result.status_code,
-                        response_body=response_body,
-                        headers=dict(result.headers),
-                        ttl_hours=ttl_hours
-                    )
-                    
-                    # Ajouter des headers informatifs
-                    result.headers['X-Idempotent-Key'] = idempotence_key
-                
-                return result
-                
-            except Exception as e:
-                logger.error(f"Erreur lors de l'exécution de la fonction idempotente: {e}")
-                raise
+            g.idempotence_key = client_key
+            scoped_key = _scoped_key(user_id, endpoint, f"{client_key}:{json.dumps(key_data, sort_keys=True)}")
+            return idempotency_store.run(scoped_key, user_id, endpoint, ttl_hours,
+                                         lambda: f(*args, **kwargs))
             
         return decorated_function
     return decorator
@@ -310,31 +572,17 @@ def require_idempotence_key():
                     'message': 'La clé d\'idempotence doit être un UUID valide'
                 }), 400
             
-            # Vérifier si la clé a déjà été utilisée
-            stored_response = IdempotenceMiddleware.get_stored_response(idempotence_key)
-            
-            if stored_response:
-                logger.info(f"Clé d'idempotence déjà utilisée: {idempotence_key}")
-                
-                response_body = stored_response['response_body']
-                status_code = stored_response['status_code']
-                
-                try:
-                    json_response = json.loads(response_body)
-                    response = jsonify(json_response)
-                except:
-                    response = response_body
-                
-                response.status_code = status_code
-                response.headers['X-Idempotent'] = 'true'
-                response.headers['X-Idempotent-Key'] = idempotence_key
-                
-                return response
-            
             # Stocker la clé pour utilisation dans la fonction
             g.idempotence_key = idempotence_key
             
-            return f(*args, **kwargs)
+            user_id = session.get('user_id')
+            endpoint = f"{request.method}:{request.endpoint}"
+            return idempotency_store.run(_scoped_key(user_id, endpoint, idempotence_key), user_id, endpoint,
+                                         IdempotenceMiddleware.DEFAULT_TTL_HOURS, lambda: f(*args, **kwargs))
             
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+# Instance globale
+idempotency_store = IdempotencyStore(os.getenv('IDEMPOTENCY_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
@@ -1,26 +1,161 @@
-
-
-
-# src/middleware/rate_limiting.py
-
 """
 Middleware de rate limiting pour PadelVar
 Protège contre les abus et attaques par déni de service
+
+Algorithme GCRA (fenêtre glissante lissée): une seule valeur par clé, l'heure théorique
+d'arrivée (TAT) de la prochaine requête. N requêtes par fenêtre W autorisent une rafale
+de N puis une requête toutes les W/N secondes; chaque requête est comptée, même
+plusieurs dans la même seconde.
+- Redis: un seul script Lua (un aller-retour) vérifie et consomme toutes les limites
+  d'une requête de façon atomique (refusée: rien n'est consommé); la clé expire
+  quand son TAT est dépassé (TTL <= fenêtre)
+- Sans Redis: même algorithme en mémoire, borné à RATE_LIMIT_LOCAL_MAX_KEYS clés (LRU),
+  les clés revenues au repos étant purgées périodiquement
+
+Bibliothèque: create_app n'enregistre pas RateLimitMiddleware (ses limites par IP
+pénaliseraient les clubs derrière une même IP); rate_limit() permet de limiter une
+route au cas par cas. L'authentification utilise middleware/rate_limiter.py.
 """
 
+import math
+import os
 import time
 import logging
-import hashlib
-from datetime import datetime, timedelta
+import threading
+from collections import OrderedDict
 from functools import wraps
-from collections import defaultdict
+from typing import List, Optional, Sequence, Tuple
 from flask import request, jsonify, g
-import redis
 
 from ..config import Config
 
 logger = logging.getLogger(__name__)
 
+# Vérifie puis consomme toutes les limites d'une requête
+# KEYS: clés des limites; ARGV: maintenant (ms), puis (intervalle ms, rafale) par clé
+# Retour: {0, 0} si autorisée, sinon {index de la limite (1..n), attente en ms}
+_GCRA = """
+local now = tonumber(ARGV[1])
+local tats = {}
+for i = 1, #KEYS do
+  local interval = tonumber(ARGV[i * 2])
+  local burst = tonumber(ARGV[i * 2 + 1])
+  local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+  if tat < now then tat = now end
+  local new_tat = tat + interval
+  local allow_at = new_tat - interval * burst
+  if allow_at > now then
+    return {i, allow_at - now}
+  end
+  tats[i] = new_tat
+end
+for i = 1, #KEYS do
+  redis.call('SET', KEYS[i], tats[i], 'PX', tats[i] - now)
+end
+return {0, 0}
+"""
+
+# Une vérification: (clé, nombre de requêtes, fenêtre en secondes)
+Check = Tuple[str, int, int]
+
+
+class RateLimiter:
+    """Limiteur GCRA partagé (Redis) avec repli local borné"""
+
+    def __init__(self, redis_url: str = None, redis_client=None, max_local_keys: int = None,
+                 compact_every: int = 1000):
+        self.redis_url = redis_url
+        self.max_local_keys = max_local_keys or int(os.getenv('RATE_LIMIT_LOCAL_MAX_KEYS', '10000'))
+        self.compact_every = compact_every
+        self._redis = redis_client
+        self._redis_checked_at = 0.0
+        self._script = redis_client.register_script(_GCRA) if redis_client is not None else None
+        self._local = OrderedDict()  # clé -> TAT (ms), du moins au plus récemment utilisé
+        self._lock = threading.Lock()
+        self._since_compaction = 0
+
+    def _client(self):
+        """Client Redis, ou None (nouvel essai de connexion au plus toutes les 30 s)"""
+        if self._redis is not None or not self.redis_url:
+            return self._redis
+        if time.time() - self._redis_checked_at < 30:
+            return None
+        self._redis_checked_at = time.time()
+        try:
+            import redis
+            client = redis.from_url(self.redis_url, decode_responses=True, socket_timeout=1)
+            client.ping()
+            self._script = client.register_script(_GCRA)
+            self._redis = client
+            logger.info("Rate limiting avec Redis configuré")
+        except Exception as e:
+            logger.warning(f"Impossible de se connecter à Redis: {e}, utilisation du stockage mémoire")
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        logger.error(f"Erreur Redis rate limit: {e}, utilisation du stockage mémoire")
+        self._redis = None
+        self._redis_checked_at = time.time()
+
+    @staticmethod
+    def _interval_ms(requests: int, window: int) -> int:
+        return max(1, math.ceil(window * 1000 / requests))
+
+    def hit(self, checks: Sequence[Check]) -> Optional[Tuple[int, float]]:
+        """
+        Compter une requête sur toutes les limites checks
+
+        Returns:
+            None si autorisée, sinon (index de la limite dépassée, secondes avant nouvel essai)
+        """
+        if not checks:
+            return None
+        now = int(time.time() * 1000)
+        client = self._client()
+        if client is not None:
+            args = [now]
+            for _, requests, window in checks:
+                args += [self._interval_ms(requests, window), requests]
+            try:
+                index, wait_ms = self._script(keys=[key for key, _, _ in checks], args=args, client=client)
+                return None if not index else (int(index) - 1, int(wait_ms) / 1000)
+            except Exception as e:
+                self._redis_failed(e)
+        return self._hit_local(checks, now)
+
+    def _hit_local(self, checks: Sequence[Check], now: int) -> Optional[Tuple[int, float]]:
+        with self._lock:
+            new_tats: List[int] = []
+            for index, (key, requests, window) in enumerate(checks):
+                interval = self._interval_ms(requests, window)
+                new_tat = max(self._local.get(key, now), now) + interval
+                allow_at = new_tat - interval * requests
+                if allow_at > now:
+                    return index, (allow_at - now) / 1000
+                new_tats.append(new_tat)
+
+            for (key, _, _), new_tat in zip(checks, new_tats):
+                self._local[key] = new_tat
+                self._local.move_to_end(key)
+            while len(self._local) > self.max_local_keys:
+                self._local.popitem(last=False)
+
+            self._since_compaction += 1
+            if self._since_compaction >= self.compact_every:
+                self._compact(now)
+        return None
+
+    def _compact(self, now: int):
+        """Retirer les clés dont le TAT est passé (budget plein: équivalent à une clé absente)"""
+        self._since_compaction = 0
+        expired = [key for key, tat in self._local.items() if tat <= now]
+        for key in expired:
+            del self._local[key]
+
+    def local_size(self) -> int:
+        return len(self._local)
+
+
 class RateLimitMiddleware:
     """Middleware pour gérer le rate limiting des requêtes"""
     
@@ -99,30 +234,16 @@ class RateLimitMiddleware:
         }
     }
     
-    def __init__(self, app=None, redis_client=None):
-        self.redis_client = redis_client
-        self.memory_store = defaultdict(dict)  # Fallback si Redis non disponible
+    def __init__(self, app=None, redis_client=None, limiter: RateLimiter = None):
+        if limiter is None:
+            limiter = RateLimiter(redis_client=redis_client) if redis_client is not None else rate_limiter
+        self.limiter = limiter
         
         if app:
             self.init_app(app)
     
     def init_app(self, app):
         """Initialise le middleware avec l'application Flask"""
-        # Configurer Redis si disponible
-        if not self.redis_client:
-            try:
-                redis_url = Config.RATELIMIT_STORAGE_URL or Config.CELERY_BROKER_URL
-                if redis_url:
-                    self.redis_client = redis.from_url(redis_url, decode_responses=True)
-                    # Test de connexion
-                    self.redis_client.ping()
-                    logger.info("Rate limiting avec Redis configuré")
-                else:
-                    logger.warning("Redis non configuré, utilisation du stockage mémoire")
-            except Exception as e:
-                logger.warning(f"Impossible de se connecter à Redis: {e}, utilisation du stockage mémoire")
-                self.redis_client = None
-        
         app.before_request(self.before_request)
     
     def before_request(self):
@@ -140,13 +261,19 @@ class RateLimitMiddleware:
             # Obtenir les limites pour cette requête
             limits = self._get_limits_for_request()
             
-            # Vérifier chaque limite
+            # Vérifier et compter toutes les limites en une fois (un seul aller-retour Redis)
+            configs = []
+            checks = []
             for limit_name, limit_config in limits.items():
-                if self._is_rate_limited(identifier, limit_name, limit_config):
-                    return self._rate_limit_response(limit_config)
+                key = self._limit_key(identifier, limit_name, limit_config)
+                if key:
+                    configs.append(limit_config)
+                    checks.append((key, limit_config['requests'], limit_config['window']))
             
-            # Enregistrer la requête
-            self._record_request(identifier, limits)
+            exceeded = self.limiter.hit(checks)
+            if exceeded:
+                index, retry_after = exceeded
+                return self._rate_limit_response(configs[index], retry_after)
             
             return None
             
@@ -214,82 +341,17 @@ class RateLimitMiddleware:
         
         return limits
     
-    def _is_rate_limited(self, identifier, limit_name, limit_config):
-        """Vérifie si une limite est dépassée"""
+    def _limit_key(self, identifier, limit_name, limit_config):
+        """Clé Redis/mémoire d'une limite pour cet appelant (None: pas d'identifiant)"""
         # Déterminer quel identifiant utiliser
         key_identifier = identifier['user_id'] if limit_config.get('per') == 'user' and identifier['user_id'] else identifier['ip']
         if not key_identifier:
-            return False
-        
-        # Construire la clé Redis/mémoire
-        key = f"rate_limit:{limit_name}:{key_identifier}"
-        window = limit_config['window']
-        max_requests = limit_config['requests']
-        
-        current_time = int(time.time())
-        window_start = current_time - window
-        
-        if self.redis_client:
-            return self._check_redis_limit(key, window_start, current_time, max_requests)
-        else:
-            return self._check_memory_limit(key, window_start, current_time, max_requests)
-    
-    def _check_redis_limit(self, key, window_start, current_time, max_requests):
-        """Vérifie la limite avec Redis (sliding window)"""
-        try:
-            pipe = self.redis_client.pipeline()
-            
-            # Supprimer les entrées expirées
-            pipe.zremrangebyscore(key, 0, window_start)
-            
-            # Compter les requêtes dans la fenêtre
-            pipe.zcard(key)
-            
-            # Ajouter la requête actuelle
-            pipe.zadd(key, {str(current_time): current_time})
-            
-            # Définir l'expiration de la clé
-            pipe.expire(key, int(max(3600, window_start)))
-            
-            results = pipe.execute()
-            current_count = results[1]
-            
-            return current_count >= max_requests
-            
-        except Exception as e:
-            logger.error(f"Erreur Redis rate limit: {e}")
-            return False
-    
-    def _check_memory_limit(self, key, window_start, current_time, max_requests):
-        """Vérifie la limite avec le stockage mémoire"""
-        if key not in self.memory_store:
-            self.memory_store[key] = []
-        
-        # Nettoyer les anciennes entrées
-        self.memory_store[key] = [
-            timestamp for timestamp in self.memory_store[key]
-            if timestamp > window_start
-        ]
-        
-        # Vérifier la limite
-        current_count = len(self.memory_store[key])
-        
-        if current_count >= max_requests:
-            return True
-        
-        # Ajouter la requête actuelle
-        self.memory_store[key].append(current_time)
-        return False
-    
-    def _record_request(self, identifier, limits):
-        """Enregistre la requête (déjà fait dans _is_rate_limited)"""
-        # Cette méthode est appelée après vérification, l'enregistrement
-        # est déjà fait dans _is_rate_limited
-        pass
+            return None
+        return f"rate_limit:{limit_name}:{key_identifier}"
     
-    def _rate_limit_response(self, limit_config):
+    def _rate_limit_response(self, limit_config, retry_after):
         """Retourne une réponse de rate limiting"""
-        retry_after = limit_config.get('window', 3600)
+        retry_after = max(1, math.ceil(retry_after))
         
         response = jsonify({
             'error': 'Rate limit exceeded',
@@ -324,8 +386,8 @@ def rate_limit(requests=100, window=3600, per='ip', skip_if_authenticated=False)
             
             # Logique de rate limiting personnalisée
             identifier = _get_custom_identifier(per)
-            if identifier and _check_custom_limit(identifier, f.__name__, requests, window):
-                retry_after = window
+            retry_after = _check_custom_limit(identifier, f.__name__, requests, window) if identifier else None
+            if retry_after:
                 response = jsonify({
                     'error': 'Rate limit exceeded',
                     'message': f'Too many requests to this endpoint. Please try again in {retry_after} seconds.',
@@ -353,14 +415,11 @@ def _get_custom_identifier(per):
     return None
 
 def _check_custom_limit(identifier, endpoint, max_requests, window):
-    """Vérifie une limite personnalisée (version simplifiée)"""
-    # Cette implémentation simplifiée utilise la mémoire
-    # En production, utiliser Redis comme dans la classe principale
+    """Vérifie une limite personnalisée; renvoie le délai avant nouvel essai si elle est dépassée"""
     key = f"custom_rate_limit:{endpoint}:{identifier}"
-    
-    current_time = int(time.time())
-    window_start = current_time - window
-    
-    # Simulation simple (en production, utiliser Redis)
-    # Pour l'instant, on autorise tout (le middleware principal gère déjà)
-    return False
\ No newline at end of file
+    exceeded = rate_limiter.hit([(key, max_requests, window)])
+    return max(1, math.ceil(exceeded[1])) if exceeded else None
+
+
+# Instance globale (partagée par le middleware et le décorateur)
+rate_limiter = RateLimiter(redis_url=Config.RATELIMIT_STORAGE_URL or Config.CELERY_BROKER_URL)
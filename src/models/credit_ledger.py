@@ -0,0 +1,63 @@
+"""
+Grand livre des crédits (joueurs et clubs)
+- CreditLedgerEntry: un mouvement par ligne, jamais modifié ni supprimé (sauf suppression du compte)
+- CreditBalanceSnapshot: solde et cumuls d'un compte arrêtés périodiquement; les totaux
+  s'obtiennent depuis le dernier instantané sans relire tout l'historique
+Le solde courant reste la colonne credits_balance (User/Club), modifiée uniquement par
+services.credit_ledger dans la même transaction que l'écriture au grand livre.
+"""
+from datetime import datetime
+
+from src.models.database import db
+
+ACCOUNT_USER = 'user'
+ACCOUNT_CLUB = 'club'
+
+
+class CreditLedgerEntry(db.Model):
+    """Mouvement de crédits (delta signé) et solde du compte après le mouvement"""
+    __tablename__ = 'credit_ledger'
+    __table_args__ = (
+        db.Index('ix_credit_ledger_account', 'account_type', 'account_id', 'id'),
+        db.Index('ix_credit_ledger_created_at', 'created_at'),  # Borne des instantanés
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_type = db.Column(db.String(10), nullable=False)  # 'user' ou 'club'
+    account_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    balance_after = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(40), nullable=False)  # 'recording', 'unlock_video', 'purchase', 'club_grant'...
+    reference = db.Column(db.String(100), nullable=True)  # Ex: 'video:12', 'recording:rec_...', 'club:3'
+    performed_by_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'account_type': self.account_type,
+            'account_id': self.account_id,
+            'delta': self.delta,
+            'balance_after': self.balance_after,
+            'reason': self.reason,
+            'reference': self.reference,
+            'performed_by_id': self.performed_by_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class CreditBalanceSnapshot(db.Model):
+    """Solde d'un compte recalculé depuis le grand livre jusqu'à ledger_id inclus"""
+    __tablename__ = 'credit_balance_snapshots'
+    __table_args__ = (db.Index('ix_credit_snapshots_account', 'account_type', 'account_id', 'ledger_id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_type = db.Column(db.String(10), nullable=False)
+    account_id = db.Column(db.Integer, nullable=False)
+    ledger_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)
+    total_credited = db.Column(db.Integer, nullable=False, default=0)
+    total_debited = db.Column(db.Integer, nullable=False, default=0)
+    # balance_after du mouvement ledger_id - balance recalculée (0 attendu)
+    drift = db.Column(db.Integer, nullable=False, default=0)
+    taken_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
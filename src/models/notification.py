@@ -28,6 +28,8 @@ class NotificationType(PyEnum):
 class Notification(db.Model):
     """Modèle pour les notifications utilisateur"""
     __tablename__ = 'notifications'
+    # Liste paginée et comptage des non lues d'un utilisateur en un parcours d'index
+    __table_args__ = (db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -84,8 +86,9 @@ class Notification(db.Model):
     
     @staticmethod
     def get_unread_count(user_id):
-        """Compter les notifications non lues"""
-        return Notification.query.filter_by(user_id=user_id, is_read=False).count()
+        """Compter les notifications non lues (compteur dénormalisé, recompté en base si absent)"""
+        from src.services.notification_counters import unread_counters
+        return unread_counters.get(user_id)
     
     @staticmethod
     def mark_as_read(notification_id, user_id):
@@ -100,7 +103,9 @@ class Notification(db.Model):
     @staticmethod
     def mark_all_as_read(user_id):
         """Marquer toutes les notifications comme lues"""
+        from src.services.notification_counters import unread_counters
         Notification.query.filter_by(user_id=user_id, is_read=False).update({'is_read': True})
+        unread_counters.invalidate_after_commit(db.session, [user_id])
         db.session.commit()
 
 
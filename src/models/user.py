@@ -10,6 +10,10 @@ import logging
 # Logging
 logger = logging.getLogger(__name__)
 
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
 class UserRole(Enum):
     SUPER_ADMIN = "super_admin"
     PLAYER = "player"
@@ -201,7 +205,7 @@ class Video(db.Model):
     file_size = db.Column(db.Integer, nullable=True)  # Taille du fichier en octets
     is_unlocked = db.Column(db.Boolean, default=True)
     credits_cost = db.Column(db.Integer, default=1)
-    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Clé de tri du fil (indexée)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     cdn_migrated_at = db.Column(db.DateTime, nullable=True)  # Date de migration vers Bunny Stream
     bunny_video_id = db.Column(db.String(100), nullable=True)  # ID vidéo Bunny Stream (GUID)
@@ -216,61 +220,83 @@ class Video(db.Model):
     
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     court_id = db.Column(db.Integer, db.ForeignKey('court.id'), nullable=True)
+
+    # Fil "mes vidéos" trié par date (pagination par curseur)
+    __table_args__ = (db.Index('ix_video_user_recorded_at', 'user_id', 'recorded_at'),)
     
     # Relations (en utilisant les backrefs existants)
     # user = défini via backref='owner' dans User.videos
     # court = défini via backref='court' dans Court.videos
 
-    def to_dict(self):
-        # Calculer le statut de suppression
-        deletion_status = "active"  # Par défaut
+    def deletion_status(self) -> str:
+        """État de suppression (local, cloud, les deux, base)"""
         if self.local_file_deleted_at and self.cloud_deleted_at:
-            deletion_status = "deleted_both"  # Supprimé local + cloud
-        elif self.local_file_deleted_at:
-            deletion_status = "deleted_local"  # Supprimé local uniquement
-        elif self.cloud_deleted_at:
-            deletion_status = "deleted_cloud"  # Supprimé cloud uniquement
-        elif self.deleted_at:
-            deletion_status = "deleted_db"  # Supprimé en base (ne devrait pas arriver)
-        
-        # ✅ NOUVEAU: Une vidéo est expirée si le cloud est supprimé ou inexistant
+            return "deleted_both"  # Supprimé local + cloud
+        if self.local_file_deleted_at:
+            return "deleted_local"  # Supprimé local uniquement
+        if self.cloud_deleted_at:
+            return "deleted_cloud"  # Supprimé cloud uniquement
+        if self.deleted_at:
+            return "deleted_db"  # Supprimé en base (ne devrait pas arriver)
+        return "active"
+
+    def is_expired(self) -> bool:
+        # ✅ Une vidéo est expirée si le cloud est supprimé ou inexistant
         # (important pour les joueurs qui ne peuvent plus regarder la vidéo)
-        is_expired = (
-            deletion_status in ["deleted_cloud", "deleted_both"] or
+        return (
+            self.deletion_status() in ["deleted_cloud", "deleted_both"] or
             (self.bunny_video_id is None and self.local_file_path is None) or
             self.cloud_deleted_at is not None
         )
-        
-        return {
-            "id": self.id, "user_id": self.user_id, "court_id": self.court_id,
-            "file_url": self.file_url, "thumbnail_url": self.thumbnail_url,
-            "title": self.title, "description": self.description, "duration": self.duration,
-            "file_size": self.file_size, "is_unlocked": self.is_unlocked, "credits_cost": self.credits_cost,
-            "recorded_at": self.recorded_at.isoformat() if self.recorded_at else None,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "cdn_migrated_at": self.cdn_migrated_at.isoformat() if self.cdn_migrated_at else None,
-            "bunny_video_id": self.bunny_video_id,
-            "processing_status": self.processing_status,  # 'pending', 'uploading', 'processing', 'ready', 'failed'
-            "deleted_at": self.deleted_at.isoformat() if self.deleted_at else None,
-            "is_deleted": self.deleted_at is not None,
-            "deletion_mode": self.deletion_mode,
-            "deletion_status": deletion_status,  # ✅ Indicateur clair de l'état de suppression
-            "is_expired": is_expired,  # ✅ NOUVEAU: Vidéo expirée (cloud supprimé/inexistant)
-            "club_id": self.court.club_id if self.court else None,
-            "court_name": self.court.name if self.court else None,  # ✅ Nom du terrain
-            "club_name": self.court.club.name if (self.court and self.court.club) else None,  # ✅ Nom du club
-            
-            # État des fichiers locaux et cloud
-            "local_file_path": self.local_file_path,
-            "has_local_file": self.local_file_path is not None and self.local_file_deleted_at is None,
-            "has_cloud_file": self.bunny_video_id is not None and self.cloud_deleted_at is None,
-            "local_file_deleted_at": self.local_file_deleted_at.isoformat() if self.local_file_deleted_at else None,
-            "cloud_deleted_at": self.cloud_deleted_at.isoformat() if self.cloud_deleted_at else None,
-            
-            # Simplicité pour frontend - une vidéo est visible si elle est prête ET pas supprimée du cloud
-            "is_watchable": self.bunny_video_id is not None and self.cloud_deleted_at is None and self.processing_status == 'ready',
-            "is_processing": self.processing_status in ['pending', 'uploading', 'processing'],
-        }
+
+    # Champs de to_dict(): chacun calculé seulement s'il est demandé (projection fields=)
+    SERIALIZERS = {
+        "id": lambda v: v.id,
+        "user_id": lambda v: v.user_id,
+        "court_id": lambda v: v.court_id,
+        "file_url": lambda v: v.file_url,
+        "thumbnail_url": lambda v: v.thumbnail_url,
+        "title": lambda v: v.title,
+        "description": lambda v: v.description,
+        "duration": lambda v: v.duration,
+        "file_size": lambda v: v.file_size,
+        "is_unlocked": lambda v: v.is_unlocked,
+        "credits_cost": lambda v: v.credits_cost,
+        "recorded_at": lambda v: _isoformat(v.recorded_at),
+        "created_at": lambda v: _isoformat(v.created_at),
+        "cdn_migrated_at": lambda v: _isoformat(v.cdn_migrated_at),
+        "bunny_video_id": lambda v: v.bunny_video_id,
+        "processing_status": lambda v: v.processing_status,  # 'pending', 'uploading', 'processing', 'ready', 'failed'
+        "deleted_at": lambda v: _isoformat(v.deleted_at),
+        "is_deleted": lambda v: v.deleted_at is not None,
+        "deletion_mode": lambda v: v.deletion_mode,
+        "deletion_status": lambda v: v.deletion_status(),  # ✅ Indicateur clair de l'état de suppression
+        "is_expired": lambda v: v.is_expired(),  # ✅ Vidéo expirée (cloud supprimé/inexistant)
+        "club_id": lambda v: v.court.club_id if v.court else None,
+        "court_name": lambda v: v.court.name if v.court else None,  # ✅ Nom du terrain
+        "club_name": lambda v: v.court.club.name if (v.court and v.court.club) else None,  # ✅ Nom du club
+
+        # État des fichiers locaux et cloud
+        "local_file_path": lambda v: v.local_file_path,
+        "has_local_file": lambda v: v.local_file_path is not None and v.local_file_deleted_at is None,
+        "has_cloud_file": lambda v: v.bunny_video_id is not None and v.cloud_deleted_at is None,
+        "local_file_deleted_at": lambda v: _isoformat(v.local_file_deleted_at),
+        "cloud_deleted_at": lambda v: _isoformat(v.cloud_deleted_at),
+
+        # Simplicité pour frontend - une vidéo est visible si elle est prête ET pas supprimée du cloud
+        "is_watchable": lambda v: v.bunny_video_id is not None and v.cloud_deleted_at is None and v.processing_status == 'ready',
+        "is_processing": lambda v: v.processing_status in ['pending', 'uploading', 'processing'],
+    }
+    # Champs qui lisent le terrain et le club (chargement joint inutile sans eux)
+    COURT_FIELDS = {"club_id", "court_name", "club_name"}
+
+    def to_dict(self, fields=None):
+        """
+        Args:
+            fields: noms de champs à calculer (défaut: tous), les inconnus sont ignorés
+        """
+        names = self.SERIALIZERS if fields is None else fields
+        return {name: self.SERIALIZERS[name](self) for name in names if name in self.SERIALIZERS}
 
 class HighlightVideo(db.Model):
     """Vidéo de highlights générée automatiquement"""
@@ -436,7 +462,7 @@ class RecordingSession(db.Model):
     
     # Statut
     status = db.Column(db.String(20), default='active')  # active, stopped, completed, expired
-    stopped_by = db.Column(db.String(20), nullable=True)  # player, club, auto
+    stopped_by = db.Column(db.String(20), nullable=True)  # player, club, admin, auto
     
     # Métadonnées
     title = db.Column(db.String(200), nullable=True)
@@ -499,6 +525,66 @@ class RecordingSession(db.Model):
         # L'enregistrement expire si la durée planifiée est dépassée
         return elapsed >= self.planned_duration
 
+class RecordingFinalization(db.Model):
+    """Tâche de finalisation d'un enregistrement arrêté (traitée hors requête HTTP)
+
+    Machine à états: stopping → assembling → overlaying → validating → registering →
+    uploading → notifying → done
+    (ou failed après max_attempts). Chaque étape est idempotente et persistée,
+    un redémarrage reprend à l'étape en cours.
+    """
+    __tablename__ = 'recording_finalization'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recording_id = db.Column(db.String(100), unique=True, nullable=False)
+    recording_session_id = db.Column(db.Integer, db.ForeignKey('recording_session.id'), nullable=False)
+    stopped_by = db.Column(db.String(20), nullable=True)  # player, club, admin, auto
+    performed_by_id = db.Column(db.Integer, nullable=True)
+
+    # Machine à états
+    state = db.Column(db.String(20), nullable=False, default='stopping', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=8)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+
+    # Processus propriétaire (FFmpeg local, tâche d'upload en mémoire) et bail de traitement
+    owner = db.Column(db.String(100), nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+
+    # Résultats des étapes
+    local_path = db.Column(db.String(500), nullable=True)
+    overlays_pending = db.Column(db.Boolean, nullable=False, default=False)  # incrustation différée
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id'), nullable=True)
+    upload_id = db.Column(db.String(100), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    recording_session = db.relationship('RecordingSession', backref=db.backref('finalization', uselist=False))
+
+    TERMINAL_STATES = ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'recording_id': self.recording_id,
+            'state': self.state,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'video_id': self.video_id,
+            'upload_id': self.upload_id,
+            'stopped_by': self.stopped_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'is_finished': self.state in self.TERMINAL_STATES
+        }
+
 class ClubActionHistory(db.Model):
     __tablename__ = 'club_action_history'
     id = db.Column(db.Integer, primary_key=True)
@@ -695,6 +781,8 @@ class SharedVideo(db.Model):
     video = db.relationship('Video', backref='shared_instances')
     owner = db.relationship('User', foreign_keys=[owner_user_id], backref='videos_shared_by_me')
     shared_with = db.relationship('User', foreign_keys=[shared_with_user_id], backref='videos_shared_with_me')
+
+    __table_args__ = (db.Index('ix_shared_videos_recipient_shared_at', 'shared_with_user_id', 'shared_at'),)
     
     def to_dict(self):
         """Sérialise en dictionnaire pour l'API"""
@@ -4,6 +4,9 @@ from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Club, Court, Video, UserRole, ClubActionHistory, RecordingSession, ClubOverlay, SharedVideo, UserClip, HighlightJob, HighlightVideo, Transaction, IdempotencyKey
 from src.models.system_configuration import SystemConfiguration, ConfigType
 from src.models.notification import Notification, NotificationType, SupportMessage
+from src.models.credit_ledger import ACCOUNT_CLUB, ACCOUNT_USER, CreditBalanceSnapshot, CreditLedgerEntry
+from src.services import credit_ledger
+from src.services.notification_counters import unread_counters
 from werkzeug.security import generate_password_hash
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import aliased, joinedload
@@ -146,7 +149,9 @@ def update_user(user_id):
     try:
         if "name" in data: user.name = data["name"]
         if "phone_number" in data: user.phone_number = data["phone_number"]
-        if "credits_balance" in data: user.credits_balance = data["credits_balance"]
+        if "credits_balance" in data:
+            credit_ledger.adjust_to(user, lambda _: int(data["credits_balance"]), 'admin_adjustment',
+                                    performed_by_id=session.get('user_id'))
         if "role" in data: user.role = UserRole(data["role"])
         db.session.commit()
         return jsonify({"message": "Utilisateur mis à jour", "user": user.to_dict()}), 200
@@ -220,11 +225,15 @@ def delete_user(user_id):
         
         # 7. Supprimer les notifications de l'utilisateur
         Notification.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+        unread_counters.invalidate_after_commit(db.session, [user_id])
         print(f"   🔔 Notifications supprimées pour l'utilisateur")
         
         # 8. Supprimer les transactions de l'utilisateur
         Transaction.query.filter_by(user_id=user_id).delete(synchronize_session=False)
         print(f"   💰 Transactions supprimées pour l'utilisateur")
+        CreditLedgerEntry.query.filter_by(account_type=ACCOUNT_USER, account_id=user_id).delete(synchronize_session=False)
+        CreditBalanceSnapshot.query.filter_by(account_type=ACCOUNT_USER, account_id=user_id).delete(synchronize_session=False)
+        print(f"   📒 Grand livre des crédits supprimé pour l'utilisateur")
         
         # 9. Supprimer les messages de support de l'utilisateur
         SupportMessage.query.filter_by(user_id=user_id).delete(synchronize_session=False)
@@ -271,8 +280,9 @@ def add_credits(user_id):
         return jsonify({"error": "Le nombre de crédits doit être un entier positif"}), 400
 
     try:
-        old_balance = user.credits_balance
-        user.credits_balance += credits_to_add
+        new_balance = credit_ledger.credit(user, credits_to_add, 'admin_grant',
+                                           performed_by_id=session.get('user_id'))
+        old_balance = new_balance - credits_to_add
         
         log_club_action(
             user_id=user.id, 
@@ -318,8 +328,9 @@ def add_credits_to_club(club_id):
         return jsonify({"error": "Le nombre de crédits doit être un entier positif"}), 400
 
     try:
-        old_balance = club.credits_balance
-        club.credits_balance += credits_to_add
+        new_balance = credit_ledger.credit(club, credits_to_add, 'admin_grant',
+                                           performed_by_id=session.get('user_id'))
+        old_balance = new_balance - credits_to_add
         
         # Récupérer l'utilisateur du club pour l'historique
         club_user = User.query.filter_by(club_id=club.id, role=UserRole.CLUB).first()
@@ -508,8 +519,10 @@ def update_club(club_id):
             try:
                 new_balance = int(data["credits_balance"])
                 if new_balance >= 0:
-                    old_balance = club.credits_balance
-                    club.credits_balance = new_balance
+                    old_balance, new_balance = credit_ledger.adjust_to(
+                        club, lambda _: new_balance, 'admin_adjustment',
+                        performed_by_id=session.get('user_id')
+                    )
                     # Log credit adjustment
                     if old_balance != new_balance:
                          log_club_action(
@@ -844,168 +857,17 @@ def admin_stop_recording(recording_id):
         if not active_recording:
             return jsonify({"error": "Session d'enregistrement non trouvée ou déjà terminée"}), 404
         
-        # Récupérer le terrain
-        court = Court.query.get(active_recording.court_id)
-        if not court:
-            return jsonify({"error": "Terrain non trouvé"}), 404
-        
-        # Marquer la session comme terminée
-        active_recording.status = 'stopped'
-        active_recording.end_time = datetime.utcnow()
-        active_recording.stopped_by = 'admin'
-        
         # Libérer le terrain
-        court.is_recording = False
-        court.current_recording_id = None
-        logger.info(f"🔓 Terrain {court.name} libéré (enregistrement admin)")
-
-        # Calculer la durée estimée
-        duration_minutes = 1
-        if active_recording.start_time:
-            duration_seconds = (active_recording.end_time - active_recording.start_time).total_seconds()
-            duration_minutes = max(1, int(duration_seconds / 60))
-
-        # 🆕 Arrêter l'enregistrement vidéo via NOUVEAU système
-        from src.video_system.session_manager import session_manager
-        from src.video_system.recording import video_recorder
-        
-        video_file_url = None
-        try:
-            # Arrêter enregistrement FFmpeg
-            video_file_path = video_recorder.stop_recording(active_recording.recording_id)
-            logger.info(f"Arrêt enregistrement via nouveau système: {video_file_path}")
-            
-            # Fermer session proxy
-            session = session_manager.get_session(active_recording.recording_id)
-            if session:
-                session.recording_active = False
-            session_manager.close_session(active_recording.recording_id)
-            
-            # Déterminer URL fichier
-            if video_file_path and os.path.exists(video_file_path):
-                video_file_url = video_file_path
-            else:
-                # Fallback search
-                possible_paths = [
-                    f"static/videos/{court.club_id}/{active_recording.recording_id}.mp4",
-                    f"static/videos/{active_recording.recording_id}.mp4"
-                ]
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        video_file_url = path
-                        break
-                
-        except Exception as e:
-            logger.warning(f"Erreur lors de l'arrêt du service vidéo: {e}")
-
-        # Créer la vidéo en base
-        # Format: "Match [jour/mois], Terrain [n°], [nom club]"
-        recorded_date = active_recording.start_time.strftime('%d/%m') if active_recording.start_time else datetime.now().strftime('%d/%m')
-        club = Club.query.get(court.club_id) if court.club_id else None
-        club_name = club.name if club else "Club"
-        video_title = active_recording.title or f"Match {recorded_date}, {court.name}, {club_name}"
-        
-        new_video = Video(
-            title=video_title,
-            description=f"Arrêté par administrateur le {datetime.now().strftime('%d/%m/%Y %H:%M')}",
-            duration=duration_minutes * 60, # Temporaire, sera affiné
-            user_id=active_recording.user_id,
-            court_id=court.id,
-            recorded_at=active_recording.start_time,
-            file_url=video_file_url,
-            local_file_path=video_file_url,  # ✅ AJOUTÉ: Sauvegarder le chemin local du fichier
-            is_unlocked=True,
-            credits_cost=0
-        )
-        
-        # Vérification durée réelle avec FFprobe
-        if video_file_url and os.path.exists(video_file_url):
-            try:
-                import time
-                time.sleep(1) # Attendre flush disque
-                
-                from src.services.ffmpeg_runner import FFmpegRunner
-                runner = FFmpegRunner()
-                ffprobe_result = runner.probe_video_info(video_file_url)
-                
-                if ffprobe_result:
-                    real_duration_seconds = ffprobe_result['duration']
-                    new_video.duration = int(real_duration_seconds)
-                    logger.info(f"🎯 Durée réelle FFprobe appliquée: {new_video.duration}s")
-            except Exception as e:
-                logger.warning(f"⚠️ Erreur lecture durée réelle: {e}")
-
-        db.session.add(new_video)
-        db.session.flush() # Pour avoir l'ID
-        
-        # Upload Bunny CDN
-        if video_file_url and os.path.exists(video_file_url):
-            try:
-                from src.services.bunny_storage_service import bunny_storage_service
-                logger.info(f"🚀 Début upload vers Bunny CDN: {video_file_url}")
-                
-                # 🆕 Mettre à jour le statut avant l'upload
-                new_video.processing_status = 'uploading'
-                db.session.commit()
-                
-                upload_id = bunny_storage_service.queue_upload(
-                    local_path=video_file_url,
-                    title=new_video.title,
-                    metadata={
-                        'video_id': new_video.id,
-                        'user_id': active_recording.user_id,
-                        'court_id': court.id,
-                        'recording_id': active_recording.recording_id,
-                        'duration': new_video.duration
-                    }
-                )
-                logger.info(f"✅ Upload Bunny programmé: {upload_id}")
-                
-                # ✨ NEW: Wait briefly for upload to complete and extract bunny_video_id
-                import time
-                time.sleep(3)  # Give queue time to process and create video
-                
-                upload_status = bunny_storage_service.get_upload_status(upload_id)
-                if upload_status and upload_status.get('bunny_video_id'):
-                    new_video.bunny_video_id = upload_status['bunny_video_id']
-                    # ✨ NEW: Update processing status so updater picks it up
-                    new_video.processing_status = 'processing'
-                    # ✨ NEW: Also update file_url to Bunny CDN URL
-                    from src.config.bunny_config import BUNNY_CONFIG
-                    cdn_hostname = BUNNY_CONFIG.get('cdn_hostname', 'vz-9b857324-07d.b-cdn.net')
-                    new_video.file_url = f"https://{cdn_hostname}/{new_video.bunny_video_id}/playlist.m3u8"
-                    logger.info(f"✅ Bunny video ID saved: {new_video.bunny_video_id}")
-                    logger.info(f"✅ Bunny URL updated: {new_video.file_url}")
-                else:
-                    logger.warning(f"⚠️ Upload status: {upload_status}")
-            except Exception as e:
-                logger.warning(f"⚠️ Erreur upload Bunny: {e}")
-        
-        db.session.commit()
-        
-        logger.info(f"✅ Enregistrement {recording_id} arrêté par admin - Vidéo ID: {new_video.id}")
-        
-        # Créer une notification pour l'utilisateur
-        try:
-            from src.models.notification import Notification, NotificationType
-            
-            Notification.create_notification(
-                user_id=new_video.user_id,
-                notification_type=NotificationType.RECORDING_STOPPED,
-                title="Enregistrement terminé",
-                message=f"Votre session a été arrêtée par un administrateur. La vidéo est en cours de traitement.",
-                link="/player"  # Lien vers le dashboard
-            )
-            logger.info(f"✅ Notification 'Arrêt' créée pour user {new_video.user_id}")
-        except Exception as notif_error:
-            logger.error(f"❌ Erreur création notification: {notif_error}")
+        court = Court.query.get(active_recording.court_id)
+        if court:
+            court.current_recording_id = None
         
-        return jsonify({
-            "message": "Enregistrement arrêté avec succès",
-            "recording_id": recording_id,
-            "video_id": new_video.id,
-            "duration_seconds": new_video.duration
-        }), 200
+        # Arrêt FFmpeg, fichier final, vidéo, upload Bunny et notification: RecordingFinalizer
+        # (réponse 202, suivi via /api/recording/finalization/<recording_id>)
+        from src.routes.recording import stop_recording_session
+        response = stop_recording_session(active_recording, 'admin', session.get("user_id"))
+        logger.info(f"✅ Enregistrement {recording_id} arrêté par admin, finalisation en arrière-plan")
+        return response
         
     except Exception as e:
         db.session.rollback()
@@ -1445,25 +1307,8 @@ def get_clubs_statistics():
             except:
                 followers_count = 0
             
-            # Calculer les crédits distribués
-            credits_distributed = 0
-            try:
-                credit_entries = ClubActionHistory.query.filter_by(
-                    club_id=club.id,
-                    action_type='add_credits'
-                ).all()
-                
-                for entry in credit_entries:
-                    try:
-                        if entry.action_details:
-                            details = json.loads(entry.action_details)
-                            credits_added = details.get('credits_added', 0)
-                            if isinstance(credits_added, (int, float)):
-                                credits_distributed += int(credits_added)
-                    except:
-                        pass
-            except:
-                credits_distributed = 0
+            # Crédits distribués aux joueurs (débits 'club_grant' du compte club au grand livre)
+            credits_distributed = credit_ledger.totals(ACCOUNT_CLUB, club.id, reasons=['club_grant'])['total_debited']
             
             # Activité récente du club
             recent_activity_count = ClubActionHistory.query.filter_by(club_id=club.id).filter(
@@ -2150,15 +1995,18 @@ def bulk_update_credits():
         else:
             users = User.query.filter_by(role=UserRole.PLAYER).all()
         
+        if operation == 'add':
+            compute = lambda balance: balance + amount
+        elif operation == 'set':
+            compute = lambda balance: amount
+        else:
+            compute = lambda balance: int(balance * amount)
+        
         for user in users:
-            old_balance = user.credits_balance
-            
-            if operation == 'add':
-                user.credits_balance += amount
-            elif operation == 'set':
-                user.credits_balance = amount
-            elif operation == 'multiply':
-                user.credits_balance = int(user.credits_balance * amount)
+            # Compare-and-swap par compte: un débit concurrent n'est jamais écrasé
+            old_balance, _ = credit_ledger.adjust_to(user, compute, 'admin_adjustment',
+                                                     reference=f"bulk:{operation}",
+                                                     performed_by_id=session.get('user_id'))
             
             # Log the action
             log_club_action(
@@ -13,6 +13,7 @@ from ..services.email_verification_service import (
     verify_email_code
 )
 from ..utils.jwt_helpers import generate_jwt_token, get_current_user_from_token  # 🆕 JWT Support
+from ..utils.current_user import current_user, current_user_snapshot
 from ..middleware.rate_limiter import rate_limit  # 🛡️ Rate limiting protection
 import re
 import traceback
@@ -601,10 +602,7 @@ def get_current_user():
     Récupère l'utilisateur actuellement connecté depuis la session
     Retourne None si aucun utilisateur n'est connecté
     """
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    return current_user()
 
 def require_auth(f):
     """
@@ -612,8 +610,8 @@ def require_auth(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        current_user = get_current_user()
-        if not current_user:
+        # Instantané en cache: pas de requête SQL pour les endpoints interrogés en boucle
+        if not current_user_snapshot():
             return jsonify({'error': 'Authentification requise'}), 401
         return f(*args, **kwargs)
     return decorated_function
@@ -624,10 +622,10 @@ def require_admin(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        current_user = get_current_user()
-        if not current_user:
+        user = current_user_snapshot()
+        if not user:
             return jsonify({'error': 'Authentification requise'}), 401
-        if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        if user.role != UserRole.SUPER_ADMIN:
             return jsonify({'error': 'Privilèges administrateur requis'}), 403
         return f(*args, **kwargs)
     return decorated_function
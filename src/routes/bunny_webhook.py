@@ -0,0 +1,67 @@
+"""
+Webhook Bunny Stream
+Bunny appelle cette URL à chaque changement de statut d'encodage: la vidéo, le clip
+ou le highlight correspondant passe à 'ready'/'completed' sans attendre le balayage.
+
+URL à configurer dans la bibliothèque Bunny:
+    https://<domaine>/api/webhooks/bunny?token=<BUNNY_WEBHOOK_SECRET>
+"""
+
+import hmac
+import logging
+import os
+
+from flask import Blueprint, request, jsonify
+
+from ..services.bunny_status_updater import (
+    WEBHOOK_STATUS_STATES, apply_bunny_statuses, get_bunny_status_updater
+)
+
+logger = logging.getLogger(__name__)
+
+bunny_webhook_bp = Blueprint('bunny_webhook', __name__, url_prefix='/api/webhooks')
+
+
+@bunny_webhook_bp.route('/bunny', methods=['POST'])
+def bunny_stream_webhook():
+    """Recevoir un changement de statut Bunny Stream"""
+    secret = os.environ.get('BUNNY_WEBHOOK_SECRET')
+    if not secret:
+        return jsonify({'error': 'Webhook Bunny non configuré'}), 404
+
+    if not hmac.compare_digest(request.args.get('token', ''), secret):
+        logger.warning("Webhook Bunny reçu avec un jeton invalide")
+        return jsonify({'error': 'Jeton invalide'}), 403
+
+    payload = request.get_json(silent=True) or {}
+    guid = payload.get('VideoGuid')
+    status = payload.get('Status')
+    if not guid or status is None:
+        return jsonify({'error': 'VideoGuid et Status requis'}), 400
+
+    library_id = os.environ.get('BUNNY_LIBRARY_ID')
+    if library_id and str(payload.get('VideoLibraryId', library_id)) != str(library_id):
+        return jsonify({'status': 'ignored', 'reason': 'autre bibliothèque'}), 200
+
+    state = WEBHOOK_STATUS_STATES.get(status)
+    if state is None:
+        # Sous-titres, titres générés...: rien à faire
+        return jsonify({'status': 'ignored'}), 200
+
+    # Durée réelle uniquement disponible sur l'objet vidéo
+    length = None
+    if state == 'ready':
+        try:
+            info = get_bunny_status_updater().fetch_video(guid)
+            length = info.get('length') if info else None
+        except Exception as e:
+            logger.warning(f"⚠️ Durée Bunny indisponible pour {guid}: {e}")
+
+    try:
+        counts = apply_bunny_statuses({guid: (state, length)})
+    except Exception as e:
+        logger.error(f"❌ Erreur application webhook Bunny {guid}: {e}")
+        return jsonify({'error': 'Erreur application du statut'}), 500
+
+    logger.info(f"📬 Webhook Bunny {guid}: statut {status} → {state} {counts}")
+    return jsonify({'status': 'ok', 'state': state, 'updated': counts}), 200
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Club, Court, UserRole, ClubActionHistory, Video, RecordingSession
+from src.utils.current_user import current_user
 from src.models.system_settings import SystemSettings
 from src.models.notification import Notification, NotificationType
+from src.models.credit_ledger import ACCOUNT_CLUB
 from src.routes.admin import log_club_action
 from datetime import datetime, timedelta
 import json
@@ -11,6 +13,8 @@ import logging
 from werkzeug.security import generate_password_hash
 from sqlalchemy.orm import joinedload
 from src.extensions import cache
+from src.services import credit_ledger, dashboard_read_model
+from src.services.credit_ledger import InsufficientCredits
 
 # Logger pour tracer les actions
 logger = logging.getLogger(__name__)
@@ -19,10 +23,7 @@ logger = logging.getLogger(__name__)
 clubs_bp = Blueprint('clubs', __name__)
 
 def get_current_user():
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    return current_user()
 
 # Route pour récupérer la liste des clubs
 @clubs_bp.route('/', methods=['GET'])
@@ -142,29 +143,20 @@ def diagnostic_club_data(club_id):
             followers_count = 0
             followers_data = []
         
-        # 5. Vérifier les crédits dans l'historique
-        credit_entries = ClubActionHistory.query.filter_by(
-            club_id=club.id,
-            action_type='add_credits'
-        ).all()
+        # 5. Vérifier les crédits offerts (débits 'club_grant' du compte club au grand livre)
+        credit_entries = credit_ledger.entries(ACCOUNT_CLUB, club.id, reasons=['club_grant'])
         
-        print(f"Entrées de crédits trouvées: {len(credit_entries)}")
+        print(f"Mouvements de crédits trouvés: {len(credit_entries)}")
         credits_data = []
-        total_credits = 0
         for entry in credit_entries:
-            try:
-                details = json.loads(entry.action_details)
-                credits_added = details.get('credits_added', 0)
-                total_credits += int(credits_added)
-                credits_data.append({
-                    'id': entry.id,
-                    'user_id': entry.user_id,
-                    'credits_added': credits_added,
-                    'performed_at': entry.performed_at.isoformat()
-                })
-                print(f"  - Entrée {entry.id}: {credits_added} crédits pour user {entry.user_id}")
-            except Exception as e:
-                print(f"  - Erreur parsing entrée {entry.id}: {e}")
+            credits_data.append({
+                'id': entry.id,
+                'performed_by_id': entry.performed_by_id,
+                'credits_added': -entry.delta,
+                'performed_at': entry.created_at.isoformat() if entry.created_at else None
+            })
+            print(f"  - Mouvement {entry.id}: {-entry.delta} crédits offerts")
+        total_credits = credit_ledger.totals(ACCOUNT_CLUB, club.id, reasons=['club_grant'])['total_debited']
         
         print(f"Total crédits calculés: {total_credits}")
         
@@ -235,200 +227,18 @@ def get_club_dashboard():
         
         print(f"Récupération du tableau de bord pour le club ID: {club.id}, nom: {club.name}")
         
-        # 1. Compter les joueurs associés au club - Méthode similaire à admin.py
-        players = User.query.filter_by(club_id=club.id, role=UserRole.PLAYER).all()
-        players_count = len(players)
-        print(f"Nombre de joueurs: {players_count}")
-        
-        # Debug: afficher les joueurs trouvés
-        for player in players[:3]:
-            print(f"  Joueur: {player.name} (ID: {player.id}, club_id: {player.club_id})")
-        
-        # 2. Compter les terrains du club et vérifier leur statut d'occupation
-        courts = Court.query.filter_by(club_id=club.id).all()
-        courts_count = len(courts)
-        print(f"Nombre de terrains: {courts_count}")
-        
-        # ACTIVATION: Nettoyer automatiquement les sessions expirées
-        # pour libérer les terrains qui ne sont plus réellement occupés
-        try:
-            # Nettoyer les sessions expirées
-            expired_sessions = RecordingSession.query.filter_by(status='active').all()
-            cleaned_count = 0
-            
-            for session in expired_sessions:
-                if session.is_expired():
-                    session.status = 'completed'
-                    
-                    # 🔧 LIBÉRER LE TERRAIN (FIX CRITIQUE)
-                    court = Court.query.get(session.court_id)
-                    if court:
-                        court.is_recording = False
-                        print(f"🔓 Terrain {court.name} (ID:{court.id}) libéré")
-                    
-                    cleaned_count += 1
-                    print(f"Nettoyage session expirée {session.id} (Court {session.court_id})")
-            
-            if cleaned_count > 0:
-                db.session.commit()
-                print(f"✅ {cleaned_count} session(s) expirée(s) nettoyée(s)")
-                
-        except Exception as e:
-            print(f"Erreur lors du nettoyage des sessions expirées: {e}")
-        
-        # Enrichir les informations des terrains avec le statut d'occupation
-        courts_with_status = []
-        for court in courts:
-            court_dict = court.to_dict()
-            
-            # Vérifier s'il y a un enregistrement actif sur ce terrain
-            active_recording = RecordingSession.query.filter_by(
-                court_id=court.id,
-                status='active'
-            ).first()
-            
-            if active_recording and not active_recording.is_expired():
-                court_dict.update({
-                    'is_occupied': True,
-                    'occupation_status': 'Occupé - Enregistrement en cours',
-                    'recording_player': active_recording.user.name if active_recording.user else 'Joueur inconnu',
-                    'recording_remaining': active_recording.get_remaining_minutes(),
-                    'recording_total': active_recording.planned_duration
-                })
-            else:
-                court_dict.update({
-                    'is_occupied': False,
-                    'occupation_status': 'Disponible',
-                    'recording_player': None,
-                    'recording_remaining': None,
-                    'recording_total': None
-                })
-            
-            courts_with_status.append(court_dict)
-            print(f"  Terrain: {court.name} (ID: {court.id}) - {court_dict['occupation_status']}")
-        
-        courts = courts_with_status
-        
-        # 3. Compter les vidéos - Requête similaire à admin.py avec jointures explicites
-        court_ids = [court_data['id'] if isinstance(court_data, dict) else court_data.id for court_data in courts]
-        videos_count = 0
-        
-        if court_ids:
-            # Utiliser une requête avec joinedload pour éviter le problème N+1
-            videos = db.session.query(Video).options(joinedload(Video.owner)).join(Court, Video.court_id == Court.id).filter(
-                Court.club_id == club.id
-            ).all()
-            videos_count = len(videos)
-            
-            # Debug: afficher les vidéos trouvées
-            print(f"Nombre de vidéos: {videos_count}")
-            for video in videos[:3]:
-                player_name = video.owner.name if video.owner else 'Joueur inconnu'
-                print(f"  Vidéo: {video.title} (ID: {video.id}, joueur: {player_name})")
-        else:
-            videos = []
-            print("Aucun terrain trouvé, donc aucune vidéo")
+        # Vidéos paginées (les statistiques portent sur l'ensemble)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
         
-        # 4. Compter les followers - Correction de la méthode
-        followers_count = 0
-        try:
-            # Utiliser une requête directe comme dans admin.py
-            followers = db.session.query(User).join(
-                club.followers.property.secondary
-            ).filter(
-                club.followers.property.secondary.c.club_id == club.id
-            ).all()
-            followers_count = len(followers)
-            
-            print(f"Nombre de followers: {followers_count}")
-            # Debug: afficher les followers trouvés
-            for follower in followers[:3]:
-                print(f"  Follower: {follower.name} (ID: {follower.id})")
-                
-        except Exception as e:
-            # Fallback: utiliser la relation directe
-            try:
-                followers_list = club.followers.all()
-                followers_count = len(followers_list)
-                print(f"Nombre de followers (fallback): {followers_count}")
-            except Exception as e2:
-                print(f"Erreur lors du comptage des followers: {e}, fallback: {e2}")
-                followers_count = 0
-        
-        # 5. Compter les crédits offerts - Amélioration de la méthode
-        credits_given = 0
-        try:
-            # Récupérer toutes les entrées d'historique de type 'add_credits', 'club_add_credits' et 'admin_add_credits' pour ce club
-            credit_entries = db.session.query(ClubActionHistory).filter(
-                ClubActionHistory.club_id == club.id,
-                ClubActionHistory.action_type.in_(['add_credits', 'club_add_credits', 'admin_add_credits'])
-            ).all()
-            
-            print(f"Entrées de crédits trouvées: {len(credit_entries)}")
-            
-            # Parcourir chaque entrée pour extraire les crédits
-            for entry in credit_entries:
-                try:
-                    if entry.action_details:
-                        details = json.loads(entry.action_details)
-                        credits_added = details.get('credits_added', 0)
-                        if isinstance(credits_added, (int, float)):
-                            credits_given += int(credits_added)
-                            print(f"  Entrée {entry.id}: +{credits_added} crédits")
-                        else:
-                            print(f"  Entrée {entry.id}: valeur de crédits invalide: {credits_added}")
-                    else:
-                        print(f"  Entrée {entry.id}: pas de détails")
-                except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
-                    print(f"  Erreur parsing entrée {entry.id}: {e}")
-            
-            print(f"Total des crédits offerts: {credits_given}")
-            
-        except Exception as e:
-            print(f"Erreur lors du calcul des crédits: {e}")
-            credits_given = 0
-        
-        # Statistiques finales - CORRIGER LES NOMS POUR CORRESPONDRE AU FRONTEND
-        stats = {
-            'total_players': players_count,      # Frontend attend 'total_players'
-            'total_courts': courts_count,        # Frontend attend 'total_courts'
-            'total_videos': videos_count,        # Frontend attend 'total_videos'
-            'total_credits_offered': credits_given,  # Frontend attend 'total_credits_offered'
-            'followers_count': followers_count,  # Pas utilisé dans le frontend actuellement
-            # Garder aussi les anciens noms pour compatibilité
-            'players_count': players_count,
-            'courts_count': courts_count,
-            'videos_count': videos_count,
-            'credits_given': credits_given
+        dashboard = dashboard_read_model.club_dashboard(club, page, per_page)
+        dashboard['debug_info'] = {
+            'user_id': user.id,
+            'club_id': user.club_id,
+            'role': user.role.value,
+            'court_ids': [court['id'] for court in dashboard['courts']]
         }
-        
-        print(f"Statistiques finales: {stats}")
-        
-        # Enrichir les vidéos avec le nom du joueur
-        videos_enriched = []
-        if videos:
-            for video in videos:
-                video_dict = video.to_dict()
-                # Ajouter le nom du joueur
-                if video.owner:
-                    video_dict['player_name'] = video.owner.name
-                else:
-                    video_dict['player_name'] = 'Joueur inconnu'
-                videos_enriched.append(video_dict)
-        
-        return jsonify({
-            'club': club.to_dict(),
-            'stats': stats,
-            'players': [player.to_dict() for player in players],  # Ajouter les joueurs pour le frontend
-            'courts': courts,      # Ajouter les terrains avec statut d'occupation pour le frontend
-            'videos': videos_enriched,  # Vidéos enrichies avec nom du joueur
-            'debug_info': {
-                'user_id': user.id,
-                'club_id': user.club_id,
-                'role': user.role.value,
-                'court_ids': court_ids
-            }
-        }), 200
+        return jsonify(dashboard), 200
         
     except Exception as e:
         print(f"Erreur lors de la récupération du tableau de bord: {e}")
@@ -767,8 +577,8 @@ def buy_club_credits():
             return jsonify({'error': 'Club non trouvé'}), 404
         
         # Ajouter les crédits au club
-        old_balance = club.credits_balance
-        club.credits_balance += credits_amount
+        new_balance = credit_ledger.credit(club, credits_amount, 'purchase', performed_by_id=user.id)
+        old_balance = new_balance - credits_amount
         
         # Logger dans l'historique
         log_club_action(
@@ -873,15 +683,23 @@ def add_credits_to_player(player_id):
                 'credits_requested': credits
             }), 400
         
-        # Déduire les crédits du club
-        logger.info(f"💸 [ADD CREDITS] Déduction crédits club - ancien={club.credits_balance}, nouveau={club.credits_balance - credits}")
-        old_club_balance = club.credits_balance
-        club.credits_balance -= credits
-        
-        # Ajouter les crédits au joueur
-        logger.info(f"✨ [ADD CREDITS] Ajout crédits joueur - ancien={player.credits_balance}, nouveau={player.credits_balance + credits}")
-        old_balance = player.credits_balance
-        player.credits_balance += credits
+        # Transfert club -> joueur: débit conditionnel du club (un transfert concurrent
+        # ne peut pas le faire passer sous zéro) puis crédit du joueur, même transaction
+        try:
+            club_balance, player_balance = credit_ledger.transfer(
+                club, player, credits, 'club_grant', reference=f"club:{club.id}", performed_by_id=user.id
+            )
+        except InsufficientCredits as e:
+            db.session.rollback()
+            logger.error(f"❌ [ADD CREDITS] Solde insuffisant - solde={e.available}, demandé={credits}")
+            return jsonify({
+                'error': f'Solde insuffisant. Vous avez {e.available} crédits, vous essayez d\'en offrir {credits}.',
+                'club_balance': e.available,
+                'credits_requested': credits
+            }), 400
+        old_club_balance = club_balance + credits
+        old_balance = player_balance - credits
+        logger.info(f"💸 [ADD CREDITS] Transfert effectué - club={club_balance}, joueur={player_balance}")
         
         # Enregistrer l'action dans l'historique
         logger.info(f"📝 [ADD CREDITS] Création entrée historique")
@@ -1168,25 +986,8 @@ def test_dashboard_json():
         except:
             followers_count = 0
         
-        # 5. Compter les crédits
-        credits_given = 0
-        try:
-            credit_entries = db.session.query(ClubActionHistory).filter_by(
-                club_id=club.id,
-                action_type='add_credits'
-            ).all()
-            
-            for entry in credit_entries:
-                try:
-                    if entry.action_details:
-                        details = json.loads(entry.action_details)
-                        credits_added = details.get('credits_added', 0)
-                        if isinstance(credits_added, (int, float)):
-                            credits_given += int(credits_added)
-                except:
-                    pass
-        except:
-            credits_given = 0
+        # 5. Crédits offerts aux joueurs (débits 'club_grant' du compte club au grand livre)
+        credits_given = credit_ledger.totals(ACCOUNT_CLUB, club.id, reasons=['club_grant'])['total_debited']
         
         # Réponse JSON claire - NOMS COMPATIBLES AVEC LE FRONTEND
         response_data = {
@@ -1722,7 +1523,7 @@ def stop_court_recording(court_id):
             return jsonify({'error': 'Ce terrain ne vous appartient pas'}), 403
         
         # Importer les classes nécessaires
-        from src.models.user import RecordingSession, Video
+        from src.models.user import RecordingSession
         
         # Trouver l'enregistrement actif sur ce terrain
         active_recording = RecordingSession.query.filter_by(
@@ -1733,219 +1534,13 @@ def stop_court_recording(court_id):
         if not active_recording:
             return jsonify({'error': 'Aucun enregistrement actif sur ce terrain'}), 404
         
-        # Arrêter l'enregistrement
-        active_recording.status = 'stopped'
-        active_recording.end_time = datetime.utcnow()
-        active_recording.stopped_by = 'club'
-        
         # IMPORTANT: Libérer le terrain pour que le joueur le voit comme disponible
-        court.is_recording = False
         court.current_recording_id = None
         
-        # Calculer la durée de l'enregistrement avec debug
-        start_time = active_recording.start_time
-        end_time = active_recording.end_time
-        
-        print(f"DEBUG - Calcul durée:")
-        print(f"  Start time: {start_time}")
-        print(f"  End time: {end_time}")
-        
-        if start_time and end_time:
-            duration_delta = end_time - start_time
-            duration_seconds = duration_delta.total_seconds()
-            duration_minutes = max(1, int(duration_seconds / 60))  # Minimum 1 minute
-            
-            print(f"  Durée en secondes: {duration_seconds}")
-            print(f"  Durée en minutes: {duration_minutes}")
-        else:
-            # Fallback si les dates sont nulles
-            duration_minutes = 1
-            print(f"  Fallback: durée fixée à 1 minute")
-        
-        
-        # 🆕 Arrêter l'enregistrement vidéo via NOUVEAU système
-        from src.video_system.session_manager import session_manager
-        from src.video_system.recording import video_recorder
-        
-        try:
-            # Arrêter enregistrement FFmpeg
-            video_file_path = video_recorder.stop_recording(active_recording.recording_id)
-            logger.info(f"Arrêt enregistrement via nouveau système: {video_file_path}")
-            
-            # Fermer session proxy
-            # CRITIQUE: Marquer comme inactif AVANT de fermer
-            session = session_manager.get_session(active_recording.recording_id)
-            if session:
-                session.recording_active = False
-            session_manager.close_session(active_recording.recording_id)
-            
-            # Le fichier est dans static/videos/{club_id}/{session_id}.mp4
-            if video_file_path:
-                video_file_url = f"videos/{court.club_id}/{active_recording.recording_id}.mp4"
-            else:
-                video_file_url = None
-                
-        except Exception as e:
-            logger.warning(f"Erreur lors de l'arrêt du service vidéo: {e}")
-            video_file_url = None
-                
-        # Créer automatiquement une vidéo pour le joueur
-        # Format: "Match [jour/mois], Terrain [n°], [nom club]"
-        recorded_date = active_recording.start_time.strftime('%d/%m') if active_recording.start_time else datetime.now().strftime('%d/%m')
-        club = Club.query.get(court.club_id) if court.club_id else None
-        club_name = club.name if club else "Club"
-        video_title = active_recording.title or f"Match {recorded_date}, {court.name}, {club_name}"
-        
-        # Déterminer l'URL du fichier vidéo
-        video_file_url = None
-        # video_file_url déjà défini plus haut (ligne ~1449)
-        # Vérifier que le fichier existe
-        if not video_file_url or not os.path.exists(video_file_url):
-            possible_paths = [
-                f"static/videos/{court.club_id}/{active_recording.recording_id}.mp4",
-                f"static/videos/{active_recording.recording_id}.mp4"
-            ]
-            for path in possible_paths:
-                if os.path.exists(path):
-                    video_file_url = path
-                    logger.info(f"Fichier vidéo trouvé: {path}")
-                    break
-            else:
-                logger.warning(f"Fichier vidéo introuvable pour {active_recording.recording_id}")
-        
-        new_video = Video(
-            title=video_title,
-            description=active_recording.description or f"Enregistrement automatique sur {court.name}",
-            duration=duration_minutes,  # ⚠️ TEMPORAIRE - sera corrigé ci-dessous
-            user_id=active_recording.user_id,
-            court_id=court_id,
-            recorded_at=active_recording.start_time,
-            file_url=video_file_url,  # ✅ Ajouter l'URL du fichier
-            is_unlocked=True,  # Vidéo débloquée automatiquement
-            credits_cost=0     # Pas de coût puisque l'enregistrement a été arrêté par le club
-        )
-        
-        # 🔍 CORRECTION CRITIQUE - Vérifier durée réelle du fichier (comme dans recording.py)
-        if video_file_url and os.path.exists(video_file_url):
-            try:
-                logger.info(f"🔍 Vérification durée réelle fichier: {video_file_url}")
-                
-                # Attendre que le fichier soit complètement finalisé
-                import time
-                time.sleep(2)
-                
-                # Utiliser ffprobe pour obtenir la durée réelle
-                # Utiliser FFmpegRunner
-                from src.services.ffmpeg_runner import FFmpegRunner
-                runner = FFmpegRunner()
-                ffprobe_result = runner.probe_video_info(video_file_url)
-                
-                if ffprobe_result:
-                    real_duration_seconds = ffprobe_result['duration']
-                    real_duration_minutes = real_duration_seconds / 60
-                    difference_seconds = abs(real_duration_seconds - (duration_minutes * 60))
-                    
-                    logger.info(f"📊 COMPARAISON DURÉES (route clubs):")
-                    logger.info(f"   🗄️ DB (calcul): {duration_minutes:.2f} min = {duration_minutes * 60:.0f}s")
-                    logger.info(f"   🎥 Fichier réel: {real_duration_minutes:.2f} min = {real_duration_seconds:.0f}s")
-                    logger.info(f"   📈 Différence: {difference_seconds:.0f}s")
-                    
-                    if difference_seconds > 10:  # Différence significative
-                        logger.warning(f"⚠️ ÉCART IMPORTANT: {difference_seconds:.0f}s - utilisation durée réelle")
-                        new_video.duration = real_duration_seconds  # ✅ Correction durée
-                    else:
-                        logger.info("✅ Durées cohérentes")
-                        new_video.duration = real_duration_seconds  # ✅ Utiliser durée précise même si cohérente
-                        
-                    logger.info(f"🎯 DURÉE FINALE clubs.py: {new_video.duration:.0f}s")
-                else:
-                    logger.warning("⚠️ Impossible de lire durée réelle - utilisation durée DB")
-                    new_video.duration = duration_minutes * 60  # Conversion en secondes
-            except Exception as e:
-                logger.error(f"❌ Erreur lecture durée réelle: {e}")
-                new_video.duration = duration_minutes * 60
-        else:
-            logger.warning("⚠️ Pas de fichier pour vérification - utilisation durée DB")
-            new_video.duration = duration_minutes * 60
-        
-        db.session.add(new_video)
-        
-        # Upload automatique vers Bunny CDN si le fichier existe
-        if video_file_url and os.path.exists(video_file_url):
-            try:
-                from src.services.bunny_storage_service import bunny_storage_service
-                
-                logger.info(f"🚀 Début upload vers Bunny CDN: {video_file_url}")
-                
-                # Déclencher l'upload en arrière-plan
-                upload_id = bunny_storage_service.queue_upload(
-                    local_path=video_file_url,
-                    title=new_video.title,
-                    metadata={
-                        'video_id': new_video.id,
-                        'user_id': active_recording.user_id,
-                        'court_id': court_id,
-                        'recording_id': active_recording.recording_id,
-                        'duration': duration_minutes
-                    }
-                )
-                
-                if upload_id:
-                    logger.info(f"✅ Upload Bunny programmé avec ID: {upload_id}")
-                    
-                    # ✨ CORRECTION: Wait for upload and update bunny_video_id + file_url
-                    import time
-                    time.sleep(3)  # Give queue time to process
-                    
-                    upload_status = bunny_storage_service.get_upload_status(upload_id)
-                    if upload_status and upload_status.get('bunny_video_id'):
-                        bunny_id = upload_status['bunny_video_id']
-                        new_video.bunny_video_id = bunny_id
-                        from src.config.bunny_config import BUNNY_CONFIG
-                        cdn_hostname = BUNNY_CONFIG.get('cdn_hostname', 'vz-9b857324-07d.b-cdn.net')
-                        new_video.file_url = f"https://{cdn_hostname}/{bunny_id}/playlist.m3u8"
-                        db.session.commit()
-                        logger.info(f"✅ Bunny video ID saved: {new_video.bunny_video_id}")
-                        logger.info(f"✅ Bunny URL updated: {new_video.file_url}")
-                    else:
-                        logger.warning(f"⚠️ Upload status: {upload_status}")
-                else:
-                    logger.warning(f"⚠️ Échec programmation upload Bunny")
-                    
-            except Exception as bunny_error:
-                logger.warning(f"⚠️ Erreur upload Bunny CDN: {bunny_error}")
-        
-        # Log de l'action d'arrêt par le club
-        try:
-            action_history = ClubActionHistory(
-                club_id=user.club.id,
-                user_id=active_recording.user_id,
-                action_type='stop_recording',
-                action_details=json.dumps({
-                    'stopped_by': 'club',
-                    'duration_minutes': duration_minutes,
-                    'court_name': court.name,
-                    'video_title': new_video.title,
-                    'recording_id': active_recording.recording_id
-                }),
-                performed_by_id=user.id,
-                performed_at=datetime.utcnow()
-            )
-            db.session.add(action_history)
-            logger.info(f"Club {user.club.name} a arrêté l'enregistrement {active_recording.recording_id}")
-        except Exception as log_error:
-            logger.warning(f"Erreur lors du log d'action: {log_error}")
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Enregistrement arrêté avec succès et vidéo créée',
-            'recording_id': active_recording.id,
-            'video_id': new_video.id,
-            'video_title': new_video.title,
-            'duration_minutes': duration_minutes,
-            'court_id': court_id
-        }), 200
+        # Arrêt FFmpeg, fichier final, vidéo, upload Bunny et notification: RecordingFinalizer
+        # (réponse 202, suivi via /api/recording/finalization/<recording_id>)
+        from src.routes.recording import stop_recording_session
+        return stop_recording_session(active_recording, 'club', user.id)
         
     except Exception as e:
         db.session.rollback()
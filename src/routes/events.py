@@ -0,0 +1,80 @@
+"""
+Flux d'événements temps réel (Server-Sent Events)
+Remplace le polling des notifications, des minuteurs d'enregistrement et des statuts vidéo:
+le client ouvre un EventSource sur /api/events/stream et reçoit
+- hello: état initial (compteur de non lues) à chaque (re)connexion
+- notification, notifications_read, recording, video_status
+- resync: événements perdus (client trop lent), recharger l'état par l'API
+Le flux est fermé au bout de EVENTS_STREAM_MAX_SECONDS; EventSource se reconnecte seul.
+Chaque flux ouvert occupe un thread du worker: gunicorn tourne en gthread (gunicorn.conf.py)
+et EVENTS_STREAM_MAX_SECONDS reste inférieur à son --timeout.
+"""
+
+import json
+import logging
+import os
+import time
+
+from flask import Blueprint, Response, jsonify
+
+from ..models.notification import Notification
+from ..models.user import UserRole
+from ..services.event_bus import event_bus, user_channel, club_channel
+from ..utils.current_user import current_user_snapshot
+
+logger = logging.getLogger(__name__)
+
+events_bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = int(os.getenv('EVENTS_STREAM_MAX_SECONDS', '90'))
+RETRY_MS = 3000
+
+
+def _format(event_type: str, data: dict, event_id: str = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@events_bp.route('/stream', methods=['GET'])
+def stream_events():
+    user = current_user_snapshot()
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+
+    channels = {user_channel(user.id)}
+    if user.role == UserRole.CLUB and user.club_id:
+        channels.add(club_channel(user.club_id))
+
+    # Seule requête SQL du flux: le générateur ne touche pas la base
+    unread_count = Notification.get_unread_count(user.id)
+    subscription = event_bus.subscribe(channels)
+
+    def generate():
+        started = time.monotonic()
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            yield _format('hello', {'user_id': user.id, 'unread_count': unread_count})
+            while time.monotonic() - started < STREAM_MAX_SECONDS:
+                message = subscription.get(timeout=KEEPALIVE_SECONDS)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    while subscription.get(timeout=0) is not None:
+                        pass
+                    yield _format('resync', {})
+                    continue
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _format(message['event'], message['data'], message.get('id'))
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Pas de mise en tampon nginx
+    return response
@@ -10,6 +10,7 @@ from flask import Blueprint, jsonify, request
 from datetime import datetime
 
 from ..services.monitoring_service import MonitoringService
+from ..services.metrics import metrics_response
 from ..routes.auth import token_required
 from ..models.user import UserRole
 
@@ -140,82 +141,10 @@ def readiness_probe():
 def prometheus_metrics():
     """
     Métriques au format Prometheus
+    Séries tenues à jour par l'instrumentation (services/metrics.py): le scrape ne lance
+    aucun health check
     """
-    try:
-        metrics = monitoring_service.get_system_metrics()
-        
-        # Convertir en format Prometheus
-        prometheus_lines = []
-        
-        # Métriques système
-        system_metrics = metrics.get('system', {})
-        prometheus_lines.extend([
-            f"# HELP padelvar_cpu_percent CPU usage percentage",
-            f"# TYPE padelvar_cpu_percent gauge",
-            f"padelvar_cpu_percent {system_metrics.get('cpu_percent', 0)}",
-            f"",
-            f"# HELP padelvar_memory_percent Memory usage percentage", 
-            f"# TYPE padelvar_memory_percent gauge",
-            f"padelvar_memory_percent {system_metrics.get('memory_percent', 0)}",
-            f"",
-            f"# HELP padelvar_disk_used_percent Disk usage percentage",
-            f"# TYPE padelvar_disk_used_percent gauge", 
-            f"padelvar_disk_used_percent {system_metrics.get('disk_used_percent', 0)}",
-            f""
-        ])
-        
-        # Métriques de base de données
-        db_metrics = metrics.get('database', {})
-        if 'users_total' in db_metrics:
-            prometheus_lines.extend([
-                f"# HELP padelvar_users_total Total number of users",
-                f"# TYPE padelvar_users_total gauge",
-                f"padelvar_users_total {db_metrics['users_total']}",
-                f"",
-                f"# HELP padelvar_active_sessions Active recording sessions",
-                f"# TYPE padelvar_active_sessions gauge", 
-                f"padelvar_active_sessions {db_metrics.get('active_recording_sessions', 0)}",
-                f"",
-                f"# HELP padelvar_recordings_total Total recordings",
-                f"# TYPE padelvar_recordings_total gauge",
-                f"padelvar_recordings_total {db_metrics.get('recordings_total', 0)}",
-                f""
-            ])
-        
-        # Métriques applicatives  
-        app_metrics = metrics.get('application', {})
-        prometheus_lines.extend([
-            f"# HELP padelvar_uptime_seconds Application uptime in seconds",
-            f"# TYPE padelvar_uptime_seconds counter",
-            f"padelvar_uptime_seconds {app_metrics.get('uptime_seconds', 0)}",
-            f""
-        ])
-        
-        # Métriques business
-        business_metrics = metrics.get('business', {})
-        if 'new_users_24h' in business_metrics:
-            prometheus_lines.extend([
-                f"# HELP padelvar_new_users_24h New users in last 24 hours",
-                f"# TYPE padelvar_new_users_24h gauge",
-                f"padelvar_new_users_24h {business_metrics['new_users_24h']}",
-                f"",
-                f"# HELP padelvar_new_recordings_24h New recordings in last 24 hours", 
-                f"# TYPE padelvar_new_recordings_24h gauge",
-                f"padelvar_new_recordings_24h {business_metrics['new_recordings_24h']}",
-                f""
-            ])
-        
-        response_text = '\n'.join(prometheus_lines)
-        
-        from flask import Response
-        return Response(response_text, mimetype='text/plain'), 200
-        
-    except Exception as e:
-        logger.error(f"Error generating Prometheus metrics: {e}")
-        return jsonify({
-            'error': 'Metrics generation failed',
-            'details': str(e)
-        }), 500
+    return metrics_response()
 
 @health_bp.route('/api/monitoring/health', methods=['GET'])
 @token_required
@@ -2,14 +2,13 @@
 Routes API pour la génération de highlights
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from src.models.database import db
 from src.models.user import HighlightJob, HighlightVideo
 from src.services.simple_highlights_service import simple_highlights_service
 from datetime import datetime
 from functools import wraps
 import logging
-import threading
 import jwt
 
 logger = logging.getLogger(__name__)
@@ -76,16 +75,8 @@ def generate_highlights(current_user):
             target_duration=target_duration
         )
         
-        # Lancer le traitement en arrière-plan
-        def process_async():
-            try:
-                simple_highlights_service.process_highlights(job.id)
-            except Exception as e:
-                logger.error(f"Error processing highlights job {job.id}: {e}")
-        
-        thread = threading.Thread(target=process_async)
-        thread.daemon = True
-        thread.start()
+        # Lancer le traitement en arrière-plan (pool borné, contexte applicatif propre)
+        simple_highlights_service.submit(job.id, current_app._get_current_object())
         
         return jsonify({
             "success": True,
@@ -2,51 +2,146 @@
 Routes Live Streaming HLS — Spovio Padel
 Architecture:
   Caméra MJPEG → FFmpeg → segments .ts + playlist .m3u8 (HLS)
-                     └─► Flask sert les segments → HLS.js (viewers)
+                     └─► nginx sert les segments (X-Accel-Redirect) → HLS.js (viewers)
 
 Un seul encodage FFmpeg partagé par tous les spectateurs.
-Supporte ~100-500 viewers sur le VPS OVH.
+Supporte ~100-500 viewers sur le VPS OVH:
+- registre des lives et spectateurs partagé entre workers/nœuds (services.live_registry)
+- Flask ne fait que valider le live; le fichier est envoyé par nginx (sendfile),
+  segments en cache immuable, playlist avec un TTL court
+- FFmpeg tourne dans le worker qui a démarré le live: un thread de surveillance y
+  rafraîchit le registre et arrête FFmpeg quand le live est arrêté depuis un autre worker
 """
+import atexit
+import logging
 import os
+import re
 import shutil
 import random
+import socket
 import string
 import threading
 import subprocess
 import time
 from datetime import datetime
 from flask import (Blueprint, request, jsonify, send_from_directory,
-                   Response, current_app)
+                   Response, current_app, redirect)
+
+from src.services.live_hls import (DEFAULT_MODE, MODE_ABR, MODE_SINGLE, LivePlan, build_command, plan_live,
+                                   probe_source_height)
+from src.services.live_registry import live_registry
+
+logger = logging.getLogger(__name__)
 
 live_bp = Blueprint('live', __name__)
 _lock = threading.Lock()
 
-# ─── État global des lives ────────────────────────────────────────────
-# { code: { stream_url, team_a, team_b, logo_url, club_name,
-#           hls_dir, ffmpeg_proc, started_at, active, started_by,
-#           viewer_count } }
-_lives: dict = {}
+# ─── Processus FFmpeg des lives démarrés par ce worker ───────────────
+# { code: subprocess.Popen } — l'état partagé des lives est dans live_registry
+_procs: dict = {}
 
-HLS_BASE = os.path.join(os.path.sep, 'tmp', 'hls')   # Linux VPS
-if os.name == 'nt':                                    # Windows dev
+HLS_BASE = os.environ.get('LIVE_HLS_DIR') or os.path.join(os.path.sep, 'tmp', 'hls')   # Linux VPS
+if os.name == 'nt' and not os.environ.get('LIVE_HLS_DIR'):                               # Windows dev
     HLS_BASE = os.path.join(os.environ.get('TEMP', 'C:\\Temp'), 'spovio_hls')
 
+# Location nginx "internal" pointant sur HLS_BASE (vide: fichiers servis par Flask)
+HLS_ACCEL_PREFIX = os.environ.get('LIVE_HLS_ACCEL_PREFIX', '').rstrip('/')
+# Nœud courant et son URL publique (lives répartis sur plusieurs serveurs)
+NODE_ID = os.environ.get('LIVE_NODE_ID') or socket.gethostname()
+PUBLIC_BASE_URL = os.environ.get('LIVE_PUBLIC_BASE_URL', '').rstrip('/')
+
+# Playlist réécrite à chaque segment (4 s): TTL court; segments jamais modifiés
+PLAYLIST_MAX_AGE = int(os.environ.get('LIVE_PLAYLIST_MAX_AGE', '1'))
+SEGMENT_MAX_AGE = 86400
+# Intervalle de rafraîchissement du registre par le worker propriétaire (s)
+WATCH_INTERVAL = 2
+
+_HLS_FILENAME = re.compile(r'^[\w-]+\.(m3u8|ts|m4s|mp4)$')
+_HLS_MIMETYPES = {
+    'm3u8': 'application/vnd.apple.mpegurl',
+    'ts':   'video/mp2t',
+    'm4s':  'video/iso.segment',   # segments fMP4 (mode ABR)
+    'mp4':  'video/mp4',           # segment d'initialisation fMP4
+}
+
 
 def _gen_code(length=6):
     chars = string.ascii_uppercase + string.digits
     while True:
         code = ''.join(random.choices(chars, k=length))
-        if code not in _lives:
+        if not live_registry.exists(code):
             return code
 
 
 def _get_session_user():
-    from flask import session as flask_session
-    from src.models.user import User
-    uid = flask_session.get('user_id')
-    if not uid:
-        return None
-    return User.query.get(uid)
+    from src.utils.current_user import current_user
+    return current_user()
+
+
+def _get_session_user_snapshot():
+    """Instantané en cache (id, rôle, club): suffit aux endpoints interrogés en boucle"""
+    from src.utils.current_user import current_user_snapshot
+    return current_user_snapshot()
+
+
+def _terminate(proc):
+    """Tuer FFmpeg proprement"""
+    if proc and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+
+def _watch_live(live: dict, proc, hls_dir: str):
+    """
+    Thread du worker propriétaire: garde le live vivant dans le registre tant que FFmpeg
+    tourne, arrête FFmpeg dès que le live est arrêté (quel que soit le worker)
+    """
+    code = live['code']
+    while True:
+        time.sleep(WATCH_INTERVAL)
+        with _lock:
+            if code not in _procs:
+                break  # Arrêté par stop_live dans ce worker
+        if proc.poll() is not None:
+            logger.warning(f"⚠️ FFmpeg HLS arrêté (code {proc.returncode}), fin du live {code}")
+            live_registry.deactivate(code)
+            break
+        try:
+            if not live_registry.touch(live):
+                _terminate(proc)
+                break
+        except Exception as e:
+            logger.error(f"❌ Rafraîchissement du live {code} impossible: {e}")
+    with _lock:
+        _procs.pop(code, None)
+    shutil.rmtree(hls_dir, ignore_errors=True)
+    logger.info(f"⏹ Segments HLS du live {code} supprimés")
+
+
+@atexit.register
+def _stop_local_lives():
+    """Arrêt du worker: ne pas laisser de FFmpeg orphelin ni de live annoncé actif"""
+    with _lock:
+        procs = dict(_procs)
+        _procs.clear()
+    for code, proc in procs.items():
+        _terminate(proc)
+        try:
+            live_registry.deactivate(code)
+        except Exception:
+            pass
+        shutil.rmtree(os.path.join(HLS_BASE, code), ignore_errors=True)
+
+
+def _public_live(live: dict) -> dict:
+    """Champs exposés d'un live, nombre de spectateurs à jour"""
+    safe = {k: v for k, v in live.items() if k not in ('node', 'origin')}
+    if live.get('active'):
+        safe['viewer_count'] = live_registry.viewer_count(live['code'])
+    return safe
 
 
 def _find_ffmpeg():
@@ -69,9 +164,9 @@ def _find_ffmpeg():
     return None
 
 
-def _start_ffmpeg_hls(stream_url: str, hls_dir: str) -> subprocess.Popen | None:
+def _start_ffmpeg_hls(stream_url: str, hls_dir: str, plan: LivePlan) -> subprocess.Popen | None:
     """
-    Lance FFmpeg pour convertir le flux caméra en segments HLS.
+    Lance FFmpeg pour convertir le flux caméra en segments HLS (rendu unique ou échelle ABR).
     Retourne le process ou None en cas d'erreur.
     """
     ffmpeg = _find_ffmpeg()
@@ -80,29 +175,7 @@ def _start_ffmpeg_hls(stream_url: str, hls_dir: str) -> subprocess.Popen | None:
 
     os.makedirs(hls_dir, exist_ok=True)
     playlist = os.path.join(hls_dir, 'stream.m3u8')
-
-    cmd = [
-        ffmpeg, '-hide_banner',
-        # Input
-        '-i', stream_url,
-        # Encodage léger (CPU ~5-10%)
-        '-c:v', 'libx264',
-        '-preset', 'ultrafast',
-        '-tune', 'zerolatency',
-        '-crf', '28',           # qualité raisonnable (23=haute, 28=stream)
-        '-r', '25',             # 25 fps
-        '-g', '50',             # GOP = 2s (keyframe interval)
-        '-sc_threshold', '0',
-        # Pas d'audio pour MJPEG par sécurité (évite crash FFmpeg)
-        '-an',
-        # HLS output
-        '-f', 'hls',
-        '-hls_time', '4',           # segments de 4s
-        '-hls_list_size', '6',      # 6 segments en playlist (~24s de buffer)
-        '-hls_flags', 'delete_segments+append_list+discont_start',
-        '-hls_segment_filename', os.path.join(hls_dir, 'seg%05d.ts'),
-        playlist,
-    ]
+    cmd = build_command(ffmpeg, stream_url, hls_dir, plan)
 
     try:
         proc = subprocess.Popen(
@@ -116,7 +189,7 @@ def _start_ffmpeg_hls(stream_url: str, hls_dir: str) -> subprocess.Popen | None:
         for _ in range(60):
             if proc.poll() is not None:
                 err = proc.stderr.read()
-                current_app.logger.error(f"❌ FFmpeg HLS crashed prematurely. Code: {proc.returncode}. Erreur: {err}")
+                logger.error(f"❌ FFmpeg HLS crashed prematurely. Code: {proc.returncode}. Erreur: {err}")
                 return None
             if os.path.exists(playlist):
                 return proc
@@ -125,12 +198,12 @@ def _start_ffmpeg_hls(stream_url: str, hls_dir: str) -> subprocess.Popen | None:
         proc.terminate()
         try:
             err = proc.stderr.read()
-            current_app.logger.error(f"❌ FFmpeg HLS Timeout. Stderr: {err}")
+            logger.error(f"❌ FFmpeg HLS Timeout. Stderr: {err}")
         except:
             pass
         return None
     except Exception as e:
-        current_app.logger.error(f"❌ FFmpeg HLS erreur: {e}")
+        logger.error(f"❌ FFmpeg HLS erreur: {e}")
         return None
 
 
@@ -153,31 +226,45 @@ def serve_hls(code, filename):
     """
     Sert les fichiers HLS : stream.m3u8 et seg*.ts
     Utilisé par HLS.js dans le navigateur.
+    Avec LIVE_HLS_ACCEL_PREFIX, nginx envoie le fichier (X-Accel-Redirect): le worker
+    ne fait que vérifier le live (registre lu au plus toutes les 2 s).
     """
-    with _lock:
-        live = _lives.get(code)
+    if not _HLS_FILENAME.match(filename):
+        return Response('Segment introuvable', status=404)
 
+    live = live_registry.get_cached(code)
     if not live or not live.get('active'):
         return Response('Live terminé', status=404)
 
-    hls_dir = live.get('hls_dir', '')
-    if not hls_dir or not os.path.isdir(hls_dir):
-        return Response('HLS non prêt', status=503)
+    hls_dir = os.path.join(HLS_BASE, code)
 
-    filepath = os.path.join(hls_dir, filename)
-    if not os.path.exists(filepath):
-        return Response('Segment introuvable', status=404)
+    # Live encodé sur un autre nœud: ses segments n'existent que là-bas
+    if live.get('node') != NODE_ID and live.get('origin') and live['origin'] != PUBLIC_BASE_URL:
+        return redirect(f"{live['origin']}/api/live/{code}/hls/{filename}", code=302)
+
+    is_playlist = filename.endswith('.m3u8')
+    mime = _HLS_MIMETYPES[filename.rsplit('.', 1)[1]]
+    cache_control = (f'public, max-age={PLAYLIST_MAX_AGE}' if is_playlist
+                     else f'public, max-age={SEGMENT_MAX_AGE}, immutable')
 
-    mime = 'application/vnd.apple.mpegurl' if filename.endswith('.m3u8') else 'video/mp2t'
-    return send_from_directory(hls_dir, filename, mimetype=mime,
-                               max_age=0)
+    if HLS_ACCEL_PREFIX:
+        response = Response(status=200, mimetype=mime)
+        response.headers['X-Accel-Redirect'] = f'{HLS_ACCEL_PREFIX}/{code}/{filename}'
+    else:
+        if not os.path.isdir(hls_dir):
+            return Response('HLS non prêt', status=503)
+        if not os.path.exists(os.path.join(hls_dir, filename)):
+            return Response('Segment introuvable', status=404)
+        response = send_from_directory(hls_dir, filename, mimetype=mime, conditional=True)
+
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 
 # ─── Info live (public) ───────────────────────────────────────────────
 @live_bp.route('/api/live/<code>/info')
 def live_info(code):
-    with _lock:
-        live = _lives.get(code)
+    live = live_registry.get(code)
     if not live:
         return jsonify({'error': 'Live introuvable'}), 404
 
@@ -189,6 +276,7 @@ def live_info(code):
     except Exception:
         pass
 
+    live = _public_live(live)
     return jsonify({
         'code':         code,
         'active':       live.get('active', False),
@@ -206,16 +294,11 @@ def live_info(code):
 def viewer_heartbeat(code):
     """Chaque spectateur ping toutes les 10s. Incrémente le compteur."""
     viewer_id = request.get_json(silent=True, force=True).get('viewer_id', '') if request.data else ''
-    with _lock:
-        live = _lives.get(code)
-        if live and live.get('active'):
-            ts = live.setdefault('_viewers', {})
-            ts[viewer_id or request.remote_addr] = time.time()
-            # Nettoyer les viewers inactifs (> 20s)
-            cutoff = time.time() - 20
-            live['_viewers'] = {k: v for k, v in ts.items() if v > cutoff}
-            live['viewer_count'] = len(live['_viewers'])
-    return jsonify({'ok': True}), 200
+    viewer_count = 0
+    live = live_registry.get_cached(code)
+    if live and live.get('active'):
+        viewer_count = live_registry.heartbeat(code, viewer_id or request.remote_addr)
+    return jsonify({'ok': True, 'viewer_count': viewer_count}), 200
 
 
 # ─── Démarrer un live ─────────────────────────────────────────────────
@@ -226,6 +309,8 @@ def start_live():
       camera_url  (str)  — URL MJPEG/RTSP de la caméra
       team_a, team_b (str)
       logo_url    (str, optionnel)
+      mode        (str, optionnel) — 'single' (rendu unique) ou 'abr' (échelle multi-débits),
+                                     LIVE_HLS_MODE par défaut; réduit selon le budget CPU
     """
     try:
         user = _get_session_user()
@@ -237,22 +322,38 @@ def start_live():
         team_a     = data.get('team_a', 'Équipe A')
         team_b     = data.get('team_b', 'Équipe B')
         logo_url   = data.get('logo_url', '')
+        mode       = data.get('mode') or DEFAULT_MODE
 
         if not camera_url:
             return jsonify({'error': 'camera_url requis'}), 400
 
-        if not _find_ffmpeg():
+        if mode not in (MODE_SINGLE, MODE_ABR):
+            return jsonify({'error': f'mode invalide: {mode}'}), 400
+
+        ffmpeg = _find_ffmpeg()
+        if not ffmpeg:
             return jsonify({'error': 'FFmpeg non trouvé sur ce serveur. Installez FFmpeg.'}), 503
 
+        # Échelle ABR limitée à la résolution de la caméra
+        source_height = probe_source_height(ffmpeg, camera_url) if mode == MODE_ABR else None
+
+        # Budget CPU: encodages déjà en cours (ou en démarrage) sur ce nœud, tous workers confondus
+        cpu_in_use = sum(l.get('cpu_cost', 0) for l in live_registry.running() if l.get('node') == NODE_ID)
+        plan = plan_live(mode, cpu_in_use, source_height)
+        if not plan:
+            return jsonify({'error': 'Capacité live atteinte sur ce serveur, réessayez plus tard.'}), 503
+
         code    = _gen_code()
         hls_dir = os.path.join(HLS_BASE, code)
+        live_registry.reserve({'code': code, 'started_by': user.id, 'node': NODE_ID,
+                               'cpu_cost': plan.cpu_cost})
 
         # Démarrer FFmpeg dans un thread pour ne pas bloquer Flask
         proc_container = [None]
         ready_event = threading.Event()
 
         def launch():
-            proc = _start_ffmpeg_hls(camera_url, hls_dir)
+            proc = _start_ffmpeg_hls(camera_url, hls_dir, plan)
             proc_container[0] = proc
             ready_event.set()
 
@@ -263,27 +364,32 @@ def start_live():
         proc = proc_container[0]
 
         if not proc:
+            live_registry.discard(code)
             shutil.rmtree(hls_dir, ignore_errors=True)
             return jsonify({'error': 'Impossible de démarrer le stream HLS. Vérifiez l\'URL caméra et FFmpeg.'}), 500
 
         host = request.host
+        live = {
+            'code':         code,
+            'camera_url':   camera_url,
+            'club_name':    getattr(user, 'name', ''),
+            'logo_url':     logo_url,
+            'team_a':       team_a,
+            'team_b':       team_b,
+            'started_at':   datetime.utcnow().isoformat(),
+            'active':       True,
+            'started_by':   user.id,
+            'viewer_count': 0,
+            'node':         NODE_ID,
+            'origin':       PUBLIC_BASE_URL,
+            **plan.to_dict(),
+        }
 
         with _lock:
-            _lives[code] = {
-                'code':         code,
-                'camera_url':   camera_url,
-                'hls_dir':      hls_dir,
-                'ffmpeg_proc':  proc,
-                'club_name':    getattr(user, 'name', ''),
-                'logo_url':     logo_url,
-                'team_a':       team_a,
-                'team_b':       team_b,
-                'started_at':   datetime.utcnow().isoformat(),
-                'active':       True,
-                'started_by':   user.id,
-                'viewer_count': 0,
-                '_viewers':     {},
-            }
+            _procs[code] = proc
+        live_registry.create(live)
+        threading.Thread(target=_watch_live, args=(live, proc, hls_dir),
+                         daemon=True, name=f'live-{code}').start()
 
         # Sync noms arbitre
         try:
@@ -294,8 +400,9 @@ def start_live():
         except Exception:
             pass
 
-        watch_url = f'http://{host}/watch/{code}'
-        hls_url   = f'http://{host}/api/live/{code}/hls/stream.m3u8'
+        base_url  = PUBLIC_BASE_URL or f'http://{host}'
+        watch_url = f'{base_url}/watch/{code}'
+        hls_url   = f'{base_url}/api/live/{code}/hls/stream.m3u8'
         current_app.logger.info(f"🔴 HLS Live démarré: {code} → {watch_url}")
 
         return jsonify({
@@ -303,6 +410,7 @@ def start_live():
             'code':     code,
             'watch_url': watch_url,
             'hls_url':  hls_url,
+            **plan.to_dict(),
         }), 201
     except Exception as e:
         import traceback
@@ -313,7 +421,7 @@ def start_live():
 # ─── Lister les terrains (club) ───────────────────────────────────────
 @live_bp.route('/api/live/courts', methods=['GET'])
 def live_courts():
-    user = _get_session_user()
+    user = _get_session_user_snapshot()
     if not user:
         return jsonify({'error': 'Non authentifié'}), 401
 
@@ -355,33 +463,21 @@ def stop_live():
     code = data.get('code')
 
     if not code:
-        with _lock:
-            for c, live in _lives.items():
-                if live.get('started_by') == user.id and live.get('active'):
-                    code = c
-                    break
+        live = live_registry.active_for_user(user.id)
+        code = live['code'] if live else None
 
     if not code:
         return jsonify({'error': 'Aucun live actif'}), 404
 
-    with _lock:
-        live = _lives.get(code, {})
-        live['active'] = False
-        live['ended_at'] = datetime.utcnow().isoformat()
-        proc    = live.get('ffmpeg_proc')
-        hls_dir = live.get('hls_dir', '')
-
-    # Tuer FFmpeg proprement
-    if proc and proc.poll() is None:
-        proc.terminate()
-        try:
-            proc.wait(timeout=5)
-        except Exception:
-            proc.kill()
+    # Le worker propriétaire arrête FFmpeg à son prochain rafraîchissement
+    live_registry.deactivate(code)
 
-    # Nettoyer les segments HLS
-    if hls_dir and os.path.isdir(hls_dir):
-        shutil.rmtree(hls_dir, ignore_errors=True)
+    # Live démarré par ce worker: arrêt immédiat
+    with _lock:
+        proc = _procs.pop(code, None)
+    if proc:
+        _terminate(proc)
+        shutil.rmtree(os.path.join(HLS_BASE, code), ignore_errors=True)
 
     current_app.logger.info(f"⏹ HLS Live arrêté: {code}")
     return jsonify({'ok': True, 'code': code}), 200
@@ -390,16 +486,13 @@ def stop_live():
 # ─── Live actif de l'utilisateur ─────────────────────────────────────
 @live_bp.route('/api/live/my', methods=['GET'])
 def my_live():
-    user = _get_session_user()
+    user = _get_session_user_snapshot()
     if not user:
         return jsonify({'error': 'Non authentifié'}), 401
 
-    with _lock:
-        for code, live in _lives.items():
-            if live.get('started_by') == user.id and live.get('active'):
-                safe = {k: v for k, v in live.items()
-                        if k not in ('ffmpeg_proc', '_viewers', 'hls_dir')}
-                return jsonify({'live': {**safe, 'code': code}}), 200
+    live = live_registry.active_for_user(user.id)
+    if live:
+        return jsonify({'live': _public_live(live)}), 200
 
     return jsonify({'live': None}), 200
 
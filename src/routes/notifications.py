@@ -14,6 +14,8 @@ from ..models.database import db
 from ..models.user import User
 from ..models.notification import Notification, NotificationType  # FIX: Importer depuis notification.py
 from ..routes.auth import require_auth
+from ..services.event_bus import event_bus, user_channel
+from ..services.notification_counters import unread_counters
 # from ..tasks.notification_tasks import send_notification, send_bulk_notification
 
 logger = logging.getLogger(__name__)
@@ -32,6 +34,8 @@ def get_user_notifications():
     - unread_only: true pour ne récupérer que les non lues (default: false)
     - type: filtrer par type de notification (optionnel)
     - include_archived: true pour inclure les archivées (default: false)
+    - include_total: true pour compter le total (requête COUNT supplémentaire); sans filtre
+      de type, le total des non lues est toujours fourni par le compteur
     """
     try:
         # Récupérer user_id depuis la session
@@ -45,14 +49,11 @@ def get_user_notifications():
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
         notification_type = request.args.get('type')
         include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
         # Construire la requête
         query = Notification.query.filter_by(user_id=user_id)
         
-        # DEBUG
-        logger.info(f"[NOTIF DEBUG] user_id from session: {user_id}")
-        logger.info(f"[NOTIF DEBUG] Total notifications in DB for user {user_id}: {Notification.query.filter_by(user_id=user_id).count()}")
-        
         # Filtres
         if unread_only:
             query = query.filter_by(is_read=False)
@@ -64,20 +65,22 @@ def get_user_notifications():
             except ValueError:
                 return jsonify({'error': f'Invalid notification type: {notification_type}'}), 400
         
-        # Appliquer la pagination et l'ordre (plus récentes en premier)
-        notifications = query.order_by(Notification.created_at.desc()).offset(offset).limit(limit).all()
-        
-        # DEBUG
-        logger.info(f"[NOTIF DEBUG] Query returned {len(notifications)} notifications")
+        # Pagination et ordre (plus récentes en premier): une ligne de plus pour has_more,
+        # parcours de l'index (user_id, is_read, created_at) sans COUNT
+        notifications = query.order_by(
+            Notification.created_at.desc(), Notification.id.desc()
+        ).offset(offset).limit(limit + 1).all()
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
         
-        # Compter le total pour la pagination
-        total = query.count()
+        # Badge: compteur dénormalisé (pas de COUNT tant qu'il est en cache)
+        unread_count = Notification.get_unread_count(user_id)
         
-        # Statistiques rapides
-        unread_count = Notification.query.filter_by(
-            user_id=user_id,
-            is_read=False
-        ).count()
+        total = None
+        if unread_only and not notification_type:
+            total = unread_count
+        elif include_total:
+            total = query.count()
         
         result = {
             'notifications': [notification.to_dict() for notification in notifications],
@@ -85,7 +88,7 @@ def get_user_notifications():
                 'total': total,
                 'limit': limit,
                 'offset': offset,
-                'has_more': offset + limit < total
+                'has_more': has_more
             },
             'stats': {
                 'unread_count': unread_count
@@ -129,8 +132,11 @@ def mark_notification_read(notification_id):
                 'notification_id': notification_id
             }), 200
         
-        # Marquer comme lue
+        # Marquer comme lue (les autres onglets sont prévenus par le flux SSE)
         notification.is_read = True
+        event_bus.publish_after_commit(db.session, [user_channel(user_id)], 'notifications_read', {
+            'notification_ids': [notification_id], 'unread_delta': -1
+        })
         db.session.commit()
         
         logger.info(f"Notification {notification_id} marquée comme lue pour utilisateur {user_id}")
@@ -158,27 +164,25 @@ def mark_all_notifications_read():
         if not user_id:
             return jsonify({'error': 'Non authentifié'}), 401
         
-        current_time = datetime.utcnow()
-        
-        # Récupérer toutes les notifications non lues de l'utilisateur
-        unread_notifications = Notification.query.filter_by(
+        # Marquer toutes comme lues en un UPDATE (compteur invalidé, recompté à la prochaine lecture)
+        marked_count = Notification.query.filter_by(
             user_id=user_id,
             is_read=False
-        ).all()
+        ).update({'is_read': True}, synchronize_session=False)
         
-        if not unread_notifications:
+        if not marked_count:
+            db.session.rollback()
             return jsonify({
                 'status': 'no_unread_notifications',
                 'marked_count': 0
             }), 200
         
-        # Marquer toutes comme lues
-        for notification in unread_notifications:
-            notification.is_read = True
-        
+        unread_counters.invalidate_after_commit(db.session, [user_id])
+        event_bus.publish_after_commit(db.session, [user_channel(user_id)], 'notifications_read', {
+            'all': True, 'unread_count': 0
+        })
         db.session.commit()
         
-        marked_count = len(unread_notifications)
         logger.info(f"{marked_count} notifications marquées comme lues pour utilisateur {user_id}")
         
         return jsonify({
@@ -194,7 +198,7 @@ def mark_all_notifications_read():
 
 @notifications_bp.route('/<int:notification_id>/archive', methods=['POST'])
 @require_auth
-def archive_notification(current_user, notification_id):
+def archive_notification(notification_id):
     """
     Archive une notification
     """
@@ -231,7 +235,7 @@ def archive_notification(current_user, notification_id):
 
 @notifications_bp.route('/<int:notification_id>', methods=['DELETE'])
 @require_auth
-def delete_notification(current_user, notification_id):
+def delete_notification(notification_id):
     """
     Supprime une notification
     """
@@ -267,7 +271,7 @@ def delete_notification(current_user, notification_id):
 
 @notifications_bp.route('/stats', methods=['GET'])
 @require_auth
-def get_notification_stats(current_user):
+def get_notification_stats():
     """
     Récupère les statistiques des notifications de l'utilisateur
     """
@@ -282,10 +286,7 @@ def get_notification_stats(current_user):
         # Compter par statut (sans les champs qui n'existent pas encore)
         total = Notification.query.filter_by(user_id=user_id).count()
         
-        unread = Notification.query.filter_by(
-            user_id=user_id,
-            is_read=False
-        ).count()
+        unread = Notification.get_unread_count(user_id)
         
         # Compter par type (derniers 30 jours)
         last_month = current_time - timedelta(days=30)
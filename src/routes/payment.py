@@ -14,6 +14,7 @@ from flask_limiter.util import get_remote_address
 from ..services.payment_service import payment_service, CREDIT_PACKAGES
 from ..models.user import User, Transaction
 from ..middleware.rate_limiting import limiter
+from ..middleware.idempotence import idempotent
 from .auth import require_auth, get_current_user
 
 logger = logging.getLogger(__name__)
@@ -53,6 +54,7 @@ def get_credit_packages():
 @payment_bp.route('/create-checkout-session', methods=['POST'])
 @require_auth
 @limiter.limit("10 per minute")  # Protection contre le spam
+@idempotent()  # Header Idempotency-Key: un double clic ne crée qu'une session
 def create_checkout_session():
     """
     Crée une session de paiement Stripe
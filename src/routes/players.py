@@ -5,17 +5,32 @@ Philosophie d'optimisation appliquée selon clubs.py et admin.py
 
 from flask import Blueprint, request, jsonify, session
 from sqlalchemy.orm import joinedload
-from sqlalchemy import desc, func, and_, or_
+from sqlalchemy import desc, func, and_, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime, timedelta
 import json
 import time
 import logging
 
 from ..models.database import db
+from ..middleware.idempotence import idempotent
 from ..models.user import User, Club, Court, Video, ClubActionHistory, player_club_follows
+from ..models.credit_ledger import ACCOUNT_USER, CreditLedgerEntry
+from ..services import credit_ledger, dashboard_read_model
+from ..services.credit_ledger import InsufficientCredits
+from ..utils.current_user import current_user
 
 logger = logging.getLogger(__name__)
 
+# Motif du grand livre -> action_type historique attendu par le frontend
+LEGACY_ACTION_TYPES = {
+    'purchase': 'buy_credits',
+    'unlock_video': 'unlock_video',
+    'recording': 'start_recording',
+    'admin_grant': 'admin_add_credits',
+    'club_grant': 'club_add_credits',
+}
+
 players_bp = Blueprint('players', __name__, url_prefix='/api/players')
 
 # --- FONCTIONS UTILITAIRES OPTIMISÉES ---
@@ -44,8 +59,8 @@ def require_player_access():
             logger.warning("Tentative d'accès sans session")
             return None
         
-        # Optimisation: requête simple sans jointure pour la vérification d'accès
-        user = User.query.filter_by(id=session['user_id']).first()
+        # Chargé une seule fois par requête (partagé avec les autres contrôles d'accès)
+        user = current_user()
         
         if not user:
             logger.warning(f"Utilisateur {session.get('user_id')} non trouvé")
@@ -390,108 +405,7 @@ def get_player_dashboard():
     
     try:
         logger.info(f"Récupération du dashboard pour le joueur {user.id}")
-        
-        # 1. Informations de base du joueur
-        player_info = user.to_dict()
-        
-        # 2. Statistiques des clubs suivis
-        followed_clubs_count = user.followed_clubs.count()  # count() pour dynamic relationship
-        primary_club = None
-        if user.club_id:
-            primary_club = Club.query.get(user.club_id)
-        
-        # 3. Statistiques des vidéos du joueur
-        player_videos = Video.query.filter_by(user_id=user.id).all()
-        videos_stats = {
-            "total_videos": len(player_videos),
-            "unlocked_videos": len([v for v in player_videos if v.is_unlocked]),
-            "total_duration": sum(v.duration for v in player_videos if v.duration),
-            "recent_videos": [v.to_dict() for v in player_videos[-5:]]  # 5 dernières
-        }
-        
-        # 4. Historique d'activité récente
-        recent_activity = ClubActionHistory.query.filter_by(
-            user_id=user.id
-        ).order_by(desc(ClubActionHistory.performed_at)).limit(10).all()
-        
-        activity_data = []
-        for activity in recent_activity:
-            club_name = "Club inconnu"
-            if activity.club_id:
-                club = Club.query.get(activity.club_id)
-                if club:
-                    club_name = club.name
-            
-            activity_data.append({
-                "action_type": activity.action_type,
-                "club_name": club_name,
-                "performed_at": activity.performed_at.isoformat(),
-                "details": activity.action_details
-            })
-        
-        # 5. Statistiques de crédits
-        credits_stats = {
-            "current_balance": user.credits_balance,
-            "credits_earned_this_month": 0,  # À calculer depuis l'historique
-            "credits_spent_this_month": 0     # À calculer depuis l'historique
-        }
-        
-        # Calculer les crédits du mois
-        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_credits = ClubActionHistory.query.filter(
-            ClubActionHistory.user_id == user.id,
-            ClubActionHistory.action_type == 'add_credits',
-            ClubActionHistory.performed_at >= month_start
-        ).all()
-        
-        for entry in monthly_credits:
-            try:
-                if entry.action_details:
-                    details = json.loads(entry.action_details)
-                    credits_added = details.get('credits_added', 0)
-                    if isinstance(credits_added, (int, float)):
-                        credits_stats["credits_earned_this_month"] += int(credits_added)
-            except:
-                pass
-        
-        # 6. Recommandations de clubs
-        recommended_clubs = []
-        try:
-            # Recommander des clubs populaires non suivis
-            all_clubs = Club.query.all()
-            followed_ids = {c.id for c in user.followed_clubs.all()}  # .all() pour dynamic relationship
-            
-            for club in all_clubs:
-                if club.id not in followed_ids:
-                    followers_count = club.followers.count()  # count() pour dynamic relationship
-                    courts_count = len(club.courts) if hasattr(club, 'courts') else 0
-                    
-                    if followers_count > 0 or courts_count > 0:  # Clubs actifs
-                        club_dict = club.to_dict()
-                        club_dict["followers_count"] = followers_count
-                        club_dict["courts_count"] = courts_count
-                        recommended_clubs.append(club_dict)
-            
-            # Trier par popularité et prendre les 5 premiers
-            recommended_clubs.sort(key=lambda x: x.get("followers_count", 0), reverse=True)
-            recommended_clubs = recommended_clubs[:5]
-        except Exception as e:
-            logger.error(f"Erreur lors du calcul des recommandations: {e}")
-        
-        dashboard_data = {
-            "player": player_info,
-            "clubs_statistics": {
-                "followed_clubs_count": followed_clubs_count,
-                "primary_club": primary_club.to_dict() if primary_club else None
-            },
-            "videos_statistics": videos_stats,
-            "credits_statistics": credits_stats,
-            "recent_activity": activity_data,
-            "recommended_clubs": recommended_clubs,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        return jsonify(dashboard_data), 200
+        return jsonify(dashboard_read_model.player_dashboard(user)), 200
         
     except Exception as e:
         logger.error(f"Erreur lors de la récupération du dashboard joueur: {e}")
@@ -581,9 +495,29 @@ def unlock_video(video_id):
                 "available": user.credits_balance
             }), 400
         
-        # Débloquer la vidéo
-        user.credits_balance -= video.credits_cost
-        video.is_unlocked = True
+        # Débloquer la vidéo: un seul déblocage gagne si deux requêtes arrivent ensemble
+        claimed = db.session.execute(
+            update(Video)
+            .where(Video.id == video.id, Video.is_unlocked.isnot(True))
+            .values(is_unlocked=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            return jsonify({"error": "Cette vidéo est déjà débloquée"}), 400
+        set_committed_value(video, 'is_unlocked', True)
+        
+        try:
+            if video.credits_cost:
+                credit_ledger.debit(user, video.credits_cost, 'unlock_video',
+                                    reference=f"video:{video.id}", performed_by_id=user.id)
+        except InsufficientCredits as e:
+            db.session.rollback()
+            return jsonify({
+                "error": "Crédits insuffisants",
+                "required": e.required,
+                "available": e.available
+            }), 400
         
         # Log de l'action
         court = Court.query.get(video.court_id)
@@ -619,6 +553,7 @@ def unlock_video(video_id):
 # --- ROUTES DE GESTION DES CRÉDITS OPTIMISÉES ---
 
 @players_bp.route("/credits/buy", methods=["POST"])
+@idempotent()
 def buy_credits():
     """Acheter des crédits avec les tarifs tunisiens"""
     user = require_player_access()
@@ -664,7 +599,9 @@ def buy_credits():
         
         if payment_successful:
             # Ajouter les crédits au solde
-            user.credits_balance += credits_amount
+            credit_ledger.credit(user, credits_amount, 'purchase',
+                                 reference=f"package:{package_id}" if package_id else None,
+                                 performed_by_id=user.id)
             
             # Log de la transaction
             log_action(
@@ -890,40 +827,41 @@ def get_credits_history():
         limit = request.args.get('limit', 20, type=int)
         offset = request.args.get('offset', 0, type=int)
         
-        # Récupérer l'historique des crédits
-        credits_actions = ClubActionHistory.query.filter(
-            ClubActionHistory.user_id == user.id,
-            or_(
-                ClubActionHistory.action_type == 'buy_credits',
-                ClubActionHistory.action_type == 'unlock_video',
-                ClubActionHistory.action_type == 'purchase'
-            )
-        ).order_by(desc(ClubActionHistory.performed_at)).offset(offset).limit(limit).all()
+        # Grand livre des crédits du joueur (plus de reconstitution depuis ClubActionHistory)
+        entries_query = CreditLedgerEntry.query.filter(
+            CreditLedgerEntry.account_type == ACCOUNT_USER,
+            CreditLedgerEntry.account_id == user.id
+        )
+        total_count = entries_query.count()
+        entries = entries_query.order_by(CreditLedgerEntry.id.desc()).offset(offset).limit(limit).all()
         
-        total_count = ClubActionHistory.query.filter(
-            ClubActionHistory.user_id == user.id,
-            or_(
-                ClubActionHistory.action_type == 'buy_credits',
-                ClubActionHistory.action_type == 'unlock_video',
-                ClubActionHistory.action_type == 'purchase'
-            )
-        ).count()
+        # Clubs cités en référence (crédits offerts par un club), chargés en une requête
+        club_ids = {int(e.reference.split(':', 1)[1]) for e in entries
+                    if e.reference and e.reference.startswith('club:') and e.reference[5:].isdigit()}
+        club_names = dict(db.session.query(Club.id, Club.name).filter(Club.id.in_(club_ids))) if club_ids else {}
         
         history_data = []
-        for action in credits_actions:
+        for entry in entries:
+            # Champs historiques conservés pour le frontend (action_type, details JSON)
+            details = {"new_balance": entry.balance_after}
+            if entry.delta > 0:
+                details["credits_purchased" if entry.reason == 'purchase' else "credits_added"] = entry.delta
+            else:
+                details["credits_spent"] = -entry.delta
             action_data = {
-                "id": action.id,
-                "action_type": action.action_type,
-                "performed_at": action.performed_at.isoformat(),
-                "details": action.action_details
+                "id": entry.id,
+                "action_type": LEGACY_ACTION_TYPES.get(entry.reason, entry.reason),
+                "reason": entry.reason,
+                "delta": entry.delta,
+                "balance_after": entry.balance_after,
+                "reference": entry.reference,
+                "performed_at": entry.created_at.isoformat(),
+                "details": json.dumps(details)
             }
-            
-            # Ajouter les informations du club si disponible
-            if action.club_id:
-                club = Club.query.get(action.club_id)
-                if club:
-                    action_data["club_name"] = club.name
-            
+            if entry.reference and entry.reference.startswith('club:'):
+                club_name = club_names.get(int(entry.reference[5:])) if entry.reference[5:].isdigit() else None
+                if club_name:
+                    action_data["club_name"] = club_name
             history_data.append(action_data)
         
         return jsonify({
@@ -947,34 +885,10 @@ def get_credits_balance():
         return jsonify({"error": "Accès non autorisé"}), 403
     
     try:
-        # Calculer les statistiques des crédits
-        total_earned = 0
-        total_spent = 0
-        
-        credits_actions = ClubActionHistory.query.filter(
-            ClubActionHistory.user_id == user.id,
-            or_(
-                ClubActionHistory.action_type == 'buy_credits',
-                ClubActionHistory.action_type == 'unlock_video'
-            )
-        ).all()
-        
-        for action in credits_actions:
-            try:
-                if action.action_details:
-                    details = json.loads(action.action_details)
-                    
-                    if action.action_type == 'buy_credits':
-                        credits_added = details.get('credits_purchased', 0)
-                        if isinstance(credits_added, (int, float)):
-                            total_earned += int(credits_added)
-                    
-                    elif action.action_type == 'unlock_video':
-                        credits_spent = details.get('credits_spent', 0)
-                        if isinstance(credits_spent, (int, float)):
-                            total_spent += int(credits_spent)
-            except:
-                continue
+        # Cumuls tenus par le grand livre (dernier instantané + mouvements récents)
+        account_totals = credit_ledger.totals(ACCOUNT_USER, user.id)
+        total_earned = account_totals['total_credited']
+        total_spent = account_totals['total_debited']
         
         return jsonify({
             "current_balance": user.credits_balance,
@@ -2011,19 +1925,10 @@ def get_advanced_player_analytics():
             "average_duration_minutes": round((total_duration / len(videos_in_period)) / 60, 2) if videos_in_period and total_duration else 0
         }
         
-        # 4. Analyse des crédits
-        credits_activities = [a for a in activity_analysis if a.action_type in ['add_credits', 'unlock_video']]
-        credits_earned = credits_spent = 0
-        
-        for activity in credits_activities:
-            try:
-                details = json.loads(activity.action_details) if activity.action_details else {}
-                if activity.action_type == 'add_credits':
-                    credits_earned += details.get('credits_added', 0)
-                elif activity.action_type == 'unlock_video':
-                    credits_spent += details.get('credits_spent', 0)
-            except:
-                pass
+        # 4. Analyse des crédits (mouvements du grand livre sur la période)
+        credit_totals = credit_ledger.totals(ACCOUNT_USER, user.id, since=start_date)
+        credits_earned = credit_totals['total_credited']
+        credits_spent = credit_totals['total_debited']
         
         analytics_data["metrics"]["credits_analysis"] = {
             "credits_earned": credits_earned,
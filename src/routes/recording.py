@@ -11,14 +11,17 @@ import json
 import os
 
 from ..models.database import db
+from ..middleware.idempotence import idempotent
 from ..models.user import (
-    User, Club, Court, Video, RecordingSession, 
+    User, Club, Court, Video, RecordingSession, RecordingFinalization,
     ClubActionHistory, UserRole
 )
+from ..services import credit_ledger
+from ..services.credit_ledger import InsufficientCredits
+from ..utils.current_user import current_user, current_user_snapshot
 # from ..services.video_capture_service_ultimate import (
 #     DirectVideoCaptureService
 # )
-from ..video_system.config import VideoConfig
 
 # Instance globale du service
 # video_capture_service = DirectVideoCaptureService()
@@ -29,11 +32,8 @@ logger = logging.getLogger(__name__)
 recording_bp = Blueprint('recording', __name__, url_prefix='/api/recording')
 
 def get_current_user():
-    """Récupérer l'utilisateur actuel"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    """Récupérer l'utilisateur actuel (chargé une fois par requête)"""
+    return current_user()
 
 def log_recording_action(session_obj, action_type, action_details, performed_by_id):
     """Log d'action pour les enregistrements avec gestion d'erreur améliorée"""
@@ -76,7 +76,7 @@ def cleanup_expired_sessions(club_id=None):
         for session in expired_sessions:
             if session.is_expired():
                 logger.info(f"Nettoyage automatique de la session expirée: {session.recording_id}")
-                _stop_recording_session(session, 'auto', session.user_id)
+                stop_recording_session(session, 'auto', session.user_id)
                 cleaned_count += 1
         
         if cleaned_count > 0:
@@ -92,6 +92,7 @@ def cleanup_expired_sessions(club_id=None):
 # ====================================================================
 
 @recording_bp.route('/start', methods=['POST'])
+@idempotent()
 def start_recording_with_duration():
     """Démarrer un enregistrement avec durée sélectionnable"""
     user = get_current_user()
@@ -170,12 +171,17 @@ def start_recording_with_duration():
         # Note: Le terrain est réservé via RecordingSession status='active'
         # L'ancien système utilisait court.is_recording qui n'existe plus
         
-        #Débiter un crédit
-        user.credits_balance -= 1
-        
         # Ajouter tous les objets à la session
         db.session.add(recording_session)
         
+        # Débiter un crédit (instruction conditionnelle: jamais de solde négatif)
+        try:
+            credit_ledger.debit(user, 1, 'recording', reference=f"recording:{recording_id}",
+                                performed_by_id=user.id)
+        except InsufficientCredits:
+            db.session.rollback()
+            return jsonify({'error': 'Crédits insuffisants'}), 400
+        
         # Log de l'action (sera ajouté à la session mais pas encore commité)
         log_recording_action(
             recording_session,
@@ -246,7 +252,7 @@ def stop_recording(recording_id=None):
             return jsonify({'error': 'Session d\'enregistrement non trouvée ou déjà terminée'}), 404
         
         # Arrêter l'enregistrement
-        return _stop_recording_session(recording_session, 'player', user.id)
+        return stop_recording_session(recording_session, 'player', user.id, wait_for_video=True)
         
     except Exception as e:
         db.session.rollback()
@@ -276,22 +282,32 @@ def force_stop_recording(recording_id):
             return jsonify({'error': 'Session d\'enregistrement non trouvée'}), 404
         
         # Arrêter l'enregistrement
-        return _stop_recording_session(recording_session, 'club', user.id)
+        return stop_recording_session(recording_session, 'club', user.id, wait_for_video=True)
         
     except Exception as e:
         db.session.rollback()
         logger.error(f"Erreur lors de l'arrêt forcé: {e}")
         return jsonify({'error': 'Erreur lors de l\'arrêt forcé'}), 500
 
-def _stop_recording_session(recording_session, stopped_by, performed_by_id):
-    """Fonction utilitaire pour arrêter une session d'enregistrement"""
+def stop_recording_session(recording_session, stopped_by, performed_by_id, wait_for_video=False):
+    """
+    Arrêter une session d'enregistrement (rapide, ne bloque pas le worker HTTP)
+
+    Marque la session comme arrêtée, libère le terrain et crée la tâche de
+    finalisation: arrêt FFmpeg, validation du fichier, création de la vidéo,
+    upload Bunny et notification sont faits par le RecordingFinalizer.
+
+    Réponse 202 ('video': None) avec la tâche de finalisation: le client suit
+    /finalization/<recording_id> ou l'événement SSE 'recording'. Avec
+    wait_for_video (routes d'arrêt) et RECORDING_STOP_WAIT_SECONDS > 0 (0 par
+    défaut), la vidéo est attendue au plus ce délai: réponse 200 si elle existe.
+    """
+    from src.services.recording_finalizer import recording_finalizer
+
     try:
-        # Mettre à jour la session
-        recording_session.status = 'stopped'
-        recording_session.stopped_by = stopped_by
-        
         # ✅ CORRECTION DURÉE: Si arrêté automatiquement (expiration), on force la durée prévue
         # car cela signifie souvent que le serveur a redémarré après l'heure de fin prévue.
+        # (is_expired() doit être évalué avant le changement de statut)
         if stopped_by == 'auto' and recording_session.is_expired():
             # Calculer la fin théorique
             theoretical_end = recording_session.start_time + timedelta(minutes=recording_session.planned_duration)
@@ -300,6 +316,9 @@ def _stop_recording_session(recording_session, stopped_by, performed_by_id):
         else:
             recording_session.end_time = datetime.utcnow()
         
+        # Mettre à jour la session
+        recording_session.status = 'stopped'
+        recording_session.stopped_by = stopped_by
         
         # 🔧 LIBÉRER LE TERRAIN
         court = Court.query.get(recording_session.court_id)
@@ -307,80 +326,17 @@ def _stop_recording_session(recording_session, stopped_by, performed_by_id):
             court.is_recording = False
             logger.info(f"🔓 Terrain {court.name} libéré (enregistrement {stopped_by})")
         
-        # Créer la vidéo
-        elapsed_minutes = recording_session.get_elapsed_minutes()
-        
-        # � LOGS DÉTAILLÉS DURÉE - Début analyse
-        logger.info(f"🕐 ANALYSE DURÉE pour {recording_session.recording_id}:")
-        logger.info(f"   📅 Start time: {recording_session.start_time}")
-        logger.info(f"   📅 End time: {recording_session.end_time}")
-        logger.info(f"   ⏱️ Durée calculée DB: {elapsed_minutes:.2f} minutes = {elapsed_minutes * 60:.0f} secondes")
-        
-        # Use elapsed time from database as duration
-        final_duration = elapsed_minutes * 60
-        
-        # 📊 LOGS DÉTAILLÉS - Résultat final
-        logger.info(f"🎯 DURÉE FINALE RETENUE:")
-        logger.info(f"   💾 Stockage en DB: {final_duration:.0f} secondes = {final_duration/60:.2f} minutes")
-        # Source: Calcul DB (temps start → end)
-
-        # 🛑 NETTOYAGE SYSTÈME VIDÉO (V3)
-        # 🛑 NETTOYAGE SYSTÈME VIDÉO (V3)
+        # Libérer aussi le terrain côté système vidéo: un nouvel enregistrement peut
+        # démarrer pendant que la finalisation arrête FFmpeg en arrière-plan
         try:
-            from src.video_system.recording import video_recorder
             from src.video_system.session_manager import session_manager
-            
-            # 1. Arrêter le processus FFmpeg (ce qui libère le flag recording_active)
-            logger.info(f"🛑 Arrêt du système vidéo pour {recording_session.recording_id}")
-            # Note: recording_session.recording_id == session_id dans la V3
-            video_recorder.stop_recording(recording_session.recording_id)
-            
-            # 2. Fermer la session (arrêt proxy, cleanup mémoire)
-            session_manager.close_session(recording_session.recording_id)
-            logger.info(f"✅ Session système fermée: {recording_session.recording_id}")
-            
+            mem_session = session_manager.get_session(recording_session.recording_id)
+            if mem_session:
+                mem_session.recording_active = False
         except Exception as v3_err:
-            logger.warning(f"⚠️ Erreur lors du nettoyage V3 (non critique): {v3_err}")
-            # On continue, ce n'est pas bloquant pour la sauvegarde BDD
-        
-        video = Video(
-            user_id=recording_session.user_id,
-            court_id=recording_session.court_id,
-            title=recording_session.title,
-            description=recording_session.description,
-            duration=final_duration,  # ✅ DURÉE RÉELLE du fichier vidéo
-            file_url=f'/videos/rec_{recording_session.recording_id}.mp4',
-            is_unlocked=True,
-            processing_status='pending',  # 🆕 Statut initial avant upload
-            local_file_path=str(VideoConfig.get_video_dir(recording_session.club_id) / f"{recording_session.recording_id}.mp4") if (VideoConfig.get_video_dir(recording_session.club_id) / f"{recording_session.recording_id}.mp4").exists() else (f"static/videos/{recording_session.recording_id}.mp4" if os.path.exists(f"static/videos/{recording_session.recording_id}.mp4") else None)
-        )
-        
-        # 📦 Calculer la taille du fichier si disponible
-        try:
-            # Chemins possibles pour le fichier vidéo
-            video_dir = VideoConfig.get_video_dir(recording_session.club_id)
-            possible_paths = [
-                str(video_dir / f"{recording_session.recording_id}.mp4"),
-                f"static/videos/{recording_session.club_id}/{recording_session.recording_id}.mp4",
-                f"static/videos/{recording_session.recording_id}.mp4"
-            ]
-            
-            for video_path in possible_paths:
-                if os.path.exists(video_path):
-                    file_size = os.path.getsize(video_path)
-                    # Check for Integer overflow (Postgres Integer is max 2147483647)
-                    if file_size < 2147483647:
-                        video.file_size = file_size
-                    else:
-                        logger.warning(f"⚠️ File size {file_size} exceeds Integer limit, setting to None")
-                        video.file_size = None
-                    
-                    logger.info(f"📦 Taille fichier vidéo: {file_size / (1024*1024):.2f} MB")
-                    break
-        except Exception as e:
-            logger.warning(f"⚠️ Impossible de calculer la taille du fichier: {e}")
+            logger.warning(f"⚠️ Erreur libération session V3 (non critique): {v3_err}")
         
-        db.session.add(video)
+        elapsed_minutes = recording_session.get_elapsed_minutes()
         
         # Log de l'action
         log_recording_action(
@@ -394,112 +350,65 @@ def _stop_recording_session(recording_session, stopped_by, performed_by_id):
             performed_by_id
         )
         
+        finalization = recording_finalizer.create_job(recording_session, stopped_by, performed_by_id)
         db.session.commit()
         
-        db.session.commit()
+        logger.info(f"Enregistrement arrêté: {recording_session.recording_id} par {stopped_by} (finalisation {finalization.id})")
+        recording_finalizer.submit(finalization.id)
         
-        logger.info(f"Enregistrement arrêté: {recording_session.recording_id} par {stopped_by}")
-
-        # 🔔 NOTIFICATION D'ARRÊT (si pas par le joueur)
-        if stopped_by in ['auto', 'club']:
-            try:
-                from ..models.notification import Notification, NotificationType
-                
-                notif_title = "Enregistrement terminé"
-                if stopped_by == 'auto':
-                    notif_msg = "Votre session a expiré et l'enregistrement a été arrêté automatiquement."
-                else:
-                    notif_msg = "Le club a arrêté votre session d'enregistrement."
-                
-                # Créer la notification
-                # Note: On utilise le constructeur direct car create_notification n'est peut-être pas une méthode de classe accessible ici
-                notif = Notification(
-                    user_id=recording_session.user_id,
-                    notification_type=NotificationType.RECORDING_STOPPED,
-                    title=notif_title,
-                    message=notif_msg,
-                    related_resource_type='video',
-                    related_resource_id=str(video.id)
-                )
-                db.session.add(notif)
-                db.session.commit()
-                logger.info(f"✅ Notification d'arrêt envoyée à l'utilisateur {recording_session.user_id}")
-            except Exception as notif_e:
-                logger.error(f"⚠️ Erreur envoi notification arrêt: {notif_e}")
-
-        # 🚀 UPLOAD BUNNY CDN AUTOMATIQUE
-        try:
-            # Déterminer le chemin local du fichier
-            local_video_path = None
-            video_dir = VideoConfig.get_video_dir(recording_session.club_id)
-            possible_paths = [
-                str(video_dir / f"{recording_session.recording_id}.mp4"),
-                f"static/videos/{recording_session.club_id}/{recording_session.recording_id}.mp4",
-                f"static/videos/{recording_session.recording_id}.mp4"
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path):
-                    local_video_path = path
-                    break
-            
-            if local_video_path:
-                from src.services.bunny_storage_service import bunny_storage_service
-                logger.info(f"🚀 Début upload vers Bunny CDN: {local_video_path}")
-                
-                # 🆕 Mettre à jour le statut avant l'upload
-                video.processing_status = 'uploading'
-                db.session.commit()
-                
-                upload_id = bunny_storage_service.queue_upload(
-                    local_path=local_video_path,
-                    title=video.title,
-                    metadata={
-                        'video_id': video.id,
-                        'user_id': recording_session.user_id,
-                        'court_id': recording_session.court_id,
-                        'recording_id': recording_session.recording_id,
-                        'duration': final_duration / 60
-                    }
-                )
-                logger.info(f"✅ Upload Bunny programmé: {upload_id}")
-                
-                # ✨ NEW: Wait briefly for upload to complete and extract bunny_video_id
-                import time
-                time.sleep(3)  # Give queue time to process and create video
-                
-                upload_status = bunny_storage_service.get_upload_status(upload_id)
-                if upload_status and upload_status.get('bunny_video_id'):
-                    bunny_id = upload_status['bunny_video_id']
-                    video.bunny_video_id = bunny_id
-                    # ✅ CORRECTION: Mettre à jour file_url avec l'URL Bunny CDN complète
-                    from src.config.bunny_config import BUNNY_CONFIG
-                    cdn_hostname = BUNNY_CONFIG.get('cdn_hostname', 'vz-9b857324-07d.b-cdn.net')
-                    video.file_url = f"https://{cdn_hostname}/{bunny_id}/playlist.m3u8"
-                    # 🆕 Mettre à jour le statut selon le statut Bunny
-                    video.processing_status = 'processing'
-                    db.session.commit()
-                    logger.info(f"✅ Bunny video ID saved: {video.bunny_video_id}")
-                    logger.info(f"✅ Bunny URL updated: {video.file_url}")
-                else:
-                    logger.warning(f"⚠️ Upload status: {upload_status}")
-            else:
-                logger.warning(f"⚠️ Fichier vidéo introuvable pour upload: {recording_session.recording_id}")
-                
-        except Exception as upload_error:
-            logger.error(f"❌ Erreur déclenchement upload Bunny: {upload_error}")
+        video_id = None
+        if wait_for_video and recording_finalizer.stop_wait_seconds > 0:
+            video_id = recording_finalizer.wait_for_video(finalization.id, recording_finalizer.stop_wait_seconds)
+        if video_id:
+            db.session.refresh(finalization)
+            return jsonify({
+                'message': 'Enregistrement arrêté avec succès',
+                'video': Video.query.get(video_id).to_dict(),
+                'finalization': finalization.to_dict(),
+                'session': recording_session.to_dict(),
+                'stopped_by': stopped_by
+            }), 200
         
         return jsonify({
-            'message': 'Enregistrement arrêté avec succès',
-            'video': video.to_dict(),
+            'message': 'Enregistrement arrêté, finalisation en cours',
+            'status': 'finalizing',
+            'video': None,
+            'finalization': finalization.to_dict(),
             'session': recording_session.to_dict(),
             'stopped_by': stopped_by
-        }), 200
+        }), 202
         
     except Exception as e:
         db.session.rollback()
         raise e
 
+@recording_bp.route('/finalization/<recording_id>', methods=['GET'])
+@recording_bp.route('/v3/finalization/<recording_id>', methods=['GET'])  # Route v3
+def get_recording_finalization(recording_id):
+    """Suivre la finalisation d'un enregistrement arrêté (vidéo disponible une fois 'registering' passé)"""
+    user = current_user_snapshot()  # Interrogé en boucle: contrôle d'accès sans requête SQL
+    if not user:
+        return jsonify({'error': 'Non authentifié'}), 401
+    
+    finalization = RecordingFinalization.query.filter_by(recording_id=recording_id).first()
+    if not finalization:
+        return jsonify({'error': 'Finalisation non trouvée'}), 404
+    
+    recording_session = finalization.recording_session
+    allowed = (
+        user.role == UserRole.SUPER_ADMIN or
+        recording_session.user_id == user.id or
+        (user.role == UserRole.CLUB and recording_session.club_id == user.club_id)
+    )
+    if not allowed:
+        return jsonify({'error': 'Accès non autorisé'}), 403
+    
+    video = Video.query.get(finalization.video_id) if finalization.video_id else None
+    return jsonify({
+        'finalization': finalization.to_dict(),
+        'video': video.to_dict() if video else None
+    }), 200
+
 # ====================================================================
 # ROUTES DE CONSULTATION
 # ====================================================================
@@ -508,7 +417,7 @@ def _stop_recording_session(recording_session, stopped_by, performed_by_id):
 @recording_bp.route('/v3/my-active', methods=['GET'])  # Route v3
 def get_my_active_recording():
     """Récupérer l'enregistrement actif de l'utilisateur"""
-    user = get_current_user()
+    user = current_user_snapshot()  # Minuteur du joueur, interrogé en boucle
     if not user:
         return jsonify({'error': 'Non authentifié'}), 401
     
@@ -524,7 +433,7 @@ def get_my_active_recording():
         # Vérifier si l'enregistrement a expiré
         if recording_session.is_expired():
             # Arrêter automatiquement l'enregistrement expiré
-            _stop_recording_session(recording_session, 'auto', user.id)
+            stop_recording_session(recording_session, 'auto', user.id)
             return jsonify({'active_recording': None, 'message': 'Enregistrement expiré et arrêté automatiquement'}), 200
         
         # Enrichir avec les données du terrain et club
@@ -547,7 +456,7 @@ def get_my_active_recording():
 @recording_bp.route('/v3/club/active', methods=['GET'])  # Route v3
 def get_club_active_recordings():
     """Récupérer tous les enregistrements actifs d'un club"""
-    user = get_current_user()
+    user = current_user_snapshot()  # Minuteurs du club, interrogés en boucle
     if not user:
         return jsonify({'error': 'Non authentifié'}), 401
     
@@ -655,7 +564,7 @@ def cleanup_expired_recordings():
         
         for session in expired_sessions:
             if session.is_expired():
-                _stop_recording_session(session, 'auto', user.id)
+                stop_recording_session(session, 'auto', user.id)
                 expired_count += 1
         
         logger.info(f"Nettoyage automatique: {expired_count} enregistrements expirés arrêtés")
@@ -733,6 +642,7 @@ def recording_v3_test():
 
 
 @recording_bp.route('/v3/start', methods=['POST'])
+@idempotent()
 def start_recording_v3():
     """🆕 ADAPTATEUR: Redirige vers le nouveau système vidéo stable"""
     user = get_current_user()
@@ -802,7 +712,7 @@ def start_recording_v3():
                          logger.info("✅ Session zombie (RAM missing) nettoyée en BDD")
                     else:
                         # Si elle est en RAM (même inactive), on tente un cleanup propre
-                        _stop_recording_session(existing_recording, 'auto', user.id)
+                        stop_recording_session(existing_recording, 'auto', user.id)
                         logger.info("✅ Session expirée/inactive nettoyée avec succès via stop_recording")
                 except Exception as e:
                     logger.error(f"⚠️ Erreur nettoyage session {reason}: {e}")
@@ -862,12 +772,6 @@ def start_recording_v3():
             from datetime import datetime
             
             try:
-                # 💳 DÉBITER 1 CRÉDIT (déjà vérifié avant)
-                # Débiter 1 crédit
-                user.credits_balance -= 1
-                logger.info(f"💳 Crédit déduit: Nouveau solde = {user.credits_balance}")
-
-                
                 # Récupérer le club pour le titre
                 club = Club.query.get(court.club_id)
                 
@@ -896,9 +800,24 @@ def start_recording_v3():
                 # Marquer le terrain comme occupé
                 court.is_recording = True
                 
+                # 💳 DÉBITER 1 CRÉDIT: instruction conditionnelle juste avant le commit
+                # (le contrôle ci-dessus a pu être dépassé par un débit concurrent)
+                new_balance = credit_ledger.debit(user, 1, 'recording',
+                                                  reference=f"recording:{session.session_id}",
+                                                  performed_by_id=user.id)
+                
                 db.session.commit()
+                logger.info(f"💳 Crédit déduit: Nouveau solde = {new_balance}")
                 logger.info(f"📊 État terrain mis à jour: {court.name} → En enregistrement")
                 
+            except InsufficientCredits:
+                db.session.rollback()
+                video_recorder.stop_recording(session.session_id)
+                session_manager.close_session(session.session_id)
+                return jsonify({
+                    'success': False,
+                    'error': 'Crédits insuffisants. Vous devez avoir au moins 1 crédit pour démarrer un enregistrement.'
+                }), 400
             except Exception as db_err:
                 logger.error(f"⚠️ Erreur mise à jour DB: {db_err}")
                 # Rollback et arrêter enregistrement proprement
@@ -10,6 +10,7 @@ import asyncio
 
 from ..models.database import db
 from ..models.user import User, UserRole
+from ..utils.current_user import current_user
 from ..services.flask_recording_manager import get_recording_manager
 from ..services.flask_proxy_manager import get_proxy_manager
 
@@ -54,12 +55,7 @@ def token_required(f):
 
 def get_current_user():
     """Obtenir l'utilisateur courant depuis la session"""
-    from flask import session
-    if 'user_id' not in session:
-        return None
-    
-    user = User.query.get(session['user_id'])
-    return user
+    return current_user()
 
 
 @recording_bp.route('/api/recording/matches/<int:match_id>/recording/start', methods=['POST'])
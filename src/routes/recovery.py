@@ -4,14 +4,15 @@ from ..services.recovery_service import recovery_service
 from ..models.recovery import RecoveryRequestType, VideoRecoveryRequest
 from ..models.user import UserRole, User
 from ..utils.jwt_helpers import get_current_user_from_token
+from ..utils.current_user import current_user
 
 recovery_bp = Blueprint('recovery', __name__, url_prefix='/api/recovery')
 
 def get_current_user():
     # Try session first
-    user_id = session.get('user_id')
-    if user_id:
-        return User.query.get(user_id)
+    user = current_user()
+    if user:
+        return user
     
     # Try token
     return get_current_user_from_token()
@@ -135,6 +135,27 @@ def system_metrics():
         logger.error(f"Erreur lors de la récupération des métriques: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@system_bp.route('/db-profile', methods=['GET', 'DELETE'])
+@require_admin
+def db_profile():
+    """
+    Coût SQL par endpoint (requêtes, temps base, requête la plus lente, N+1 probables)
+    Agrégats du worker qui répond; DELETE les remet à zéro
+    Accessible uniquement aux administrateurs
+    """
+    from ..services.query_profiler import query_profiler
+    
+    if request.method == 'DELETE':
+        query_profiler.reset()
+        return jsonify({'status': 'success', 'message': 'Profil SQL réinitialisé'})
+    
+    profile = query_profiler.snapshot(sort=request.args.get('sort', 'db_time'))
+    limit = request.args.get('limit', type=int)
+    if limit:
+        profile['endpoints'] = dict(list(profile['endpoints'].items())[:limit])
+    profile['timestamp'] = datetime.utcnow().isoformat()
+    return jsonify(profile)
+
 @system_bp.route('/cleanup', methods=['POST'])
 @require_admin
 def force_cleanup():
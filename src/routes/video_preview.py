@@ -3,16 +3,21 @@ Routes Preview - Streaming Vidéo en Temps Réel
 ===============================================
 
 Endpoints pour:
-- Preview MJPEG (streaming continu)
-- Snapshot JPEG (image unique)
+- Preview MJPEG (streaming continu): servi de façon asynchrone par le hub proxy, relayé
+  par nginx (X-Accel-Redirect) après contrôle d'accès; aucun worker Flask n'est occupé
+  pendant le flux. Tous les viewers d'un terrain partagent la lecture amont de la caméra
+- Snapshot JPEG (image unique, ?width= pour une vignette réduite, ETag / If-None-Match)
 - Support multi-viewers
 """
 
 import logging
+from urllib.parse import urlencode, urlsplit
+
 from flask import Blueprint, Response, jsonify, request
 import requests
 
 from ..video_system import session_manager
+from ..video_system.config import VideoConfig
 from ..models.user import UserRole
 from ..routes.auth import get_current_user
 
@@ -22,6 +27,14 @@ logger = logging.getLogger(__name__)
 preview_bp = Blueprint('preview', __name__, url_prefix='/api/preview')
 
 
+def _preview_params() -> dict:
+    """Cadence et largeur de la preview (bornées côté proxy)"""
+    return {
+        'fps': request.args.get('fps', VideoConfig.PREVIEW_FPS, type=float),
+        'width': request.args.get('width', VideoConfig.PREVIEW_WIDTH, type=int),
+    }
+
+
 @preview_bp.route('/<session_id>/stream.mjpeg', methods=['GET'])
 def stream_mjpeg(session_id: str):
     """
@@ -45,12 +58,27 @@ def stream_mjpeg(session_id: str):
         if session.user_id != user.id:
             return jsonify({'error': 'Accès non autorisé'}), 403
     
-    # Proxy le stream depuis le proxy local
+    logger.info(f"📡 Stream preview demandé pour {session_id} par user {user.id}")
     try:
-        logger.info(f"📡 Stream preview demandé pour {session_id} par user {user.id}")
-        
-        # Connexion au proxy local
-        proxy_response = requests.get(session.local_url, stream=True, timeout=30)
+        # Proxy attaché à la demande (enregistrement RTSP en copie directe)
+        preview_url = session_manager.ensure_proxy(session).replace('/stream.mjpg', '/preview.mjpg')
+    except Exception as e:
+        logger.error(f"❌ Proxy indisponible pour la preview: {e}")
+        return jsonify({'error': 'Proxy non disponible'}), 503
+    query = urlencode(_preview_params())
+    
+    # Hub proxy relayé par nginx: le flux ne passe pas par un worker Flask
+    if VideoConfig.PREVIEW_ACCEL_PREFIX and urlsplit(preview_url).port == VideoConfig.PROXY_HUB_PORT:
+        response = Response(status=200)
+        response.headers['X-Accel-Redirect'] = (
+            f"{VideoConfig.PREVIEW_ACCEL_PREFIX}{urlsplit(preview_url).path}?{query}"
+        )
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    # Relais par Flask (développement, proxy par session): occupe un worker pendant le flux
+    try:
+        proxy_response = requests.get(f"{preview_url}?{query}", stream=True, timeout=(5, 30))
         
         if proxy_response.status_code != 200:
             return jsonify({'error': 'Proxy non disponible'}), 503
@@ -63,6 +91,8 @@ def stream_mjpeg(session_id: str):
                         yield chunk
             except Exception as e:
                 logger.error(f"❌ Erreur streaming: {e}")
+            finally:
+                proxy_response.close()
         
         return Response(
             generate(),
@@ -85,8 +115,8 @@ def snapshot(session_id: str):
     Obtenir un snapshot JPEG unique
     
     Usage:
-        <img src="/api/preview/<session_id>/snapshot.jpg" />
-        Polling toutes les N secondes pour preview animée
+        <img src="/api/preview/<session_id>/snapshot.jpg?width=320" />
+        Polling toutes les N secondes pour preview animée (If-None-Match: 304 sans nouvelle frame)
     """
     user = get_current_user()
     if not user:
@@ -104,23 +134,25 @@ def snapshot(session_id: str):
     
     try:
         # Construire l'URL du snapshot depuis le proxy
-        snapshot_url = session.local_url.replace('/stream.mjpg', '/snapshot.jpg')
+        snapshot_url = session_manager.ensure_proxy(session).replace('/stream.mjpg', '/snapshot.jpg')
         
-        # Récupérer le snapshot
-        response = requests.get(snapshot_url, timeout=5)
+        # Dernière frame gardée en mémoire par le proxy (pas de lecture caméra);
+        # If-None-Match transmis: 304 tant que la caméra n'a pas produit de nouvelle frame
+        headers = {}
+        if request.headers.get('If-None-Match'):
+            headers['If-None-Match'] = request.headers['If-None-Match']
+        params = {'width': request.args['width']} if request.args.get('width', type=int) else None
+        response = requests.get(snapshot_url, params=params, headers=headers, timeout=5)
         
+        cache_headers = {'Cache-Control': 'no-cache'}
+        if response.headers.get('ETag'):
+            cache_headers['ETag'] = response.headers['ETag']
+        if response.status_code == 304:
+            return Response(status=304, headers=cache_headers)
         if response.status_code != 200:
             return jsonify({'error': 'Snapshot non disponible'}), 503
         
-        return Response(
-            response.content,
-            mimetype='image/jpeg',
-            headers={
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-        )
+        return Response(response.content, mimetype='image/jpeg', headers=cache_headers)
         
     except Exception as e:
         logger.error(f"❌ Erreur snapshot: {e}", exc_info=True)
@@ -148,7 +180,7 @@ def preview_info(session_id: str):
     
     try:
         # Vérifier la santé du proxy
-        health_url = session.local_url.replace('/stream.mjpg', '/health')
+        health_url = session_manager.ensure_proxy(session).replace('/stream.mjpg', '/health')
         
         proxy_healthy = False
         try:
@@ -164,6 +196,7 @@ def preview_info(session_id: str):
             'proxy_url': session.local_url,
             'stream_url': f'/api/preview/{session_id}/stream.mjpeg',
             'snapshot_url': f'/api/preview/{session_id}/snapshot.jpg',
+            'thumbnail_url': f'/api/preview/{session_id}/snapshot.jpg?width={VideoConfig.PREVIEW_WIDTH}',
             'recording_active': session.recording_active
         }), 200
         
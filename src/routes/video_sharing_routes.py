@@ -3,6 +3,7 @@ Routes pour le partage de vidéos entre utilisateurs
 """
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Video, SharedVideo
+from src.utils.current_user import current_user
 from functools import wraps
 import logging
 import os
@@ -157,9 +158,8 @@ def login_required(f):
     return wrapper
 
 def get_current_user():
-    """Récupère l'utilisateur courant depuis la session"""
-    uid = session.get('user_id')
-    return User.query.get(uid) if uid else None
+    """Récupère l'utilisateur courant depuis la session (une requête SQL au plus par requête HTTP)"""
+    return current_user()
 
 def api_response(data=None, message=None, status=200, error=None):
     """Format de réponse API standardisé"""
@@ -4,6 +4,8 @@ Utiliser /api/recording/start et /api/recording/stop.
 """
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Video, Court, Club
+from src.utils.current_user import current_user
+from src.services import video_feed
 from functools import wraps
 import logging
 
@@ -22,8 +24,7 @@ def login_required(f):
 
 
 def get_current_user():
-    uid = session.get('user_id')
-    return User.query.get(uid) if uid else None
+    return current_user()
 
 
 def api_response(data=None, message=None, status=200, error=None):
@@ -40,36 +41,34 @@ def api_response(data=None, message=None, status=200, error=None):
 @videos_bp.route('/my-videos', methods=['GET'])
 @login_required
 def my_videos():
-    from src.models.user import SharedVideo
+    """
+    Vidéos possédées et partagées avec l'utilisateur, les plus récentes d'abord
+
+    Query params:
+    - limit: taille de page (max 100); sans limit ni cursor, le fil complet est renvoyé
+    - cursor: next_cursor de la page précédente
+    - fields: champs à renvoyer, séparés par des virgules (ex: id,title,thumbnail_url)
+    """
     user = get_current_user()
-    
-    # Vidéos possédées par l'utilisateur
-    owned_videos = Video.query.filter_by(user_id=user.id).order_by(Video.recorded_at.desc()).all()
-    
-    # Vidéos partagées avec l'utilisateur
-    shared_with_me = SharedVideo.query.filter_by(shared_with_user_id=user.id).order_by(SharedVideo.shared_at.desc()).all()
-    
-    # Combiner les vidéos
-    videos_list = []
-    
-    # Ajouter les vidéos possédées
-    for v in owned_videos:
-        video_data = v.to_dict()  # ✅ Utiliser to_dict() pour avoir tous les champs
-        video_data['is_shared'] = False  # Ajouter le champ is_shared
-        videos_list.append(video_data)
-    
-    # Ajouter les vidéos partagées
-    for sv in shared_with_me:
-        if sv.video:  # Vérifier que la vidéo existe toujours
-            video_data = sv.video.to_dict()  # ✅ Utiliser to_dict() pour avoir tous les champs
-            video_data['is_shared'] = True  # C'est une vidéo partagée
-            video_data['shared_by'] = sv.owner.name if sv.owner else 'Inconnu'
-            video_data['shared_at'] = sv.shared_at.isoformat() if sv.shared_at else None
-            video_data['shared_message'] = sv.message
-            video_data['shared_video_id'] = sv.id  # Pour pouvoir supprimer le partage
-            videos_list.append(video_data)
-    
-    return api_response({'videos': videos_list})
+
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if cursor and not limit:
+        limit = 50
+    if limit:
+        limit = max(1, min(limit, 100))
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or None
+
+    try:
+        page = video_feed.my_videos_page(user.id, limit=limit, cursor=cursor, fields=fields)
+    except video_feed.InvalidCursor:
+        return api_response(error='Curseur invalide', status=400)
+
+    # ETag sur le contenu: une page inchangée est servie en 304 sans corps
+    response = jsonify(page)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 
@@ -9,6 +9,7 @@ la gestion des erreurs et des ressources.
 
 from flask import Blueprint, request, jsonify, session, send_file, Response
 from src.models.user import db, User, Video, Court, Club
+from src.utils.current_user import current_user
 from src.services.video_capture_service import video_capture_service
 from datetime import datetime, timedelta
 import os
@@ -403,10 +404,7 @@ def get_current_user() -> Optional[User]:
     Returns:
         L'objet utilisateur ou None si non authentifié
     """
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    return current_user()
 
 def handle_api_error(f):
     """Décorateur pour gérer uniformément les erreurs d'API."""
@@ -1287,10 +1285,7 @@ def auto_stop_recording(session_id, court_id, duration_minutes, user_id):
 
 def get_current_user():
     """Récupère l'utilisateur actuellement connecté"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    return User.query.get(user_id)
+    return current_user()
 
 
 # ====================================================================
@@ -1,53 +1,218 @@
 """
 Service de mise à jour automatique du statut des vidéos Bunny CDN
-Vérifie périodiquement les vidéos en cours de processing et met à jour leur statut
+Réconciliation par lots: les statuts sont récupérés en masse (liste paginée de la
+bibliothèque, puis requêtes concurrentes bornées pour le reste) et appliqués avec un
+UPDATE groupé par statut et par table. Les webhooks Bunny (routes/bunny_webhook.py)
+passent par le même apply_bunny_statuses(): le balayage périodique n'est plus qu'un filet.
 """
 
 import logging
+import os
 import time
 import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterable, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Statuts de l'objet vidéo Bunny Stream (GET /videos, /videos/{id})
+# 0=Created, 1=Uploaded, 2=Processing, 3=Transcoding, 4=Finished, 5=Error, 6=UploadFailed
+VIDEO_STATUS_STATES = {0: 'processing', 1: 'processing', 2: 'processing', 3: 'processing',
+                       4: 'ready', 5: 'failed', 6: 'failed'}
+
+# Statuts des webhooks Bunny Stream (numérotation différente de l'objet vidéo)
+# 0=Queued, 1=Processing, 2=Encoding, 3=Finished, 4=ResolutionFinished, 5=Failed,
+# 6=PresignedUploadStarted, 7=PresignedUploadFinished, 8=PresignedUploadFailed
+WEBHOOK_STATUS_STATES = {0: 'processing', 1: 'processing', 2: 'processing', 3: 'ready',
+                         4: 'processing', 5: 'failed', 6: 'processing', 7: 'processing',
+                         8: 'failed'}
+
+# Statuts locaux encore en attente d'une réponse Bunny
+PENDING_STATUSES = ('uploading', 'processing', 'pending')
+
+# bunny_video_id -> (état normalisé 'ready'|'failed'|'processing', durée Bunny en secondes ou None)
+BunnyStates = Dict[str, Tuple[str, Optional[float]]]
+
+
+def _targets():
+    """Tables suivies: (nom, modèle, colonne de statut, valeurs par état normalisé)"""
+    from src.models.user import Video, UserClip, HighlightVideo
+
+    return (
+        ('video', Video, Video.processing_status,
+         {'ready': 'ready', 'failed': 'failed', 'processing': 'processing'}),
+        ('clip', UserClip, UserClip.status,
+         {'ready': 'completed', 'failed': 'failed', 'processing': 'processing'}),
+        ('highlight', HighlightVideo, HighlightVideo.generation_status,
+         {'ready': 'completed', 'failed': 'failed', 'processing': 'processing'}),
+    )
+
+
+def _owner_column(name: str, model):
+    """Utilisateur propriétaire (destinataire des événements de statut)"""
+    from sqlalchemy import select
+    from src.models.user import Video, HighlightVideo
+
+    if name == 'highlight':
+        return select(Video.user_id).where(Video.id == HighlightVideo.original_video_id).scalar_subquery()
+    return model.user_id
+
+
+def pending_bunny_ids() -> set:
+    """Identifiants Bunny de tout ce qui attend encore un statut (une requête par table)"""
+    from src.models.database import db
+
+    guids = set()
+    for _, model, status_col, _ in _targets():
+        rows = db.session.query(model.bunny_video_id).filter(
+            status_col.in_(PENDING_STATUSES),
+            model.bunny_video_id.isnot(None)
+        ).all()
+        guids.update(row[0] for row in rows)
+    return guids
+
+
+def apply_bunny_statuses(states: BunnyStates) -> Dict[str, int]:
+    """
+    Appliquer des statuts Bunny aux vidéos, clips et highlights en attente
+
+    Un UPDATE groupé par statut et par table, notifications ajoutées en lot,
+    un seul commit. Les lignes déjà finalisées ne sont pas touchées.
+
+    Args:
+        states: {bunny_video_id: (état normalisé 'ready'|'failed'|'processing', durée ou None)}
+
+    Returns:
+        Nombre de lignes modifiées par table
+    """
+    from sqlalchemy import case
+    from src.models.database import db
+    from src.models.notification import Notification, NotificationType
+    from src.services.event_bus import publish_status_changes
+
+    counts = {}
+    if not states:
+        return counts
+
+    guids = list(states)
+    now = datetime.utcnow()
+    notifications = []
+
+    for name, model, status_col, values in _targets():
+        notify_cols = (model.user_id, model.title) if name in ('video', 'clip') else ()
+        owner_col = _owner_column(name, model)
+        rows = db.session.query(model.id, model.bunny_video_id, status_col.label('status'),
+                                owner_col.label('owner_id'), *notify_cols).filter(
+            model.bunny_video_id.in_(guids),
+            status_col.in_(PENDING_STATUSES)
+        ).all()
+
+        ids_by_state = {}
+        for row in rows:
+            state = states[row.bunny_video_id][0]
+            if row.status != values[state]:
+                ids_by_state.setdefault(state, []).append(row)
+
+        changed = 0
+        for state, state_rows in ids_by_state.items():
+            ids = [row.id for row in state_rows]
+            update_values = {status_col: values[state]}
+            if state == 'ready':
+                if name == 'video':
+                    lengths = {row.id: states[row.bunny_video_id][1] for row in state_rows
+                               if states[row.bunny_video_id][1]}
+                    if lengths:
+                        update_values[model.duration] = case(lengths, value=model.id, else_=model.duration)
+                else:
+                    update_values[model.completed_at] = now
+
+            changed += model.query.filter(
+                model.id.in_(ids),
+                status_col.in_(PENDING_STATUSES)
+            ).update(update_values, synchronize_session=False)
+
+            # Flux SSE des propriétaires (publié au commit)
+            publish_status_changes(db.session, name, [
+                {'id': row.id, 'bunny_video_id': row.bunny_video_id, 'status': values[state], 'user_id': row.owner_id}
+                for row in state_rows
+            ])
+
+            if state == 'ready' and name == 'video':
+                notifications += [dict(
+                    user_id=row.user_id,
+                    notification_type=NotificationType.VIDEO,
+                    title="🎬 Votre vidéo est prête !",
+                    message=f"La vidéo '{row.title}' a été traitée avec succès.",
+                    link="/dashboard"
+                ) for row in state_rows]
+            elif state == 'ready' and name == 'clip':
+                notifications += [dict(
+                    user_id=row.user_id,
+                    notification_type=NotificationType.VIDEO_READY,
+                    title="🎬 Votre clip est prêt !",
+                    message=f"Le clip '{row.title}' est prêt.",
+                    link="/dashboard?tab=clips"
+                ) for row in state_rows]
+
+        if changed:
+            counts[name] = changed
+
+    for notification in notifications:
+        Notification.create_notification(**notification)
+
+    db.session.commit()
+    if counts:
+        logger.info(f"✅ Statuts Bunny appliqués: {counts}")
+    return counts
+
 
 class BunnyStatusUpdater:
     """Service qui met à jour le statut des vidéos Bunny en background"""
-    
-    def __init__(self, api_key: str, library_id: str, app=None):
+
+    def __init__(self, api_key: str, library_id: str, app=None, api_base_url: str = None):
         self.api_key = api_key
         self.library_id = library_id
-        self.api_base_url = f"https://video.bunnycdn.com/library/{library_id}"
+        self.api_base_url = api_base_url or f"https://video.bunnycdn.com/library/{library_id}"
         self.headers = {
             "AccessKey": api_key,
             "Accept": "application/json"
         }
-        
+
         self.is_running = False
         self._thread = None
-        self.check_interval = 30  # Vérifier toutes les 30 secondes
+        # Avec les webhooks Bunny, le balayage ne sert qu'à rattraper les notifications perdues
+        self.check_interval = 300 if os.environ.get('BUNNY_WEBHOOK_SECRET') else 30
         self.app = app  # 🆕 Stocker l'instance Flask
-    
+
+        # Récupération en masse: pages de la liste, puis requêtes concurrentes bornées
+        self.items_per_page = 100
+        self.max_list_pages = 5
+        self.max_concurrent_requests = 8
+        self._http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_concurrent_requests)
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
+
     def start(self):
         """Démarre le service de mise à jour"""
         if self.is_running:
             logger.warning("Le service de mise à jour Bunny est déjà démarré")
             return
-        
+
         self.is_running = True
         self._thread = threading.Thread(target=self._update_loop, daemon=True)
         self._thread.start()
         logger.info("✅ Service de mise à jour Bunny CDN démarré")
-    
+
     def stop(self):
         """Arrête le service"""
         self.is_running = False
         if self._thread:
             self._thread.join(timeout=5)
         logger.info("🛑 Service de mise à jour Bunny CDN arrêté")
-    
+
     def _update_loop(self):
         """Boucle principale de mise à jour"""
         while self.is_running:
@@ -55,161 +220,88 @@ class BunnyStatusUpdater:
                 self._check_and_update_videos()
             except Exception as e:
                 logger.error(f"❌ Erreur dans la boucle de mise à jour: {e}")
-            
+
             # Attendre avant la prochaine vérification
             time.sleep(self.check_interval)
-    
+
     def _check_and_update_videos(self):
-        """Vérifie et met à jour les vidéos en cours de processing"""
-        from src.models.database import db
-        from src.models.user import Video
-        
+        """Vérifie et met à jour les vidéos, clips et highlights en cours de processing"""
         # 🆕 Utiliser le contexte d'application Flask stocké
         if not self.app:
             logger.warning("⚠️ Pas d'instance Flask - impossible de mettre à jour les vidéos")
             return
-        
+
         with self.app.app_context():
-            # Récupérer toutes les vidéos en cours de processing OU en attente (si ID Bunny existe)
-            processing_videos = Video.query.filter(
-                Video.processing_status.in_(['uploading', 'processing', 'pending']),
-                Video.bunny_video_id.isnot(None)
-            ).all()
-            
-            if not processing_videos:
+            guids = pending_bunny_ids()
+            if not guids:
                 return
-            
-            logger.debug(f"🔍 Vérification de {len(processing_videos)} vidéos en processing")
-            
-            for video in processing_videos:
-                try:
-                    self._sync_video_status(video, db)
-                except Exception as e:
-                    logger.error(f"❌ Erreur vérification vidéo {video.id}: {e}")
-                time.sleep(0.5)
-
-            # 🆕 Vérifier les clips utilisateur
-            from src.models.user import UserClip
-            processing_clips = UserClip.query.filter(
-                UserClip.status.in_(['processing', 'pending', 'uploading']),
-                UserClip.bunny_video_id.isnot(None)
-            ).all()
-
-            for clip in processing_clips:
-                try:
-                    self._sync_clip_status(clip, db)
-                except Exception as e:
-                    logger.error(f"❌ Erreur vérification clip {clip.id}: {e}")
-                time.sleep(0.5)
-
-            # 🆕 Vérifier les highlights
-            from src.models.user import HighlightVideo
-            processing_highlights = HighlightVideo.query.filter(
-                HighlightVideo.generation_status.in_(['processing', 'pending', 'uploading']),
-                HighlightVideo.bunny_video_id.isnot(None)
-            ).all()
-
-            for highlight in processing_highlights:
-                try:
-                    self._sync_highlight_status(highlight, db)
-                except Exception as e:
-                    logger.error(f"❌ Erreur vérification highlight {highlight.id}: {e}")
-                time.sleep(0.5)
-
-    def _sync_video_status(self, video, db):
-        """Synchronise le statut d'une vidéo avec Bunny CDN"""
-        check_url = f"{self.api_base_url}/videos/{video.bunny_video_id}"
-        response = requests.get(check_url, headers=self.headers, timeout=10)
-        
-        if response.status_code == 200:
-            video_info = response.json()
-            status = video_info.get("status")
-            
-            if status == 4:  # Finished
-                if video.processing_status != 'ready':
-                    video.processing_status = 'ready'
-                    real_duration = video_info.get("length")
-                    if real_duration and real_duration > 0:
-                        video.duration = real_duration
-                    
-                    try:
-                        from src.models.notification import Notification, NotificationType
-                        Notification.create_notification(
-                            user_id=video.user_id,
-                            notification_type=NotificationType.VIDEO,
-                            title="🎬 Votre vidéo est prête !",
-                            message=f"La vidéo '{video.title}' a été traitée avec succès.",
-                            link="/dashboard"
-                        )
-                    except: pass
-                    db.session.commit()
-            elif status == 5:  # Failed
-                video.processing_status = 'failed'
-                db.session.commit()
-            elif status in [0, 1, 2, 3] and video.processing_status != 'processing':
-                video.processing_status = 'processing'
-                db.session.commit()
-        elif response.status_code == 404:
-            video.processing_status = 'failed'
-            db.session.commit()
-
-    def _sync_clip_status(self, clip, db):
-        """Synchronise le statut d'un clip utilisateur avec Bunny CDN"""
-        check_url = f"{self.api_base_url}/videos/{clip.bunny_video_id}"
-        response = requests.get(check_url, headers=self.headers, timeout=10)
-        
-        if response.status_code == 200:
-            video_info = response.json()
-            status = video_info.get("status")
-            
-            if status == 4:  # Finished
-                if clip.status != 'completed':
-                    clip.status = 'completed'
-                    clip.completed_at = datetime.utcnow()
-                    try:
-                        from src.models.notification import Notification, NotificationType
-                        Notification.create_notification(
-                            user_id=clip.user_id,
-                            notification_type=NotificationType.VIDEO_READY,
-                            title="🎬 Votre clip est prêt !",
-                            message=f"Le clip '{clip.title}' est prêt.",
-                            link="/dashboard?tab=clips"
-                        )
-                    except: pass
-                    db.session.commit()
-            elif status == 5:
-                clip.status = 'failed'
-                db.session.commit()
-            elif status in [0, 1, 2, 3] and clip.status != 'processing':
-                clip.status = 'processing'
-                db.session.commit()
-        elif response.status_code == 404:
-            clip.status = 'failed'
-            db.session.commit()
-
-    def _sync_highlight_status(self, highlight, db):
-        """Synchronise le statut d'un highlight avec Bunny CDN"""
-        check_url = f"{self.api_base_url}/videos/{highlight.bunny_video_id}"
-        response = requests.get(check_url, headers=self.headers, timeout=10)
-        
-        if response.status_code == 200:
-            video_info = response.json()
-            status = video_info.get("status")
-            
-            if status == 4:  # Finished
-                if highlight.generation_status != 'completed':
-                    highlight.generation_status = 'completed'
-                    highlight.completed_at = datetime.utcnow()
-                    db.session.commit()
-            elif status == 5:
-                highlight.generation_status = 'failed'
-                db.session.commit()
-            elif status in [0, 1, 2, 3] and highlight.generation_status != 'processing':
-                highlight.generation_status = 'processing'
-                db.session.commit()
-        elif response.status_code == 404:
-            highlight.generation_status = 'failed'
-            db.session.commit()
+
+            started = time.time()
+            states = self.fetch_statuses(guids)
+            counts = apply_bunny_statuses(states)
+            logger.debug(
+                f"🔍 Réconciliation Bunny: {len(guids)} en attente, {len(states)} statuts reçus, "
+                f"{counts or 'aucun changement'} en {time.time() - started:.1f}s"
+            )
+
+    def fetch_statuses(self, guids: Iterable[str]) -> BunnyStates:
+        """
+        Statuts Bunny d'un ensemble de vidéos
+
+        Les vidéos en attente sont récentes: la liste triée par date les couvre en
+        quelques pages; les manquantes sont demandées une à une en parallèle.
+        """
+        remaining = set(guids)
+        states: BunnyStates = {}
+
+        page = 1
+        while remaining and page <= self.max_list_pages:
+            response = self._http.get(
+                f"{self.api_base_url}/videos",
+                headers=self.headers,
+                params={'page': page, 'itemsPerPage': self.items_per_page, 'orderBy': 'date'},
+                timeout=15
+            )
+            if response.status_code != 200:
+                logger.warning(f"⚠️ Liste Bunny indisponible ({response.status_code}), repli sur les requêtes unitaires")
+                break
+            data = response.json()
+            items = data.get('items') or []
+            for item in items:
+                guid = item.get('guid')
+                state = VIDEO_STATUS_STATES.get(item.get('status'))
+                if guid in remaining and state:
+                    states[guid] = (state, item.get('length'))
+                    remaining.discard(guid)
+            if not items or page * self.items_per_page >= data.get('totalItems', 0):
+                break
+            page += 1
+
+        if remaining:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+                for guid, result in zip(remaining, executor.map(self._fetch_one, remaining)):
+                    if result:
+                        states[guid] = result
+        return states
+
+    def _fetch_one(self, guid: str) -> Optional[Tuple[str, Optional[float]]]:
+        try:
+            info = self.fetch_video(guid)
+        except requests.RequestException as e:
+            logger.warning(f"⚠️ Statut Bunny indisponible pour {guid}: {e}")
+            return None
+        if info is None:
+            return ('failed', None)  # Supprimée côté Bunny
+        state = VIDEO_STATUS_STATES.get(info.get('status'))
+        return (state, info.get('length')) if state else None
+
+    def fetch_video(self, guid: str) -> Optional[dict]:
+        """Détails d'une vidéo Bunny (None si elle n'existe pas)"""
+        response = self._http.get(f"{self.api_base_url}/videos/{guid}", headers=self.headers, timeout=10)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
 
 
 # Instance globale
@@ -219,11 +311,10 @@ _bunny_status_updater = None
 def get_bunny_status_updater() -> BunnyStatusUpdater:
     """Récupère l'instance du service de mise à jour"""
     global _bunny_status_updater
-    
+
     if _bunny_status_updater is None:
-        import os
         api_key = os.environ.get('BUNNY_API_KEY', 'ac7bcccc-69bc-47aa-ae8fed1c3364-5693-4e1b')
         library_id = os.environ.get('BUNNY_LIBRARY_ID', '589708')
         _bunny_status_updater = BunnyStatusUpdater(api_key, library_id)
-    
+
     return _bunny_status_updater
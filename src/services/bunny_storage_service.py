@@ -16,7 +16,12 @@ from pathlib import Path
 from queue import Queue, Empty
 from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import base64
 import random
+from urllib.parse import urljoin
+
+from .upload_journal import UploadJournal
+from .upload_throttle import destination_slot, ThrottledFile
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
@@ -40,6 +45,7 @@ class BunnyStorageConfig:
         
         # URLs API
         self.api_base_url = f"https://video.bunnycdn.com/library/{self.library_id}"
+        self.tus_endpoint = "https://video.bunnycdn.com/tusupload"
         
         # Headers API
         self.headers = {
@@ -49,12 +55,16 @@ class BunnyStorageConfig:
         }
         
         # Configuration avancée avec variables d'environnement
-        self.chunk_size = 8 * 1024 * 1024  # 8MB chunks
+        self.chunk_size = int(os.environ.get('BUNNY_UPLOAD_CHUNK_MB', '32')) * 1024 * 1024  # Point de reprise TUS
+        self.upload_protocol = os.environ.get('BUNNY_UPLOAD_PROTOCOL', 'tus')  # 'tus' (reprenable) ou 'put' (fichier entier)
+        self.journal_dir = os.environ.get('BUNNY_UPLOAD_JOURNAL_DIR', 'uploads/bunny_journal')
+        self.journal_retention = 7 * 24 * 3600  # Entrées terminées conservées 7 jours
+        self.journal_scan_interval = 60  # Reprise des uploads orphelins d'autres processus
         self.max_retries = int(os.environ.get('BUNNY_MAX_RETRIES', '3'))
         self.retry_delay = int(os.environ.get('BUNNY_RETRY_DELAY', '10'))
         self.timeout = int(os.environ.get('BUNNY_UPLOAD_TIMEOUT', '7200'))
         self.upload_timeout = int(os.environ.get('BUNNY_UPLOAD_TIMEOUT', '7200'))
-        self.max_concurrent_uploads = 2
+        self.max_concurrent_uploads = int(os.environ.get('BUNNY_MAX_CONCURRENT_UPLOADS', '2'))
     
     def is_valid(self) -> bool:
         """Vérifie si la configuration est valide"""
@@ -97,10 +107,18 @@ class UploadTask:
         self.bunny_url = None
         self.error_message = None
         
-        # Pour suivi de progression
+        # Pour suivi de progression (octets acquittés par Bunny)
         self.bytes_uploaded = 0
         self.total_bytes = 0
         
+        # Reprise: URL de l'upload TUS et empreinte du fichier envoyé
+        self.upload_url = None
+        self.file_mtime = None
+        self.journaled = False  # upload_immediately() n'est pas journalisé
+        
+        # Upload progressif: [nom, taille] des fichiers envoyés bout à bout (None: fichier unique)
+        self.stream_files = None
+        
         # Lock pour thread safety
         self._lock = threading.Lock()
     
@@ -128,6 +146,50 @@ class UploadTask:
             except:
                 self._file_size = 0
         return self._file_size
+    
+    def to_journal(self) -> Dict[str, Any]:
+        """État persistable de la tâche (point de reprise)"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'local_path': self.local_path,
+                'title': self.title,
+                'metadata': self.metadata,
+                'status': self.status,
+                'retries': self.retries,
+                'bunny_video_id': self.bunny_video_id,
+                'bunny_url': self.bunny_url,
+                'error_message': self.error_message,
+                'upload_url': self.upload_url,
+                'bytes_uploaded': self.bytes_uploaded,
+                'total_bytes': self.total_bytes,
+                'file_mtime': self.file_mtime,
+                'stream_files': self.stream_files,
+                'created_at': self.created_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'completed_at': self.completed_at.isoformat() if self.completed_at else None
+            }
+    
+    @classmethod
+    def from_journal(cls, entry: Dict[str, Any]) -> 'UploadTask':
+        """Reconstruire une tâche depuis son entrée de journal"""
+        task = cls(entry['local_path'], entry.get('title'), entry.get('metadata'))
+        task.id = entry['id']
+        task.status = entry.get('status', UploadStatus.PENDING)
+        task.retries = entry.get('retries', 0)
+        task.bunny_video_id = entry.get('bunny_video_id')
+        task.bunny_url = entry.get('bunny_url')
+        task.error_message = entry.get('error_message')
+        task.upload_url = entry.get('upload_url')
+        task.bytes_uploaded = entry.get('bytes_uploaded', 0)
+        task.total_bytes = entry.get('total_bytes', 0)
+        task.file_mtime = entry.get('file_mtime')
+        task.stream_files = entry.get('stream_files')
+        task.journaled = True
+        for field in ('created_at', 'started_at', 'completed_at'):
+            if entry.get(field):
+                setattr(task, field, datetime.fromisoformat(entry[field]))
+        return task
 
 
 class BunnyStorageService:
@@ -157,6 +219,11 @@ class BunnyStorageService:
         # httpx Client pour uploads robustes et streaming
         self.client = self._create_client()
         
+        # Journal persistant: reprise des uploads après redémarrage
+        self.journal = UploadJournal(self.config.journal_dir)
+        self._last_journal_scan = 0.0
+        self._defer_length_supported = None  # Extension TUS creation-defer-length (upload progressif)
+        
         # Statistiques
         self.stats = {
             'uploads_started': 0,
@@ -165,7 +232,8 @@ class BunnyStorageService:
             'bytes_uploaded': 0
         }
         
-        # Démarrer le worker
+        # Reprendre les uploads interrompus puis démarrer les workers
+        self._resume_from_journal()
         self._start_workers()
         
         logger.info(f"✅ Service Bunny Storage initialisé (Library: {self.config.library_id})")
@@ -210,14 +278,38 @@ class BunnyStorageService:
                 self.upload_queue.task_done()
                 
             except Empty:
-                continue  # Timeout normal, continuer
+                # Timeout normal: reprendre les uploads abandonnés par un autre processus
+                if time.time() - self._last_journal_scan > self.config.journal_scan_interval:
+                    self._resume_from_journal()
+                continue
             except Exception as e:
                 logger.error(f"❌ Erreur worker {worker_name}: {e}")
                 time.sleep(1)
     
     def _process_upload(self, task: UploadTask, worker_name: str):
-        """Traite un upload individuel avec retry automatique"""
+        """Traite un upload individuel avec retry automatique et reprise à l'offset acquitté"""
         
+        with self.journal.lock(task.id) as owned:
+            if not owned:
+                # Un autre processus envoie déjà ce fichier: son journal fait foi
+                logger.info(f"⏭️ {worker_name}: upload {task.id} déjà pris en charge par un autre processus")
+                with self._lock:
+                    self.active_uploads.pop(task.id, None)
+                return
+            
+            # L'entrée a pu avancer (ou se terminer) dans un autre processus depuis la mise en queue
+            entry = self.journal.load(task.id)
+            if entry:
+                task = UploadTask.from_journal(entry)
+                if task.status in (UploadStatus.COMPLETED, UploadStatus.FAILED):
+                    with self._lock:
+                        self.active_uploads.pop(task.id, None)
+                        self.completed_uploads[task.id] = task
+                    return
+            
+            self._run_upload(task, worker_name)
+    
+    def _run_upload(self, task: UploadTask, worker_name: str):
         with self._lock:
             self.active_uploads[task.id] = task
             self.stats['uploads_started'] += 1
@@ -228,6 +320,7 @@ class BunnyStorageService:
             try:
                 if task.retries > 0:
                     task.update_status(UploadStatus.RETRYING)
+                    self._checkpoint(task)
                     # Backoff exponentiel avec jitter pour éviter thundering herd
                     base_delay = self.config.retry_delay * (2 ** (task.retries - 1))
                     jitter = random.uniform(0, base_delay * 0.3)  # +/- 30% jitter
@@ -236,10 +329,13 @@ class BunnyStorageService:
                     time.sleep(delay)
                 
                 task.update_status(UploadStatus.UPLOADING)
+                progress_mark = task.bytes_uploaded
                 success = self._upload_file_to_bunny(task, worker_name)
                 
                 if success:
+                    task.bytes_uploaded = task.total_bytes
                     task.update_status(UploadStatus.COMPLETED)
+                    self._checkpoint(task)
                     logger.info(f"✅ Upload réussi: {task.title} -> {task.bunny_url}")
                     
                     with self._lock:
@@ -253,15 +349,23 @@ class BunnyStorageService:
                     
                     
                 else:
+                    # Lien instable mais qui progresse: ne pas épuiser les tentatives
+                    if task.bytes_uploaded > progress_mark:
+                        logger.info(
+                            f"♻️ {task.title}: {task.bytes_uploaded - progress_mark} octets acquittés "
+                            f"avant l'erreur, reprise à l'offset {task.bytes_uploaded}"
+                        )
+                        task.retries = 0
                     task.increment_retry()
                     
             except Exception as e:
                 logger.error(f"❌ Erreur upload {task.title}: {e}")
-                task.update_status(UploadStatus.FAILED, str(e))
+                task.error_message = str(e)
                 task.increment_retry()
         
         if not success:
             task.update_status(UploadStatus.FAILED, f"Échec après {self.config.max_retries} tentatives")
+            self._checkpoint(task)
             logger.error(f"❌ Upload définitivement échoué: {task.title}")
             
             with self._lock:
@@ -273,8 +377,45 @@ class BunnyStorageService:
                 del self.active_uploads[task.id]
             self.completed_uploads[task.id] = task
     
+    def _checkpoint(self, task: UploadTask):
+        """Persister l'état de la tâche dans le journal"""
+        if not task.journaled:
+            return
+        try:
+            self.journal.save(task.to_journal())
+        except OSError as e:
+            logger.warning(f"⚠️ Journal d'upload non écrit pour {task.id}: {e}")
+    
+    def _resume_from_journal(self):
+        """Remettre en queue les uploads interrompus (redémarrage, crash d'un autre worker)"""
+        with self._lock:
+            self._last_journal_scan = time.time()
+            known = set(self.active_uploads) | set(self.completed_uploads)
+        
+        try:
+            self.journal.prune(self.config.journal_retention)
+            entries = self.journal.unfinished()
+        except OSError as e:
+            logger.warning(f"⚠️ Lecture du journal d'upload impossible: {e}")
+            return
+        
+        for entry in entries:
+            if entry['id'] in known or entry.get('stream_files') is not None:
+                continue  # Upload progressif: terminé par la finalisation de l'enregistrement
+            with self.journal.lock(entry['id']) as owned:
+                if not owned:
+                    continue  # En cours dans un autre processus
+            task = UploadTask.from_journal(entry)
+            logger.info(
+                f"♻️ Reprise upload {task.id} ({task.title}) à "
+                f"{task.bytes_uploaded / (1024*1024):.1f}/{task.total_bytes / (1024*1024):.1f} MB"
+            )
+            with self._lock:
+                self.active_uploads[task.id] = task
+            self.upload_queue.put(task)
+    
     def _upload_file_to_bunny(self, task: UploadTask, worker_name: str) -> bool:
-        """Upload effectif vers Bunny CDN avec vérification du statut via API"""
+        """Upload effectif vers Bunny CDN (TUS reprenable par défaut)"""
         
         try:
             # Vérifier que le fichier existe
@@ -283,83 +424,35 @@ class BunnyStorageService:
                 return False
             
             task.total_bytes = task.get_file_size()
+            file_mtime = Path(task.local_path).stat().st_mtime
+            if task.file_mtime is not None and task.file_mtime != file_mtime:
+                # Fichier réécrit depuis le dernier point de reprise: tout renvoyer
+                logger.warning(f"⚠️ {task.local_path} modifié depuis l'upload interrompu, reprise à zéro")
+                task.upload_url = None
+                task.bytes_uploaded = 0
+            task.file_mtime = file_mtime
             
             # 1. Créer la vidéo sur Bunny Stream SEULEMENT si pas déjà créée (éviter duplicatas lors des retries)
-            if not task.bunny_video_id:
-                logger.info(f"📝 {worker_name}: Création vidéo Bunny: {task.title}")
-                
-                create_response = self.client.post(
-                    f"{self.config.api_base_url}/videos",
-                    headers=self.config.headers,
-                    json={"title": task.title}
-                )
-                
-                if create_response.status_code not in [200, 201]:
-                    error_detail = create_response.text
-                    logger.error(f"❌ Erreur création vidéo Bunny: {create_response.status_code} - {error_detail}")
-                    task.error_message = f"Erreur création: {create_response.status_code} - {error_detail}"
-                    return False
-                
-                video_data = create_response.json()
-                task.bunny_video_id = video_data.get("guid")
-                
-                if not task.bunny_video_id:
-                    logger.error(f"❌ Pas d'ID vidéo retourné par Bunny")
-                    task.error_message = "Pas d'ID vidéo retourné"
-                    return False
-                
-                logger.info(f"✅ {worker_name}: Vidéo Bunny créée avec ID: {task.bunny_video_id}")
-            else:
-                logger.info(f"♻️ {worker_name}: Réutilisation vidéo Bunny existante: {task.bunny_video_id}")
+            if not self._ensure_bunny_video(task, worker_name):
+                return False
             
-            # 2. Upload du fichier avec timeout raisonnable et retry
+            # 2. Upload du fichier (créneau borné par destination, débit limité)
             logger.info(f"📤 {worker_name}: Début upload fichier {task.local_path} ({task.total_bytes / (1024*1024):.2f} MB)")
-            logger.info(f"⏰ Upload timeout: {self.config.upload_timeout}s ({self.config.upload_timeout/60:.1f} minutes)")
-            
-            upload_headers = {
-                "AccessKey": self.config.api_key,
-                "Content-Type": "application/octet-stream"
-            }
-            
-            upload_url = f"{self.config.api_base_url}/videos/{task.bunny_video_id}"
             
             try:
-                # Avec httpx: streaming upload plus fiable
-                # Au lieu de charger tout en mémoire, on stream directement le fichier
-                logger.info(f"📖 Upload streaming avec httpx: {task.local_path}")
-                
-                # httpx supporte streaming de fichiers nativement
-                with open(task.local_path, 'rb') as file:
-                    upload_response = self.client.put(
-                        upload_url,
-                        headers=upload_headers,
-                        content=file,  # httpx streame automatiquement
-                    )
-                
-                logger.info(f"✅ Upload terminé: {upload_response.status_code}")
-                
-                # Vérifier le statut de la réponse
-                if upload_response.status_code in [200, 201, 204]:
-                    logger.info(f"✅ Upload fichier terminé - vérification du statut Bunny...")
-                elif upload_response.status_code == 400:
-                    # Vérifier si c'est une erreur "already uploaded"
-                    error_detail = upload_response.text
-                    if "already been uploaded" in error_detail.lower():
-                        logger.info(f"✅ Vidéo déjà uploadée sur Bunny (probablement upload précédent réussi)")
-                        # Considérer comme succès et continuer avec la vérification du statut
+                with destination_slot("video.bunnycdn.com"):
+                    if self.config.upload_protocol == 'tus':
+                        uploaded = self._tus_upload(task, worker_name)
                     else:
-                        logger.error(f"❌ Erreur upload contenu Bunny: {upload_response.status_code} - {error_detail}")
-                        task.error_message = f"Erreur upload: {upload_response.status_code} - {error_detail}"
-                        return False
-                else:
-                    error_detail = upload_response.text
-                    logger.error(f"❌ Erreur upload contenu Bunny: {upload_response.status_code} - {error_detail}")
-                    task.error_message = f"Erreur upload: {upload_response.status_code} - {error_detail}"
-                    return False
-                
+                        uploaded = self._put_upload(task, worker_name)
             except httpx.HTTPError as e:
                 logger.error(f"❌ Erreur réseau lors de l'upload: {e}")
                 task.error_message = f"Erreur réseau: {str(e)}"
+                self._checkpoint(task)
+                return False
+            
+            if not uploaded:
+                self._checkpoint(task)
                 return False
             
             # 3. Générer l'URL finale et marquer comme uploadé
@@ -375,6 +468,364 @@ class BunnyStorageService:
             task.error_message = f"Erreur inattendue: {str(e)}"
             return False
     
+    def _ensure_bunny_video(self, task: UploadTask, worker_name: str) -> bool:
+        """Créer la vidéo Bunny de la tâche si elle n'existe pas encore (point de reprise ensuite)"""
+        if task.bunny_video_id:
+            logger.info(f"♻️ {worker_name}: Réutilisation vidéo Bunny existante: {task.bunny_video_id}")
+            return True
+        
+        logger.info(f"📝 {worker_name}: Création vidéo Bunny: {task.title}")
+        create_response = self.client.post(
+            f"{self.config.api_base_url}/videos",
+            headers=self.config.headers,
+            json={"title": task.title}
+        )
+        
+        if create_response.status_code not in [200, 201]:
+            error_detail = create_response.text
+            logger.error(f"❌ Erreur création vidéo Bunny: {create_response.status_code} - {error_detail}")
+            task.error_message = f"Erreur création: {create_response.status_code} - {error_detail}"
+            return False
+        
+        task.bunny_video_id = create_response.json().get("guid")
+        if not task.bunny_video_id:
+            logger.error(f"❌ Pas d'ID vidéo retourné par Bunny")
+            task.error_message = "Pas d'ID vidéo retourné"
+            return False
+        
+        logger.info(f"✅ {worker_name}: Vidéo Bunny créée avec ID: {task.bunny_video_id}")
+        self._checkpoint(task)
+        return True
+    
+    def _tus_headers(self, task: UploadTask) -> Dict[str, str]:
+        """En-têtes d'authentification TUS Bunny (signature SHA256 à durée limitée)"""
+        expire = int(time.time()) + 24 * 3600
+        signature = hashlib.sha256(
+            f"{self.config.library_id}{self.config.api_key}{expire}{task.bunny_video_id}".encode()
+        ).hexdigest()
+        return {
+            "Tus-Resumable": "1.0.0",
+            "AuthorizationSignature": signature,
+            "AuthorizationExpire": str(expire),
+            "VideoId": task.bunny_video_id,
+            "LibraryId": str(self.config.library_id)
+        }
+    
+    def _tus_head(self, task: UploadTask) -> Optional[httpx.Headers]:
+        """En-têtes HEAD d'un upload existant (None si inconnu/expiré)"""
+        response = self.client.head(task.upload_url, headers=self._tus_headers(task))
+        if response.status_code in (200, 204) and 'Upload-Offset' in response.headers:
+            return response.headers
+        logger.warning(f"⚠️ Upload TUS {task.upload_url} inconnu du serveur ({response.status_code})")
+        return None
+    
+    def _tus_offset(self, task: UploadTask) -> Optional[int]:
+        """Offset acquitté par le serveur pour un upload existant (None si inconnu/expiré)"""
+        headers = self._tus_head(task)
+        return int(headers['Upload-Offset']) if headers is not None else None
+    
+    def _tus_create(self, task: UploadTask, worker_name: str, length_headers: Dict[str, str]) -> bool:
+        """Créer l'upload TUS de la tâche (Upload-Length, ou Upload-Defer-Length pour un flux)"""
+        metadata = ",".join(
+            f"{key} {base64.b64encode(value.encode()).decode()}"
+            for key, value in (("filetype", "video/mp4"), ("title", task.title))
+        )
+        create_response = self.client.post(
+            self.config.tus_endpoint,
+            headers={
+                **self._tus_headers(task),
+                **length_headers,
+                "Upload-Metadata": metadata
+            }
+        )
+        if create_response.status_code != 201 or 'Location' not in create_response.headers:
+            task.error_message = f"Création upload TUS: {create_response.status_code} - {create_response.text}"
+            logger.error(f"❌ {task.error_message}")
+            return False
+        task.upload_url = urljoin(self.config.tus_endpoint, create_response.headers['Location'])
+        logger.info(f"🆕 {worker_name}: Upload TUS créé: {task.upload_url}")
+        return True
+    
+    def _tus_upload(self, task: UploadTask, worker_name: str) -> bool:
+        """Upload TUS par morceaux, point de reprise dans le journal après chaque morceau acquitté"""
+        offset = None
+        if task.upload_url:
+            offset = self._tus_offset(task)
+            if offset is None:
+                task.upload_url = None
+        
+        if not task.upload_url:
+            if not self._tus_create(task, worker_name, {"Upload-Length": str(task.total_bytes)}):
+                return False
+            offset = 0
+        elif offset:
+            logger.info(f"♻️ {worker_name}: Reprise TUS à {offset / (1024*1024):.1f} MB")
+        
+        task.bytes_uploaded = offset
+        self._checkpoint(task)
+        next_log = 0
+        
+        with open(task.local_path, 'rb') as file:
+            while offset < task.total_bytes:
+                length = min(self.config.chunk_size, task.total_bytes - offset)
+                file.seek(offset)
+                response = self.client.patch(
+                    task.upload_url,
+                    headers={
+                        **self._tus_headers(task),
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                        "Content-Length": str(length)
+                    },
+                    content=ThrottledFile(file, limit=length)
+                )
+                
+                if response.status_code == 409:
+                    # Offset désynchronisé (morceau partiellement reçu): se recaler sur le serveur
+                    server_offset = self._tus_offset(task)
+                    if server_offset is None:
+                        task.upload_url = None
+                        task.error_message = "Upload TUS perdu côté serveur"
+                        return False
+                    offset = server_offset
+                    continue
+                if response.status_code not in (200, 204):
+                    task.error_message = f"Erreur upload: {response.status_code} - {response.text}"
+                    logger.error(f"❌ Erreur upload morceau TUS: {task.error_message}")
+                    return False
+                
+                offset = int(response.headers.get('Upload-Offset', offset + length))
+                task.bytes_uploaded = offset
+                self._checkpoint(task)
+                
+                progress = offset * 100 / task.total_bytes if task.total_bytes else 100
+                if progress >= next_log:
+                    logger.info(f"📊 {worker_name}: {task.title} {progress:.0f}% ({offset / (1024*1024):.1f} MB acquittés)")
+                    next_log = progress + 10
+        
+        return True
+    
+    def _put_upload(self, task: UploadTask, worker_name: str) -> bool:
+        """Upload du fichier entier en un PUT (BUNNY_UPLOAD_PROTOCOL=put, sans reprise)"""
+        logger.info(f"⏰ Upload timeout: {self.config.upload_timeout}s ({self.config.upload_timeout/60:.1f} minutes)")
+        
+        upload_headers = {
+            "AccessKey": self.config.api_key,
+            "Content-Type": "application/octet-stream",
+            "Content-Length": str(task.total_bytes)
+        }
+        
+        upload_url = f"{self.config.api_base_url}/videos/{task.bunny_video_id}"
+        task.bytes_uploaded = 0
+        
+        with open(task.local_path, 'rb') as file:
+            upload_response = self.client.put(
+                upload_url,
+                headers=upload_headers,
+                content=ThrottledFile(file),
+            )
+        
+        logger.info(f"✅ Upload terminé: {upload_response.status_code}")
+        
+        # Vérifier le statut de la réponse
+        if upload_response.status_code in [200, 201, 204]:
+            return True
+        error_detail = upload_response.text
+        if upload_response.status_code == 400 and "already been uploaded" in error_detail.lower():
+            logger.info(f"✅ Vidéo déjà uploadée sur Bunny (probablement upload précédent réussi)")
+            return True
+        logger.error(f"❌ Erreur upload contenu Bunny: {upload_response.status_code} - {error_detail}")
+        task.error_message = f"Erreur upload: {upload_response.status_code} - {error_detail}"
+        return False
+    
+    # ------------------------------------------------------------------
+    # Upload progressif: fichiers envoyés bout à bout pendant l'enregistrement
+    # (TUS à longueur différée, longueur déclarée au dernier envoi)
+    
+    def supports_stream_upload(self) -> bool:
+        """Le serveur TUS accepte-t-il une longueur différée (extension creation-defer-length)"""
+        if self.config.upload_protocol != 'tus':
+            return False
+        if self._defer_length_supported is None:
+            try:
+                response = self.client.options(self.config.tus_endpoint, headers={"Tus-Resumable": "1.0.0"})
+            except httpx.HTTPError as e:
+                logger.warning(f"⚠️ Extensions TUS inconnues, upload progressif désactivé: {e}")
+                return False
+            extensions = [e.strip() for e in response.headers.get('Tus-Extension', '').split(',')]
+            self._defer_length_supported = 'creation-defer-length' in extensions
+            if not self._defer_length_supported:
+                logger.warning("⚠️ Serveur TUS sans creation-defer-length: upload progressif désactivé")
+        return self._defer_length_supported
+    
+    def open_stream_upload(self, upload_id: str, local_dir: str, title: str, metadata: Dict = None) -> Optional[str]:
+        """
+        Préparer un upload progressif (journalisé; vidéo et upload TUS créés au premier envoi)
+        
+        Returns:
+            upload_id, ou None si le serveur ne gère pas la longueur différée
+        """
+        if self.journal.load(upload_id):
+            return upload_id
+        if not self.supports_stream_upload():
+            return None
+        task = UploadTask(local_dir, title, metadata)
+        task.id = upload_id
+        task.stream_files = []
+        task.journaled = True
+        self._checkpoint(task)
+        return upload_id
+    
+    def append_stream_upload(self, upload_id: str, files: List[str], final: bool = False) -> bool:
+        """
+        Envoyer la suite d'un upload progressif: les octets de files, bout à bout, au-delà
+        de l'offset acquitté
+        
+        files est à chaque appel la liste complète (fichiers déjà envoyés compris), qui ne
+        doivent pas avoir changé. final: déclarer la longueur totale, ce qui termine
+        l'upload (Bunny lance l'encodage).
+        
+        Returns:
+            True si tout a été acquitté (et l'upload terminé si final)
+        """
+        with self.journal.lock(upload_id) as owned:
+            if not owned:
+                logger.info(f"⏭️ Upload progressif {upload_id} en cours dans un autre processus")
+                return False
+            entry = self.journal.load(upload_id)
+            if not entry:
+                return False
+            task = UploadTask.from_journal(entry)
+            if task.status in (UploadStatus.COMPLETED, UploadStatus.FAILED):
+                return task.status == UploadStatus.COMPLETED
+            
+            try:
+                with destination_slot("video.bunnycdn.com"):
+                    sent = self._stream_upload(task, files, final)
+            except (httpx.HTTPError, OSError) as e:
+                task.error_message = f"Erreur réseau: {str(e)}"
+                sent = False
+            if not sent:
+                logger.warning(f"⚠️ Upload progressif {upload_id}: {task.error_message}")
+            self._checkpoint(task)
+            return sent
+    
+    def _stream_upload(self, task: UploadTask, files: List[str], final: bool) -> bool:
+        sizes = [[Path(f).name, Path(f).stat().st_size] for f in files]
+        announced = task.stream_files or []
+        if sizes[:len(announced)] != announced:
+            # Octets déjà envoyés réécrits: le flux ne peut plus être complété
+            task.update_status(UploadStatus.FAILED, "Fichiers déjà envoyés modifiés")
+            return False
+        task.stream_files = sizes
+        task.total_bytes = sum(size for _, size in sizes)
+        task.update_status(UploadStatus.UPLOADING)
+        
+        if not self._ensure_bunny_video(task, task.id):
+            return False
+        
+        offset = 0
+        length_declared = False
+        if task.upload_url:
+            head = self._tus_head(task)
+            if head is None:
+                task.upload_url = None
+            else:
+                offset = int(head['Upload-Offset'])
+                length_declared = 'Upload-Length' in head
+        if not task.upload_url:
+            if not self._tus_create(task, task.id, {"Upload-Defer-Length": "1"}):
+                return False
+            offset = 0
+        task.bytes_uploaded = offset
+        self._checkpoint(task)
+        
+        file_start = 0
+        for path, (_, size) in zip(files, sizes):
+            file_end = file_start + size
+            if offset < file_end:
+                with open(path, 'rb') as fh:
+                    while offset < file_end:
+                        length = min(self.config.chunk_size, file_end - offset)
+                        fh.seek(offset - file_start)
+                        response = self.client.patch(
+                            task.upload_url,
+                            headers={
+                                **self._tus_headers(task),
+                                "Upload-Offset": str(offset),
+                                "Content-Type": "application/offset+octet-stream",
+                                "Content-Length": str(length)
+                            },
+                            content=ThrottledFile(fh, limit=length)
+                        )
+                        if response.status_code not in (200, 204):
+                            # 409 compris: l'appel suivant se recale sur l'offset du serveur (HEAD)
+                            task.error_message = f"Erreur upload: {response.status_code} - {response.text}"
+                            return False
+                        offset = int(response.headers.get('Upload-Offset', offset + length))
+                        task.bytes_uploaded = offset
+                        self._checkpoint(task)
+            file_start = file_end
+        
+        if not final:
+            return True
+        
+        if not length_declared:
+            response = self.client.patch(
+                task.upload_url,
+                headers={
+                    **self._tus_headers(task),
+                    "Upload-Offset": str(offset),
+                    "Upload-Length": str(task.total_bytes),
+                    "Content-Type": "application/offset+octet-stream",
+                    "Content-Length": "0"
+                },
+                content=b''
+            )
+            if response.status_code not in (200, 204):
+                task.error_message = f"Déclaration de la longueur: {response.status_code} - {response.text}"
+                return False
+        
+        task.bunny_url = f"https://{self.config.cdn_hostname}/{task.bunny_video_id}/playlist.m3u8"
+        task.update_status(UploadStatus.COMPLETED)
+        with self._lock:
+            self.stats['uploads_completed'] += 1
+            self.stats['bytes_uploaded'] += task.total_bytes
+        logger.info(f"✅ Upload progressif terminé: {task.id} -> {task.bunny_url}")
+        return True
+    
+    def abort_stream_upload(self, upload_id: str, reason: str):
+        """Abandonner un upload progressif: la vidéo Bunny partielle est supprimée"""
+        entry = self.journal.load(upload_id)
+        if not entry:
+            return
+        task = UploadTask.from_journal(entry)
+        if task.bunny_video_id:
+            try:
+                self.client.delete(f"{self.config.api_base_url}/videos/{task.bunny_video_id}",
+                                   headers=self.config.headers)
+            except httpx.HTTPError as e:
+                logger.warning(f"⚠️ Vidéo Bunny {task.bunny_video_id} non supprimée: {e}")
+            task.bunny_video_id = None
+        task.update_status(UploadStatus.FAILED, reason)
+        self._checkpoint(task)
+        with self._lock:
+            self.stats['uploads_failed'] += 1
+        logger.warning(f"⚠️ Upload progressif {upload_id} abandonné: {reason}")
+    
+    def set_video_title(self, bunny_video_id: str, title: str) -> bool:
+        """Renommer une vidéo Bunny (upload progressif créé avant que le titre soit connu)"""
+        try:
+            response = self.client.post(
+                f"{self.config.api_base_url}/videos/{bunny_video_id}",
+                headers=self.config.headers,
+                json={"title": title}
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ Titre Bunny non mis à jour pour {bunny_video_id}: {e}")
+            return False
+        return response.status_code in (200, 204)
+    
     def _wait_for_bunny_processing(self, task: UploadTask, worker_name: str, max_wait: int = 1800) -> bool:
         """
         Attend que Bunny CDN termine l'encodage de la vidéo.
@@ -445,22 +896,6 @@ class BunnyStorageService:
         task.error_message = f"Timeout processing Bunny (> {max_wait}s)"
         return False
     
-    def _file_iterator(self, file, task: UploadTask):
-        """Itérateur de fichier avec suivi de progression"""
-        while True:
-            chunk = file.read(self.config.chunk_size)
-            if not chunk:
-                break
-            
-            task.bytes_uploaded += len(chunk)
-            
-            # Log de progression (tous les 10MB)
-            if task.bytes_uploaded % (10 * 1024 * 1024) == 0:
-                progress = (task.bytes_uploaded / task.total_bytes) * 100
-                logger.debug(f"📊 Upload {task.title}: {progress:.1f}%")
-            
-            yield chunk
-    
     def _update_database(self, task: UploadTask):
         """Met à jour la base de données avec l'URL Bunny - Version corrigée"""
         if 'video_id' not in task.metadata:
@@ -582,7 +1017,19 @@ class BunnyStorageService:
         if not Path(local_path).exists():
             raise FileNotFoundError(f"Fichier introuvable: {local_path}")
         
+        # Upload déjà en cours pour ce fichier (ex: finalisation relancée): ne pas le renvoyer
+        existing = self.journal.find_unfinished(local_path)
+        if existing:
+            logger.info(f"♻️ Upload déjà journalisé pour {local_path}: {existing['id']}")
+            return existing['id']
+        
         task = UploadTask(local_path, title, metadata)
+        task.total_bytes = task.get_file_size()
+        task.journaled = True
+        self._checkpoint(task)
+        # Visible par get_upload_status() dès la mise en queue (statut 'pending')
+        with self._lock:
+            self.active_uploads[task.id] = task
         self.upload_queue.put(task)
         
         logger.info(f"📋 Tâche ajoutée à la queue: {task.title} (ID: {task.id})")
@@ -605,13 +1052,16 @@ class BunnyStorageService:
     def get_upload_status(self, upload_id: str) -> Optional[Dict[str, Any]]:
         """Retourne le statut d'un upload"""
         
-        # Chercher dans les uploads actifs
+        # Chercher dans les uploads actifs, puis dans le journal (autre processus, redémarrage)
         if upload_id in self.active_uploads:
             task = self.active_uploads[upload_id]
         elif upload_id in self.completed_uploads:
             task = self.completed_uploads[upload_id]
         else:
-            return None
+            entry = self.journal.load(upload_id)
+            if not entry:
+                return None
+            task = UploadTask.from_journal(entry)
         
         progress = 0
         if task.total_bytes > 0:
@@ -626,6 +1076,9 @@ class BunnyStorageService:
             'bunny_video_id': task.bunny_video_id,
             'bunny_url': task.bunny_url,
             'error_message': task.error_message,
+            'bytes_uploaded': task.bytes_uploaded,
+            'total_bytes': task.total_bytes,
+            'finished': task.status in (UploadStatus.COMPLETED, UploadStatus.FAILED),
             'created_at': task.created_at.isoformat(),
             'started_at': task.started_at.isoformat() if task.started_at else None,
             'completed_at': task.completed_at.isoformat() if task.completed_at else None
@@ -8,6 +8,8 @@ import requests
 import logging
 from typing import Optional
 
+from .upload_throttle import destination_slot, ThrottledFile
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,20 +40,33 @@ class BunnyStorageUploader:
         Returns:
             str: URL publique CDN du fichier uploadé
             
+        Raises:
+            Exception: Si l'upload échoue
+        """
+        return self.upload_file(file_path, f"clips/{filename}")
+    
+    def upload_file(self, file_path: str, remote_path: str) -> str:
+        """
+        Upload un fichier local vers un chemin de la Storage Zone
+        
+        Le fichier est envoyé en streaming (pas chargé entièrement en mémoire),
+        avec les uploads Stream dans la limite de débit et de concurrence partagée.
+        
+        Args:
+            file_path: Chemin local du fichier
+            remote_path: Chemin de destination (ex: clips/x.mp4)
+            
+        Returns:
+            str: URL publique CDN du fichier uploadé
+            
         Raises:
             Exception: Si l'upload échoue
         """
         try:
-            # Créer le chemin de destination (dossier clips/)
-            remote_path = f"clips/{filename}"
             upload_url = f"{self.base_url}/{remote_path}"
             
             logger.info(f"📤 Uploading to Bunny Storage: {remote_path}")
             
-            # Lire le fichier
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
             # Headers pour l'authentification
             headers = {
                 'AccessKey': self.access_key,
@@ -60,12 +75,13 @@ class BunnyStorageUploader:
             
             # Upload via PUT request avec timeout augmenté à 2h (comme vidéos)
             timeout = int(os.environ.get('BUNNY_UPLOAD_TIMEOUT', '7200'))
-            response = requests.put(
-                upload_url,
-                headers=headers,
-                data=file_data,
-                timeout=timeout
-            )
+            with destination_slot(self.hostname), open(file_path, 'rb') as f:
+                response = requests.put(
+                    upload_url,
+                    headers=headers,
+                    data=ThrottledFile(f),
+                    timeout=timeout
+                )
             
             response.raise_for_status()
             
@@ -0,0 +1,316 @@
+"""
+Extraction de clips sans téléchargement complet de la vidéo source
+- FFmpeg lit la source distante par requêtes HTTP Range (index MP4) ou par segments (HLS)
+  et ne récupère que les GOP couvrant le clip, copiés tels quels dans une fenêtre locale
+- "Smart cut": seul le GOP partiel de tête (du début demandé à la keyframe suivante) est
+  ré-encodé avec les paramètres de la source (profil, niveau, format de pixel), le reste
+  de la vidéo est copié sans ré-encodage. Les deux parties sont jointes en MPEG-TS (Annex B:
+  chaque keyframe porte ses SPS/PPS) et le clip est vérifié par décodage, avec repli sur
+  un ré-encodage complet de la fenêtre
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFPROBE_PATH = os.getenv('FFPROBE_PATH', 'ffprobe')
+
+# Encodeurs utilisés pour le GOP de tête, selon le codec source
+HEAD_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+# Conversion en Annex B du corps copié: paramètres (SPS/PPS) répétés dans le flux
+ANNEXB_FILTERS = {'h264': 'h264_mp4toannexb', 'hevc': 'hevc_mp4toannexb'}
+
+
+class ClipExtractionError(Exception):
+    """Extraction impossible depuis une source"""
+
+
+@dataclass
+class ClipSource:
+    """Source distante d'un clip (MP4 accessible par Range ou playlist HLS)"""
+    url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    label: str = ''
+
+    @property
+    def is_hls(self) -> bool:
+        return '.m3u8' in self.url
+
+
+@dataclass
+class ClipResult:
+    path: str
+    width: int
+    height: int
+    source: str
+    smart_cut: bool
+
+
+class ClipExtractor:
+    """Découpe d'un intervalle d'une vidéo distante en ne lisant que les octets utiles"""
+
+    def __init__(self, temp_dir: str = None):
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self.timeout = int(os.getenv('CLIP_EXTRACT_TIMEOUT', '300'))
+        # Écart maximal (s) entre le début demandé et une keyframe pour se passer de ré-encodage
+        self.keyframe_tolerance = 0.02
+
+    def extract(self, sources: List[ClipSource], start_time: float, end_time: float) -> ClipResult:
+        """
+        Extraire [start_time, end_time) depuis la première source utilisable
+
+        Raises:
+            ClipExtractionError: aucune source n'a permis l'extraction
+        """
+        errors = []
+        for source in sources:
+            try:
+                return self._extract_from(source, start_time, end_time)
+            except (ClipExtractionError, subprocess.TimeoutExpired, OSError) as e:
+                logger.warning(f"⚠️ Extraction par plage impossible depuis {source.label or source.url}: {e}")
+                errors.append(f"{source.label or source.url}: {e}")
+        raise ClipExtractionError("; ".join(errors) or "Aucune source")
+
+    def _extract_from(self, source: ClipSource, start_time: float, end_time: float) -> ClipResult:
+        if not source.is_hls and not self._supports_range(source):
+            raise ClipExtractionError("la source n'accepte pas les requêtes Range")
+
+        work_dir = tempfile.mkdtemp(prefix='clip_', dir=self.temp_dir)
+        try:
+            window = os.path.join(work_dir, 'window.mkv')
+            self._fetch_window(source, start_time, end_time, window)
+            info = self._probe_window(window)
+            output = os.path.join(work_dir, 'clip.mp4')
+
+            smart_cut = self._smart_cut(window, info, start_time, end_time, work_dir, output)
+
+            final_path = os.path.join(
+                self.temp_dir,
+                f"clip_{datetime.now().timestamp()}_{int(start_time)}_{int(end_time)}.mp4"
+            )
+            shutil.move(output, final_path)
+            logger.info(
+                f"✂️ Clip extrait depuis {source.label or 'source'} "
+                f"({os.path.getsize(window) / 1024 / 1024:.1f} MB lus, "
+                f"{'smart cut' if smart_cut else 'ré-encodage'})"
+            )
+            return ClipResult(final_path, info['width'], info['height'], source.label, smart_cut)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Lecture distante
+
+    def _supports_range(self, source: ClipSource) -> bool:
+        """Vérifier que le serveur répond en 206 (sinon FFmpeg lirait tout le fichier)"""
+        if not source.url.startswith(('http://', 'https://')):
+            return True
+        try:
+            response = requests.get(source.url, headers={**source.headers, 'Range': 'bytes=0-0'},
+                                    stream=True, timeout=10)
+            response.close()
+            return response.status_code == 206
+        except requests.RequestException as e:
+            logger.debug(f"Test Range échoué pour {source.url}: {e}")
+            return False
+
+    def _input_options(self, source: ClipSource) -> List[str]:
+        options = []
+        if source.url.startswith(('http://', 'https://')):
+            options += ['-rw_timeout', '15000000']
+            if source.headers:
+                options += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in source.headers.items())]
+        return options
+
+    def _fetch_window(self, source: ClipSource, start_time: float, end_time: float, window: str):
+        """
+        Copier localement les GOP couvrant le clip
+
+        -ss avant -i: FFmpeg se positionne via l'index (moov MP4 ou playlist HLS) sur la
+        keyframe précédant start_time et ne lit que les octets suivants; -copyts
+        -start_at_zero conserve la chronologie de la source pour la suite.
+        """
+        cmd = [
+            FFMPEG_PATH, '-y', '-v', 'error',
+            *self._input_options(source),
+            '-ss', f"{start_time:.3f}",
+            '-t', f"{end_time - start_time + 1:.3f}",
+            '-i', source.url,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-c', 'copy',
+            '-copyts', '-start_at_zero',
+            window
+        ]
+        self._run(cmd, "lecture de la fenêtre")
+
+    # ------------------------------------------------------------------
+    # Découpe locale
+
+    def _probe_window(self, window: str) -> dict:
+        """Codec vidéo, start_time et keyframes (chronologie source) de la fenêtre"""
+        cmd = [
+            FFPROBE_PATH, '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'format=start_time:stream=codec_name,profile,level,pix_fmt,width,height:packet=pts_time,flags',
+            '-of', 'json',
+            window
+        ]
+        result = self._run(cmd, "analyse de la fenêtre")
+        try:
+            data = json.loads(result.stdout)
+            stream = data['streams'][0]
+        except (ValueError, KeyError, IndexError):
+            raise ClipExtractionError("aucune piste vidéo dans la fenêtre")
+
+        keyframes = sorted(
+            float(packet['pts_time']) for packet in data.get('packets', [])
+            if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A')
+        )
+        if not keyframes:
+            raise ClipExtractionError("aucune keyframe dans la fenêtre")
+
+        return {
+            'start': float(data.get('format', {}).get('start_time') or 0),
+            'codec': stream.get('codec_name'),
+            'profile': stream.get('profile'),
+            'level': stream.get('level'),
+            'pix_fmt': stream.get('pix_fmt'),
+            'width': int(stream.get('width') or 0),
+            'height': int(stream.get('height') or 0),
+            'keyframes': keyframes
+        }
+
+    def _smart_cut(self, window: str, info: dict, start_time: float, end_time: float,
+                   work_dir: str, output: str) -> bool:
+        """
+        Assembler le clip: tête ré-encodée + reste copié, audio ré-encodé (négligeable)
+
+        Returns:
+            True si le smart cut a été appliqué, False si le clip a été entièrement ré-encodé
+        """
+        # -ss sur la fenêtre est relatif à son propre start_time
+        offset = info['start']
+        next_keyframe = next(
+            (k for k in info['keyframes'] if k >= start_time - self.keyframe_tolerance), None
+        )
+
+        encoder = HEAD_ENCODERS.get(info['codec'])
+        if encoder is None or next_keyframe is None or next_keyframe >= end_time:
+            # Codec non géré ou clip contenu dans un seul GOP: la fenêtre est petite, on la ré-encode
+            self._reencode(window, start_time - offset, end_time - start_time, output)
+            return False
+
+        parts = []
+        if next_keyframe - start_time > self.keyframe_tolerance:
+            head = os.path.join(work_dir, 'head.ts')
+            self._run([
+                FFMPEG_PATH, '-y', '-v', 'error',
+                '-ss', f"{start_time - offset:.3f}", '-i', window,
+                '-t', f"{next_keyframe - start_time:.3f}",
+                '-map', '0:v:0',
+                *self._head_encoder_options(encoder, info),
+                '-f', 'mpegts', head
+            ], "ré-encodage du GOP de tête")
+            parts.append(head)
+
+        body = os.path.join(work_dir, 'body.ts')
+        self._run([
+            FFMPEG_PATH, '-y', '-v', 'error',
+            # Léger dépassement: le seek retombe sur cette keyframe malgré les arrondis
+            '-ss', f"{next_keyframe - offset + 0.0005:.6f}", '-i', window,
+            '-t', f"{end_time - next_keyframe:.3f}",
+            '-map', '0:v:0', '-c', 'copy',
+            '-bsf:v', ANNEXB_FILTERS[info['codec']],
+            '-f', 'mpegts', body
+        ], "copie du corps du clip")
+        parts.append(body)
+
+        concat_list = os.path.join(work_dir, 'parts.txt')
+        with open(concat_list, 'w') as f:
+            f.writelines(f"file '{part}'\n" for part in parts)
+
+        cmd = [
+            FFMPEG_PATH, '-y', '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', concat_list,
+            '-ss', f"{start_time - offset:.3f}", '-t', f"{end_time - start_time:.3f}", '-i', window,
+            '-map', '0:v:0', '-map', '1:a:0?',
+            '-c:v', 'copy',
+            '-c:a', 'aac', '-b:a', '128k',
+        ]
+        if info['codec'] == 'hevc':
+            cmd += ['-tag:v', 'hvc1']
+        cmd += ['-movflags', '+faststart', output]
+        self._run(cmd, "assemblage du clip")
+
+        if not self._decodes_cleanly(output):
+            logger.warning("⚠️ Smart cut non décodable proprement, ré-encodage complet de la fenêtre")
+            self._reencode(window, start_time - offset, end_time - start_time, output)
+            return False
+        return True
+
+    def _head_encoder_options(self, encoder: str, info: dict) -> List[str]:
+        """Paramètres du GOP de tête alignés sur la source (profil, niveau, format de pixel)"""
+        options = ['-c:v', encoder, '-preset', 'veryfast', '-crf', '18', '-vsync', 'passthrough']
+        if info.get('pix_fmt'):
+            options += ['-pix_fmt', info['pix_fmt']]
+        profile = (info.get('profile') or '').lower()
+        level = info.get('level')
+        level = level if isinstance(level, int) and level > 0 else None
+        if encoder == 'libx264':
+            if profile in ('baseline', 'constrained baseline', 'main', 'high', 'high 10'):
+                options += ['-profile:v', {'constrained baseline': 'baseline', 'high 10': 'high10'}.get(profile, profile)]
+            if level:
+                # ffprobe: level_idc H.264 (41 = 4.1)
+                options += ['-level:v', f"{level / 10:.1f}"]
+        elif encoder == 'libx265':
+            if profile in ('main', 'main 10'):
+                options += ['-profile:v', profile.replace(' ', '')]
+            if level:
+                # ffprobe: general_level_idc HEVC (123 = 4.1)
+                options += ['-x265-params', f"level-idc={level / 30:.1f}"]
+        return options
+
+    def _decodes_cleanly(self, path: str) -> bool:
+        """Décoder la piste vidéo du clip (quelques secondes): aucune erreur du décodeur"""
+        try:
+            result = subprocess.run(
+                [FFMPEG_PATH, '-v', 'error', '-xerror', '-i', path, '-map', '0:v:0', '-f', 'null', '-'],
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        except (subprocess.TimeoutExpired, OSError) as e:
+            logger.debug(f"Vérification du clip impossible: {e}")
+            return False
+        return result.returncode == 0 and not result.stderr.strip()
+
+    def _reencode(self, window: str, start: float, duration: float, output: str):
+        self._run([
+            FFMPEG_PATH, '-y', '-v', 'error',
+            '-ss', f"{start:.3f}", '-i', window,
+            '-t', f"{duration:.3f}",
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+            '-c:a', 'aac', '-b:a', '128k',
+            '-movflags', '+faststart',
+            output
+        ], "ré-encodage du clip")
+
+    def _run(self, cmd: List[str], step: str) -> subprocess.CompletedProcess:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise ClipExtractionError(f"{step}: {result.stderr.strip()[-500:]}")
+        return result
+
+
+# Instance globale
+clip_extractor = ClipExtractor()
@@ -0,0 +1,319 @@
+"""
+Mouvements de crédits (joueurs et clubs) via le grand livre
+- Débit: une seule instruction conditionnelle
+  UPDATE ... SET credits_balance = credits_balance - n WHERE id = ? AND credits_balance >= n RETURNING
+  Pas de lecture préalable ni de SELECT ... FOR UPDATE: deux débits concurrents ne peuvent pas
+  passer sous zéro et le verrou de ligne ne dure que jusqu'au commit, que l'appelant fait aussitôt
+- Chaque mouvement ajoute une ligne au grand livre (credit_ledger) dans la même transaction
+- Les fixations de solde (admin: 'set', 'multiply') utilisent un compare-and-swap sur l'ancien solde
+- snapshot_balances(): instantané périodique des soldes recalculés depuis le grand livre,
+  avec contrôle de dérive par rapport au balance_after du dernier mouvement
+- totals(): cumuls d'un compte (éventuellement par motif et depuis une date) pour les
+  historiques et statistiques, sans relire l'historique JSON des actions
+L'objet User/Club passé en argument est mis à jour sans être marqué modifié (pas de second UPDATE).
+Un compte créé avec un solde non nul (crédits de bienvenue) reçoit un mouvement 'opening_balance'.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, event, func, select, true, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.models.credit_ledger import (
+    ACCOUNT_CLUB, ACCOUNT_USER, CreditBalanceSnapshot, CreditLedgerEntry
+)
+from src.models.database import db
+from src.models.user import Club, User
+from src.utils.current_user import invalidate_user_snapshots_after_commit
+
+logger = logging.getLogger(__name__)
+
+# Essais du compare-and-swap avant d'abandonner (écritures concurrentes sur le même compte)
+CAS_ATTEMPTS = 5
+# Âge minimal d'un mouvement pour entrer dans un instantané (transactions encore ouvertes)
+SNAPSHOT_SETTLE_SECONDS = 900
+
+
+class InsufficientCredits(Exception):
+    """Solde insuffisant au moment du débit"""
+
+    def __init__(self, required: int, available: int):
+        super().__init__(f"Crédits insuffisants: {available} disponible(s), {required} requis")
+        self.required = required
+        self.available = available
+
+
+def _account(account) -> Tuple[type, str]:
+    if isinstance(account, Club):
+        return Club, ACCOUNT_CLUB
+    if isinstance(account, User):
+        return User, ACCOUNT_USER
+    raise TypeError(f"Compte de crédits inconnu: {type(account).__name__}")
+
+
+def _balance_column(model):
+    return func.coalesce(model.credits_balance, 0)
+
+
+def _execute_update(model, account_id: int, where, values) -> Optional[int]:
+    """UPDATE conditionnel d'une ligne; renvoie le nouveau solde, ou None si la condition a échoué"""
+    stmt = (
+        update(model)
+        .where(model.id == account_id, where)
+        .values(credits_balance=values)
+        .execution_options(synchronize_session=False)
+    )
+    session = db.session
+    if session.get_bind().dialect.update_returning:
+        return session.execute(stmt.returning(model.credits_balance)).scalar_one_or_none()
+    # MySQL: pas de RETURNING, le solde relu appartient à notre transaction (ligne verrouillée)
+    if session.execute(stmt).rowcount != 1:
+        return None
+    return _read_balance(model, account_id)
+
+
+def _read_balance(model, account_id: int) -> Optional[int]:
+    return db.session.execute(
+        select(_balance_column(model)).where(model.id == account_id)
+    ).scalar_one_or_none()
+
+
+def _record(account, model, account_type: str, delta: int, balance: int, reason: str,
+            reference: Optional[str], performed_by_id: Optional[int]) -> CreditLedgerEntry:
+    set_committed_value(account, 'credits_balance', balance)
+    entry = CreditLedgerEntry(
+        account_type=account_type,
+        account_id=account.id,
+        delta=delta,
+        balance_after=balance,
+        reason=reason,
+        reference=reference,
+        performed_by_id=performed_by_id,
+    )
+    db.session.add(entry)
+    if model is User:
+        invalidate_user_snapshots_after_commit(db.session, [account.id])
+    return entry
+
+
+def debit(account, amount: int, reason: str, reference: str = None,
+          performed_by_id: int = None) -> int:
+    """
+    Retirer amount crédits (User ou Club) en une instruction conditionnelle
+
+    Returns:
+        Nouveau solde
+
+    Raises:
+        InsufficientCredits: solde insuffisant (rien n'est écrit)
+    """
+    if amount <= 0:
+        raise ValueError("Le montant débité doit être positif")
+    model, account_type = _account(account)
+    balance_col = _balance_column(model)
+    balance = _execute_update(model, account.id, balance_col >= amount, balance_col - amount)
+    if balance is None:
+        available = _read_balance(model, account.id) or 0
+        set_committed_value(account, 'credits_balance', available)
+        raise InsufficientCredits(amount, available)
+    _record(account, model, account_type, -amount, balance, reason, reference, performed_by_id)
+    return balance
+
+
+def credit(account, amount: int, reason: str, reference: str = None,
+           performed_by_id: int = None) -> int:
+    """Ajouter amount crédits (User ou Club); renvoie le nouveau solde"""
+    if amount <= 0:
+        raise ValueError("Le montant crédité doit être positif")
+    model, account_type = _account(account)
+    balance = _execute_update(model, account.id, true(), _balance_column(model) + amount)
+    if balance is None:
+        raise LookupError(f"Compte {account_type} {account.id} introuvable")
+    _record(account, model, account_type, amount, balance, reason, reference, performed_by_id)
+    return balance
+
+
+def transfer(source, target, amount: int, reason: str, reference: str = None,
+             performed_by_id: int = None) -> Tuple[int, int]:
+    """
+    Transférer amount crédits de source vers target (ex. club -> joueur) dans la transaction courante
+
+    Returns:
+        (solde source, solde cible)
+    """
+    source_balance = debit(source, amount, reason, reference, performed_by_id)
+    target_balance = credit(target, amount, reason, reference, performed_by_id)
+    return source_balance, target_balance
+
+
+def adjust_to(account, compute: Callable[[int], int], reason: str, reference: str = None,
+              performed_by_id: int = None) -> Tuple[int, int]:
+    """
+    Fixer le solde à compute(solde actuel) (ex. 'set' ou 'multiply' de l'admin)
+    Compare-and-swap sur l'ancien solde, réessayé si un autre mouvement est passé entre-temps
+
+    Returns:
+        (ancien solde, nouveau solde)
+    """
+    model, account_type = _account(account)
+    for _ in range(CAS_ATTEMPTS):
+        old_balance = _read_balance(model, account.id)
+        if old_balance is None:
+            raise LookupError(f"Compte {account_type} {account.id} introuvable")
+        new_balance = max(0, int(compute(old_balance)))
+        if new_balance == old_balance:
+            set_committed_value(account, 'credits_balance', old_balance)
+            return old_balance, new_balance
+        balance = _execute_update(model, account.id, _balance_column(model) == old_balance, new_balance)
+        if balance is not None:
+            _record(account, model, account_type, new_balance - old_balance, balance,
+                    reason, reference, performed_by_id)
+            return old_balance, balance
+    raise RuntimeError(f"Solde du compte {account_type} {account.id} modifié en continu, réessayer")
+
+
+def entries(account_type: str, account_id: int, limit: int = None,
+            reasons: List[str] = None) -> List[CreditLedgerEntry]:
+    """Mouvements d'un compte, du plus récent au plus ancien"""
+    query = CreditLedgerEntry.query.filter(
+        CreditLedgerEntry.account_type == account_type,
+        CreditLedgerEntry.account_id == account_id
+    )
+    if reasons:
+        query = query.filter(CreditLedgerEntry.reason.in_(reasons))
+    query = query.order_by(CreditLedgerEntry.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def totals(account_type: str, account_id: int, reasons: List[str] = None,
+           since: datetime = None) -> Dict[str, int]:
+    """
+    Cumuls crédités/débités d'un compte: dernier instantané + mouvements postérieurs
+    Filtrés par motif ou par date (since): sommés depuis le grand livre seul
+    """
+    snapshot = None
+    if not reasons and since is None:
+        snapshot = CreditBalanceSnapshot.query.filter_by(
+            account_type=account_type, account_id=account_id
+        ).order_by(CreditBalanceSnapshot.id.desc()).first()
+    query = db.session.query(
+        func.sum(case((CreditLedgerEntry.delta > 0, CreditLedgerEntry.delta), else_=0)),
+        func.sum(case((CreditLedgerEntry.delta < 0, -CreditLedgerEntry.delta), else_=0)),
+    ).filter(
+        CreditLedgerEntry.account_type == account_type,
+        CreditLedgerEntry.account_id == account_id,
+        CreditLedgerEntry.id > (snapshot.ledger_id if snapshot else 0)
+    )
+    if reasons:
+        query = query.filter(CreditLedgerEntry.reason.in_(reasons))
+    if since is not None:
+        query = query.filter(CreditLedgerEntry.created_at >= since)
+    credited, debited = query.one()
+    return {
+        'total_credited': (snapshot.total_credited if snapshot else 0) + (credited or 0),
+        'total_debited': (snapshot.total_debited if snapshot else 0) + (debited or 0),
+    }
+
+
+def snapshot_balances(settle_seconds: int = SNAPSHOT_SETTLE_SECONDS) -> Dict[str, int]:
+    """
+    Instantané des comptes ayant des mouvements depuis leur dernier instantané
+    Le solde est recalculé à partir de l'instantané précédent et des nouveaux mouvements,
+    puis comparé au balance_after du dernier mouvement (dérive attendue: 0)
+
+    Les identifiants sont attribués avant le commit: une ligne d'id inférieur peut devenir
+    visible après une ligne d'id supérieur. L'instantané s'arrête donc avant le premier
+    mouvement de moins de settle_seconds; les lignes plus anciennes sont toutes commitées.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    first_recent = db.session.query(func.min(CreditLedgerEntry.id)).filter(
+        CreditLedgerEntry.created_at >= cutoff
+    ).scalar()
+    if first_recent is not None:
+        upper = first_recent - 1
+    else:
+        upper = db.session.query(func.max(CreditLedgerEntry.id)).scalar()
+    if not upper:
+        return {'accounts': 0, 'drifting': 0}
+
+    latest_ids = (
+        db.session.query(func.max(CreditBalanceSnapshot.id).label('id'))
+        .group_by(CreditBalanceSnapshot.account_type, CreditBalanceSnapshot.account_id)
+        .subquery()
+    )
+    previous = {
+        (s.account_type, s.account_id): s
+        for s in CreditBalanceSnapshot.query.join(latest_ids, CreditBalanceSnapshot.id == latest_ids.c.id)
+    }
+
+    latest = (
+        select(CreditBalanceSnapshot.account_type, CreditBalanceSnapshot.account_id,
+               CreditBalanceSnapshot.ledger_id)
+        .join(latest_ids, CreditBalanceSnapshot.id == latest_ids.c.id)
+        .subquery()
+    )
+    ledger = CreditLedgerEntry
+    rows = db.session.execute(
+        select(
+            ledger.account_type, ledger.account_id,
+            func.sum(case((ledger.delta > 0, ledger.delta), else_=0)),
+            func.sum(case((ledger.delta < 0, -ledger.delta), else_=0)),
+            func.max(ledger.id),
+        )
+        .outerjoin(latest, and_(latest.c.account_type == ledger.account_type,
+                                latest.c.account_id == ledger.account_id))
+        .where(ledger.id <= upper, ledger.id > func.coalesce(latest.c.ledger_id, 0))
+        .group_by(ledger.account_type, ledger.account_id)
+    ).all()
+    if not rows:
+        return {'accounts': 0, 'drifting': 0}
+
+    last_ids = [row[4] for row in rows]
+    balances_after = dict(db.session.query(ledger.id, ledger.balance_after).filter(ledger.id.in_(last_ids)))
+
+    drifting = 0
+    now = datetime.utcnow()
+    for account_type, account_id, credited, debited, last_id in rows:
+        before = previous.get((account_type, account_id))
+        total_credited = (before.total_credited if before else 0) + (credited or 0)
+        total_debited = (before.total_debited if before else 0) + (debited or 0)
+        balance = total_credited - total_debited
+        drift = balances_after[last_id] - balance
+        if drift:
+            drifting += 1
+            logger.warning(f"⚠️ Grand livre: dérive de {drift} crédit(s) sur le compte {account_type} {account_id}")
+        db.session.add(CreditBalanceSnapshot(
+            account_type=account_type,
+            account_id=account_id,
+            ledger_id=last_id,
+            balance=balance,
+            total_credited=total_credited,
+            total_debited=total_debited,
+            drift=drift,
+            taken_at=now,
+        ))
+    db.session.commit()
+    logger.info(f"📒 Instantané des soldes: {len(rows)} compte(s), {drifting} en dérive")
+    return {'accounts': len(rows), 'drifting': drifting}
+
+
+# ----------------------------------------------------------------------
+# Solde initial des comptes créés avec des crédits
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(Club, 'after_insert')
+def _record_opening_balance(mapper, connection, target):
+    balance = target.credits_balance or 0
+    if balance:
+        connection.execute(CreditLedgerEntry.__table__.insert().values(
+            account_type=ACCOUNT_CLUB if isinstance(target, Club) else ACCOUNT_USER,
+            account_id=target.id,
+            delta=balance,
+            balance_after=balance,
+            reason='opening_balance',
+            created_at=datetime.utcnow(),
+        ))
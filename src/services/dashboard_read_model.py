@@ -0,0 +1,266 @@
+"""
+Read model des tableaux de bord joueur et club
+Chaque section est calculée en SQL agrégé (COUNT/SUM/GROUP BY) ou avec des jointures
+chargées d'avance: le nombre de requêtes est fixe, quel que soit le volume de données.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import case, desc, func, or_
+from sqlalchemy.orm import joinedload, selectinload
+
+from src.models.credit_ledger import ACCOUNT_CLUB, ACCOUNT_USER
+from src.models.database import db
+from src.models.user import (
+    User, UserRole, Club, Court, Video, ClubActionHistory, RecordingSession, player_club_follows
+)
+from src.services import credit_ledger
+
+logger = logging.getLogger(__name__)
+
+# Crédits offerts (hors achats) au sens du grand livre
+GRANT_REASONS = ['club_grant', 'admin_grant']
+
+
+def _with_court_and_club(query):
+    """Charger terrain et club avec les vidéos (utilisés par Video.to_dict)"""
+    return query.options(joinedload(Video.court).joinedload(Court.club))
+
+
+# ----------------------------------------------------------------------
+# Joueur
+
+def player_videos_statistics(user_id: int, recent_limit: int = 5) -> Dict:
+    total, unlocked, duration = db.session.query(
+        func.count(Video.id),
+        func.coalesce(func.sum(case((Video.is_unlocked.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(Video.duration), 0)
+    ).filter(Video.user_id == user_id).one()
+
+    recent = _with_court_and_club(Video.query).filter(
+        Video.user_id == user_id
+    ).order_by(desc(Video.id)).limit(recent_limit).all()
+
+    return {
+        "total_videos": total,
+        "unlocked_videos": int(unlocked),
+        "total_duration": int(duration),
+        "recent_videos": [v.to_dict() for v in reversed(recent)]  # Ordre chronologique
+    }
+
+
+def player_recent_activity(user_id: int, limit: int = 10) -> List[Dict]:
+    rows = db.session.query(ClubActionHistory, Club.name).outerjoin(
+        Club, Club.id == ClubActionHistory.club_id
+    ).filter(
+        ClubActionHistory.user_id == user_id
+    ).order_by(desc(ClubActionHistory.performed_at)).limit(limit).all()
+
+    return [{
+        "action_type": activity.action_type,
+        "club_name": club_name or "Club inconnu",
+        "performed_at": activity.performed_at.isoformat(),
+        "details": activity.action_details
+    } for activity, club_name in rows]
+
+
+def recommended_clubs(user_id: int, limit: int = 5) -> List[Dict]:
+    """Clubs actifs non suivis, les plus suivis d'abord"""
+    followers = db.session.query(
+        player_club_follows.c.club_id, func.count().label('followers_count')
+    ).group_by(player_club_follows.c.club_id).subquery()
+    courts = db.session.query(
+        Court.club_id, func.count(Court.id).label('courts_count')
+    ).group_by(Court.club_id).subquery()
+    followed = db.session.query(player_club_follows.c.club_id).filter(
+        player_club_follows.c.player_id == user_id
+    )
+
+    followers_count = func.coalesce(followers.c.followers_count, 0)
+    courts_count = func.coalesce(courts.c.courts_count, 0)
+    rows = db.session.query(Club, followers_count, courts_count).outerjoin(
+        followers, followers.c.club_id == Club.id
+    ).outerjoin(
+        courts, courts.c.club_id == Club.id
+    ).filter(
+        Club.id.notin_(followed),
+        or_(followers_count > 0, courts_count > 0)
+    ).options(
+        selectinload(Club.overlays)
+    ).order_by(desc(followers_count), Club.id).limit(limit).all()
+
+    result = []
+    for club, club_followers, club_courts in rows:
+        club_dict = club.to_dict()
+        club_dict["followers_count"] = club_followers
+        club_dict["courts_count"] = club_courts
+        result.append(club_dict)
+    return result
+
+
+def player_dashboard(user: User) -> Dict:
+    followed_clubs_count = db.session.query(func.count()).select_from(player_club_follows).filter(
+        player_club_follows.c.player_id == user.id
+    ).scalar()
+
+    primary_club = None
+    if user.club_id:
+        primary_club = Club.query.options(selectinload(Club.overlays)).filter_by(id=user.club_id).first()
+
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    credits_earned = credit_ledger.totals(
+        ACCOUNT_USER, user.id, reasons=GRANT_REASONS, since=month_start
+    )['total_credited']
+
+    try:
+        recommendations = recommended_clubs(user.id)
+    except Exception as e:
+        logger.error(f"Erreur lors du calcul des recommandations: {e}")
+        recommendations = []
+
+    return {
+        "player": user.to_dict(),
+        "clubs_statistics": {
+            "followed_clubs_count": followed_clubs_count,
+            "primary_club": primary_club.to_dict() if primary_club else None
+        },
+        "videos_statistics": player_videos_statistics(user.id),
+        "credits_statistics": {
+            "current_balance": user.credits_balance,
+            "credits_earned_this_month": credits_earned,
+            "credits_spent_this_month": 0  # À calculer depuis l'historique
+        },
+        "recent_activity": player_recent_activity(user.id),
+        "recommended_clubs": recommendations,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+# ----------------------------------------------------------------------
+# Club
+
+def _expire_sessions(sessions: List[RecordingSession], courts_by_id: Dict[int, Court]) -> int:
+    """Clore les sessions expirées et libérer leurs terrains (objets déjà chargés, sans commit)"""
+    expired = 0
+    for recording in sessions:
+        if recording.is_expired():
+            recording.status = 'completed'
+            court = courts_by_id.get(recording.court_id)
+            if court:
+                court.is_recording = False
+                logger.info(f"🔓 Terrain {court.name} (ID:{court.id}) libéré")
+            expired += 1
+    return expired
+
+
+def club_courts_with_status(club_id: int) -> List[Dict]:
+    """
+    Terrains du club avec leur occupation; les sessions expirées sont closes au passage.
+    Le commit n'intervient qu'une fois les terrains sérialisés (il expire les objets chargés).
+    """
+    courts = Court.query.filter_by(club_id=club_id).order_by(Court.id).all()
+    courts_by_id = {court.id: court for court in courts}
+
+    # Une requête pour toutes les sessions actives des terrains du club
+    active_sessions = []
+    if courts_by_id:
+        active_sessions = RecordingSession.query.options(joinedload(RecordingSession.user)).filter(
+            RecordingSession.status == 'active',
+            RecordingSession.court_id.in_(list(courts_by_id))
+        ).all()
+    expired = _expire_sessions(active_sessions, courts_by_id)
+    active_by_court = {s.court_id: s for s in active_sessions if s.status == 'active'}
+
+    result = []
+    for court in courts:
+        court_dict = court.to_dict()
+        recording = active_by_court.get(court.id)
+        if recording:
+            court_dict.update({
+                'is_occupied': True,
+                'occupation_status': 'Occupé - Enregistrement en cours',
+                'recording_player': recording.user.name if recording.user else 'Joueur inconnu',
+                'recording_remaining': recording.get_remaining_minutes(),
+                'recording_total': recording.planned_duration
+            })
+        else:
+            court_dict.update({
+                'is_occupied': False,
+                'occupation_status': 'Disponible',
+                'recording_player': None,
+                'recording_remaining': None,
+                'recording_total': None
+            })
+        result.append(court_dict)
+
+    if expired:
+        try:
+            db.session.commit()
+            logger.info(f"✅ {expired} session(s) expirée(s) nettoyée(s)")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erreur lors du nettoyage des sessions expirées: {e}")
+    return result
+
+
+def club_videos_page(club_id: int, page: int = 1, per_page: int = 50) -> Dict:
+    """Vidéos des terrains du club, paginées, avec propriétaire/terrain/club chargés d'avance"""
+    base = Video.query.join(Court, Video.court_id == Court.id).filter(Court.club_id == club_id)
+    total = base.with_entities(func.count(Video.id)).scalar()
+
+    videos = _with_court_and_club(base).options(joinedload(Video.owner)).order_by(
+        desc(Video.recorded_at), desc(Video.id)
+    ).offset((page - 1) * per_page).limit(per_page).all()
+
+    items = []
+    for video in videos:
+        video_dict = video.to_dict()
+        video_dict['player_name'] = video.owner.name if video.owner else 'Joueur inconnu'
+        items.append(video_dict)
+
+    return {
+        'items': items,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'has_more': page * per_page < total
+    }
+
+
+def club_dashboard(club: Club, page: int = 1, per_page: int = 50) -> Dict:
+    # Club et joueurs sérialisés avant le commit éventuel du nettoyage des sessions
+    club_data = club.to_dict()
+    players = [player.to_dict() for player in User.query.filter_by(club_id=club.id, role=UserRole.PLAYER).all()]
+    courts = club_courts_with_status(club.id)
+    videos = club_videos_page(club.id, page, per_page)
+
+    followers_count = db.session.query(func.count()).select_from(player_club_follows).filter(
+        player_club_follows.c.club_id == club.id
+    ).scalar()
+
+    # Débits 'club_grant' du compte club (transferts vers les joueurs)
+    credits_given = credit_ledger.totals(ACCOUNT_CLUB, club.id, reasons=['club_grant'])['total_debited']
+
+    stats = {
+        'total_players': len(players),
+        'total_courts': len(courts),
+        'total_videos': videos['total'],
+        'total_credits_offered': credits_given,
+        'followers_count': followers_count,
+        # Garder aussi les anciens noms pour compatibilité
+        'players_count': len(players),
+        'courts_count': len(courts),
+        'videos_count': videos['total'],
+        'credits_given': credits_given
+    }
+
+    return {
+        'club': club_data,
+        'stats': stats,
+        'players': players,
+        'courts': courts,
+        'videos': videos['items'],
+        'videos_pagination': {k: videos[k] for k in ('total', 'page', 'per_page', 'has_more')},
+    }
@@ -0,0 +1,290 @@
+"""
+Bus d'événements temps réel (SSE) adossé à Redis pub/sub
+- Canaux: user:<id> (notifications, enregistrements du joueur, statuts vidéo) et
+  club:<id> (enregistrements des terrains du club)
+- Publication après commit uniquement: un événement n'annonce jamais une écriture annulée
+- Un seul abonnement Redis (psubscribe) par worker, redistribué aux flux SSE du
+  processus via des files en mémoire; sans Redis, diffusion limitée au processus
+- Notifications et sessions d'enregistrement publient via les événements ORM (toutes
+  les origines: routes, scheduler, finaliseur); les UPDATE groupés publient explicitement
+"""
+
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'padel:events:'
+_PENDING_KEY = '_pending_events'
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def club_channel(club_id: int) -> str:
+    return f"club:{club_id}"
+
+
+class Subscription:
+    """File d'événements d'un flux SSE"""
+
+    def __init__(self, channels: Set[str], max_size: int):
+        self.channels = channels
+        self.queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.overflowed = False
+
+    def put(self, message: dict):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Client trop lent: il recevra un événement 'resync' pour recharger son état
+            self.overflowed = True
+
+    def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """Publication et abonnement aux événements par canal"""
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url
+        self.queue_size = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+        self._redis = None
+        self._redis_checked_at = 0.0
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._ids = itertools.count(1)
+
+    # ------------------------------------------------------------------
+    # Redis
+
+    def _client(self):
+        """Client Redis, ou None (nouvel essai de connexion au plus toutes les 30 s)"""
+        if self._redis is not None or not self.redis_url:
+            return self._redis
+        if time.time() - self._redis_checked_at < 30:
+            return None
+        self._redis_checked_at = time.time()
+        try:
+            import redis
+            client = redis.from_url(self.redis_url, decode_responses=True, socket_timeout=5)
+            client.ping()
+            self._redis = client
+            logger.info("📡 Bus d'événements connecté à Redis")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis indisponible pour le bus d'événements, diffusion locale: {e}")
+        return self._redis
+
+    def _subscriber_client(self):
+        """
+        Connexion dédiée à l'abonnement: sans socket_timeout, un canal silencieux
+        ferait échouer listen() toutes les 5 s (redis-py < 8); une coupure réseau
+        est détectée par le keepalive TCP et les PING de health_check_interval
+        """
+        import redis
+        return redis.from_url(
+            self.redis_url,
+            decode_responses=True,
+            socket_timeout=None,
+            socket_connect_timeout=5,
+            socket_keepalive=True,
+            health_check_interval=30
+        )
+
+    # ------------------------------------------------------------------
+    # Publication
+
+    def publish(self, channels: Iterable[str], event_type: str, data: dict):
+        message = {
+            'id': f"{int(time.time() * 1000)}-{os.getpid()}-{next(self._ids)}",
+            'event': event_type,
+            'data': data,
+        }
+        channels = set(channels)
+        client = self._client()
+        if client is not None:
+            payload = json.dumps(message, default=str)
+            try:
+                with client.pipeline(transaction=False) as pipe:
+                    for channel in channels:
+                        pipe.publish(CHANNEL_PREFIX + channel, payload)
+                    pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Publication Redis impossible, diffusion locale: {e}")
+                self._redis = None
+        for channel in channels:
+            self._dispatch(channel, message)
+
+    def publish_after_commit(self, session: Session, channels: Iterable[str], event_type: str, data: dict):
+        """Publier au commit de la session (abandonné en cas de rollback)"""
+        session.info.setdefault(_PENDING_KEY, []).append((list(channels), event_type, data))
+
+    # ------------------------------------------------------------------
+    # Abonnement
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(set(channels), self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subscribers in self._subscriptions.values() for s in subscribers})
+
+    def _dispatch(self, channel: str, message: dict):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            if self._client() is None:
+                return
+            self._listener = threading.Thread(target=self._listen, daemon=True, name='event-bus-listener')
+            self._listener.start()
+
+    def _listen(self):
+        """Abonnement Redis du worker, reconnecté en cas de coupure"""
+        delay = 1
+        while True:
+            client = self._client()
+            if client is None:
+                time.sleep(5)
+                continue
+            subscriber = pubsub = None
+            try:
+                subscriber = self._subscriber_client()
+                pubsub = subscriber.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                delay = 1
+                for item in pubsub.listen():
+                    if item.get('type') != 'pmessage':
+                        continue
+                    try:
+                        message = json.loads(item['data'])
+                    except (TypeError, ValueError):
+                        continue
+                    self._dispatch(item['channel'][len(CHANNEL_PREFIX):], message)
+            except Exception as e:
+                logger.warning(f"⚠️ Abonnement Redis du bus interrompu, reconnexion dans {delay}s: {e}")
+                self._redis = None
+                self._redis_checked_at = 0.0
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                for resource in (pubsub, subscriber):
+                    try:
+                        if resource is not None:
+                            resource.close()
+                    except Exception:
+                        pass
+
+
+# Instance globale
+event_bus = EventBus(os.getenv('EVENTS_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
+
+
+# ----------------------------------------------------------------------
+# Publication sur événements ORM
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    for channels, event_type, data in pending or ():
+        try:
+            event_bus.publish(channels, event_type, data)
+        except Exception as e:
+            logger.error(f"❌ Publication de l'événement {event_type} impossible: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _register_model_events():
+    from src.models.notification import Notification
+    from src.models.user import RecordingSession
+
+    @event.listens_for(Notification, 'after_insert')
+    def _notification_created(mapper, connection, target):
+        session = inspect(target).session
+        if session is not None:
+            event_bus.publish_after_commit(session, [user_channel(target.user_id)], 'notification', {
+                'notification': target.to_dict(),
+                'unread_delta': 1
+            })
+
+    def _recording_event(target, action: str):
+        session = inspect(target).session
+        if session is None:
+            return
+        data = {
+            'action': action,
+            'recording_id': target.recording_id,
+            'status': target.status,
+            'stopped_by': target.stopped_by,
+            'user_id': target.user_id,
+            'court_id': target.court_id,
+            'club_id': target.club_id,
+            'planned_duration': target.planned_duration,
+            'start_time': target.start_time.isoformat() if target.start_time else None,
+        }
+        event_bus.publish_after_commit(
+            session, [user_channel(target.user_id), club_channel(target.club_id)], 'recording', data
+        )
+
+    @event.listens_for(RecordingSession, 'after_insert')
+    def _recording_started(mapper, connection, target):
+        _recording_event(target, 'started')
+
+    @event.listens_for(RecordingSession, 'after_update')
+    def _recording_changed(mapper, connection, target):
+        if inspect(target).attrs.status.history.has_changes():
+            action = 'expired' if target.stopped_by == 'auto' else target.status
+            _recording_event(target, action)
+
+
+_register_model_events()
+
+
+def publish_status_changes(session: Session, kind: str, rows: List[dict]):
+    """Transitions de statut Bunny appliquées par UPDATE groupé (sans événements ORM)"""
+    for row in rows:
+        if row.get('user_id'):
+            event_bus.publish_after_commit(session, [user_channel(row['user_id'])], 'video_status', {
+                'kind': kind, **row
+            })
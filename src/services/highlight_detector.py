@@ -0,0 +1,223 @@
+"""
+Détection des temps forts d'un match (sans IA)
+Analyse un proxy basse définition de la vidéo: énergie de mouvement (différence entre
+images dans la zone du terrain) et énergie audio (RMS), agrégées par seconde avec NumPy,
+puis sélection des K fenêtres les plus actives sans chevauchement.
+
+Le décodage est le coût dominant: FFmpeg décode sans les images non référencées,
+réduit à quelques images/s en niveaux de gris 160 px, et les images sont lues par lots
+dans un tableau (aucune boucle Python par pixel ou par image).
+"""
+
+import logging
+import os
+import subprocess
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DetectorSettings:
+    fps: float = float(os.getenv('HIGHLIGHTS_DETECT_FPS', '4'))
+    width: int = 160
+    height: int = 90
+    audio_rate: int = 8000
+    batch_frames: int = 512
+    # Zone du terrain en fractions de l'image (x0, y0, x1, y1): exclut bandeaux et tribunes
+    court_roi: Tuple[float, float, float, float] = tuple(
+        float(v) for v in os.getenv('HIGHLIGHTS_COURT_ROI', '0.05,0.15,0.95,0.95').split(',')
+    )
+    motion_weight: float = 0.20
+    audio_weight: float = 0.25
+
+
+class HighlightDetector:
+    """Scores d'activité par seconde et choix des meilleures fenêtres"""
+
+    def __init__(self, settings: DetectorSettings = None):
+        self.settings = settings or DetectorSettings()
+
+    def detect(self, video_path: str, duration: float, window: float, count: int,
+               has_audio: bool = True, on_progress: Callable[[float], None] = None) -> List[Dict]:
+        """
+        Fenêtres les plus actives de la vidéo
+
+        Args:
+            duration: durée de la vidéo (s)
+            window: durée de chaque extrait (s)
+            count: nombre d'extraits voulus
+
+        Returns:
+            [{'start', 'end', 'score', 'motion', 'audio'}] triés chronologiquement
+        """
+        seconds = int(np.ceil(duration))
+        audio = np.zeros(seconds, dtype=np.float32)
+
+        # L'audio (démultiplexage + décodage AAC, peu coûteux) est analysé en parallèle de la vidéo
+        audio_thread = None
+        if has_audio:
+            def run_audio():
+                try:
+                    audio[:] = self.audio_energy(video_path, seconds)
+                except Exception as e:
+                    logger.warning(f"⚠️ Analyse audio impossible: {e}")
+            audio_thread = threading.Thread(target=run_audio, daemon=True)
+            audio_thread.start()
+
+        motion = self.motion_energy(video_path, seconds, on_progress)
+        if audio_thread:
+            audio_thread.join()
+
+        s = self.settings
+        scores = s.motion_weight * self._normalize(motion) + s.audio_weight * self._normalize(audio)
+        windows = self.select_windows(scores, int(round(window)), count)
+
+        return [{
+            'start': float(start),
+            'end': float(min(start + window, duration)),
+            'score': round(float(scores[start:start + int(round(window))].mean()), 4),
+            'motion': round(float(motion[start:start + int(round(window))].mean()), 4),
+            'audio': round(float(audio[start:start + int(round(window))].mean()), 4)
+        } for start in windows]
+
+    # ------------------------------------------------------------------
+    # Signaux
+
+    def motion_energy(self, video_path: str, seconds: int,
+                      on_progress: Callable[[float], None] = None) -> np.ndarray:
+        """Différence absolue moyenne entre images successives dans la zone du terrain, par seconde"""
+        s = self.settings
+        frame_size = s.width * s.height
+        x0, y0, x1, y1 = s.court_roi
+        roi = (slice(int(y0 * s.height), int(y1 * s.height)), slice(int(x0 * s.width), int(x1 * s.width)))
+
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-skip_frame', 'nonref',
+            '-i', video_path,
+            '-an', '-sn',
+            '-vf', f"fps={s.fps},scale={s.width}:{s.height},format=gray",
+            '-f', 'rawvideo', 'pipe:1'
+        ]
+        totals = np.zeros(seconds, dtype=np.float64)
+        counts = np.zeros(seconds, dtype=np.int64)
+        previous = None
+        frame_index = 0
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                data = process.stdout.read(frame_size * s.batch_frames)
+                usable = len(data) // frame_size
+                if usable == 0:
+                    break
+                frames = np.frombuffer(data, dtype=np.uint8, count=usable * frame_size)
+                frames = frames.reshape(usable, s.height, s.width)[:, roi[0], roi[1]].astype(np.int16)
+                if previous is not None:
+                    frames = np.concatenate([previous, frames])
+                    first = frame_index
+                else:
+                    first = frame_index + 1
+
+                # Différence de chaque image avec la précédente, moyennée sur la zone
+                diffs = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2))
+                second = (np.arange(first, first + len(diffs)) / s.fps).astype(np.int64)
+                valid = second < seconds
+                totals += np.bincount(second[valid], weights=diffs[valid], minlength=seconds)[:seconds]
+                counts += np.bincount(second[valid], minlength=seconds)[:seconds]
+
+                previous = frames[-1:]
+                frame_index += usable
+                if on_progress and seconds:
+                    on_progress(min(frame_index / s.fps / seconds, 1.0))
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        if frame_index == 0:
+            raise RuntimeError("Aucune image décodée pour l'analyse de mouvement")
+        return (totals / np.maximum(counts, 1)).astype(np.float32)
+
+    def audio_energy(self, video_path: str, seconds: int) -> np.ndarray:
+        """RMS audio par seconde (mono, basse fréquence d'échantillonnage)"""
+        s = self.settings
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-i', video_path,
+            '-vn', '-sn',
+            '-ac', '1', '-ar', str(s.audio_rate),
+            '-f', 's16le', 'pipe:1'
+        ]
+        rms = np.zeros(seconds, dtype=np.float32)
+        chunk_seconds = 60
+        second = 0
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while second < seconds:
+                data = process.stdout.read(s.audio_rate * 2 * chunk_seconds)
+                whole = len(data) // (s.audio_rate * 2)
+                if whole == 0:
+                    break
+                samples = np.frombuffer(data, dtype=np.int16, count=whole * s.audio_rate)
+                blocks = samples.reshape(whole, s.audio_rate).astype(np.float32) / 32768.0
+                end = min(second + whole, seconds)
+                rms[second:end] = np.sqrt((blocks ** 2).mean(axis=1))[:end - second]
+                second = end
+            process.stdout.close()
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        return rms
+
+    # ------------------------------------------------------------------
+    # Sélection
+
+    @staticmethod
+    def _normalize(signal: np.ndarray) -> np.ndarray:
+        """
+        Écart à la médiane rapporté au 99e percentile (robuste aux pics isolés), borné à [0, 1];
+        au maximum si l'activité est trop rare pour atteindre le percentile
+        """
+        if not signal.size or not signal.any():
+            return np.zeros_like(signal)
+        median = np.median(signal)
+        spread = np.percentile(signal, 99) - median
+        if spread <= 0:
+            spread = signal.max() - median
+        if spread <= 0:
+            return np.zeros_like(signal)
+        return np.clip((signal - median) / spread, 0, 1)
+
+    @staticmethod
+    def select_windows(scores: np.ndarray, window: int, count: int) -> List[int]:
+        """
+        Débuts (s) des `count` fenêtres de `window` secondes au score cumulé maximal,
+        sans chevauchement, triés chronologiquement
+        """
+        window = max(1, window)
+        if scores.size < window:
+            return [0] if scores.size else []
+
+        # Score de chaque fenêtre possible (somme glissante)
+        cumulative = np.concatenate([[0.0], np.cumsum(scores, dtype=np.float64)])
+        sums = cumulative[window:] - cumulative[:-window]
+
+        taken = np.zeros(scores.size, dtype=bool)
+        picked = []
+        for start in np.argsort(-sums, kind='stable'):
+            if not taken[start:start + window].any():
+                picked.append(int(start))
+                taken[start:start + window] = True
+                if len(picked) == count:
+                    break
+        return sorted(picked)
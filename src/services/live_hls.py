@@ -0,0 +1,213 @@
+"""
+Plan d'encodage des lives HLS
+- Mode 'single': un seul rendu (comportement historique, segments .ts de 4 s)
+- Mode 'abr': la caméra est décodée une fois puis déclinée en échelle de rendus
+  (ex. 1080p/720p/360p) avec playlist maître; HLS.js choisit le rendu selon la bande passante
+  du spectateur. Segments fMP4 de 2 s à GOP aligné pour réduire la latence
+- Budget CPU: chaque live est limité à LIVE_CPU_PER_COURT cœurs et l'ensemble des lives
+  d'un nœud à LIVE_CPU_TOTAL; les rendus les plus coûteux sont retirés de l'échelle
+  jusqu'à tenir dans le budget restant
+- Les rendus plus hauts que la caméra (hauteur sondée par ffprobe au démarrage) sont
+  retirés de l'échelle: ils ne feraient que réencoder la même image
+"""
+
+import logging
+import math
+import os
+import subprocess
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODE_SINGLE = 'single'
+MODE_ABR = 'abr'
+
+DEFAULT_MODE = os.getenv('LIVE_HLS_MODE', MODE_SINGLE)
+FPS = 25
+SEGMENT_SECONDS = int(os.getenv('LIVE_HLS_SEGMENT_SECONDS', '2'))
+FMP4 = os.getenv('LIVE_HLS_FMP4', 'true').lower() in ('1', 'true', 'yes')
+LIST_SIZE = 6
+
+CPU_PER_COURT = float(os.getenv('LIVE_CPU_PER_COURT', '2'))
+CPU_TOTAL = float(os.getenv('LIVE_CPU_TOTAL', str(os.cpu_count() or 2)))
+PROBE_TIMEOUT = float(os.getenv('LIVE_PROBE_TIMEOUT', '10'))
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """Rendu de l'échelle ABR; cpu_cost: cœurs estimés (libx264 veryfast, 25 fps)"""
+    name: str
+    height: int
+    video_kbps: int
+    cpu_cost: float
+
+
+LADDER = {
+    1080: Rendition('1080p', 1080, 4500, 1.6),
+    720: Rendition('720p', 720, 2500, 0.8),
+    480: Rendition('480p', 480, 1200, 0.4),
+    360: Rendition('360p', 360, 800, 0.25),
+}
+# Décodage MJPEG/RTSP partagé par les rendus
+DECODE_COST = 0.3
+# Rendu unique historique (ultrafast, crf 28)
+SINGLE_COST = 0.6
+
+
+def _ladder_from_env() -> List[Rendition]:
+    heights = []
+    for value in os.getenv('LIVE_HLS_LADDER', '1080,720,360').split(','):
+        value = value.strip().lower().rstrip('p')
+        if value.isdigit() and int(value) in LADDER:
+            heights.append(int(value))
+    return [LADDER[h] for h in sorted(set(heights), reverse=True)] or [LADDER[720], LADDER[360]]
+
+
+@dataclass
+class LivePlan:
+    mode: str
+    cpu_cost: float
+    threads: int
+    renditions: List[Rendition] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            'mode': self.mode,
+            'cpu_cost': round(self.cpu_cost, 2),
+            'renditions': [r.name for r in self.renditions],
+        }
+
+
+def probe_source_height(ffmpeg: str, stream_url: str, timeout: float = PROBE_TIMEOUT) -> Optional[int]:
+    """Hauteur de l'image de la caméra (ffprobe à côté de FFmpeg), None si inconnue"""
+    name = 'ffprobe.exe' if ffmpeg.lower().endswith('.exe') else 'ffprobe'
+    ffprobe = os.path.join(os.path.dirname(ffmpeg), name) if os.path.dirname(ffmpeg) else name
+    cmd = [
+        ffprobe, '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=height',
+        '-of', 'csv=p=0',
+        stream_url,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"⚠️ Hauteur de la caméra inconnue (ffprobe): {e}")
+        return None
+    value = result.stdout.strip().split('\n')[0].strip().rstrip(',')
+    if result.returncode != 0 or not value.isdigit():
+        logger.warning(f"⚠️ Hauteur de la caméra inconnue (ffprobe code {result.returncode}): {result.stderr.strip()[:200]}")
+        return None
+    return int(value)
+
+
+def plan_live(mode: str, cpu_in_use: float, source_height: Optional[int] = None) -> Optional[LivePlan]:
+    """
+    Choisir l'encodage d'un nouveau live selon le budget CPU restant du nœud
+
+    Args:
+        source_height: hauteur de l'image de la caméra si connue; les rendus plus
+            hauts sont retirés de l'échelle ABR
+
+    Returns:
+        LivePlan, ou None si le nœud n'a plus la capacité d'encoder un live
+    """
+    budget = min(CPU_PER_COURT, CPU_TOTAL - cpu_in_use)
+    threads = max(1, math.floor(min(CPU_PER_COURT, CPU_TOTAL)))
+
+    if mode == MODE_ABR:
+        renditions = _ladder_from_env()
+        if source_height:
+            # Caméra 720p: un rendu 1080p serait un second 720p (même image, débit plus haut)
+            renditions = [r for r in renditions if r.height <= source_height]
+        # Retirer les rendus les plus coûteux (les plus hautes résolutions) d'abord
+        while renditions and DECODE_COST + sum(r.cpu_cost for r in renditions) > budget:
+            renditions.pop(0)
+        if len(renditions) > 1:
+            cost = DECODE_COST + sum(r.cpu_cost for r in renditions)
+            return LivePlan(MODE_ABR, cost, threads, renditions)
+        # Un seul rendu possible: autant garder l'encodage historique, plus léger
+
+    if SINGLE_COST <= budget:
+        return LivePlan(MODE_SINGLE, SINGLE_COST, threads)
+    return None
+
+
+def build_command(ffmpeg: str, stream_url: str, hls_dir: str, plan: LivePlan) -> List[str]:
+    """Commande FFmpeg du plan; la playlist d'entrée est toujours stream.m3u8"""
+    if plan.mode == MODE_SINGLE:
+        return [
+            ffmpeg, '-hide_banner',
+            # Input
+            '-i', stream_url,
+            # Encodage léger (CPU ~5-10%)
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            '-tune', 'zerolatency',
+            '-crf', '28',           # qualité raisonnable (23=haute, 28=stream)
+            '-r', str(FPS),         # 25 fps
+            '-g', str(FPS * 2),     # GOP = 2s (keyframe interval)
+            '-sc_threshold', '0',
+            '-threads', str(plan.threads),
+            # Pas d'audio pour MJPEG par sécurité (évite crash FFmpeg)
+            '-an',
+            # HLS output
+            '-f', 'hls',
+            '-hls_time', '4',           # segments de 4s
+            '-hls_list_size', str(LIST_SIZE),  # 6 segments en playlist (~24s de buffer)
+            '-hls_flags', 'delete_segments+append_list+discont_start',
+            '-hls_segment_filename', os.path.join(hls_dir, 'seg%05d.ts'),
+            os.path.join(hls_dir, 'stream.m3u8'),
+        ]
+
+    renditions = plan.renditions
+    gop = FPS * SEGMENT_SECONDS  # Une image clé par segment, alignée sur tous les rendus
+
+    # Un décodage, N mises à l'échelle (rendus plus hauts que la caméra déjà retirés du plan)
+    outputs = ''.join(f'[s{i}]' for i in range(len(renditions)))
+    scales = ';'.join(
+        f'[s{i}]scale=-2:{r.height}[v{i}]' for i, r in enumerate(renditions)
+    )
+    filter_graph = f'[0:v]fps={FPS},split={len(renditions)}{outputs};{scales}'
+
+    cmd = [
+        ffmpeg, '-hide_banner',
+        '-i', stream_url,
+        '-filter_complex', filter_graph,
+    ]
+    for i in range(len(renditions)):
+        cmd += ['-map', f'[v{i}]']
+    cmd += [
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-tune', 'zerolatency',
+        '-g', str(gop),
+        '-keyint_min', str(gop),
+        '-sc_threshold', '0',
+        '-threads', str(plan.threads),
+    ]
+    for i, r in enumerate(renditions):
+        cmd += [
+            f'-b:v:{i}', f'{r.video_kbps}k',
+            f'-maxrate:v:{i}', f'{int(r.video_kbps * 1.1)}k',
+            f'-bufsize:v:{i}', f'{r.video_kbps}k',
+        ]
+
+    extension = 'm4s' if FMP4 else 'ts'
+    cmd += [
+        '-an',
+        '-f', 'hls',
+        '-hls_time', str(SEGMENT_SECONDS),
+        '-hls_list_size', str(LIST_SIZE),
+        '-hls_flags', 'delete_segments+independent_segments+discont_start',
+    ]
+    if FMP4:
+        cmd += ['-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'init_%v.mp4']
+    cmd += [
+        '-hls_segment_filename', os.path.join(hls_dir, f'seg_%v_%05d.{extension}'),
+        '-master_pl_name', 'stream.m3u8',
+        '-var_stream_map', ' '.join(f'v:{i},name:{r.name}' for i, r in enumerate(renditions)),
+        os.path.join(hls_dir, 'stream_%v.m3u8'),
+    ]
+    return cmd
@@ -0,0 +1,287 @@
+"""
+Registre partagé des lives HLS
+- Un enregistrement JSON par live dans Redis (padel:live:<code>), index par utilisateur et
+  spectateurs dans un sorted set (viewer_id -> dernier heartbeat): tous les workers gunicorn
+  et tous les nœuds voient les mêmes lives et le même nombre de spectateurs
+- L'enregistrement d'un live actif expire s'il n'est plus rafraîchi par le worker qui fait
+  tourner FFmpeg (worker arrêté ou planté): pas de live fantôme
+- Sans Redis: registre en mémoire du processus (un seul worker)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'padel:live:'
+# Durée de vie d'un live actif sans rafraîchissement par son worker (s)
+ACTIVE_TTL = int(os.getenv('LIVE_REGISTRY_TTL', '30'))
+# Conservation d'un live terminé (page spectateur "live terminé")
+ENDED_TTL = 3600
+# Réservation d'un live en cours de démarrage (FFmpeg attend la première playlist)
+STARTING_TTL = 60
+ACTIVE_SET_KEY = f'{KEY_PREFIX}active'
+# Spectateur considéré parti sans heartbeat depuis (s)
+VIEWER_TIMEOUT = 20
+# Cache local des lectures pour le service des segments HLS (s)
+LOOKUP_CACHE_SECONDS = 2
+
+
+def _live_key(code: str) -> str:
+    return f"{KEY_PREFIX}{code}"
+
+
+def _viewers_key(code: str) -> str:
+    return f"{KEY_PREFIX}{code}:viewers"
+
+
+def _user_key(user_id: int) -> str:
+    return f"{KEY_PREFIX}user:{user_id}"
+
+
+class LiveRegistry:
+    """Lives en cours, partagés entre workers via Redis"""
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url
+        self._redis = None
+        self._redis_checked_at = 0.0
+        self._lock = threading.Lock()
+        # Repli sans Redis: {clé: (valeur, expiration)}
+        self._local: Dict[str, tuple] = {}
+        self._local_viewers: Dict[str, Dict[str, float]] = {}
+        self._local_active: set = set()
+        # Cache des lectures (code -> (live, lu à))
+        self._lookups: Dict[str, tuple] = {}
+
+    def _client(self):
+        """Client Redis, ou None (nouvel essai de connexion au plus toutes les 30 s)"""
+        if self._redis is not None or not self.redis_url:
+            return self._redis
+        if time.time() - self._redis_checked_at < 30:
+            return None
+        self._redis_checked_at = time.time()
+        try:
+            import redis
+            client = redis.from_url(self.redis_url, decode_responses=True, socket_timeout=2)
+            client.ping()
+            self._redis = client
+        except Exception as e:
+            logger.warning(f"⚠️ Redis indisponible pour le registre des lives, registre local au worker: {e}")
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"⚠️ Registre des lives: erreur Redis, registre local au worker: {e}")
+        self._redis = None
+        self._redis_checked_at = time.time()
+
+    # ------------------------------------------------------------------
+    # Stockage clé/valeur (Redis ou mémoire)
+
+    def _set(self, key: str, value: str, ttl: int):
+        client = self._client()
+        if client is not None:
+            try:
+                client.set(key, value, ex=ttl)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            self._local[key] = (value, time.time() + ttl)
+
+    def _get(self, key: str) -> Optional[str]:
+        client = self._client()
+        if client is not None:
+            try:
+                return client.get(key)
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                self._local.pop(key, None)
+                return None
+            return entry[0]
+
+    def _delete(self, *keys: str):
+        client = self._client()
+        if client is not None:
+            try:
+                client.delete(*keys)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def _track(self, code: str, active: bool):
+        """Index des lives en cours (démarrage ou actifs)"""
+        client = self._client()
+        if client is not None:
+            try:
+                if active:
+                    client.sadd(ACTIVE_SET_KEY, code)
+                else:
+                    client.srem(ACTIVE_SET_KEY, code)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            if active:
+                self._local_active.add(code)
+            else:
+                self._local_active.discard(code)
+
+    # ------------------------------------------------------------------
+    # Lives
+
+    def exists(self, code: str) -> bool:
+        return self._get(_live_key(code)) is not None
+
+    def reserve(self, live: dict):
+        """Réserver le code et la capacité CPU d'un live pendant le démarrage de FFmpeg"""
+        self._set(_live_key(live['code']), json.dumps({**live, 'active': False, 'starting': True}), STARTING_TTL)
+        self._track(live['code'], True)
+
+    def discard(self, code: str):
+        """Abandonner une réservation (démarrage de FFmpeg échoué)"""
+        self._delete(_live_key(code))
+        self._track(code, False)
+
+    def create(self, live: dict):
+        """Enregistrer un live actif (rafraîchi ensuite par touch())"""
+        self._set(_live_key(live['code']), json.dumps(live), ACTIVE_TTL)
+        self._set(_user_key(live['started_by']), live['code'], ACTIVE_TTL)
+        self._track(live['code'], True)
+
+    def running(self) -> List[dict]:
+        """Lives actifs ou en démarrage, tous nœuds confondus"""
+        client = self._client()
+        codes = None
+        if client is not None:
+            try:
+                codes = client.smembers(ACTIVE_SET_KEY)
+            except Exception as e:
+                self._redis_failed(e)
+        if codes is None:
+            with self._lock:
+                codes = set(self._local_active)
+
+        lives = []
+        for code in codes:
+            live = self.get(code)
+            if live and (live.get('active') or live.get('starting')):
+                lives.append(live)
+            else:
+                self._track(code, False)  # Expiré sans arrêt propre (worker disparu)
+        return lives
+
+    def get(self, code: str) -> Optional[dict]:
+        raw = self._get(_live_key(code))
+        live = json.loads(raw) if raw else None
+        self._lookups[code] = (live, time.monotonic())
+        return live
+
+    def get_cached(self, code: str) -> Optional[dict]:
+        """Lecture tolérant LOOKUP_CACHE_SECONDS de retard (requêtes de segments HLS)"""
+        cached = self._lookups.get(code)
+        if cached is not None and time.monotonic() - cached[1] < LOOKUP_CACHE_SECONDS:
+            return cached[0]
+        return self.get(code)
+
+    def touch(self, live: dict) -> bool:
+        """Prolonger un live actif (worker propriétaire de FFmpeg); False s'il a été arrêté"""
+        code = live['code']
+        current = self.get(code)
+        if current is None:
+            # Registre perdu (Redis vidé, bascule vers le registre local): réenregistrer
+            self.create(live)
+            return True
+        if not current.get('active'):
+            return False
+        client = self._client()
+        if client is not None:
+            try:
+                with client.pipeline(transaction=False) as pipe:
+                    pipe.expire(_live_key(code), ACTIVE_TTL)
+                    pipe.expire(_user_key(live['started_by']), ACTIVE_TTL)
+                    pipe.execute()
+                return True
+            except Exception as e:
+                self._redis_failed(e)
+        self.create(live)
+        return True
+
+    def active_for_user(self, user_id: int) -> Optional[dict]:
+        code = self._get(_user_key(user_id))
+        if not code:
+            return None
+        live = self.get(code)
+        return live if live and live.get('active') else None
+
+    def deactivate(self, code: str) -> Optional[dict]:
+        """Marquer un live terminé (conservé ENDED_TTL pour les spectateurs)"""
+        live = self.get(code)
+        if not live:
+            return None
+        if live.get('active'):
+            live['active'] = False
+            live['ended_at'] = datetime.utcnow().isoformat()
+            live['viewer_count'] = self.viewer_count(code)
+            self._set(_live_key(code), json.dumps(live), ENDED_TTL)
+            if self._get(_user_key(live['started_by'])) == code:
+                self._delete(_user_key(live['started_by']))
+            self._delete(_viewers_key(code))
+            self._track(code, False)
+            with self._lock:
+                self._local_viewers.pop(code, None)
+        self._lookups.pop(code, None)
+        return live
+
+    # ------------------------------------------------------------------
+    # Spectateurs
+
+    def heartbeat(self, code: str, viewer_id: str) -> int:
+        """Enregistrer le ping d'un spectateur; renvoie le nombre de spectateurs actifs"""
+        now = time.time()
+        client = self._client()
+        if client is not None:
+            try:
+                key = _viewers_key(code)
+                with client.pipeline(transaction=False) as pipe:
+                    pipe.zadd(key, {viewer_id: now})
+                    pipe.zremrangebyscore(key, '-inf', now - VIEWER_TIMEOUT)
+                    pipe.zcard(key)
+                    pipe.expire(key, VIEWER_TIMEOUT * 3)
+                    return pipe.execute()[2]
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            viewers = self._local_viewers.setdefault(code, {})
+            viewers[viewer_id] = now
+            cutoff = now - VIEWER_TIMEOUT
+            self._local_viewers[code] = {k: v for k, v in viewers.items() if v > cutoff}
+            return len(self._local_viewers[code])
+
+    def viewer_count(self, code: str) -> int:
+        cutoff = time.time() - VIEWER_TIMEOUT
+        client = self._client()
+        if client is not None:
+            try:
+                return client.zcount(_viewers_key(code), cutoff, '+inf')
+            except Exception as e:
+                self._redis_failed(e)
+        with self._lock:
+            return sum(1 for ts in self._local_viewers.get(code, {}).values() if ts > cutoff)
+
+
+# Instance globale
+live_registry = LiveRegistry(os.getenv('LIVE_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
@@ -7,12 +7,15 @@ import os
 import subprocess
 import tempfile
 import logging
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, Optional
 from src.models.database import db
 from src.models.user import UserClip, Video
 from src.models.notification import Notification, NotificationType
 from src.config.bunny_config import BUNNY_CONFIG
+from src.services.clip_extractor import ClipSource, ClipExtractionError, clip_extractor
+from src.services.source_video_cache import source_video_cache, local_video_file
 import requests
 
 logger = logging.getLogger(__name__)
@@ -153,17 +156,32 @@ class ManualClipService:
             logger.info(f"Creating clip from Bunny video: {video.bunny_video_id}")
             logger.info(f"Cutting from {clip.start_time}s to {clip.end_time}s")
             
-            # Télécharger la vidéo source via API (utilise méthode existante)
-            source_path = self._download_bunny_video(video.bunny_video_id)
-            
+            # Extraire seulement les GOP utiles (requêtes Range / segments HLS) + smart cut,
+            # depuis l'enregistrement local ou le cache partagé s'ils sont disponibles
+            with source_video_cache.cached(video.bunny_video_id, 'source') as cached_path:
+                local_sources = [ClipSource(url=path, label=label) for path, label in (
+                    (local_video_file(video), 'fichier local'), (cached_path, 'cache')
+                ) if path]
+                try:
+                    result = clip_extractor.extract(
+                        local_sources + self._clip_sources(video.bunny_video_id, config),
+                        clip.start_time, clip.end_time
+                    )
+                    clip_path = result.path
+                    src_w, src_h = result.width, result.height
+                except ClipExtractionError as e:
+                    result = None
+                    logger.warning(f"⚠️ Extraction par plage impossible, téléchargement complet: {e}")
+
+            if result is None:
+                # Dernier recours: vidéo source complète (cache partagé)
+                with self.source_video(video) as source_path:
+                    src_w, src_h = self._get_video_resolution(source_path)
+                    clip_path = self._cut_video_local(source_path, clip.start_time, clip.end_time)
+
             # 🔍 ANALYSE RÉSOLUTION SOURCE
-            src_w, src_h = self._get_video_resolution(source_path)
             logger.info(f"🔍 Source Resolution: {src_w}x{src_h}")
             
-            # Découper localement
-            duration = clip.end_time - clip.start_time
-            clip_path = self._cut_video_local(source_path, clip.start_time, clip.end_time)
-            
             # 🔍 ANALYSE RÉSOLUTION CLIP
             clip_w, clip_h = self._get_video_resolution(clip_path)
             logger.info(f"🔍 Clip Resolution: {clip_w}x{clip_h}")
@@ -202,7 +220,44 @@ class ManualClipService:
             db.session.commit()
             return False
     
-    def _download_bunny_video(self, video_id: str) -> str:
+    def _clip_sources(self, video_id: str, config: dict) -> list:
+        """
+        Sources lisibles par plage, par ordre de préférence:
+        original (API), MP4 encodés (CDN), puis playlists HLS (CDN)
+        """
+        sources = [ClipSource(
+            url=f"https://video.bunnycdn.com/library/{config['library_id']}/videos/{video_id}/mp4/original",
+            headers={'AccessKey': config['api_key']},
+            label='original'
+        )]
+        hostname = config.get('cdn_hostname')
+        if hostname:
+            qualities = ['1080p', '720p', '480p']
+            sources += [ClipSource(url=f"https://{hostname}/{video_id}/play_{quality}.mp4", label=f"mp4 {quality}")
+                        for quality in qualities]
+            sources += [ClipSource(url=f"https://{hostname}/{video_id}/{quality}/video.m3u8", label=f"hls {quality}")
+                        for quality in qualities]
+        return sources
+
+    @contextmanager
+    def source_video(self, video: Video):
+        """
+        Vidéo source complète en local: fichier d'enregistrement s'il est encore sur le
+        serveur, sinon copie du cache partagé (téléchargée une seule fois pour tous les jobs)
+        """
+        local_path = local_video_file(video)
+        if local_path:
+            yield local_path
+            return
+        if not video.bunny_video_id:
+            raise ValueError("Source video must have a Bunny video ID")
+        with source_video_cache.source(
+            video.bunny_video_id, 'source',
+            lambda dest: self._download_bunny_video(video.bunny_video_id, dest)
+        ) as path:
+            yield path
+
+    def _download_bunny_video(self, video_id: str, dest_path: str = None) -> str:
         """
         Télécharge une vidéo depuis Bunny Stream via l'API
         Si 'original' n'existe pas, fallback sur les versions encodées via CDN
@@ -217,7 +272,7 @@ class ManualClipService:
         try:
             response = requests.get(download_url, headers=headers, stream=True)
             if response.status_code == 200:
-                return self._save_stream_to_temp(response)
+                return self._save_stream_to_temp(response, dest_path)
             else:
                 logger.warning(f"Original file not found (Status {response.status_code}). Trying fallbacks...")
         except Exception as e:
@@ -238,17 +293,17 @@ class ManualClipService:
                 response = requests.get(cdn_url, stream=True)
                 if response.status_code == 200:
                     logger.info(f"✅ Found working fallback: {quality}")
-                    return self._save_stream_to_temp(response)
+                    return self._save_stream_to_temp(response, dest_path)
             except Exception as e:
                 logger.warning(f"Fallback {quality} failed: {e}")
                 
         raise ValueError(f"Could not download video {video_id} (Original + Fallbacks failed)")
 
-    def _save_stream_to_temp(self, response) -> str:
+    def _save_stream_to_temp(self, response, dest_path: str = None) -> str:
         """Helper pour sauvegarder un stream dans un fichier temp"""
-        temp_file = os.path.join(self.temp_dir, f"source_{datetime.now().timestamp()}.mp4")
+        temp_file = dest_path or os.path.join(self.temp_dir, f"source_{datetime.now().timestamp()}.mp4")
         with open(temp_file, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
                 f.write(chunk)
         logger.info(f"Downloaded video to {temp_file}")
         return temp_file
@@ -0,0 +1,265 @@
+"""
+Métriques Prometheus (/metrics)
+- Cycle de vie des requêtes Flask: histogramme de latence, requêtes en cours et compteur par
+  code de statut, étiquetés par méthode et endpoint (nom de la règle Flask, pas l'URL:
+  nombre de séries borné)
+- Tâches Celery: durée par tâche et état, succès/échecs; chaque worker expose ses métriques
+  sur CELERY_METRICS_PORT (job 'celery-workers' de prometheus.yml)
+- Longueur des files Celery (LLEN sur le broker au moment du scrape, une commande par file)
+- Enregistreurs FFmpeg: fps et vitesse (speed=) par terrain, enregistrements actifs
+- Plusieurs workers gunicorn: avec PROMETHEUS_MULTIPROC_DIR, les valeurs sont en mémoire
+  partagée (fichiers mmap par processus, agrégés au scrape; voir gunicorn.conf.py)
+Un scrape ne fait que lire les séries: aucun health check, aucune requête SQL.
+Noms alignés sur docker/config (alert_rules.yml, tableau de bord Grafana).
+Sans prometheus_client, l'instrumentation est inactive et /metrics répond 503.
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from flask import Flask, Response, g, got_request_exception, request
+
+# Les fichiers mmap sont ouverts dès la création des métriques: le répertoire doit exister
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # Métriques désactivées
+    prometheus_client = None
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+CELERY_QUEUES = ('celery', 'video_processing', 'notifications', 'maintenance', 'payments')
+
+
+def _multiprocess() -> bool:
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+if prometheus_client is not None:
+    HTTP_REQUEST_DURATION = Histogram(
+        'flask_http_request_duration_seconds', 'Durée des requêtes HTTP',
+        ['method', 'endpoint'], buckets=LATENCY_BUCKETS)
+    HTTP_REQUESTS = Counter(
+        'flask_http_request', 'Requêtes HTTP par code de statut',
+        ['method', 'endpoint', 'status'])
+    HTTP_EXCEPTIONS = Counter(
+        'flask_http_request_exceptions', 'Exceptions non gérées pendant une requête HTTP',
+        ['method', 'endpoint'])
+    HTTP_IN_PROGRESS = Gauge(
+        'flask_http_requests_in_progress', 'Requêtes HTTP en cours',
+        ['method', 'endpoint'], multiprocess_mode='livesum')
+
+    CELERY_TASK_DURATION = Histogram(
+        'celery_task_duration_seconds', 'Durée des tâches Celery',
+        ['task', 'state'], buckets=TASK_BUCKETS)
+    CELERY_TASK_SUCCEEDED = Counter('celery_task_succeeded', 'Tâches Celery réussies', ['task'])
+    CELERY_TASK_FAILED = Counter('celery_task_failed', 'Tâches Celery en échec', ['task'])
+    CELERY_WORKERS = Gauge('celery_workers_total', 'Workers Celery démarrés', multiprocess_mode='livesum')
+
+    ACTIVE_RECORDINGS = Gauge(
+        'padelvar_active_recordings_total', 'Enregistrements FFmpeg en cours',
+        multiprocess_mode='livesum')
+    RECORDER_FPS = Gauge(
+        'padelvar_recorder_fps', 'Images par seconde de l\'enregistreur FFmpeg',
+        ['club_id', 'court_id'], multiprocess_mode='livemostrecent')
+    RECORDER_SPEED = Gauge(
+        'padelvar_recorder_speed_ratio', 'Vitesse de l\'enregistreur FFmpeg (1 = temps réel)',
+        ['club_id', 'court_id'], multiprocess_mode='livemostrecent')
+
+
+# ----------------------------------------------------------------------
+# Requêtes Flask
+
+def init_app(app: Flask):
+    """Instrumenter les requêtes et exposer /metrics (à appeler avant les autres before_request)"""
+    app.add_url_rule('/metrics', 'prometheus_metrics', metrics_response, methods=['GET'])
+    if prometheus_client is None:
+        logger.warning("⚠️ prometheus_client non installé: métriques désactivées")
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    got_request_exception.connect(_count_exception, app, weak=False)
+    if _multiprocess():
+        logger.info(f"📈 Métriques Prometheus partagées entre workers ({os.environ['PROMETHEUS_MULTIPROC_DIR']})")
+
+
+def _labels():
+    return request.method, request.endpoint or 'none'
+
+
+def _start_request():
+    labels = _labels()
+    g._metrics_request = (labels, time.perf_counter())
+    HTTP_IN_PROGRESS.labels(*labels).inc()
+
+
+def _finish_request(response):
+    started = g.get('_metrics_request')
+    if started is not None:
+        labels, t0 = started
+        # Réponses en flux (SSE, MJPEG): temps jusqu'aux en-têtes
+        HTTP_REQUEST_DURATION.labels(*labels).observe(time.perf_counter() - t0)
+        HTTP_REQUESTS.labels(*labels, str(response.status_code)).inc()
+    return response
+
+
+def _end_request(exc):
+    started = g.pop('_metrics_request', None)
+    if started is not None:
+        HTTP_IN_PROGRESS.labels(*started[0]).dec()
+
+
+def _count_exception(sender, exception, **extra):
+    HTTP_EXCEPTIONS.labels(*_labels()).inc()
+
+
+# ----------------------------------------------------------------------
+# Files Celery (lues au scrape)
+
+class CeleryQueueCollector:
+    """Longueur des files Celery sur le broker Redis"""
+
+    def __init__(self, broker_url: str = None, queues=CELERY_QUEUES):
+        self.broker_url = broker_url if broker_url and broker_url.startswith('redis') else None
+        self.queues = queues
+        self._redis = None
+        self._redis_checked_at = 0.0
+
+    def _client(self):
+        """Client Redis, ou None (nouvel essai de connexion au plus toutes les 30 s)"""
+        if self._redis is not None or not self.broker_url:
+            return self._redis
+        if time.time() - self._redis_checked_at < 30:
+            return None
+        self._redis_checked_at = time.time()
+        try:
+            import redis
+            client = redis.from_url(self.broker_url, socket_timeout=1)
+            client.ping()
+            self._redis = client
+        except Exception as e:
+            logger.warning(f"⚠️ Broker Celery injoignable, longueur des files non exportée: {e}")
+        return self._redis
+
+    def collect(self):
+        client = self._client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for queue_name in self.queues:
+                pipe.llen(queue_name)
+            lengths = pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Longueur des files Celery indisponible: {e}")
+            self._redis = None
+            self._redis_checked_at = time.time()
+            return
+        family = GaugeMetricFamily('celery_queue_length', 'Tâches en attente par file Celery', labels=['queue'])
+        for queue_name, length in zip(self.queues, lengths):
+            family.add_metric([queue_name], length)
+        yield family
+
+
+_queue_registry = None
+
+
+def _registry():
+    """Registre lu au scrape: fichiers mmap de tous les processus, ou registre du processus"""
+    if _multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def metrics_response():
+    """Exposition Prometheus (coût proportionnel au nombre de séries)"""
+    global _queue_registry
+    if prometheus_client is None:
+        return Response('prometheus_client non installé\n', status=503, mimetype='text/plain')
+    if _queue_registry is None:
+        _queue_registry = CollectorRegistry()
+        _queue_registry.register(CeleryQueueCollector(Config.CELERY_BROKER_URL))
+    body = prometheus_client.generate_latest(_registry()) + prometheus_client.generate_latest(_queue_registry)
+    return Response(body, mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+# ----------------------------------------------------------------------
+# Tâches Celery
+
+_task_started: Dict[str, float] = {}
+
+
+def instrument_celery(celery):
+    """Durées et résultats des tâches; serveur /metrics du worker sur CELERY_METRICS_PORT"""
+    if prometheus_client is None:
+        return
+    from celery import signals
+    signals.task_prerun.connect(_task_prerun, weak=False)
+    signals.task_postrun.connect(_task_postrun, weak=False)
+    signals.worker_ready.connect(_worker_ready, weak=False)
+    signals.worker_process_shutdown.connect(_worker_process_shutdown, weak=False)
+
+
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    name = getattr(task, 'name', 'unknown')
+    if started is not None:
+        CELERY_TASK_DURATION.labels(name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+    if state == 'SUCCESS':
+        CELERY_TASK_SUCCEEDED.labels(name).inc()
+    elif state == 'FAILURE':
+        CELERY_TASK_FAILED.labels(name).inc()
+
+
+def _worker_ready(sender=None, **kwargs):
+    port = int(os.getenv('CELERY_METRICS_PORT', '9540'))
+    if not _multiprocess():
+        logger.warning("⚠️ PROMETHEUS_MULTIPROC_DIR absent: seules les métriques du processus principal "
+                       "du worker sont exposées (pas celles des processus du pool)")
+    try:
+        prometheus_client.start_http_server(port, registry=_registry())
+        CELERY_WORKERS.set(1)
+        logger.info(f"📈 Métriques du worker Celery sur le port {port}")
+    except OSError as e:
+        logger.warning(f"⚠️ Serveur de métriques Celery non démarré (port {port}): {e}")
+
+
+def _worker_process_shutdown(pid=None, **kwargs):
+    if _multiprocess() and pid:
+        multiprocess.mark_process_dead(pid)
+
+
+# ----------------------------------------------------------------------
+# Enregistreurs FFmpeg
+
+def set_active_recordings(count: int):
+    if prometheus_client is not None:
+        ACTIVE_RECORDINGS.set(count)
+
+
+def set_recorder_progress(club_id, court_id, fps: Optional[float], speed: Optional[float]):
+    """Dernière ligne de progression FFmpeg d'un terrain (0 à l'arrêt)"""
+    if prometheus_client is None:
+        return
+    labels = (str(club_id), str(court_id))
+    if fps is not None:
+        RECORDER_FPS.labels(*labels).set(fps)
+    if speed is not None:
+        RECORDER_SPEED.labels(*labels).set(speed)
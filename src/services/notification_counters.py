@@ -0,0 +1,202 @@
+"""
+Compteurs de notifications non lues (badge)
+- Un hash Redis user_id -> nombre de non lues: la lecture du badge ne touche pas la base
+- Champ absent (premier accès, invalidation, Redis vidé): recompté en base via l'index
+  (user_id, is_read, created_at) puis mémorisé; sans Redis, comptage direct en base
+- Tenus à jour après commit par les événements ORM (création, lecture, suppression d'une
+  notification); les UPDATE/DELETE groupés invalident explicitement les compteurs concernés
+- Le hash expire toutes les NOTIFICATION_COUNTER_TTL secondes: borne la dérive d'un
+  compteur rempli pendant une écriture concurrente
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from src.models.database import db
+
+logger = logging.getLogger(__name__)
+
+HASH_KEY = 'padel:notifications:unread'
+_DELTAS_KEY = '_unread_deltas'
+_INVALIDATED_KEY = '_unread_invalidated'
+_ALL = '*'
+
+# Applique des variations (user_id, delta)* aux seuls compteurs déjà connus, sans passer sous 0
+_APPLY_DELTAS = """
+for i = 1, #ARGV, 2 do
+  local current = redis.call('HGET', KEYS[1], ARGV[i])
+  if current then
+    local value = tonumber(current) + tonumber(ARGV[i + 1])
+    if value < 0 then value = 0 end
+    redis.call('HSET', KEYS[1], ARGV[i], value)
+  end
+end
+return 1
+"""
+
+# Mémorise un compteur recompté en base (sans écraser une valeur plus récente)
+_FILL = """
+redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+if redis.call('TTL', KEYS[1]) < 0 then
+  redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return redis.call('HGET', KEYS[1], ARGV[1])
+"""
+
+
+class UnreadCounters:
+    """Compteurs de non lues par utilisateur"""
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url
+        self.ttl = int(os.getenv('NOTIFICATION_COUNTER_TTL', '3600'))
+        self._redis = None
+        self._redis_checked_at = 0.0
+        self._apply_script = None
+        self._fill_script = None
+
+    def _client(self):
+        """Client Redis, ou None (nouvel essai de connexion au plus toutes les 30 s)"""
+        if self._redis is not None or not self.redis_url:
+            return self._redis
+        if time.time() - self._redis_checked_at < 30:
+            return None
+        self._redis_checked_at = time.time()
+        try:
+            import redis
+            client = redis.from_url(self.redis_url, decode_responses=True, socket_timeout=2)
+            client.ping()
+            self._apply_script = client.register_script(_APPLY_DELTAS)
+            self._fill_script = client.register_script(_FILL)
+            self._redis = client
+        except Exception as e:
+            logger.warning(f"⚠️ Redis indisponible pour les compteurs de notifications, comptage en base: {e}")
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"⚠️ Compteurs de notifications: erreur Redis, comptage en base: {e}")
+        self._redis = None
+        self._redis_checked_at = time.time()
+
+    @staticmethod
+    def count_from_db(user_id: int) -> int:
+        from src.models.notification import Notification
+        return db.session.query(func.count(Notification.id)).filter(
+            Notification.user_id == user_id,
+            Notification.is_read.is_(False)
+        ).scalar() or 0
+
+    def get(self, user_id: int) -> int:
+        """Nombre de notifications non lues (O(1) tant que le compteur est en cache)"""
+        client = self._client()
+        if client is not None:
+            try:
+                value = client.hget(HASH_KEY, user_id)
+                if value is not None:
+                    return max(0, int(value))
+            except Exception as e:
+                self._redis_failed(e)
+                client = None
+
+        count = self.count_from_db(user_id)
+        if client is not None:
+            try:
+                value = self._fill_script(keys=[HASH_KEY], args=[user_id, count, self.ttl], client=client)
+                return max(0, int(value))
+            except Exception as e:
+                self._redis_failed(e)
+        return count
+
+    def apply(self, deltas: Dict[int, int]):
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        client = self._client()
+        if not deltas or client is None:
+            return
+        args = []
+        for user_id, delta in deltas.items():
+            args.extend((user_id, delta))
+        try:
+            self._apply_script(keys=[HASH_KEY], args=args, client=client)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def invalidate(self, user_ids: Iterable[int]):
+        """Compteurs recomptés en base à la prochaine lecture ('*': tous)"""
+        client = self._client()
+        if client is None:
+            return
+        try:
+            if _ALL in user_ids:
+                client.delete(HASH_KEY)
+            elif user_ids:
+                client.hdel(HASH_KEY, *user_ids)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def invalidate_after_commit(self, session: Session, user_ids: Optional[Iterable[int]] = None):
+        """À appeler après un UPDATE/DELETE groupé de notifications (None: tous les utilisateurs)"""
+        pending = session.info.setdefault(_INVALIDATED_KEY, set())
+        pending.update(user_ids if user_ids is not None else (_ALL,))
+
+
+# Instance globale
+unread_counters = UnreadCounters(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+
+
+# ----------------------------------------------------------------------
+# Mise à jour sur événements ORM (appliquée après commit)
+
+def _add_delta(target, delta: int):
+    session = inspect(target).session
+    if session is not None:
+        deltas = session.info.setdefault(_DELTAS_KEY, {})
+        deltas[target.user_id] = deltas.get(target.user_id, 0) + delta
+
+
+def _register_model_events():
+    from src.models.notification import Notification
+
+    @event.listens_for(Notification, 'after_insert')
+    def _notification_created(mapper, connection, target):
+        if not target.is_read:
+            _add_delta(target, 1)
+
+    @event.listens_for(Notification, 'after_update')
+    def _notification_updated(mapper, connection, target):
+        history = inspect(target).attrs.is_read.history
+        if history.has_changes():
+            was_read = bool(history.deleted[0]) if history.deleted else False
+            if was_read != bool(target.is_read):
+                _add_delta(target, -1 if target.is_read else 1)
+
+    @event.listens_for(Notification, 'after_delete')
+    def _notification_deleted(mapper, connection, target):
+        if not target.is_read:
+            _add_delta(target, -1)
+
+
+_register_model_events()
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    deltas = session.info.pop(_DELTAS_KEY, None)
+    invalidated = session.info.pop(_INVALIDATED_KEY, None)
+    if invalidated:
+        unread_counters.invalidate(invalidated)
+        if deltas:
+            deltas = {user_id: delta for user_id, delta in deltas.items()
+                      if user_id not in invalidated and _ALL not in invalidated}
+    if deltas:
+        unread_counters.apply(deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_DELTAS_KEY, None)
+    session.info.pop(_INVALIDATED_KEY, None)
@@ -15,6 +15,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from ..models.database import db
 from ..models.user import User, Transaction, TransactionStatus
+from . import credit_ledger
 from ..tasks.notification_tasks import send_notification
 
 logger = logging.getLogger(__name__)
@@ -225,8 +226,8 @@ class PaymentService:
                 raise ValueError(f"Utilisateur {transaction.user_id} non trouvé")
             
             # AJOUTER LES CRÉDITS (transaction critique)
-            old_balance = user.credits_balance
-            user.credits_balance += transaction.credits_amount
+            credit_ledger.credit(user, transaction.credits_amount, 'purchase',
+                                 reference=f"transaction:{transaction.id}", performed_by_id=user.id)
             
             # Marquer la transaction comme complétée
             transaction.status = TransactionStatus.COMPLETED
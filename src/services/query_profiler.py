@@ -0,0 +1,214 @@
+"""
+Profilage SQL par requête HTTP
+- Écoute before/after_cursor_execute des moteurs SQLAlchemy et le cycle de vie des requêtes Flask
+- Par requête: nombre de requêtes SQL, temps base de données, requête la plus lente,
+  requêtes identiques répétées (signature d'un N+1)
+- En mode debug: en-têtes X-DB-* sur chaque réponse
+- Agrégats par endpoint (percentiles sur une fenêtre glissante) pour l'endpoint d'admin;
+  les agrégats sont propres à chaque worker gunicorn
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+# Longueur max des requêtes exposées par l'endpoint d'admin
+STATEMENT_PREVIEW = 500
+
+
+def _normalize(statement: str) -> str:
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Percentile (rang le plus proche) d'une liste triée"""
+    if not sorted_values:
+        return 0
+    index = math.ceil(percent / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(index, len(sorted_values) - 1))]
+
+
+def _distribution(values) -> dict:
+    ordered = sorted(values)
+    return {
+        'p50': round(_percentile(ordered, 50), 2),
+        'p95': round(_percentile(ordered, 95), 2),
+        'p99': round(_percentile(ordered, 99), 2),
+        'max': round(ordered[-1], 2) if ordered else 0
+    }
+
+
+class RequestQueries:
+    """Requêtes SQL d'une requête HTTP"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.db_time += duration
+        self.statements[statement] += 1
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def duplicates(self, threshold: int) -> Dict[str, int]:
+        return {s: n for s, n in self.statements.items() if n >= threshold}
+
+
+class EndpointStats:
+    """Agrégats d'un endpoint sur les `window` dernières requêtes"""
+
+    def __init__(self, window: int):
+        self.requests = 0
+        self.query_counts = deque(maxlen=window)
+        self.db_times = deque(maxlen=window)
+        self.durations = deque(maxlen=window)
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.duplicates = Counter()  # statement -> nombre de requêtes HTTP où il a été répété
+
+    def add(self, queries: RequestQueries, duration: float, duplicates: Dict[str, int]):
+        self.requests += 1
+        self.query_counts.append(queries.count)
+        self.db_times.append(queries.db_time)
+        self.durations.append(duration)
+        if queries.slowest_time > self.slowest_time:
+            self.slowest_time = queries.slowest_time
+            self.slowest_statement = queries.slowest_statement
+        self.duplicates.update(duplicates.keys())
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'queries': _distribution(self.query_counts),
+            'db_time_ms': _distribution([t * 1000 for t in self.db_times]),
+            'total_time_ms': _distribution([t * 1000 for t in self.durations]),
+            'slowest_query': {
+                'time_ms': round(self.slowest_time * 1000, 2),
+                'statement': (self.slowest_statement or '')[:STATEMENT_PREVIEW] or None
+            },
+            'repeated_statements': [
+                {'statement': statement[:STATEMENT_PREVIEW], 'requests': n} for statement, n in self.duplicates.most_common(5)
+            ]
+        }
+
+
+class QueryProfiler:
+    """Instrumentation SQL par endpoint"""
+
+    def __init__(self):
+        self.enabled = os.getenv('QUERY_PROFILER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.slow_query_seconds = float(os.getenv('SLOW_QUERY_MS', '200')) / 1000
+        # Une même requête exécutée N fois dans une requête HTTP: signature d'un N+1
+        self.duplicate_threshold = int(os.getenv('QUERY_PROFILER_DUPLICATE_THRESHOLD', '5'))
+        self.window = int(os.getenv('QUERY_PROFILER_WINDOW', '500'))
+        self.headers = False
+        self._stats: Dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app: Flask):
+        if not self.enabled:
+            return
+        self.headers = app.debug or os.getenv('QUERY_PROFILER_HEADERS', 'false').lower() in ('1', 'true', 'yes')
+
+        if not self._listening:
+            # Tous les moteurs: les listeners sont indépendants de l'app (une seule inscription)
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # ------------------------------------------------------------------
+    # Événements
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Début porté par le contexte d'exécution: une requête en erreur (sans
+        # after_cursor_execute) ne laisse rien sur la connexion
+        if context is not None and has_request_context() and '_db_queries' in g:
+            context._profiler_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_profiler_started', None)
+        if started is None or not has_request_context() or '_db_queries' not in g:
+            return
+        duration = time.perf_counter() - started
+        statement = _normalize(statement)
+        g._db_queries.record(statement, duration)
+        if duration >= self.slow_query_seconds:
+            logger.warning(f"🐢 Requête SQL lente ({duration * 1000:.0f} ms) sur {request.endpoint}: {statement[:300]}")
+
+    def _start_request(self):
+        g._db_queries = RequestQueries()
+
+    def _finish_request(self, response):
+        queries = g.pop('_db_queries', None)
+        if queries is None:
+            return response
+        duration = time.perf_counter() - queries.started
+        duplicates = queries.duplicates(self.duplicate_threshold)
+        endpoint = request.endpoint or 'unmatched'
+
+        if duplicates:
+            worst, times = max(duplicates.items(), key=lambda item: item[1])
+            logger.warning(f"🔁 N+1 probable sur {endpoint}: requête répétée {times} fois: {worst[:200]}")
+
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats(self.window)
+            stats.add(queries, duration, duplicates)
+
+        if self.headers:
+            response.headers['X-DB-Query-Count'] = str(queries.count)
+            response.headers['X-DB-Time-Ms'] = f"{queries.db_time * 1000:.1f}"
+            response.headers['X-DB-Slowest-Ms'] = f"{queries.slowest_time * 1000:.1f}"
+            response.headers['X-DB-Duplicate-Queries'] = str(sum(duplicates.values()))
+        return response
+
+    # ------------------------------------------------------------------
+    # Consultation
+
+    def snapshot(self, sort: str = 'db_time') -> dict:
+        """Agrégats par endpoint, triés par temps base (p95) ou nombre de requêtes (p95)"""
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in self._stats.items()}
+        key = {
+            'queries': lambda item: item[1]['queries']['p95'],
+            'requests': lambda item: item[1]['requests'],
+        }.get(sort, lambda item: item[1]['db_time_ms']['p95'])
+        return {
+            'pid': os.getpid(),
+            'window': self.window,
+            'slow_query_ms': self.slow_query_seconds * 1000,
+            'duplicate_threshold': self.duplicate_threshold,
+            'endpoints': dict(sorted(endpoints.items(), key=key, reverse=True))
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# Instance globale
+query_profiler = QueryProfiler()
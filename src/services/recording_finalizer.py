@@ -0,0 +1,489 @@
+"""
+Finalisation des enregistrements en arrière-plan
+L'arrêt HTTP ne fait que marquer la session comme arrêtée et créer une tâche
+RecordingFinalization; ce worker enchaîne ensuite l'arrêt de FFmpeg, l'assemblage
+des segments, l'incrustation des overlays différés, la validation du fichier, la création de la vidéo, l'upload Bunny et la notification.
+
+Les tâches sont persistées en base: chaque worker gunicorn interroge la file,
+réserve une tâche par UPDATE conditionnel (bail) et reprend à l'étape en cours
+après un redémarrage. Une tâche liée au processus qui fait tourner FFmpeg n'est
+traitée que par lui, sauf s'il ne donne plus signe de vie. Le suivi de l'upload
+Bunny passe par son journal et peut se faire depuis n'importe quel worker.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_
+
+logger = logging.getLogger(__name__)
+
+
+class DeferStep(Exception):
+    """L'étape n'est pas terminée: la reprendre plus tard sans compter d'échec"""
+
+    def __init__(self, delay: float, reason: str = ''):
+        super().__init__(reason)
+        self.delay = delay
+
+
+def find_recording_file(recording_id: str, club_id: int) -> Optional[str]:
+    """Chercher le MP4 d'un enregistrement parmi les emplacements connus"""
+    from src.video_system.config import VideoConfig
+
+    video_dir = VideoConfig.get_video_dir(club_id)
+    possible_paths = [
+        str(video_dir / f"{recording_id}.mp4"),
+        f"static/videos/{club_id}/{recording_id}.mp4",
+        f"static/videos/{recording_id}.mp4"
+    ]
+    for path in possible_paths:
+        if os.path.exists(path) and os.path.getsize(path) > 1000:
+            return path
+    return None
+
+
+class RecordingFinalizer:
+    """Worker de finalisation des enregistrements (un par processus)"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.max_workers = int(os.environ.get('RECORDING_FINALIZER_WORKERS', '2'))
+        self.check_interval = float(os.environ.get('RECORDING_FINALIZER_POLL_SECONDS', '5'))
+        # Attente max de la vidéo par la route d'arrêt (0: réponse 202 immédiate, sans occuper le worker)
+        self.stop_wait_seconds = float(os.environ.get('RECORDING_STOP_WAIT_SECONDS', '0'))
+        self.lease_seconds = 1800  # Arrêt FFmpeg + assemblage + incrustation overlays
+        self.handoff_seconds = 120  # Délai laissé au processus qui possède FFmpeg
+        self.orphan_seconds = 300  # Propriétaire silencieux: tâche adoptée par un autre worker
+        self.retry_base_seconds = 15
+        self.retry_max_seconds = 600
+        self.upload_poll_seconds = 10
+        self.missing_file_attempts = 3
+
+        self.is_running = False
+        self._thread = None
+        self._executor = None
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    @property
+    def identity(self) -> str:
+        """Identifiant du processus courant (calculé à l'appel: gunicorn forke après l'import)"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    def start(self, app=None):
+        """Démarre le worker de finalisation"""
+        if app is not None:
+            self.app = app
+        if self.is_running:
+            logger.warning("Le worker de finalisation est déjà démarré")
+            return
+        if not self.app:
+            logger.warning("⚠️ Pas d'instance Flask - worker de finalisation non démarré")
+            return
+
+        self.is_running = True
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="RecordingFinalize"
+        )
+        self._thread = threading.Thread(target=self._poll_loop, daemon=True, name="RecordingFinalizer")
+        self._thread.start()
+        logger.info(f"✅ Worker de finalisation des enregistrements démarré ({self.identity})")
+
+    def stop(self):
+        """Arrête le worker (les tâches en cours reprendront à leur étape)"""
+        self.is_running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        logger.info("🛑 Worker de finalisation des enregistrements arrêté")
+
+    # ------------------------------------------------------------------
+    # API utilisée par les routes
+    # ------------------------------------------------------------------
+
+    def create_job(self, recording_session, stopped_by: str, performed_by_id: Optional[int]):
+        """
+        Préparer la tâche de finalisation (ajoutée à la session DB, sans commit)
+
+        Le processus qui fait tourner FFmpeg pour cet enregistrement en devient
+        propriétaire; sinon n'importe quel worker pourra la traiter.
+        """
+        from src.models.database import db
+        from src.models.user import RecordingFinalization
+
+        job = RecordingFinalization(
+            recording_id=recording_session.recording_id,
+            recording_session_id=recording_session.id,
+            stopped_by=stopped_by,
+            performed_by_id=performed_by_id,
+            state='stopping',
+            next_attempt_at=datetime.utcnow(),
+            owner=self.identity if self._owns_recording(recording_session.recording_id) else None
+        )
+        db.session.add(job)
+        return job
+
+    def submit(self, job_id: int):
+        """Traiter une tâche tout de suite dans ce processus (après commit)"""
+        if not self.is_running:
+            return
+        with self._lock:
+            if job_id in self._inflight:
+                return
+            self._inflight.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def wait_for_video(self, job_id: int, timeout: float) -> Optional[int]:
+        """
+        Attendre que la vidéo soit créée (étape 'registering' passée)
+
+        La tâche peut être traitée par un autre processus: l'état est relu en base.
+
+        Returns:
+            ID de la vidéo, ou None si elle n'existe pas encore à l'échéance
+        """
+        from src.models.database import db
+        from src.models.user import RecordingFinalization as Job
+
+        deadline = time.monotonic() + timeout
+        while True:
+            row = db.session.query(Job.video_id, Job.state).filter(Job.id == job_id).first()
+            if row is None or row.video_id or row.state in Job.TERMINAL_STATES:
+                return row.video_id if row else None
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.2)
+
+    # ------------------------------------------------------------------
+    # Boucle de scrutation
+    # ------------------------------------------------------------------
+
+    def _poll_loop(self):
+        while self.is_running:
+            try:
+                for job_id in self._due_job_ids():
+                    self.submit(job_id)
+            except Exception as e:
+                logger.error(f"❌ Erreur dans la boucle de finalisation: {e}")
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+
+    def _due_job_ids(self) -> List[int]:
+        from src.models.database import db
+        from src.models.user import RecordingFinalization as Job
+
+        with self.app.app_context():
+            now = datetime.utcnow()
+            orphan_before = now - timedelta(seconds=self.orphan_seconds)
+            rows = db.session.query(Job.id).filter(
+                Job.state.notin_(Job.TERMINAL_STATES),
+                Job.next_attempt_at <= now,
+                or_(Job.locked_until.is_(None), Job.locked_until < now),
+                or_(Job.owner.is_(None), Job.owner == self.identity, Job.updated_at < orphan_before)
+            ).order_by(Job.next_attempt_at).limit(self.max_workers * 4).all()
+
+        with self._lock:
+            return [row.id for row in rows if row.id not in self._inflight]
+
+    def _claim(self, job_id: int) -> bool:
+        """Réserver la tâche (bail) par UPDATE conditionnel: un seul worker gagne"""
+        from src.models.database import db
+        from src.models.user import RecordingFinalization as Job
+
+        now = datetime.utcnow()
+        claimed = Job.query.filter(
+            Job.id == job_id,
+            Job.state.notin_(Job.TERMINAL_STATES),
+            or_(Job.locked_until.is_(None), Job.locked_until < now)
+        ).update({
+            'locked_by': self.identity,
+            'locked_until': now + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _run(self, job_id: int):
+        from src.models.database import db
+
+        try:
+            with self.app.app_context():
+                try:
+                    if self._claim(job_id):
+                        self._process(job_id)
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"❌ Erreur finalisation tâche {job_id}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._inflight.discard(job_id)
+
+    # ------------------------------------------------------------------
+    # Machine à états
+    # ------------------------------------------------------------------
+
+    def _process(self, job_id: int):
+        from src.models.database import db
+        from src.models.user import RecordingFinalization as Job
+
+        job = Job.query.get(job_id)
+        if not job:
+            return
+        if job.owner and job.owner != self.identity:
+            logger.warning(f"♻️ Finalisation {job.recording_id}: propriétaire {job.owner} silencieux, tâche adoptée")
+            job.owner = None
+
+        while job.state not in Job.TERMINAL_STATES:
+            state = job.state
+            step = getattr(self, f"_step_{state}")
+            try:
+                next_state = step(job)
+            except DeferStep as deferred:
+                job.next_attempt_at = datetime.utcnow() + timedelta(seconds=deferred.delay)
+                self._release(job)
+                db.session.commit()
+                return
+            except Exception as e:
+                db.session.rollback()
+                job = Job.query.get(job_id)
+                self._record_failure(job, state, e)
+                self._release(job)
+                db.session.commit()
+                return
+
+            job.state = next_state
+            job.attempts = 0
+            job.last_error = None
+            if next_state == 'done':
+                job.finished_at = datetime.utcnow()
+            db.session.commit()
+            logger.info(f"➡️ Finalisation {job.recording_id}: {state} → {next_state}")
+
+        self._release(job)
+        db.session.commit()
+        logger.info(f"✅ Finalisation terminée: {job.recording_id} (vidéo {job.video_id})")
+
+    def _record_failure(self, job, state: str, error: Exception):
+        job.attempts += 1
+        job.last_error = f"{state}: {error}"
+        if job.attempts >= job.max_attempts:
+            job.state = 'failed'
+            job.finished_at = datetime.utcnow()
+            logger.error(f"❌ Finalisation {job.recording_id} abandonnée à l'étape {state}: {error}")
+            return
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** (job.attempts - 1)))
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logger.warning(
+            f"⚠️ Finalisation {job.recording_id} ({state}) échouée "
+            f"(tentative {job.attempts}/{job.max_attempts}), nouvel essai dans {delay}s: {error}"
+        )
+
+    def _release(self, job):
+        job.locked_by = None
+        job.locked_until = None
+
+    def _owns_recording(self, recording_id: str) -> bool:
+        from src.video_system.recording import video_recorder
+        from src.video_system.session_manager import session_manager
+
+        return recording_id in video_recorder.active_recordings or recording_id in session_manager.sessions
+
+    # ------------------------------------------------------------------
+    # Étapes (idempotentes)
+    # ------------------------------------------------------------------
+
+    def _step_stopping(self, job) -> str:
+        """Arrêter FFmpeg et libérer le proxy (le fichier final est produit à l'étape suivante)"""
+        from src.video_system.recording import video_recorder
+        from src.video_system.session_manager import session_manager
+
+        rid = job.recording_id
+
+        if self._owns_recording(rid):
+            if rid in video_recorder.active_recordings:
+                job.overlays_pending = bool(video_recorder.active_recordings[rid].get('deferred_overlays'))
+                video_recorder.stop_recording(rid, finalize=False)
+            if rid in session_manager.sessions:
+                session_manager.close_session(rid)
+                logger.info(f"✅ Session système fermée: {rid}")
+        else:
+            # L'arrêt a pu arriver sur un autre worker que celui qui fait tourner FFmpeg:
+            # lui laisser le temps de prendre la tâche avant de reconstituer depuis le disque
+            waited = (datetime.utcnow() - job.created_at).total_seconds()
+            if waited < self.handoff_seconds:
+                raise DeferStep(self.check_interval, 'en attente du processus FFmpeg')
+        return 'assembling'
+
+    def _step_assembling(self, job) -> str:
+        """Assembler les segments en MP4 final (fichiers locaux: même processus si possible)"""
+        from src.video_system.recording import video_recorder
+
+        job.local_path = video_recorder.finalize_recording(job.recording_id, job.recording_session.club_id)
+        return 'overlaying'
+
+    def _step_overlaying(self, job) -> str:
+        """Incruster les overlays différés (ré-encodage complet, hors requête d'arrêt)"""
+        from pathlib import Path
+        from src.video_system.recording import video_recorder
+
+        if job.overlays_pending and job.local_path and os.path.exists(job.local_path):
+            # Échec: la version sans overlay est conservée
+            video_recorder.burn_in_club_overlays(Path(job.local_path), job.recording_session.club_id)
+        job.overlays_pending = False
+        job.owner = None  # Étapes suivantes: n'importe quel worker
+        return 'validating'
+
+    def _step_validating(self, job) -> str:
+        """Vérifier que le MP4 final existe (l'assemblage peut venir d'un autre processus)"""
+        session = job.recording_session
+        path = job.local_path if job.local_path and os.path.exists(job.local_path) else None
+        path = path or find_recording_file(job.recording_id, session.club_id)
+
+        if not path:
+            if job.attempts + 1 < self.missing_file_attempts:
+                raise FileNotFoundError(f"Fichier vidéo introuvable pour {job.recording_id}")
+            logger.warning(f"⚠️ Fichier vidéo introuvable pour {job.recording_id}, vidéo créée sans fichier local")
+
+        job.local_path = path
+        return 'registering'
+
+    def _step_registering(self, job) -> str:
+        """Créer la ligne Video (dans la même transaction que le changement d'état)"""
+        from src.models.database import db
+        from src.models.user import Video
+
+        if job.video_id:
+            return 'uploading'
+
+        session = job.recording_session
+        final_duration = session.get_elapsed_minutes() * 60
+        video = Video(
+            user_id=session.user_id,
+            court_id=session.court_id,
+            title=session.title,
+            description=session.description,
+            duration=final_duration,
+            file_url=f'/videos/rec_{session.recording_id}.mp4',
+            is_unlocked=True,
+            processing_status='pending',
+            local_file_path=job.local_path
+        )
+
+        if job.local_path:
+            file_size = os.path.getsize(job.local_path)
+            # Postgres Integer: max 2147483647
+            video.file_size = file_size if file_size < 2147483647 else None
+            logger.info(f"📦 Taille fichier vidéo: {file_size / (1024*1024):.2f} MB")
+
+        db.session.add(video)
+        db.session.flush()
+        job.video_id = video.id
+        logger.info(f"🎬 Vidéo {video.id} créée pour {job.recording_id} ({final_duration / 60:.0f} min)")
+        return 'uploading'
+
+    def _step_uploading(self, job) -> str:
+        """Programmer l'upload Bunny puis attendre l'ID vidéo Bunny sans bloquer de thread"""
+        from src.models.user import Video
+
+        video = Video.query.get(job.video_id)
+        if not video or video.bunny_video_id:
+            return 'notifying'
+
+        try:
+            from src.services.bunny_storage_service import bunny_storage_service, UploadStatus
+        except Exception as e:
+            logger.warning(f"⚠️ Bunny CDN indisponible, upload ignoré pour {job.recording_id}: {e}")
+            return 'notifying'
+
+        if not job.upload_id:
+            # Segments déjà envoyés pendant le match: adopter le flux terminé à l'assemblage
+            from src.video_system.progressive_upload import stream_upload_id
+            stream = bunny_storage_service.get_upload_status(stream_upload_id(job.recording_id))
+            if stream and stream['status'] == UploadStatus.COMPLETED:
+                job.upload_id = stream['id']
+                bunny_storage_service.set_video_title(stream['bunny_video_id'], video.title)
+
+        if not job.local_path and not job.upload_id:
+            logger.warning(f"⚠️ Fichier vidéo introuvable pour upload: {job.recording_id}")
+            return 'notifying'
+
+        if job.upload_id:
+            status = bunny_storage_service.get_upload_status(job.upload_id)
+            if status is None:
+                # Absente du journal d'upload (purgée): reprogrammer l'upload
+                logger.warning(f"⚠️ Upload {job.upload_id} inconnu, reprogrammation")
+                job.upload_id = None
+            elif status.get('bunny_video_id'):
+                from src.config.bunny_config import BUNNY_CONFIG
+                cdn_hostname = BUNNY_CONFIG.get('cdn_hostname', 'vz-9b857324-07d.b-cdn.net')
+                video.bunny_video_id = status['bunny_video_id']
+                video.file_url = f"https://{cdn_hostname}/{video.bunny_video_id}/playlist.m3u8"
+                video.processing_status = 'processing'
+                logger.info(f"✅ Bunny video ID saved: {video.bunny_video_id}")
+                return 'notifying'
+            elif status['status'] == UploadStatus.FAILED and status.get('finished'):
+                if job.attempts + 1 >= job.max_attempts:
+                    raise RuntimeError(f"Upload Bunny échoué: {status.get('error_message')}")
+                job.attempts += 1
+                job.last_error = f"uploading: {status.get('error_message')}"
+                job.upload_id = None
+            else:
+                raise DeferStep(self.upload_poll_seconds, 'upload en cours')
+
+        video.processing_status = 'uploading'
+        job.upload_id = bunny_storage_service.queue_upload(
+            local_path=job.local_path,
+            title=video.title,
+            metadata={
+                'video_id': video.id,
+                'user_id': video.user_id,
+                'court_id': video.court_id,
+                'recording_id': job.recording_id,
+                'duration': (video.duration or 0) / 60
+            }
+        )
+        logger.info(f"✅ Upload Bunny programmé: {job.upload_id}")
+        raise DeferStep(self.upload_poll_seconds, 'upload programmé')
+
+    def _step_notifying(self, job) -> str:
+        """Notifier le joueur si l'arrêt ne vient pas de lui"""
+        if job.stopped_by not in ('auto', 'club', 'admin'):
+            return 'done'
+
+        from src.models.notification import Notification, NotificationType
+
+        if job.stopped_by == 'auto':
+            notif_msg = "Votre session a expiré et l'enregistrement a été arrêté automatiquement."
+        elif job.stopped_by == 'admin':
+            notif_msg = "Votre session a été arrêtée par un administrateur. La vidéo est en cours de traitement."
+        else:
+            notif_msg = "Le club a arrêté votre session d'enregistrement."
+
+        Notification.create_notification(
+            user_id=job.recording_session.user_id,
+            notification_type=NotificationType.RECORDING_STOPPED,
+            title="Enregistrement terminé",
+            message=notif_msg,
+            link="/dashboard"
+        )
+        logger.info(f"✅ Notification d'arrêt envoyée à l'utilisateur {job.recording_session.user_id}")
+        return 'done'
+
+
+# Instance globale (démarrée par create_app)
+recording_finalizer = RecordingFinalizer()
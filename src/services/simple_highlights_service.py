@@ -5,16 +5,24 @@ Génère des highlights en extrayant des clips à intervalles réguliers
 
 import os
 import requests
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 import json
 import logging
+from contextlib import contextmanager
 
 from src.models.database import db
 from src.models.user import Video, HighlightVideo, HighlightJob
 from src.config.highlights_config import HighlightsConfig
 from src.services.bunny_storage_service import bunny_storage_service
+from src.services.source_video_cache import source_video_cache, local_video_file
+from src.services.highlight_detector import HighlightDetector, DetectorSettings
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +31,16 @@ class SimpleHighlightsService:
     
     def __init__(self):
         self.config = HighlightsConfig
-        
+        # Pool borné: au plus MAX_CONCURRENT_JOBS rendus FFmpeg simultanés par worker
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.MAX_CONCURRENT_JOBS,
+            thread_name_prefix='highlights'
+        )
+        self.detector = HighlightDetector(DetectorSettings(
+            motion_weight=self.config.WEIGHTS['motion_intensity'],
+            audio_weight=self.config.WEIGHTS['audio_energy']
+        ))
+
     def create_highlights_job(self, video_id: int, user_id: int, target_duration: int = 90) -> HighlightJob:
         """Crée un job de génération de highlights"""
         
@@ -56,6 +73,19 @@ class SimpleHighlightsService:
         
         return job
     
+    def submit(self, job_id: int, app) -> None:
+        """Mettre un job en file sur le pool de génération"""
+        self._executor.submit(self._run_job, app, job_id)
+    
+    def _run_job(self, app, job_id: int):
+        with app.app_context():
+            try:
+                self.process_highlights(job_id)
+            except Exception as e:
+                logger.error(f"Error processing highlights job {job_id}: {e}")
+            finally:
+                db.session.remove()
+    
     def process_highlights(self, job_id: int) -> Optional[HighlightVideo]:
         """Traite un job de highlights (méthode principale)"""
         
@@ -63,46 +93,48 @@ class SimpleHighlightsService:
         if not job:
             raise ValueError(f"Job {job_id} not found")
         
+        # Répertoire de travail propre au job (aucune collision entre jobs concurrents)
+        scratch_dir = tempfile.mkdtemp(prefix=f"job_{job_id}_", dir=self.config.TEMP_DIR)
+        
         try:
             # Mettre à jour le statut
             job.status = 'downloading'
             job.started_at = datetime.utcnow()
-            job.progress = 10
+            job.progress = 0
             db.session.commit()
             
             logger.info(f"🎬 Starting highlight generation for job {job_id}")
             
-            # 1. Télécharger la vidéo source
-            local_video_path = self._download_video(job)
-            job.progress = 30
-            db.session.commit()
-            
-            # 2. Générer les highlights
-            job.status = 'processing'
-            db.session.commit()
-            
-            highlight_path = self._generate_simple_highlights(
-                local_video_path, 
-                job.target_duration
-            )
-            job.progress = 70
-            db.session.commit()
+            # 1. Récupérer la vidéo source (fichier local ou cache partagé)
+            with self._source_video(job) as local_video_path:
+                # 2. Détecter puis monter les highlights (10 → 40 → 80 %)
+                job.status = 'processing'
+                job.progress = 10
+                db.session.commit()
+                
+                highlight_path, timestamps = self._generate_simple_highlights(
+                    local_video_path, 
+                    job.target_duration,
+                    scratch_dir,
+                    on_detect_progress=self._progress_reporter(job, 10, 40),
+                    on_progress=self._progress_reporter(job, 40, 80)
+                )
             
             # 3. Créer l'entrée HighlightVideo
             highlight_video = HighlightVideo(
                 original_video_id=job.video_id,
-                generation_status='processing'
+                generation_status='processing',
+                clips_count=len(timestamps),
+                highlights_data=json.dumps(timestamps)
             )
             db.session.add(highlight_video)
-            db.session.commit()
             
-            # 4. Uploader vers Bunny CDN
+            # 4. Uploader vers Bunny CDN (progression des octets envoyés: 80 → 100 %)
             job.status = 'uploading'
+            job.progress = 80
             db.session.commit()
             
-            self._upload_to_bunny(highlight_video, highlight_path)
-            job.progress = 90
-            db.session.commit()
+            self._upload_to_bunny(highlight_video, highlight_path, self._progress_reporter(job, 80, 99))
             
             # 5. Finaliser
             highlight_video.generation_status = 'completed'
@@ -115,9 +147,6 @@ class SimpleHighlightsService:
             
             db.session.commit()
             
-            # 6. Nettoyer les fichiers temporaires
-            self._cleanup_temp_files([local_video_path, highlight_path])
-            
             logger.info(f"✅ Highlights generated successfully: Job={job_id}, Highlight={highlight_video.id}")
             
             return highlight_video
@@ -125,14 +154,50 @@ class SimpleHighlightsService:
         except Exception as e:
             logger.error(f"❌ Error generating highlights for job {job_id}: {e}")
             
+            db.session.rollback()
             job.status = 'failed'
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
             db.session.commit()
             
             raise
+        
+        finally:
+            # 6. Nettoyer le répertoire de travail
+            shutil.rmtree(scratch_dir, ignore_errors=True)
     
-    def _download_video(self, job: HighlightJob) -> str:
+    def _progress_reporter(self, job: HighlightJob, low: int, high: int) -> Callable[[float], None]:
+        """Callback fraction (0-1) → job.progress dans [low, high], commits limités à un toutes les 2 s"""
+        last_commit = [0.0]
+        
+        def report(fraction: float):
+            value = int(low + (high - low) * min(max(fraction, 0.0), 1.0))
+            if value <= (job.progress or 0) or time.time() - last_commit[0] < 2:
+                return
+            job.progress = value
+            db.session.commit()
+            last_commit[0] = time.time()
+        
+        return report
+    
+    @contextmanager
+    def _source_video(self, job: HighlightJob):
+        """Vidéo source locale, partagée avec les clips (aucun téléchargement si déjà présente)"""
+        video = job.video
+        
+        if video.bunny_video_id or local_video_file(video):
+            from src.services.manual_clip_service import manual_clip_service
+            with manual_clip_service.source_video(video) as path:
+                yield path
+            return
+        
+        # Vidéo hors Bunny Stream: téléchargement de file_url, mis en cache par vidéo
+        with source_video_cache.source(
+            f"video-{video.id}", 'file_url', lambda dest: self._download_video(job, dest)
+        ) as path:
+            yield path
+    
+    def _download_video(self, job: HighlightJob, local_path: str = None) -> str:
         """Télécharge la vidéo source depuis Bunny CDN"""
         
         video = job.video
@@ -143,145 +208,207 @@ class SimpleHighlightsService:
         logger.info(f"📥 Downloading video from: {video.file_url}")
         
         # Créer le chemin local
-        filename = f"source_{job.id}_{video.id}.mp4"
-        local_path = os.path.join(self.config.TEMP_DIR, filename)
+        if not local_path:
+            filename = f"source_{job.id}_{video.id}.mp4"
+            local_path = os.path.join(self.config.TEMP_DIR, filename)
         
         # Télécharger
         response = requests.get(video.file_url, stream=True, timeout=300)
         response.raise_for_status()
         
         with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
                 f.write(chunk)
         
         logger.info(f"✅ Video downloaded to: {local_path}")
         
         return local_path
     
-    def _generate_simple_highlights(self, video_path: str, target_duration: int) -> str:
-        """Génère les highlights en mode simple (extraction à intervalles)"""
+    def _generate_simple_highlights(self, video_path: str, target_duration: int, scratch_dir: str,
+                                    on_detect_progress: Callable[[float], None] = None,
+                                    on_progress: Callable[[float], None] = None) -> Tuple[str, List[Dict]]:
+        """
+        Génère les highlights en mode simple (sans IA)
+        
+        Les extraits sont choisis par le détecteur d'activité (mouvement + audio), ou à
+        intervalles réguliers si HIGHLIGHTS_DETECTION=interval ou si l'analyse échoue.
+        
+        Une seule invocation FFmpeg pour tout le montage:
+        - 'encode' (défaut): chaque extrait est une entrée seekée (-ss/-t), assemblées par le
+          filtre concat et encodées une seule fois
+        - 'copy': liste concat avec inpoint/outpoint, copie sans ré-encodage (coupes sur keyframes)
+        
+        Returns:
+            (chemin du montage, extraits utilisés)
+        """
         
         logger.info(f"🎞️ Generating simple highlights (target: {target_duration}s)")
         
         # 1. Obtenir la durée de la vidéo
-        duration = self._get_video_duration(video_path)
+        duration, has_audio = self._probe_video(video_path)
         logger.info(f"  Video duration: {duration}s")
         
-        # 2. Calculer les intervalles pour extraire les clips
         clips_count = self.config.SIMPLE_CLIPS_COUNT
         clip_duration = target_duration / clips_count  # ~15s par clip
-        interval = duration / clips_count
-        
-        logger.info(f"  Extracting {clips_count} clips of ~{clip_duration:.1f}s")
         
-        # 3. Extraire les clips
-        clip_paths = []
+        # 2. Choisir les extraits
         timestamps = []
+        if self.config.DETECTION_MODE == 'activity':
+            try:
+                started = time.time()
+                timestamps = self.detector.detect(
+                    video_path, duration, clip_duration, clips_count,
+                    has_audio=has_audio, on_progress=on_detect_progress
+                )
+                logger.info(f"  Activity detection: {len(timestamps)} windows in {time.time() - started:.0f}s")
+            except Exception as e:
+                logger.warning(f"⚠️ Activity detection failed, falling back to intervals: {e}")
         
-        for i in range(clips_count):
-            start_time = i * interval
-            
-            # Ne pas dépasser la durée de la vidéo
-            if start_time + clip_duration > duration:
-                break
-            
-            clip_path = os.path.join(
-                self.config.TEMP_DIR,
-                f"clip_{i}_{os.path.basename(video_path)}"
-            )
-            
-            # Extraire avec FFmpeg
-            self._extract_clip(video_path, start_time, clip_duration, clip_path)
-            
-            clip_paths.append(clip_path)
-            timestamps.append({
-                'start': start_time,
-                'end': start_time + clip_duration,
-                'clip_index': i
-            })
-        
-        # 4. Concaténer les clips
-        output_path = os.path.join(
-            self.config.TEMP_DIR,
-            f"highlights_{os.path.basename(video_path)}"
-        )
+        if not timestamps:
+            interval = duration / clips_count
+            for i in range(clips_count):
+                start_time = i * interval
+                
+                # Ne pas dépasser la durée de la vidéo
+                if start_time + clip_duration > duration:
+                    break
+                timestamps.append({'start': start_time, 'end': start_time + clip_duration})
         
-        self._concatenate_clips(clip_paths, output_path)
+        for i, timestamp in enumerate(timestamps):
+            timestamp['clip_index'] = i
+        segments = [(t['start'], t['end'] - t['start']) for t in timestamps]
         
-        # 5. Nettoyer les clips individuels
-        for clip_path in clip_paths:
-            if os.path.exists(clip_path):
-                os.remove(clip_path)
+        if not segments:
+            raise ValueError(f"Video too short for highlights ({duration:.0f}s)")
         
-        logger.info(f"✅ Highlights generated: {output_path}")
+        logger.info(f"  Extracting {len(segments)} clips of ~{clip_duration:.1f}s ({self.config.RENDER_MODE})")
         
-        return output_path
-    
-    def _get_video_duration(self, video_path: str) -> float:
-        """Obtient la durée d'une vidéo avec FFprobe"""
+        # 3. Monter le résultat en une passe
+        output_path = os.path.join(scratch_dir, f"highlights_{os.path.basename(video_path)}")
         
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            video_path
-        ]
+        if self.config.RENDER_MODE == 'copy':
+            cmd = self._copy_command(video_path, segments, scratch_dir, output_path)
+        else:
+            cmd = self._encode_command(video_path, segments, has_audio, output_path)
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        duration = float(result.stdout.strip())
+        self._run_ffmpeg(cmd, sum(d for _, d in segments), scratch_dir, on_progress)
         
-        return duration
+        logger.info(f"✅ Highlights generated: {output_path}")
+        
+        return output_path, timestamps
     
-    def _extract_clip(self, input_path: str, start: float, duration: float, output_path: str):
-        """Extrait un clip avec FFmpeg"""
+    def _encode_command(self, video_path: str, segments: List[Tuple[float, float]],
+                        has_audio: bool, output_path: str) -> List[str]:
+        """Entrées seekées + filtre concat, un seul encodage"""
         
-        cmd = [
-            'ffmpeg',
-            '-y',  # Overwrite
-            '-ss', str(start),
-            '-i', input_path,
-            '-t', str(duration),
+        cmd = ['ffmpeg', '-y']
+        for start, duration in segments:
+            cmd += ['-ss', f"{start:.3f}", '-t', f"{duration:.3f}", '-i', video_path]
+        
+        streams = ''.join(
+            f"[{i}:v:0][{i}:a:0]" if has_audio else f"[{i}:v:0]" for i in range(len(segments))
+        )
+        graph = f"{streams}concat=n={len(segments)}:v=1:a={1 if has_audio else 0}[v]{'[a]' if has_audio else ''}"
+        cmd += ['-filter_complex', graph, '-map', '[v]']
+        if has_audio:
+            cmd += ['-map', '[a]', '-c:a', 'aac', '-b:a', '128k']
+        cmd += [
             '-c:v', 'libx264',
-            '-c:a', 'aac',
             '-preset', 'fast',
+            '-movflags', '+faststart',
             output_path
         ]
-        
-        subprocess.run(cmd, check=True, capture_output=True)
+        return cmd
     
-    def _concatenate_clips(self, clip_paths: List[str], output_path: str):
-        """Concatène plusieurs clips en un seul fichier"""
-        
-        # Créer le fichier de liste pour FFmpeg
-        list_file = os.path.join(self.config.TEMP_DIR, 'concat_list.txt')
+    def _copy_command(self, video_path: str, segments: List[Tuple[float, float]],
+                      scratch_dir: str, output_path: str) -> List[str]:
+        """Liste concat avec points d'entrée/sortie, copie des flux"""
         
+        list_file = os.path.join(scratch_dir, 'concat_list.txt')
+        escaped = os.path.abspath(video_path).replace("'", "'\\''")
         with open(list_file, 'w') as f:
-            for clip_path in clip_paths:
+            for start, duration in segments:
                 # Format requis par FFmpeg
-                f.write(f"file '{clip_path}'\n")
+                f.write(f"file '{escaped}'\ninpoint {start:.3f}\noutpoint {start + duration:.3f}\n")
         
-        # Concaténer avec FFmpeg
-        cmd = [
-            'ffmpeg',
-            '-y',
+        return [
+            'ffmpeg', '-y',
             '-f', 'concat',
             '-safe', '0',
             '-i', list_file,
+            '-map', '0:v:0', '-map', '0:a:0?',
             '-c', 'copy',
+            '-movflags', '+faststart',
             output_path
         ]
+    
+    def _run_ffmpeg(self, cmd: List[str], output_duration: float, scratch_dir: str,
+                    on_progress: Callable[[float], None] = None):
+        """Lance FFmpeg avec -progress et remonte l'avancement (out_time / durée de sortie)"""
+        
+        cmd = cmd[:1] + ['-nostats', '-progress', 'pipe:1'] + cmd[1:]
+        stderr_path = os.path.join(scratch_dir, 'ffmpeg.log')
+        
+        with open(stderr_path, 'w') as stderr:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            # Échéance appliquée pendant la lecture: un FFmpeg bloqué qui garde le pipe
+            # ouvert est tué, ce qui ferme stdout et termine la boucle
+            timed_out = threading.Event()
+            
+            def _kill_on_timeout():
+                timed_out.set()
+                process.kill()
+            
+            watchdog = threading.Timer(self.config.JOB_TIMEOUT, _kill_on_timeout)
+            watchdog.daemon = True
+            watchdog.start()
+            try:
+                for line in process.stdout:
+                    key, _, value = line.strip().partition('=')
+                    # out_time_us (out_time_ms est aussi en microsecondes)
+                    if key == 'out_time_us' and value.isdigit() and on_progress and output_duration > 0:
+                        on_progress(int(value) / 1_000_000 / output_duration)
+                process.wait()
+            except Exception:
+                process.kill()
+                process.wait()
+                raise
+            finally:
+                watchdog.cancel()
+        
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, self.config.JOB_TIMEOUT)
+        if process.returncode != 0:
+            with open(stderr_path) as f:
+                raise RuntimeError(f"FFmpeg failed: {f.read()[-1000:]}")
+    
+    def _probe_video(self, video_path: str) -> Tuple[float, bool]:
+        """Durée de la vidéo et présence d'une piste audio (un seul appel FFprobe)"""
+        
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-show_entries', 'format=duration:stream=codec_type',
+            '-of', 'json',
+            video_path
+        ]
         
-        subprocess.run(cmd, check=True, capture_output=True)
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        data = json.loads(result.stdout or '{}')
+        duration = float(data.get('format', {}).get('duration') or 0)
+        has_audio = any(s.get('codec_type') == 'audio' for s in data.get('streams', []))
         
-        # Nettoyer le fichier de liste
-        if os.path.exists(list_file):
-            os.remove(list_file)
+        return duration, has_audio
     
-    def _upload_to_bunny(self, highlight_video: HighlightVideo, local_path: str):
-        """Upload le fichier highlights vers Bunny CDN"""
+    def _get_video_duration(self, video_path: str) -> float:
+        """Obtient la durée d'une vidéo avec FFprobe"""
+        return self._probe_video(video_path)[0]
+    
+    def _upload_to_bunny(self, highlight_video: HighlightVideo, local_path: str,
+                         on_progress: Callable[[float], None] = None):
+        """Upload le fichier highlights vers Bunny CDN (attend la fin de l'envoi)"""
         
-        logger.info(f"☁️ Uploading highlights to Bunny CDN...")
+        logger.info("☁️ Uploading highlights to Bunny CDN...")
         
         # Utiliser le service Bunny existant
         upload_id = bunny_storage_service.queue_upload(
@@ -296,12 +423,17 @@ class SimpleHighlightsService:
         
         logger.info(f"  Upload queued: {upload_id}")
         
-        # Attendre que l'upload soit terminé
-        import time
-        time.sleep(3)
-        
-        # Récupérer le statut
-        upload_status = bunny_storage_service.get_upload_status(upload_id)
+        # Attendre que l'upload soit terminé (le fichier est dans le répertoire de travail du job)
+        deadline = time.time() + self.config.JOB_TIMEOUT
+        while True:
+            upload_status = bunny_storage_service.get_upload_status(upload_id)
+            if upload_status and upload_status.get('total_bytes') and on_progress:
+                on_progress(upload_status['bytes_uploaded'] / upload_status['total_bytes'])
+            if not upload_status or upload_status.get('finished'):
+                break
+            if time.time() > deadline:
+                raise TimeoutError(f"Upload {upload_id} not finished after {self.config.JOB_TIMEOUT}s")
+            time.sleep(2)
         
         if upload_status and upload_status.get('bunny_video_id'):
             highlight_video.bunny_video_id = upload_status['bunny_video_id']
@@ -314,18 +446,7 @@ class SimpleHighlightsService:
             
             logger.info(f"✅ Uploaded to Bunny: {highlight_video.bunny_video_id}")
         else:
-            logger.warning(f"⚠️ Upload status: {upload_status}")
-    
-    def _cleanup_temp_files(self, file_paths: List[str]):
-        """Nettoie les fichiers temporaires"""
-        
-        for path in file_paths:
-            try:
-                if path and os.path.exists(path):
-                    os.remove(path)
-                    logger.info(f"🗑️ Cleaned up: {path}")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not delete {path}: {e}")
+            raise RuntimeError(f"Upload failed: {(upload_status or {}).get('error_message') or upload_status}")
 
 # Instance singleton
 simple_highlights_service = SimpleHighlightsService()
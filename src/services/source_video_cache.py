@@ -0,0 +1,193 @@
+"""
+Cache disque des vidéos sources (clips, highlights)
+- Une entrée par (bunny_video_id, rendition), nommée par hash de la clé
+- Taille bornée, éviction LRU (date de dernier accès = mtime)
+- Téléchargement "single-flight": un seul téléchargement par entrée, les autres jobs
+  (threads ou workers gunicorn de la machine) attendent et réutilisent le fichier
+- Une entrée en cours d'utilisation n'est jamais évincée (verrou partagé tenu par le lecteur)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows (dev): déduplication limitée au processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SourceVideoCache:
+    """Cache LRU des vidéos sources partagé par les workers d'une machine"""
+
+    SHARED = getattr(fcntl, 'LOCK_SH', 0)
+    EXCLUSIVE = getattr(fcntl, 'LOCK_EX', 0)
+    UNLOCK = getattr(fcntl, 'LOCK_UN', 0)
+    # Une entrée touchée récemment n'est pas évincée (la conversion de verrou flock n'est pas atomique)
+    MIN_IDLE_SECONDS = 60
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(bunny_video_id: str, rendition: str) -> str:
+        return hashlib.sha256(f"{bunny_video_id}:{rendition}".encode()).hexdigest()[:32]
+
+    def _paths(self, key: str):
+        return self.cache_dir / f"{key}.mp4", self.cache_dir / f"{key}.lock"
+
+    @contextmanager
+    def source(self, bunny_video_id: str, rendition: str,
+               download: Callable[[str], None]) -> Iterator[str]:
+        """
+        Chemin local de la vidéo, téléchargée au besoin (une seule fois)
+
+        Args:
+            download: écrit la vidéo dans le chemin fourni (fichier temporaire du cache)
+
+        Yields:
+            Chemin du fichier en cache, protégé de l'éviction pendant le bloc
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        key = self.key(bunny_video_id, rendition)
+        path, lock_path = self._paths(key)
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        lock_file = open(lock_path, 'a+')
+        try:
+            # Verrou partagé: l'entrée ne peut pas être évincée tant qu'on la lit
+            self._flock(lock_file, self.SHARED)
+            if path.exists():
+                logger.info(f"♻️ Vidéo source {bunny_video_id} ({rendition}) servie depuis le cache")
+            else:
+                # Single-flight dans le processus, puis entre processus (verrou exclusif)
+                self._flock(lock_file, self.UNLOCK)
+                with key_lock:
+                    self._flock(lock_file, self.EXCLUSIVE)
+                    if not path.exists():
+                        self._download(bunny_video_id, rendition, path, download)
+                    self._flock(lock_file, self.SHARED)
+            os.utime(path)
+            self._pin(key, 1)
+        except BaseException:
+            lock_file.close()
+            raise
+
+        try:
+            self.evict(keep=key)
+            yield str(path)
+        finally:
+            self._pin(key, -1)
+            lock_file.close()
+
+    @contextmanager
+    def cached(self, bunny_video_id: str, rendition: str) -> Iterator[Optional[str]]:
+        """Chemin de l'entrée si elle est déjà en cache (protégée pendant le bloc), sinon None"""
+        key = self.key(bunny_video_id, rendition)
+        path, lock_path = self._paths(key)
+        if not path.exists():
+            yield None
+            return
+        lock_file = open(lock_path, 'a+')
+        try:
+            self._flock(lock_file, self.SHARED)
+            if not path.exists():  # Évincée entre-temps
+                yield None
+                return
+            os.utime(path)
+            self._pin(key, 1)
+            try:
+                yield str(path)
+            finally:
+                self._pin(key, -1)
+        finally:
+            lock_file.close()
+
+    def evict(self, keep: str = None):
+        """Supprimer les entrées les moins récemment utilisées au-delà de max_bytes"""
+        entries = []
+        for path in self.cache_dir.glob('*.mp4'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            key = path.stem
+            if key == keep or self._pins.get(key) or now - mtime < self.MIN_IDLE_SECONDS:
+                continue
+            if self._try_remove(key):
+                total -= size
+                logger.info(f"🗑️ Cache vidéo source: éviction de {path.name} ({size / 1024 / 1024:.0f} MB)")
+
+    def _try_remove(self, key: str) -> bool:
+        path, lock_path = self._paths(key)
+        with open(lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False  # Utilisée par un autre worker
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _download(self, bunny_video_id: str, rendition: str, path: Path, download: Callable[[str], None]):
+        tmp_path = path.with_suffix(f".{os.getpid()}.part")
+        started = time.time()
+        logger.info(f"📥 Vidéo source {bunny_video_id} ({rendition}) absente du cache, téléchargement")
+        try:
+            download(str(tmp_path))
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        logger.info(
+            f"✅ Vidéo source {bunny_video_id} en cache "
+            f"({path.stat().st_size / 1024 / 1024:.0f} MB en {time.time() - started:.0f}s)"
+        )
+
+    def _flock(self, lock_file, operation: int):
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), operation)
+
+    def _pin(self, key: str, delta: int):
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + delta
+            if self._pins[key] <= 0:
+                del self._pins[key]
+
+
+def local_video_file(video) -> Optional[str]:
+    """Fichier d'enregistrement encore présent sur ce serveur (prioritaire sur tout téléchargement)"""
+    path = video.local_file_path
+    if path and not video.local_file_deleted_at and os.path.isfile(path):
+        return path
+    return None
+
+
+# Instance globale
+source_video_cache = SourceVideoCache(
+    os.getenv('SOURCE_VIDEO_CACHE_DIR', 'cache/source_videos'),
+    int(float(os.getenv('SOURCE_VIDEO_CACHE_MAX_GB', '20')) * 1024 ** 3)
+)
@@ -0,0 +1,105 @@
+"""
+Journal persistant des uploads Bunny Stream
+Une entrée JSON par upload (réécrite de façon atomique à chaque point de reprise)
+et un verrou de fichier tenu par le processus qui l'envoie: après un redémarrage
+ou un crash, n'importe quel worker reprend l'upload à l'offset acquitté.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows (dev): pas de verrou inter-processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('completed', 'failed')
+
+
+class UploadJournal:
+    """Journal des uploads sur disque (partagé par les workers gunicorn d'une machine)"""
+
+    def __init__(self, journal_dir: str):
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, upload_id: str) -> Path:
+        return self.journal_dir / f"{upload_id}.json"
+
+    def save(self, entry: Dict):
+        """Écrire une entrée de façon atomique"""
+        entry['updated_at'] = time.time()
+        path = self._entry_path(entry['id'])
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(entry, fh, indent=2)
+        os.replace(tmp_path, path)
+
+    def load(self, upload_id: str) -> Optional[Dict]:
+        try:
+            with open(self._entry_path(upload_id), 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Entrée de journal illisible {upload_id}: {e}")
+            return None
+
+    def entries(self) -> List[Dict]:
+        result = []
+        for path in sorted(self.journal_dir.glob("*.json")):
+            entry = self.load(path.stem)
+            if entry:
+                result.append(entry)
+        return result
+
+    def unfinished(self) -> List[Dict]:
+        """Uploads à reprendre (ni terminés ni abandonnés)"""
+        return [e for e in self.entries() if e.get('status') not in FINAL_STATUSES]
+
+    def find_unfinished(self, local_path: str) -> Optional[Dict]:
+        """Upload en cours pour ce fichier (évite de l'envoyer deux fois)"""
+        for entry in self.unfinished():
+            if entry.get('local_path') == local_path:
+                return entry
+        return None
+
+    @contextmanager
+    def lock(self, upload_id: str):
+        """
+        Verrou exclusif non bloquant sur un upload
+
+        Yields:
+            True si ce processus détient le verrou (libéré automatiquement s'il meurt)
+        """
+        if fcntl is None:
+            yield True
+            return
+        fh = open(self.journal_dir / f"{upload_id}.lock", 'a+')
+        try:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            fh.close()
+
+    def prune(self, max_age_seconds: float):
+        """Supprimer les entrées terminées plus anciennes que max_age_seconds"""
+        cutoff = time.time() - max_age_seconds
+        for entry in self.entries():
+            if entry.get('status') in FINAL_STATUSES and entry.get('updated_at', 0) < cutoff:
+                self._entry_path(entry['id']).unlink(missing_ok=True)
+                (self.journal_dir / f"{entry['id']}.lock").unlink(missing_ok=True)
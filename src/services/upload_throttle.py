@@ -0,0 +1,99 @@
+"""
+Limitation des uploads sortants (Bunny Stream / Bunny Storage)
+- Concurrence bornée par destination (hôte distant)
+- Débit global limité par seau à jetons, partagé par tous les uploads du processus
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+_slots_lock = threading.Lock()
+
+
+def _default_slots() -> int:
+    return int(os.environ.get('BUNNY_UPLOAD_SLOTS_PER_DESTINATION', '2'))
+
+
+@contextmanager
+def destination_slot(destination: str, limit: int = None):
+    """Réserver un créneau d'upload vers une destination (bloque si toutes sont occupées)"""
+    with _slots_lock:
+        semaphore = _slots.get(destination)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(limit or _default_slots())
+            _slots[destination] = semaphore
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+class TokenBucket:
+    """Seau à jetons thread-safe (octets/seconde); rate <= 0 = illimité"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        """Attendre que `amount` octets puissent être envoyés"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= amount or self._tokens >= self.capacity:
+                    self._tokens -= amount
+                    return
+                wait = (min(amount, self.capacity) - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Débit total des uploads de ce processus (BUNNY_UPLOAD_MAX_MBPS, en mégabits/s)
+upload_bandwidth = TokenBucket(float(os.environ.get('BUNNY_UPLOAD_MAX_MBPS', '0')) * 1_000_000 / 8)
+
+
+class ThrottledFile:
+    """
+    Vue en lecture d'un fichier, limitée en taille et au débit autorisé
+
+    Utilisable comme corps de requête httpx (itérable) ou requests (read/__len__);
+    le fichier doit déjà être positionné à l'offset de départ.
+    """
+
+    def __init__(self, file_obj, limit: int = None, block_size: int = 256 * 1024):
+        self.file_obj = file_obj
+        self.block_size = block_size
+        if limit is None:
+            limit = os.fstat(file_obj.fileno()).st_size - file_obj.tell()
+        self.remaining = limit
+
+    def __len__(self) -> int:
+        return self.remaining
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        block = self.file_obj.read(size)
+        self.remaining -= len(block)
+        upload_bandwidth.consume(len(block))
+        return block
+
+    def __iter__(self):
+        while True:
+            block = self.read(self.block_size)
+            if not block:
+                break
+            yield block
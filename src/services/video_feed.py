@@ -0,0 +1,175 @@
+"""
+Fil "mes vidéos": vidéos possédées + vidéos partagées avec l'utilisateur
+- Fusion et tri par date en SQL (UNION ALL), pagination par curseur (keyset): le coût
+  d'une page ne dépend pas de sa position dans le fil
+- Tri sur recorded_at (non NULL, index user_id + recorded_at) et shared_at (index
+  shared_with_user_id + shared_at)
+- Vidéos de la page chargées en une requête, terrain et club joints seulement si lus
+- Projection des champs (fields=): seuls les champs demandés sont calculés
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, literal, null, or_, select, union_all
+from sqlalchemy.orm import joinedload
+
+from src.models.database import db
+from src.models.user import User, Video, Court, SharedVideo
+
+# Ordre des sources à date égale (départage stable du curseur)
+OWNED, SHARED = 1, 0
+
+
+class InvalidCursor(ValueError):
+    """Curseur de pagination illisible"""
+
+
+def encode_cursor(sort_at: datetime, source: int, item_id: int) -> str:
+    raw = json.dumps([sort_at.isoformat(), source, item_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_at, source, item_id = json.loads(raw)
+        return datetime.fromisoformat(sort_at), int(source), int(item_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def _after(sort_col, id_col, branch_source: int, cursor: Tuple[datetime, int, int]):
+    """Condition keyset d'une source: éléments après le curseur (plage sur l'index de tri)"""
+    sort_at, source, item_id = cursor
+    if branch_source < source:
+        return sort_col <= sort_at
+    if branch_source > source:
+        return sort_col < sort_at
+    return or_(sort_col < sort_at, and_(sort_col == sort_at, id_col < item_id))
+
+
+def _feed_query(user_id: int, cursor: Optional[Tuple[datetime, int, int]] = None, limit: Optional[int] = None):
+    """
+    Sous-requête (sort_at, source, item_id, video_id, infos de partage) des deux sources
+
+    Curseur et limite appliqués à chaque source avant l'union: chacune lit au plus
+    limit lignes dans l'ordre de son index, seules ces lignes sont triées ensemble.
+    """
+    owned = db.session.query(
+        Video.recorded_at.label('sort_at'),
+        literal(OWNED).label('source'),
+        Video.id.label('item_id'),
+        Video.id.label('video_id'),
+        null().label('shared_by'),
+        null().label('shared_at'),
+        null().label('message'),
+    ).filter(Video.user_id == user_id)
+
+    shared = db.session.query(
+        SharedVideo.shared_at.label('sort_at'),
+        literal(SHARED).label('source'),
+        SharedVideo.id.label('item_id'),
+        SharedVideo.video_id.label('video_id'),
+        User.name.label('shared_by'),
+        SharedVideo.shared_at.label('shared_at'),
+        SharedVideo.message.label('message'),
+    ).join(
+        Video, Video.id == SharedVideo.video_id  # Vidéo toujours existante
+    ).outerjoin(
+        User, User.id == SharedVideo.owner_user_id
+    ).filter(SharedVideo.shared_with_user_id == user_id)
+
+    if cursor:
+        owned = owned.filter(_after(Video.recorded_at, Video.id, OWNED, cursor))
+        shared = shared.filter(_after(SharedVideo.shared_at, SharedVideo.id, SHARED, cursor))
+    if limit:
+        owned = select(owned.order_by(
+            Video.recorded_at.desc(), Video.id.desc()
+        ).limit(limit).subquery('owned'))
+        shared = select(shared.order_by(
+            SharedVideo.shared_at.desc(), SharedVideo.id.desc()
+        ).limit(limit).subquery('shared'))
+
+    return union_all(owned, shared).subquery('feed')
+
+
+def _shared_data(row) -> Dict:
+    if row.source != SHARED:
+        return {'is_shared': False}
+    return {
+        'is_shared': True,
+        'shared_by': row.shared_by or 'Inconnu',
+        'shared_at': _isoformat(row.shared_at),
+        'shared_message': row.message,
+        'shared_video_id': row.item_id,  # Pour pouvoir supprimer le partage
+    }
+
+
+def my_videos_page(user_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   fields: Optional[Sequence[str]] = None) -> Dict:
+    """
+    Page du fil, la plus récente d'abord
+
+    Args:
+        limit: taille de page (None: fil complet, comportement historique)
+        cursor: next_cursor de la page précédente
+        fields: champs à renvoyer ('id' toujours inclus)
+
+    Raises:
+        InvalidCursor: curseur illisible
+    """
+    feed = _feed_query(user_id, decode_cursor(cursor) if cursor else None, limit + 1 if limit else None)
+    query = db.session.query(feed).order_by(feed.c.sort_at.desc(), feed.c.source.desc(), feed.c.item_id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+    rows = query.all()
+
+    has_more = bool(limit) and len(rows) > limit
+    rows = rows[:limit] if limit else rows
+
+    video_fields = None
+    if fields:
+        fields = ['id', *[field for field in fields if field != 'id']]
+        video_fields = [field for field in fields if field in Video.SERIALIZERS]
+
+    # Vidéos de la page en une requête, terrain et club joints s'ils sont lus
+    videos = {}
+    if rows:
+        query = Video.query
+        if video_fields is None or Video.COURT_FIELDS.intersection(video_fields):
+            query = query.options(joinedload(Video.court).joinedload(Court.club))
+        videos = {video.id: video for video in query.filter(
+            Video.id.in_({row.video_id for row in rows})
+        ).all()}
+
+    items = []
+    for row in rows:
+        video = videos.get(row.video_id)
+        if video is None:
+            continue
+        item = video.to_dict(video_fields)
+        shared = _shared_data(row)
+        if fields:
+            item.update((key, shared[key]) for key in fields if key in shared)
+        else:
+            item.update(shared)
+        items.append(item)
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(_as_datetime(last.sort_at), last.source, last.item_id)
+
+    return {'videos': items, 'next_cursor': next_cursor, 'has_more': has_more}
+
+
+def _as_datetime(value) -> datetime:
+    # SQLite renvoie les colonnes d'un UNION sans conversion de type
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _isoformat(value) -> Optional[str]:
+    return _as_datetime(value).isoformat() if value else None
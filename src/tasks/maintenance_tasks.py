@@ -21,6 +21,7 @@ from ..models.user import (
 from ..middleware.idempotence import IdempotenceMiddleware
 from .notification_tasks import send_notification
 from ..services.recovery_service import recovery_service
+from ..services import credit_ledger
 from ..models.recovery import RecoveryRequestType
 
 logger = logging.getLogger(__name__)
@@ -234,6 +235,18 @@ def cleanup_old_notifications():
         db.session.rollback()
         return {'error': str(e)}
 
+@celery_app.task
+def snapshot_credit_balances():
+    """
+    Instantané des soldes de crédits recalculés depuis le grand livre (contrôle de dérive)
+    """
+    try:
+        return credit_ledger.snapshot_balances()
+    except Exception as e:
+        logger.error(f"Erreur lors de l'instantané des soldes de crédits: {str(e)}")
+        db.session.rollback()
+        return {'error': str(e)}
+
 @celery_app.task
 def cleanup_old_transactions():
     """
@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 from ..celery_app import celery_app
 from ..models.database import db
 from ..models.user import User, Transaction, TransactionStatus, NotificationType
+from ..services import credit_ledger
+from ..services.credit_ledger import InsufficientCredits
 from ..tasks.notification_tasks import send_notification
 
 logger = logging.getLogger(__name__)
@@ -58,9 +60,9 @@ def process_successful_payment(self, payment_intent_id, transaction_id=None, ide
             return {'status': 'error', 'message': 'User not found'}
         
         # Ajouter les crédits au compte utilisateur
-        old_balance = user.credits_balance
-        user.credits_balance += transaction.credits_amount
-        new_balance = user.credits_balance
+        new_balance = credit_ledger.credit(user, transaction.credits_amount, 'purchase',
+                                           reference=f"transaction:{transaction.id}", performed_by_id=user.id)
+        old_balance = new_balance - transaction.credits_amount
         
         # Mettre à jour la transaction
         transaction.status = TransactionStatus.COMPLETED
@@ -190,16 +192,14 @@ def process_refund(self, payment_intent_id, refund_amount_cents, refund_id=None)
         refund_ratio = refund_amount_cents / original_transaction.amount_cents
         credits_to_remove = int(original_transaction.credits_amount * refund_ratio)
         
-        # Vérifier que l'utilisateur a assez de crédits
-        if user.credits_balance < credits_to_remove:
+        # Retirer les crédits (on retire ce qu'on peut si le solde est insuffisant)
+        old_balance, new_balance = credit_ledger.adjust_to(
+            user, lambda balance: balance - credits_to_remove, 'refund',
+            reference=f"refund:{refund_id}"
+        )
+        if old_balance - new_balance < credits_to_remove:
             logger.warning(f"Utilisateur {user.id} n'a pas assez de crédits pour le remboursement")
-            # On retire quand même ce qu'on peut
-            credits_to_remove = user.credits_balance
-        
-        # Retirer les crédits
-        old_balance = user.credits_balance
-        user.credits_balance = max(0, user.credits_balance - credits_to_remove)
-        new_balance = user.credits_balance
+            credits_to_remove = old_balance - new_balance
         
         # Créer une transaction de remboursement
         refund_transaction = Transaction(
@@ -254,19 +254,19 @@ def deduct_credits_for_recording(user_id, credits_amount, recording_id, descript
         if not user:
             return {'status': 'error', 'message': 'User not found'}
         
-        # Vérifier que l'utilisateur a assez de crédits
-        if user.credits_balance < credits_amount:
-            logger.warning(f"Utilisateur {user_id} n'a pas assez de crédits ({user.credits_balance} < {credits_amount})")
+        # Déduire les crédits (débit conditionnel: jamais de solde négatif)
+        try:
+            new_balance = credit_ledger.debit(user, credits_amount, 'recording',
+                                              reference=f"recording:{recording_id}")
+        except InsufficientCredits as e:
+            db.session.rollback()
+            logger.warning(f"Utilisateur {user_id} n'a pas assez de crédits ({e.available} < {credits_amount})")
             return {
                 'status': 'insufficient_credits',
-                'current_balance': user.credits_balance,
+                'current_balance': e.available,
                 'required': credits_amount
             }
-        
-        # Déduire les crédits
-        old_balance = user.credits_balance
-        user.credits_balance -= credits_amount
-        new_balance = user.credits_balance
+        old_balance = new_balance + credits_amount
         
         # Créer une transaction de débit
         transaction = Transaction(
@@ -0,0 +1,140 @@
+"""
+Utilisateur authentifié de la requête courante
+- current_user(): objet User (session), chargé au plus une fois par requête et gardé sur flask.g
+- current_user_snapshot(): instantané (rôle, statut, club, crédits) servi par le cache
+  (Redis, ou SimpleCache local) avec un TTL court, pour les contrôles d'accès des
+  endpoints interrogés en boucle sans toucher la base
+- Les instantanés sont invalidés au commit de toute modification ou suppression d'un User
+  (les UPDATE en masse via query.update() n'émettent pas ces événements: le TTL borne alors le retard)
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from flask import g, has_app_context, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from ..extensions import cache
+from ..models.database import db
+from ..models.user import User, UserRole, UserStatus
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = int(os.getenv('CURRENT_USER_CACHE_TTL', '30'))
+_PENDING_KEY = '_invalidated_user_ids'
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Champs utiles aux contrôles d'accès (ne pas modifier: utiliser current_user())"""
+    id: int
+    role: UserRole
+    status: UserStatus
+    club_id: Optional[int]
+    credits_balance: int
+    name: str
+    email: str
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserSnapshot':
+        return cls(user.id, user.role, user.status, user.club_id,
+                   user.credits_balance or 0, user.name, user.email)
+
+    def to_cache(self) -> dict:
+        return {**self.__dict__, 'role': self.role.value, 'status': self.status.value}
+
+    @classmethod
+    def from_cache(cls, data: dict) -> 'UserSnapshot':
+        return cls(**{**data, 'role': UserRole(data['role']), 'status': UserStatus(data['status'])})
+
+
+def _cache_key(user_id: int) -> str:
+    return f"current_user:{user_id}"
+
+
+def current_user() -> Optional[User]:
+    """Utilisateur connecté (session), chargé une seule fois par requête"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    cached = g.get('_current_user')
+    if cached is not None and cached[0] == user_id:
+        return cached[1]
+    user = db.session.get(User, user_id)
+    g._current_user = (user_id, user)
+    return user
+
+
+def current_user_snapshot() -> Optional[UserSnapshot]:
+    """Instantané de l'utilisateur connecté, sans requête SQL tant qu'il est en cache"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    cached = g.get('_current_user_snapshot')
+    if cached is not None and cached.id == user_id:
+        return cached
+
+    snapshot = None
+    try:
+        data = cache.get(_cache_key(user_id))
+        if data:
+            snapshot = UserSnapshot.from_cache(data)
+    except Exception as e:
+        logger.warning(f"⚠️ Cache utilisateur indisponible: {e}")
+
+    if snapshot is None:
+        user = current_user()
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        try:
+            cache.set(_cache_key(user_id), snapshot.to_cache(), timeout=SNAPSHOT_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache utilisateur indisponible: {e}")
+
+    g._current_user_snapshot = snapshot
+    return snapshot
+
+
+def invalidate_user_snapshots(user_ids: Iterable[int]):
+    keys = [_cache_key(user_id) for user_id in user_ids if user_id]
+    if not keys or not has_app_context():
+        return
+    try:
+        cache.delete_many(*keys)
+    except Exception as e:
+        logger.warning(f"⚠️ Invalidation du cache utilisateur impossible: {e}")
+    snapshot = g.get('_current_user_snapshot')
+    if snapshot is not None and _cache_key(snapshot.id) in keys:
+        g.pop('_current_user_snapshot')
+
+
+def invalidate_user_snapshots_after_commit(orm_session: Session, user_ids: Iterable[int]):
+    """À appeler après un UPDATE direct de users (sans événement ORM)"""
+    orm_session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+# ----------------------------------------------------------------------
+# Invalidation: User modifié ou supprimé -> instantané retiré après le commit
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _mark_user_changed(mapper, connection, target):
+    orm_session = object_session(target)
+    if orm_session is not None:
+        orm_session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(orm_session):
+    user_ids = orm_session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        invalidate_user_snapshots(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(orm_session):
+    orm_session.info.pop(_PENDING_KEY, None)
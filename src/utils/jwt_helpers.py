@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify, session
 from ..models.user import User
+from .current_user import current_user
 
 # JWT Configuration
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production-' + os.urandom(24).hex())
@@ -115,9 +116,8 @@ def get_current_user_from_token():
         User: User object or None
     """
     # Try session-based auth FIRST (works in CORS with cookies)
-    user_id = session.get('user_id')
-    if user_id:
-        user = User.query.get(user_id)
+    if session.get('user_id'):
+        user = current_user()
         if user:
             print(f"[AUTH] ✅ Session auth: {user.email}")
             return user
@@ -2,16 +2,16 @@
 PadelVar Video System - Architecture Stable
 ============================================
 
-Pipeline: Caméra IP → video_proxy_server.py → FFmpeg → MP4
+Pipeline: Caméra IP → video_proxy_server.py (hub partagé) → FFmpeg → MP4
 
 Composants:
 - SessionManager: Gestion sessions caméra
-- ProxyManager: Gestion proxies vidéo (proxy interne uniquement)
-- VideoRecorder: Enregistrement FFmpeg (un seul MP4)
+- ProxyManager: Gestion proxies vidéo (hub interne, une connexion par caméra)
+- VideoRecorder: Enregistrement FFmpeg (segments CMAF assemblés en un MP4)
 - PreviewManager: Preview WebSocket
 
 Caractéristiques:
-- Pas de segmentation vidéo
+- Segments envoyés à Bunny Stream pendant le match (upload progressif)
 - Proxy universel pour tous les flux (MJPEG, RTSP, HTTP)
 - Multi-terrain / Multi-enregistrements simultanés
 - Arrêt propre et robuste
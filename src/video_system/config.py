@@ -37,6 +37,19 @@ class VideoConfig:
     PROXY_BASE_PORT = 8080  # Port de départ pour les proxies MJPEG internes
     PROXY_TYPE = "internal"  # Toujours utiliser le proxy interne
     
+    # Hub multi-caméras: un seul process proxy partagé par toutes les sessions
+    # (une connexion amont par caméra, abonnements comptés par référence).
+    # VIDEO_PROXY_HUB=0 pour revenir à un subprocess proxy par session.
+    PROXY_HUB_ENABLED = os.getenv('VIDEO_PROXY_HUB', '1') == '1'
+    PROXY_HUB_PORT = int(os.getenv('VIDEO_PROXY_HUB_PORT', '8079'))
+    PROXY_HUB_START_TIMEOUT = 15  # secondes
+    # Le hub n'écoute qu'en loopback (POST/DELETE /cameras sans authentification).
+    # Socket unix optionnel, partagé avec nginx (autre conteneur) pour relayer les previews
+    PROXY_HUB_SOCKET = os.getenv('VIDEO_PROXY_HUB_SOCKET', '')
+    # Capture proxy: 'auto' (passthrough JPEG pour MJPEG HTTP, décodage sinon),
+    # 'passthrough' ou 'decode' (toujours décoder/ré-encoder via OpenCV)
+    PROXY_CAPTURE_MODE = os.getenv('VIDEO_PROXY_CAPTURE_MODE', 'auto')
+    
     # Recording settings
     DEFAULT_DURATION_SECONDS = 90 * 60  # 90 minutes
     MAX_CONCURRENT_RECORDINGS = 10
@@ -47,6 +60,26 @@ class VideoConfig:
     VIDEO_WIDTH = 1920
     VIDEO_HEIGHT = 1080
     
+    # Mode d'enregistrement: 'auto' = copie directe (-c copy) des caméras RTSP
+    # déjà en H.264/H.265, transcodage sinon; 'transcode' = toujours via le proxy
+    RECORDING_MODE = os.getenv('VIDEO_RECORDING_MODE', 'auto')
+    STREAM_COPY_CODECS = ('h264', 'hevc')
+    PROBE_TIMEOUT_SECONDS = 10
+    # Overlays club en copie directe: 'live' = forcer le transcodage,
+    # 'deferred' = incrustation après l'arrêt (OVERLAY_BURN_IN_PRESET)
+    OVERLAY_MODE = os.getenv('VIDEO_OVERLAY_MODE', 'live')
+    OVERLAY_BURN_IN_PRESET = "veryfast"
+    
+    # Sortie: 'segmented' = segments CMAF de SEGMENT_SECONDS (crash-safe) assemblés
+    # par le worker de finalisation; 'single' = un seul MP4
+    RECORDING_OUTPUT = os.getenv('VIDEO_RECORDING_OUTPUT', 'segmented')
+    SEGMENT_SECONDS = int(os.getenv('VIDEO_SEGMENT_SECONDS', '60'))
+    # Upload progressif vers Bunny Stream: chaque segment fermé est envoyé pendant le match,
+    # seul le dernier reste à envoyer à l'arrêt (sans effet avec des overlays différés)
+    PROGRESSIVE_UPLOAD = os.getenv('VIDEO_PROGRESSIVE_UPLOAD', '1') == '1'
+    SEGMENT_FINISH_TIMEOUT = 30  # attente max du dernier passage du suivi des segments
+    KEEP_SEGMENTS = os.getenv('VIDEO_KEEP_SEGMENTS', '0') == '1'
+    
     # Session settings
     SESSION_TIMEOUT_SECONDS = 7200  # 2 heures
     SESSION_CLEANUP_INTERVAL = 300  # 5 minutes
@@ -55,6 +88,10 @@ class VideoConfig:
     PREVIEW_FPS = 5  # Frames par seconde pour preview
     PREVIEW_JPEG_QUALITY = 70
     PREVIEW_MAX_CLIENTS = 5  # Max viewers simultanés par session
+    PREVIEW_WIDTH = int(os.getenv('VIDEO_PREVIEW_WIDTH', '640'))  # Vignette réduite par le proxy
+    # Préfixe nginx interne relayant le hub (X-Accel-Redirect): aucun worker Flask
+    # n'est occupé pendant un flux preview. Vide: relais par Flask (développement)
+    PREVIEW_ACCEL_PREFIX = os.getenv('VIDEO_PREVIEW_ACCEL_PREFIX', '').rstrip('/')
     
     # Ports alloués dynamiquement
     _allocated_ports = set()
@@ -90,6 +127,14 @@ class VideoConfig:
         video_dir.mkdir(parents=True, exist_ok=True)
         return video_dir
     
+    @classmethod
+    def get_segment_dir(cls, club_id: int, session_id: str, create: bool = True) -> Path:
+        """Obtenir le répertoire des segments d'un enregistrement"""
+        segment_dir = cls.get_video_dir(club_id) / "segments" / session_id
+        if create:
+            segment_dir.mkdir(parents=True, exist_ok=True)
+        return segment_dir
+    
     @classmethod
     def get_log_path(cls, session_id: str) -> Path:
         """Obtenir le chemin du fichier log FFmpeg"""
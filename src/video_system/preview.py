@@ -3,101 +3,160 @@ Preview Manager - WebSocket Video Streaming
 ===========================================
 
 Responsabilités:
-- Capturer frames depuis le proxy local
-- Encoder en JPEG
-- Streamer via WebSocket
-- Gérer multiple viewers simultanés
+- Relayer les vignettes du proxy local vers les WebSockets
+- Un seul relais asynchrone par session, partagé par tous ses viewers:
+  une requête amont par tick quel que soit le nombre de viewers
+  (/snapshot.jpg réduit par le proxy, If-None-Match: 304 si pas de nouvelle frame)
+- Un viewer lent saute des frames sans ralentir le relais ni les autres
 - Reconnection automatique
 """
 
-import logging
-import time
-import requests
 import asyncio
-from typing import Optional, Set
-import io
-from PIL import Image
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+
+from .config import VideoConfig
 
 logger = logging.getLogger(__name__)
 
 
+class _PreviewChannel:
+    """Dernière frame d'une session, diffusée aux viewers"""
+
+    def __init__(self):
+        self.frame: Optional[bytes] = None
+        self.seq = 0
+        self._cond = asyncio.Condition()
+
+    async def publish(self, frame: bytes):
+        async with self._cond:
+            self.frame = frame
+            self.seq += 1
+            self._cond.notify_all()
+
+    async def next(self, seq: int, timeout: float) -> Optional[Tuple[bytes, int]]:
+        """Frame plus récente que seq, ou None après timeout"""
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self.seq != seq), timeout)
+            except asyncio.TimeoutError:
+                return None
+            return self.frame, self.seq
+
+
 class PreviewManager:
     """Gestionnaire de preview vidéo WebSocket"""
-    
+
     def __init__(self):
         self.active_previews = {}  # session_id -> set(websockets)
+        self._channels: Dict[str, _PreviewChannel] = {}
+        self._relays: Dict[str, asyncio.Task] = {}
         logger.info("👁️ PreviewManager initialisé")
-    
+
     def add_viewer(self, session_id: str, websocket):
         """
         Ajouter un viewer à une session
-        
+
         Args:
             session_id: ID de la session
             websocket: WebSocket du client
         """
         if session_id not in self.active_previews:
             self.active_previews[session_id] = set()
-        
+
         self.active_previews[session_id].add(websocket)
         logger.info(f"👁️ Viewer ajouté à session {session_id} ({len(self.active_previews[session_id])} viewers)")
-    
+
     def remove_viewer(self, session_id: str, websocket):
         """
         Retirer un viewer d'une session
-        
+
         Args:
             session_id: ID de la session
             websocket: WebSocket du client
         """
         if session_id in self.active_previews:
             self.active_previews[session_id].discard(websocket)
-            
-            # Nettoyer si plus de viewers
+
+            # Nettoyer si plus de viewers (le relais s'arrête avec le dernier)
             if len(self.active_previews[session_id]) == 0:
                 del self.active_previews[session_id]
+                self._channels.pop(session_id, None)
+                relay = self._relays.pop(session_id, None)
+                if relay is not None:
+                    relay.cancel()
                 logger.info(f"🧹 Plus de viewers pour session {session_id}")
-    
+
     def get_viewer_count(self, session_id: str) -> int:
         """Obtenir le nombre de viewers pour une session"""
         return len(self.active_previews.get(session_id, set()))
-    
+
+    def _ensure_relay(self, session_id: str, local_url: str) -> _PreviewChannel:
+        channel = self._channels.get(session_id)
+        if channel is None:
+            channel = self._channels[session_id] = _PreviewChannel()
+        relay = self._relays.get(session_id)
+        if relay is None or relay.done():
+            self._relays[session_id] = asyncio.create_task(self._relay(session_id, local_url, channel))
+        return channel
+
+    async def _relay(self, session_id: str, local_url: str, channel: _PreviewChannel):
+        """Lire les vignettes du proxy pour toute la session (s'arrête avec le dernier viewer)"""
+        snapshot_url = local_url.replace('/stream.mjpg', '/snapshot.jpg')
+        params = {'width': VideoConfig.PREVIEW_WIDTH}
+        interval = 1.0 / VideoConfig.PREVIEW_FPS
+        etag = None
+        logger.info(f"📡 Relais preview démarré pour {session_id}")
+
+        async with httpx.AsyncClient(timeout=2) as client:
+            while self.get_viewer_count(session_id):
+                try:
+                    headers = {'If-None-Match': etag} if etag else {}
+                    response = await client.get(snapshot_url, params=params, headers=headers)
+                    if response.status_code == 200:
+                        etag = response.headers.get('ETag')
+                        await channel.publish(response.content)
+                    elif response.status_code != 304:
+                        logger.warning(f"⚠️ HTTP {response.status_code} pour snapshot")
+                        await asyncio.sleep(1)
+                        continue
+                except httpx.HTTPError as e:
+                    logger.error(f"❌ Erreur récupération frame: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                # FPS du preview (configurable)
+                await asyncio.sleep(interval)
+
+        logger.info(f"🛑 Relais preview arrêté pour {session_id}")
+
     async def stream_preview(self, session_id: str, local_url: str, websocket):
         """
         Streamer la preview via WebSocket
-        
+
         Args:
             session_id: ID de la session
             local_url: URL du proxy local
             websocket: WebSocket du client
         """
         logger.info(f"📡 Démarrage stream preview pour {session_id}")
-        
-        # Construire l'URL du snapshot
-        snapshot_url = local_url.replace('/stream.mjpg', '/snapshot.jpg')
-        
+        self.add_viewer(session_id, websocket)
+
+        seq = 0
         try:
             while True:
-                try:
-                    # Récupérer une frame depuis le proxy
-                    response = requests.get(snapshot_url, timeout=2)
-                    
-                    if response.status_code == 200:
-                        # Envoyer l'image JPEG au client
-                        await websocket.send_bytes(response.content)
-                    else:
-                        logger.warning(f"⚠️ HTTP {response.status_code} pour snapshot")
-                        await asyncio.sleep(1)
-                        continue
-                    
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"❌ Erreur récupération frame: {e}")
-                    await asyncio.sleep(1)
-                    continue
-                
-                # FPS du preview (configurable)
-                await asyncio.sleep(1.0 / 5)  # 5 FPS
-                
+                channel = self._ensure_relay(session_id, local_url)
+                update = await channel.next(seq, timeout=5)
+                if update is None:
+                    continue  # Pas de frame: le relais est relancé s'il s'est arrêté
+                frame, seq = update
+                # Envoyer l'image JPEG au client (la plus récente: les frames manquées sont sautées)
+                await websocket.send_bytes(frame)
+
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"❌ Erreur stream preview: {e}")
         finally:
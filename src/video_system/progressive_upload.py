@@ -0,0 +1,140 @@
+"""
+Progressive Upload - Envoi des segments pendant le match
+========================================================
+
+Responsabilités:
+- Envoyer init.mp4 puis chaque segment CMAF fermé à la suite du précédent
+  (un seul upload TUS à longueur différée vers Bunny Stream)
+- Terminer le flux à l'arrêt: seul le dernier segment reste à envoyer
+
+Le MP4 assemblé localement reste la référence: si le flux échoue ou si le serveur
+ne gère pas la longueur différée, le worker de finalisation l'envoie en entier.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from . import segments as seg
+
+logger = logging.getLogger(__name__)
+
+FINISH_ATTEMPTS = 3
+FINISH_BACKOFF_SECONDS = 2.0
+
+
+def stream_upload_id(recording_id: str) -> str:
+    """Identifiant (journal d'upload) du flux d'un enregistrement"""
+    return f"stream_{recording_id}"
+
+
+def _service():
+    """Service Bunny, ou None s'il n'est pas configuré"""
+    try:
+        from ..services.bunny_storage_service import bunny_storage_service
+        return bunny_storage_service
+    except Exception as e:
+        logger.warning(f"⚠️ Bunny CDN indisponible, pas d'upload progressif: {e}")
+        return None
+
+
+class ProgressiveUpload(threading.Thread):
+    """
+    Envoie les segments d'un enregistrement au fil de leur fermeture
+
+    segment_closed() est appelé par le SegmentWatcher; les envois se font dans ce
+    thread pour ne jamais retarder le suivi des segments.
+    """
+
+    def __init__(self, recording_id: str, segment_dir: Path, title: str):
+        super().__init__(name=f"progressive-{recording_id}", daemon=True)
+        self.recording_id = recording_id
+        self.upload_id = stream_upload_id(recording_id)
+        self.segment_dir = segment_dir
+        self.title = title
+        self.enabled = True
+        self._segment_names: List[str] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+
+    def segment_closed(self, path: Path):
+        with self._lock:
+            self._segment_names.append(path.name)
+        self._wakeup.set()
+
+    def run(self):
+        service = _service()
+        if service is None or not service.open_stream_upload(
+            self.upload_id, str(self.segment_dir), self.title, {'recording_id': self.recording_id}
+        ):
+            self.enabled = False
+            return
+
+        while not self._stop_event.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                names = list(self._segment_names)
+            if not names:
+                continue
+            # Échec réseau: nouvel essai au segment suivant (ou à l'arrêt), depuis l'offset acquitté
+            service.append_stream_upload(self.upload_id, [str(p) for p in seg.stream_files(self.segment_dir, names)])
+
+    def finish(self, timeout: Optional[float] = None) -> bool:
+        """Arrêter les envois en cours de match puis terminer le flux"""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+        if not self.enabled:
+            return False
+        with self._lock:
+            names = list(self._segment_names)
+        return finish_stream(self.recording_id, self.segment_dir, names)
+
+
+def finish_stream(recording_id: str, segment_dir: Path, segment_names: Optional[List[str]] = None) -> bool:
+    """
+    Terminer le flux d'un enregistrement arrêté (déclarer sa longueur totale)
+
+    Args:
+        segment_names: segments relevés par le suivi; par défaut ceux du manifeste
+            (reprise après redémarrage)
+
+    Returns:
+        True si Bunny a reçu la vidéo complète; False si aucun flux n'existe ou s'il a
+        été abandonné (le MP4 assemblé est alors envoyé en entier)
+    """
+    service = _service()
+    if service is None:
+        return False
+    upload_id = stream_upload_id(recording_id)
+    status = service.get_upload_status(upload_id)
+    if status is None:
+        return False
+    if status['finished']:
+        return status['status'] == 'completed'
+
+    if segment_names is None:
+        segment_names = seg.read_manifest_segments(segment_dir)
+    on_disk = [path.name for path in seg.list_segment_files(segment_dir)]
+    if not segment_names or segment_names != on_disk:
+        # Segment partiel (arrêt brutal) ou manquant: le flux ne correspond pas à l'enregistrement
+        service.abort_stream_upload(upload_id, "Segments incomplets à l'arrêt")
+        return False
+
+    files = [str(p) for p in seg.stream_files(segment_dir, segment_names)]
+    for attempt in range(FINISH_ATTEMPTS):
+        if service.append_stream_upload(upload_id, files, final=True):
+            logger.info(f"✅ Flux {upload_id} terminé à l'arrêt de l'enregistrement")
+            return True
+        status = service.get_upload_status(upload_id)
+        if status and status['finished']:
+            return status['status'] == 'completed'
+        time.sleep(FINISH_BACKOFF_SECONDS * (attempt + 1))
+
+    service.abort_stream_upload(upload_id, "Dernier segment non envoyé")
+    return False
@@ -4,13 +4,17 @@ Proxy Manager - Gestion des Proxies Vidéo
 
 Responsabilités:
 - Démarrer/arrêter proxies vidéo via video_proxy_server.py
-- Allouer ports dynamiquement
+- Mode hub (défaut): un seul process video_proxy_server.py --hub partagé,
+  les sessions s'y abonnent par URL caméra (compteur de références)
+- Allouer ports dynamiquement (mode subprocess par session)
 - Vérifier santé proxy
 - UN SEUL TYPE DE PROXY pour tous les flux
 """
 
 import logging
+import os
 import subprocess
+import threading
 import time
 import requests
 import sys
@@ -44,7 +48,8 @@ def start_proxy_server(session_id: str, source_url: str, port: int) -> subproces
         "--source", source_url,
         "--port", str(port),
         "--fps", "25",
-        "--quality", "80"
+        "--quality", "80",
+        "--mode", VideoConfig.PROXY_CAPTURE_MODE
     ]
     
     logger.info(f"🚀 Starting video proxy server on port {port}")
@@ -65,11 +70,63 @@ def start_proxy_server(session_id: str, source_url: str, port: int) -> subproces
     return process
 
 
+def start_proxy_hub(port: int) -> subprocess.Popen:
+    """
+    Démarrer le hub proxy multi-caméras (un seul process pour tous les terrains)
+    
+    Args:
+        port: Port HTTP local du hub
+        
+    Returns:
+        Processus subprocess du hub
+    """
+    script_path = Path(__file__).parent / "video_proxy_server.py"
+    
+    cmd = [
+        sys.executable,
+        str(script_path),
+        "--hub",
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--fps", "25",
+        "--quality", "80",
+        "--mode", VideoConfig.PROXY_CAPTURE_MODE
+    ]
+    if VideoConfig.PROXY_HUB_SOCKET:
+        cmd += ["--uds", VideoConfig.PROXY_HUB_SOCKET]
+    
+    logger.info(f"🚀 Starting video proxy hub on port {port}")
+    logger.info(f"   Command: {cmd}")
+    
+    # Logs vers fichier: un pipe jamais lu finirait par bloquer le hub
+    log_file = open(VideoConfig.LOGS_DIR / "proxy_hub.log", 'ab')
+    
+    kwargs = {}
+    if not VideoConfig.is_windows():
+        # Le hub survit au redémarrage d'un worker et reste partagé
+        kwargs['start_new_session'] = True
+    
+    process = subprocess.Popen(
+        cmd,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        **kwargs
+    )
+    log_file.close()
+    
+    logger.info(f"✅ Video proxy hub started (PID: {process.pid})")
+    
+    return process
+
+
 class ProxyManager:
     """Gestionnaire de proxies vidéo (proxy interne universel)"""
     
     def __init__(self):
         self.active_proxies = {}  # port -> process
+        self.hub_process: Optional[subprocess.Popen] = None
+        self.hub_subscriptions = {}  # session_id -> camera_id
+        self._hub_lock = threading.Lock()
         logger.info("🎥 ProxyManager initialisé (VERSION FIX_V2)")
     
     def start_proxy(
@@ -89,6 +146,9 @@ class ProxyManager:
         Returns:
             (local_url, port, process)
         """
+        if VideoConfig.PROXY_HUB_ENABLED and port is None:
+            return self._attach_to_hub(session_id, camera_url)
+        
         # Allouer un port si nécessaire
         if port is None:
             port = VideoConfig.allocate_port()
@@ -143,6 +203,107 @@ class ProxyManager:
             VideoConfig.free_port(port)
             raise
     
+    def _hub_url(self, path: str) -> str:
+        return f"http://127.0.0.1:{VideoConfig.PROXY_HUB_PORT}{path}"
+    
+    def _hub_alive(self) -> bool:
+        try:
+            response = requests.get(self._hub_url("/health"), timeout=1)
+            return response.status_code == 200 and response.json().get("mode") == "hub"
+        except Exception:
+            return False
+    
+    def ensure_hub(self):
+        """
+        S'assurer que le hub proxy tourne (le démarrer au besoin)
+        
+        Un hub déjà lancé par un autre worker est réutilisé tel quel.
+        """
+        with self._hub_lock:
+            if self._hub_alive():
+                return
+            
+            if self.hub_process is None or self.hub_process.poll() is not None:
+                self.hub_process = start_proxy_hub(VideoConfig.PROXY_HUB_PORT)
+            
+            deadline = time.time() + VideoConfig.PROXY_HUB_START_TIMEOUT
+            while time.time() < deadline:
+                if self._hub_alive():
+                    logger.info(f"✅ Hub proxy prêt (port {VideoConfig.PROXY_HUB_PORT})")
+                    return
+                if self.hub_process.poll() is not None and not self._hub_alive():
+                    # Un autre worker a pu prendre le port entre-temps
+                    time.sleep(0.2)
+                    if self._hub_alive():
+                        return
+                    raise RuntimeError(
+                        f"Hub proxy arrêté immédiatement. Exit code: {self.hub_process.returncode}"
+                    )
+                time.sleep(0.2)
+            
+            raise RuntimeError(
+                f"Hub proxy non disponible après {VideoConfig.PROXY_HUB_START_TIMEOUT} secondes"
+            )
+    
+    def _attach_to_hub(
+        self,
+        session_id: str,
+        camera_url: str
+    ) -> Tuple[str, int, Optional[subprocess.Popen]]:
+        """
+        Abonner une session au hub pour une caméra donnée
+        
+        Returns:
+            (local_url, hub_port, hub_process)
+        """
+        self.ensure_hub()
+        
+        response = requests.post(
+            self._hub_url("/cameras"),
+            json={"source": camera_url.strip()},
+            timeout=5
+        )
+        response.raise_for_status()
+        data = response.json()
+        camera_id = data["camera_id"]
+        self.hub_subscriptions[session_id] = camera_id
+        
+        logger.info(f"🔗 Session {session_id} abonnée à la caméra {camera_id} ({data.get('refs')} abonné(s))")
+        
+        if not self._wait_for_proxy_ready(
+            VideoConfig.PROXY_HUB_PORT,
+            timeout=30,
+            health_path=f"/cameras/{camera_id}/health",
+            poll_interval=0.2
+        ):
+            self.release_proxy(session_id)
+            raise RuntimeError(f"Caméra {camera_id}: flux vidéo non disponible après 30 secondes")
+        
+        local_url = self._hub_url(data["stream_path"])
+        logger.info(f"✅ Proxy hub prêt: {local_url}")
+        return local_url, VideoConfig.PROXY_HUB_PORT, self.hub_process
+    
+    def release_proxy(self, session_id: str, port: Optional[int] = None):
+        """
+        Libérer le proxy d'une session (désabonnement hub ou arrêt du subprocess)
+        
+        Args:
+            session_id: ID de la session
+            port: Port du proxy dédié (mode subprocess)
+        """
+        camera_id = self.hub_subscriptions.pop(session_id, None)
+        if camera_id is None:
+            if port:
+                self.stop_proxy(port)
+            return
+        
+        try:
+            response = requests.delete(self._hub_url(f"/cameras/{camera_id}"), timeout=5)
+            refs = response.json().get("refs")
+            logger.info(f"🔓 Session {session_id} désabonnée de {camera_id} ({refs} abonné(s) restant(s))")
+        except Exception as e:
+            logger.error(f"❌ Erreur désabonnement hub ({camera_id}): {e}")
+    
     def stop_proxy(self, port: int):
         """
         Arrêter un proxy
@@ -202,13 +363,21 @@ class ProxyManager:
         except:
             return False
     
-    def _wait_for_proxy_ready(self, port: int, timeout: int = 15) -> bool:
+    def _wait_for_proxy_ready(
+        self,
+        port: int,
+        timeout: int = 15,
+        health_path: str = "/health",
+        poll_interval: float = 0.5
+    ) -> bool:
         """
         Attendre que le proxy soit prêt ET qu'il ait du contenu vidéo
         
         Args:
             port: Port du proxy
             timeout: Timeout en secondes
+            health_path: Endpoint de santé (par caméra en mode hub)
+            poll_interval: Intervalle entre deux vérifications
             
         Returns:
             True si le proxy a du contenu vidéo
@@ -218,7 +387,7 @@ class ProxyManager:
         
         while time.time() - start_time < timeout:
             try:
-                response = requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+                response = requests.get(f"http://127.0.0.1:{port}{health_path}", timeout=1)
                 if response.status_code == 200:
                     data = response.json()
                     last_status = data.get("status")
@@ -233,15 +402,18 @@ class ProxyManager:
                 logger.debug(f"⏳ Attente proxy (port {port}): {e}")
                 pass
             
-            time.sleep(0.5)
+            time.sleep(poll_interval)
         
         logger.error(f"❌ Timeout waiting for proxy video content (port {port}, last_status={last_status})")
         return False
     
     def cleanup_all(self):
-        """Arrêter tous les proxies actifs"""
+        """Arrêter tous les proxies actifs (le hub reste partagé, seuls nos abonnements sont libérés)"""
         logger.info(f"🧹 Nettoyage de {len(self.active_proxies)} proxy(s)")
         
+        for session_id in list(self.hub_subscriptions.keys()):
+            self.release_proxy(session_id)
+        
         ports = list(self.active_proxies.keys())
         for port in ports:
             self.stop_proxy(port)
@@ -7,6 +7,9 @@ Implémentation basée sur le code de référence 'camera-recorder':
 - Gestion robuste des signaux (CTRL_BREAK_EVENT)
 - Résolution intelligente du chemin FFmpeg
 - Logique de fallback pour l'URL d'entrée (Source vs Proxy)
+- Copie directe (-c copy) des caméras RTSP H.264/H.265, overlays différés en option
+- Sortie segmentée CMAF crash-safe, assemblée à l'arrêt (voir segments.py)
+- Segments envoyés à Bunny Stream pendant le match (voir progressive_upload.py)
 """
 
 import logging
@@ -19,12 +22,20 @@ import shutil
 import threading
 import io
 import platform
+import re
 from pathlib import Path
 from typing import Optional, List, Dict
 from datetime import datetime
 
 from .config import VideoConfig
-from .session_manager import VideoSession
+from .session_manager import VideoSession, session_manager
+from . import segments as seg
+from .progressive_upload import ProgressiveUpload, finish_stream
+from ..services import metrics
+
+# Ligne de progression FFmpeg: "frame= 1234 fps= 25 q=-1.0 size= ... speed=1.00x"
+_PROGRESS_FPS = re.compile(r'\bfps=\s*([\d.]+)')
+_PROGRESS_SPEED = re.compile(r'\bspeed=\s*([\d.]+)x')
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +45,8 @@ class VideoRecorder:
     
     def __init__(self):
         self.active_recordings: Dict[str, dict] = {}
+        # Enregistrements arrêtés dont le fichier final reste à produire (finalize_recording)
+        self.stopped_recordings: Dict[str, dict] = {}
         logger.info("🎬 VideoRecorder initialisé (Reference Logic)")
     
     def _resolve_ffmpeg(self) -> str:
@@ -57,57 +70,33 @@ class VideoRecorder:
             logger.error(f"ffmpeg executable not found: '{ffmpeg_path}'")
             raise
 
-    def start_recording(
-        self,
-        session: VideoSession,
-        duration_seconds: int
-    ) -> bool:
-        """
-        Démarrer un enregistrement avec support des overlays FFmpeg
-        """
-        session_id = session.session_id
-        
-        if session_id in self.active_recordings:
-            logger.warning(f"⚠️ Enregistrement déjà actif pour {session_id}")
-            return False
-            
-        logger.info(f"🎬 Démarrage enregistrement {session_id}")
-        
-        # 1. Déterminer l'URL d'entrée (Logique de référence)
-        # On utilise le proxy local pour stabiliser le flux (FPS constant)
-        input_url = session.local_url
+    def _output_args(self, output_path: Path, segment_dir: Optional[Path], faststart: bool = False) -> List[str]:
+        """Arguments de sortie: MP4 unique ou segments fMP4"""
+        if segment_dir is not None:
+            return seg.output_args(segment_dir)
+        args = ["-movflags", "+faststart"] if faststart else []
+        return args + ["-y", str(output_path)]
 
-            
-        # Note: La référence tente ici de démarrer un proxy local dédié.
-        # Dans notre architecture, le proxy est géré par SessionManager.
-        # Si le proxy de session est prêt et stable, on pourrait l'utiliser,
-        # mais pour l'instant on respecte la logique "MJPEG -> Direct".
-        
-        # 2. Préparer chemins
-        video_dir = VideoConfig.get_video_dir(session.club_id)
-        output_path = video_dir / f"{session_id}.mp4"
-        log_path = VideoConfig.get_log_path(session_id)
+    def _get_club_overlays(self, club_id: int):
+        """
+        Récupérer les overlays actifs d'un club et leurs chemins image
         
-        try:
-            ffmpeg_exec = self._resolve_ffmpeg()
-        except Exception as e:
-            logger.error(f"❌ Erreur FFmpeg: {e}")
-            return False
-
-        # 3. Récupérer les overlays actifs pour le club
+        Returns:
+            (overlays, overlay_paths) alignés: seuls les overlays dont l'image existe
+        """
         overlays = []
+        kept_overlays = []
         overlay_paths = []
-        filter_complex_parts = []
         
         try:
             from ..models.user import ClubOverlay
             overlays = ClubOverlay.query.filter_by(
-                club_id=session.club_id,
+                club_id=club_id,
                 is_active=True
             ).all()
             
             if overlays:
-                logger.info(f"🎨 {len(overlays)} overlay(s) actif(s) pour club {session.club_id}")
+                logger.info(f"🎨 {len(overlays)} overlay(s) actif(s) pour club {club_id}")
                 
                 # Préparer les chemins des overlays
                 for overlay in overlays:
@@ -135,6 +124,7 @@ class VideoRecorder:
                         abs_path = Path(overlay.image_url)
                     
                     if abs_path.exists():
+                        kept_overlays.append(overlay)
                         overlay_paths.append(str(abs_path))
                         logger.info(f"  ✓ Overlay: {overlay.name} -> {abs_path}")
                     else:
@@ -145,7 +135,117 @@ class VideoRecorder:
             logger.error(f"❌ Error fetching overlays: {e}")
             # Continue without overlays if there's an error
 
-        # 4. Construire la commande FFmpeg
+        return kept_overlays, overlay_paths
+
+    def _stream_copy_codec(self, session: VideoSession) -> Optional[str]:
+        """
+        Codec de la caméra si l'enregistrement peut se faire en copie directe
+        
+        Seulement pour les sources RTSP en H.264/H.265 (mode 'auto').
+        """
+        if VideoConfig.RECORDING_MODE != 'auto' or session.camera_type != 'rtsp':
+            return None
+        codec = self.probe_video_codec(session.source_url)
+        if codec in VideoConfig.STREAM_COPY_CODECS:
+            logger.info(f"📼 Flux {codec} détecté: enregistrement en copie directe")
+            return codec
+        logger.info(f"📼 Codec caméra '{codec}': transcodage via proxy")
+        return None
+
+    def probe_video_codec(self, source_url: str) -> Optional[str]:
+        """Détecter le codec vidéo d'une source avec ffprobe (None si échec)"""
+        cmd = [VideoConfig.FFPROBE_PATH, "-v", "error"]
+        if source_url.lower().startswith('rtsp://'):
+            cmd.extend(["-rtsp_transport", "tcp"])
+        cmd.extend([
+            "-select_streams", "v:0",
+            "-show_entries", "stream=codec_name",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            source_url
+        ])
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=VideoConfig.PROBE_TIMEOUT_SECONDS)
+            codec = result.stdout.strip().splitlines()[0].strip() if result.stdout.strip() else None
+            return codec or None
+        except Exception as e:
+            logger.warning(f"⚠️ ffprobe impossible sur la source: {e}")
+            return None
+
+    def _build_copy_cmd(
+        self,
+        ffmpeg_exec: str,
+        source_url: str,
+        duration_seconds: int,
+        output_path: Path,
+        segment_dir: Optional[Path] = None
+    ) -> List[str]:
+        """Commande FFmpeg de copie directe du flux RTSP (aucun décodage vidéo)"""
+        return [
+            ffmpeg_exec,
+            "-hide_banner",
+            "-loglevel", "info",
+            "-rtsp_transport", "tcp",
+            "-i", source_url,
+            "-map", "0:v:0",
+            "-map", "0:a?",
+            "-t", str(duration_seconds),
+            "-c:v", "copy",
+            # Audio caméra souvent en G.711, non supporté en MP4: AAC (coût négligeable)
+            "-c:a", "aac",
+            *self._output_args(output_path, segment_dir, faststart=True)
+        ]
+
+    def _build_overlay_filter(self, overlays: list, overlay_paths: List[str]) -> str:
+        """Chaîne filter_complex des overlays (input 0 = vidéo, inputs 1..n = images)"""
+        # Pour FFmpeg, on construit une chaîne d'overlays avec gestion de l'opacité
+        # Exemple: [1:v]format=rgba,colorchannelmixer=aa=0.5[ov1];[0:v][ov1]overlay=...
+        
+        filter_chain = ""
+        current_main_stream = "[0:v]"
+        
+        for i, overlay in enumerate(overlays[:len(overlay_paths)], start=1):
+            # 1. Préparer l'input de l'overlay (gérer opacité)
+            overlay_input_tag = f"[{i}:v]"
+            
+            # Vérifier l'opacité (défaut 1.0)
+            opacity = getattr(overlay, 'opacity', 1.0)
+            
+            if opacity < 0.99:  # Si opacité < 100%
+                # Créer une version transparente de l'overlay
+                processed_overlay_tag = f"[ov{i}]"
+                # format=rgba est crucial pour avoir le canal alpha à modifier
+                filter_chain += f"{overlay_input_tag}format=rgba,colorchannelmixer=aa={opacity}{processed_overlay_tag};"
+                overlay_input_tag = processed_overlay_tag
+            
+            # 2. Calculer position
+            x_expr = f"W*{overlay.position_x/100}"
+            y_expr = f"H*{overlay.position_y/100}"
+            
+            # shortest=1 assure que l'overlay persiste pour toute la durée du flux vidéo
+            overlay_params = f"overlay={x_expr}:{y_expr}:shortest=1"
+            
+            if i == len(overlay_paths):
+                # Dernier overlay
+                filter_chain += f"{current_main_stream}{overlay_input_tag}{overlay_params}"
+            else:
+                # Overlay intermédiaire
+                next_stream = f"[tmp{i}]"
+                filter_chain += f"{current_main_stream}{overlay_input_tag}{overlay_params}{next_stream};"
+                current_main_stream = next_stream
+        
+        return filter_chain
+
+    def _build_transcode_cmd(
+        self,
+        ffmpeg_exec: str,
+        input_url: str,
+        overlays: list,
+        overlay_paths: List[str],
+        duration_seconds: int,
+        output_path: Path,
+        segment_dir: Optional[Path] = None
+    ) -> List[str]:
+        """Commande FFmpeg de transcodage depuis le proxy MJPEG (overlays en direct)"""
         # Base command sans overlays
         cmd = [
             ffmpeg_exec,
@@ -162,42 +262,7 @@ class VideoRecorder:
         
         # Construire le filter_complex si on a des overlays
         if overlay_paths:
-            # Pour FFmpeg, on construit une chaîne d'overlays avec gestion de l'opacité
-            # Exemple: [1:v]format=rgba,colorchannelmixer=aa=0.5[ov1];[0:v][ov1]overlay=...
-            
-            filter_chain = ""
-            current_main_stream = "[0:v]"
-            
-            for i, overlay in enumerate(overlays[:len(overlay_paths)], start=1):
-                # 1. Préparer l'input de l'overlay (gérer opacité)
-                overlay_input_tag = f"[{i}:v]"
-                
-                # Vérifier l'opacité (défaut 1.0)
-                opacity = getattr(overlay, 'opacity', 1.0)
-                
-                if opacity < 0.99:  # Si opacité < 100%
-                    # Créer une version transparente de l'overlay
-                    processed_overlay_tag = f"[ov{i}]"
-                    # format=rgba est crucial pour avoir le canal alpha à modifier
-                    filter_chain += f"{overlay_input_tag}format=rgba,colorchannelmixer=aa={opacity}{processed_overlay_tag};"
-                    overlay_input_tag = processed_overlay_tag
-                
-                # 2. Calculer position
-                x_expr = f"W*{overlay.position_x/100}"
-                y_expr = f"H*{overlay.position_y/100}"
-                
-                # shortest=1 assure que l'overlay persiste pour toute la durée du flux vidéo
-                overlay_params = f"overlay={x_expr}:{y_expr}:shortest=1"
-                
-                if i == len(overlay_paths):
-                    # Dernier overlay
-                    filter_chain += f"{current_main_stream}{overlay_input_tag}{overlay_params}"
-                else:
-                    # Overlay intermédiaire
-                    next_stream = f"[tmp{i}]"
-                    filter_chain += f"{current_main_stream}{overlay_input_tag}{overlay_params}{next_stream};"
-                    current_main_stream = next_stream
-            
+            filter_chain = self._build_overlay_filter(overlays, overlay_paths)
             cmd.extend(["-filter_complex", filter_chain])
             logger.info(f"🎨 Filter complex: {filter_chain}")
         
@@ -208,12 +273,129 @@ class VideoRecorder:
             "-preset", VideoConfig.VIDEO_PRESET,
             "-crf", str(VideoConfig.VIDEO_CRF),
             "-r", str(VideoConfig.VIDEO_FPS),
-            "-c:a", "aac",
+            "-c:a", "aac"
+        ])
+        if segment_dir is not None:
+            # Keyframe à chaque frontière pour des segments de durée exacte
+            cmd.extend(["-force_key_frames", f"expr:gte(t,n_forced*{VideoConfig.SEGMENT_SECONDS})"])
+        cmd.extend(self._output_args(output_path, segment_dir))
+
+        return cmd
+
+    def burn_in_overlays(self, video_path: Path, deferred_overlays: list) -> bool:
+        """
+        Incruster les overlays après un enregistrement en copie directe
+        
+        Le fichier est remplacé en place; en cas d'échec la version sans
+        overlay est conservée.
+        
+        Args:
+            video_path: MP4 enregistré
+            deferred_overlays: liste de (overlay, chemin image)
+        """
+        overlays = [o for o, _ in deferred_overlays]
+        overlay_paths = [p for _, p in deferred_overlays]
+        tmp_path = video_path.with_name(video_path.stem + ".overlay.mp4")
+        
+        cmd = [self._resolve_ffmpeg(), "-hide_banner", "-loglevel", "error", "-i", str(video_path)]
+        for overlay_path in overlay_paths:
+            cmd.extend(["-loop", "1", "-i", overlay_path])
+        cmd.extend([
+            "-filter_complex", self._build_overlay_filter(overlays, overlay_paths),
+            "-c:v", VideoConfig.VIDEO_CODEC,
+            "-preset", VideoConfig.OVERLAY_BURN_IN_PRESET,
+            "-crf", str(VideoConfig.VIDEO_CRF),
+            "-c:a", "copy",
+            "-movflags", "+faststart",
             "-y",
-            str(output_path)
+            str(tmp_path)
         ])
         
-        logger.info(f"📝 Commande FFmpeg: {' '.join(cmd)}")
+        logger.info(f"🎨 Incrustation différée de {len(overlay_paths)} overlay(s): {video_path}")
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0 or not tmp_path.exists():
+                logger.error(f"❌ Incrustation overlays échouée: {result.stderr[-500:]}")
+                tmp_path.unlink(missing_ok=True)
+                return False
+            os.replace(tmp_path, video_path)
+            logger.info(f"✅ Overlays incrustés: {video_path}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Erreur incrustation overlays: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return False
+
+    def burn_in_club_overlays(self, video_path: Path, club_id: int) -> bool:
+        """Incruster les overlays actifs du club (étape du worker de finalisation)"""
+        overlays, overlay_paths = self._get_club_overlays(club_id)
+        if not overlay_paths:
+            logger.info(f"🎨 Aucun overlay actif pour le club {club_id}: incrustation ignorée")
+            return False
+        return self.burn_in_overlays(video_path, list(zip(overlays, overlay_paths)))
+
+    def start_recording(
+        self,
+        session: VideoSession,
+        duration_seconds: int
+    ) -> bool:
+        """
+        Démarrer un enregistrement avec support des overlays FFmpeg
+        """
+        session_id = session.session_id
+        
+        if session_id in self.active_recordings:
+            logger.warning(f"⚠️ Enregistrement déjà actif pour {session_id}")
+            return False
+            
+        logger.info(f"🎬 Démarrage enregistrement {session_id}")
+        
+        # 1. Préparer chemins
+        video_dir = VideoConfig.get_video_dir(session.club_id)
+        output_path = video_dir / f"{session_id}.mp4"
+        log_path = VideoConfig.get_log_path(session_id)
+        
+        try:
+            ffmpeg_exec = self._resolve_ffmpeg()
+        except Exception as e:
+            logger.error(f"❌ Erreur FFmpeg: {e}")
+            return False
+
+        # 2. Récupérer les overlays actifs pour le club
+        overlays, overlay_paths = self._get_club_overlays(session.club_id)
+
+        # 3. Construire la commande FFmpeg
+        # Caméra RTSP déjà en H.264/H.265: copie directe du flux (-c copy), pas de proxy ni d'encodeur
+        copy_codec = self._stream_copy_codec(session)
+        deferred_overlays = []
+        if copy_codec and overlay_paths:
+            if VideoConfig.OVERLAY_MODE == 'deferred':
+                deferred_overlays = list(zip(overlays, overlay_paths))
+                logger.info("🎨 Overlays différés: incrustation après l'enregistrement")
+            else:
+                logger.info("🎨 Overlays en direct configurés: transcodage obligatoire")
+                copy_codec = None
+
+        segment_dir = None
+        if VideoConfig.RECORDING_OUTPUT == 'segmented':
+            segment_dir = VideoConfig.get_segment_dir(session.club_id, session_id)
+
+        if copy_codec:
+            mode = 'copy'
+            cmd = self._build_copy_cmd(ffmpeg_exec, session.source_url, duration_seconds, output_path, segment_dir)
+        else:
+            mode = 'transcode'
+            # Transcodage depuis le proxy local (FPS constant), attaché ici s'il a été différé
+            try:
+                input_url = session_manager.ensure_proxy(session)
+            except Exception as e:
+                logger.error(f"❌ Proxy indisponible: {e}")
+                return False
+            cmd = self._build_transcode_cmd(
+                ffmpeg_exec, input_url, overlays, overlay_paths, duration_seconds, output_path, segment_dir
+            )
+        
+        logger.info(f"📝 Commande FFmpeg ({mode}{' ' + copy_codec if copy_codec else ''}): {' '.join(cmd)}")
         
         try:
             # 4. Lancer le processus
@@ -247,6 +429,9 @@ class VideoRecorder:
                                     fh.write(line + '\n')
                                     fh.flush()
                             except Exception: pass
+                            if line.startswith('frame='):
+                                self._record_progress(sid, line)
+                                continue
                             # On ne loggue pas tout dans la console pour éviter le spam, juste dans le fichier
                             # Sauf erreurs ou infos importantes
                             if "Error" in line or "error" in line:
@@ -266,6 +451,19 @@ class VideoRecorder:
             
             threading.Thread(target=_close_log_when_done, args=(process, log_file), daemon=True).start()
             
+            # Suivi des segments terminés (manifeste), envoyés au fil de l'eau
+            # sauf si les overlays différés imposent un ré-encodage après l'arrêt
+            watcher = None
+            uploader = None
+            if segment_dir is not None:
+                if VideoConfig.PROGRESSIVE_UPLOAD and not deferred_overlays:
+                    uploader = ProgressiveUpload(session_id, segment_dir, f"Enregistrement {session_id}")
+                    uploader.start()
+                watcher = seg.SegmentWatcher(
+                    session_id, segment_dir, on_segment=uploader.segment_closed if uploader else None
+                )
+                watcher.start()
+            
             # Enregistrer état
             self.active_recordings[session_id] = {
                 'process': process,
@@ -273,12 +471,18 @@ class VideoRecorder:
                 'start_time': datetime.now(),
                 'duration_seconds': duration_seconds,
                 'pid': process.pid,
-                'session': session
+                'session': session,
+                'mode': mode,
+                'deferred_overlays': deferred_overlays,
+                'segment_dir': segment_dir,
+                'segment_watcher': watcher,
+                'progressive_upload': uploader
             }
             
             session.recording_process = process
             session.recording_active = True
             session.recording_path = output_path
+            metrics.set_active_recordings(len(self.active_recordings))
             
             logger.info(f"✅ Enregistrement démarré (PID: {process.pid})")
             return True
@@ -287,8 +491,19 @@ class VideoRecorder:
             logger.error(f"❌ Erreur démarrage enregistrement: {e}")
             return False
 
-    def stop_recording(self, session_id: str) -> Optional[str]:
-        """Arrêter l'enregistrement (Logique de référence)"""
+    def stop_recording(self, session_id: str, finalize: bool = True) -> Optional[str]:
+        """
+        Arrêter l'enregistrement (Logique de référence)
+        
+        Args:
+            session_id: ID de la session
+            finalize: produire le fichier final tout de suite (assemblage des segments,
+                overlays différés); False laisse ces étapes au worker de finalisation
+                (finalize_recording() puis burn_in_club_overlays())
+        
+        Returns:
+            Chemin du MP4 final (ou du fichier de sortie FFmpeg si finalize=False)
+        """
         info = self.active_recordings.get(session_id)
         if not info:
             logger.warning(f"⚠️ Pas d'enregistrement actif pour {session_id}")
@@ -335,6 +550,57 @@ class VideoRecorder:
 
             if session_id in self.active_recordings:
                 del self.active_recordings[session_id]
+            metrics.set_active_recordings(len(self.active_recordings))
+            if info.get('session'):
+                metrics.set_recorder_progress(info['session'].club_id, info['session'].terrain_id, 0, 0)
+        
+        # Le suivi des segments fait son dernier passage sans bloquer l'arrêt
+        if info.get('segment_watcher'):
+            info['segment_watcher'].finish(timeout=0)
+        self.stopped_recordings[session_id] = info
+        
+        if not finalize:
+            return str(output_path)
+        club_id = info['session'].club_id if info.get('session') else None
+        video_path = self.finalize_recording(session_id, club_id)
+        if video_path and info.get('deferred_overlays'):
+            self.burn_in_overlays(Path(video_path), info['deferred_overlays'])
+        return video_path
+
+    def finalize_recording(self, session_id: str, club_id: Optional[int]) -> Optional[str]:
+        """
+        Produire le MP4 final d'un enregistrement arrêté
+        
+        Sortie segmentée: attendre le dernier passage du suivi des segments, terminer
+        l'upload progressif (dernier segment) puis les assembler. Sans état en mémoire
+        (redémarrage), les segments présents sur disque sont assemblés.
+        
+        Returns:
+            Chemin du MP4 final, ou None si le fichier est vide ou manquant
+        """
+        info = self.stopped_recordings.pop(session_id, None)
+        if info:
+            output_path = info['output_path']
+            segment_dir = info.get('segment_dir')
+            if info.get('segment_watcher'):
+                info['segment_watcher'].finish(timeout=VideoConfig.SEGMENT_FINISH_TIMEOUT)
+        elif club_id is not None:
+            # Pas d'état en mémoire (crash, redémarrage): reprendre depuis le disque
+            info = {}
+            output_path = VideoConfig.get_video_dir(club_id) / f"{session_id}.mp4"
+            segment_dir = VideoConfig.get_segment_dir(club_id, session_id, create=False)
+            if segment_dir.exists():
+                logger.info(f"♻️ Récupération enregistrement segmenté {session_id}")
+        else:
+            logger.error(f"❌ Enregistrement {session_id} inconnu: finalisation impossible")
+            return None
+        
+        if segment_dir is not None and segment_dir.exists():
+            if info.get('progressive_upload'):
+                info['progressive_upload'].finish(timeout=VideoConfig.SEGMENT_FINISH_TIMEOUT)
+            elif VideoConfig.PROGRESSIVE_UPLOAD:
+                finish_stream(session_id, segment_dir)
+            self._assemble_segments(session_id, segment_dir, output_path, complete=bool(info))
                 
         # Vérification finale
         if output_path.exists() and output_path.stat().st_size > 1000:
@@ -344,6 +610,34 @@ class VideoRecorder:
             logger.error(f"❌ Fichier vidéo vide ou manquant: {output_path}")
             return None
 
+    def _assemble_segments(self, session_id: str, segment_dir: Path, output_path: Path, complete: bool) -> bool:
+        try:
+            ffmpeg_exec = self._resolve_ffmpeg()
+        except Exception:
+            return False
+        if not seg.assemble_segments(ffmpeg_exec, segment_dir, output_path):
+            return False
+        if VideoConfig.KEEP_SEGMENTS:
+            watched = [
+                {'index': i, 'file': p.name} for i, p in enumerate(seg.list_segment_files(segment_dir))
+            ]
+            seg.write_manifest(segment_dir, session_id, watched, complete=complete)
+        else:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+        return True
+
+    def _record_progress(self, session_id: str, line: str):
+        """Progression FFmpeg (fps, vitesse): statut de l'enregistrement et métriques du terrain"""
+        info = self.active_recordings.get(session_id)
+        if not info or not info.get('session'):
+            return
+        fps = _PROGRESS_FPS.search(line)
+        speed = _PROGRESS_SPEED.search(line)
+        info['fps'] = float(fps.group(1)) if fps else info.get('fps')
+        info['speed'] = float(speed.group(1)) if speed else info.get('speed')
+        metrics.set_recorder_progress(info['session'].club_id, info['session'].terrain_id,
+                                      info['fps'], info['speed'])
+
     def get_recording_status(self, session_id: str) -> Optional[dict]:
         info = self.active_recordings.get(session_id)
         if not info: return None
@@ -358,7 +652,11 @@ class VideoRecorder:
             'pid': info['pid'],
             'elapsed_seconds': int(elapsed),
             'duration_seconds': info['duration_seconds'],
-            'output_path': str(info['output_path'])
+            'output_path': str(info['output_path']),
+            'mode': info.get('mode', 'transcode'),
+            'fps': info.get('fps'),
+            'speed': info.get('speed'),
+            'segments_completed': len(info['segment_watcher'].segments) if info.get('segment_watcher') else None
         }
 
     def cleanup_all(self):
@@ -0,0 +1,243 @@
+"""
+Recording Segments - Sortie segmentée crash-safe
+================================================
+
+Responsabilités:
+- Arguments FFmpeg pour une sortie en segments CMAF (HLS fMP4: init.mp4 + seg_*.m4s)
+- Suivi des segments terminés (playlist FFmpeg → manifeste index.json)
+- Assemblage final sans ré-encodage (-c copy)
+
+init.mp4 suivi des segments dans l'ordre forme, octet pour octet, un MP4 fragmenté
+valide: chaque segment fermé peut être envoyé tel quel à la suite du précédent
+pendant le match (voir progressive_upload.py). Un segment reste lisible
+même si FFmpeg est tué: au pire on perd la fin du segment en cours.
+"""
+
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from .config import VideoConfig
+
+logger = logging.getLogger(__name__)
+
+INIT_NAME = "init.mp4"
+SEGMENT_PATTERN = "seg_%05d.m4s"
+SEGMENT_NAME = re.compile(r"^seg_(\d+)\.m4s(\.tmp)?$")
+PLAYLIST_NAME = "index.m3u8"
+MANIFEST_NAME = "index.json"
+
+
+def output_args(segment_dir: Path) -> List[str]:
+    """Arguments de sortie FFmpeg: segments CMAF + playlist tenue à jour par FFmpeg"""
+    return [
+        "-f", "hls",
+        "-hls_time", str(VideoConfig.SEGMENT_SECONDS),
+        "-hls_list_size", "0",
+        "-hls_playlist_type", "event",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", INIT_NAME,
+        # Segment écrit sous .tmp puis renommé: un seg_*.m4s présent est complet
+        "-hls_flags", "temp_file+independent_segments",
+        "-hls_segment_filename", str(segment_dir / SEGMENT_PATTERN),
+        "-y",
+        str(segment_dir / PLAYLIST_NAME)
+    ]
+
+
+def list_segment_files(segment_dir: Path) -> List[Path]:
+    """
+    Segments présents sur disque, dans l'ordre (sans init.mp4)
+    Un .tmp laissé par un arrêt brutal n'est gardé que s'il est le dernier
+    """
+    indexed = []
+    for path in segment_dir.glob("seg_*.m4s*"):
+        match = SEGMENT_NAME.match(path.name)
+        if match and path.stat().st_size > 0:
+            indexed.append((int(match.group(1)), bool(match.group(2)), path))
+    indexed.sort()
+    return [path for i, (_, partial, path) in enumerate(indexed) if not partial or i == len(indexed) - 1]
+
+
+def stream_files(segment_dir: Path, segment_names: Optional[List[str]] = None) -> List[Path]:
+    """
+    Fichiers dont la concaténation forme le MP4 fragmenté: init.mp4 puis les segments
+
+    Args:
+        segment_names: segments à retenir (par défaut tous ceux présents sur disque)
+    """
+    init_path = segment_dir / INIT_NAME
+    if not init_path.exists():
+        return []
+    if segment_names is None:
+        segments = list_segment_files(segment_dir)
+    else:
+        segments = [segment_dir / name for name in segment_names]
+    return [init_path] + segments
+
+
+def write_manifest(segment_dir: Path, session_id: str, segments: list, complete: bool):
+    """Écrire index.json de façon atomique (lisible à tout moment)"""
+    manifest = {
+        'session_id': session_id,
+        'segment_seconds': VideoConfig.SEGMENT_SECONDS,
+        'complete': complete,
+        'updated_at': time.time(),
+        'segments': segments
+    }
+    tmp_path = segment_dir / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp_path, segment_dir / MANIFEST_NAME)
+
+
+def read_manifest_segments(segment_dir: Path) -> List[str]:
+    """Segments relevés dans index.json (vide si absent ou illisible)"""
+    try:
+        with open(segment_dir / MANIFEST_NAME, 'r', encoding='utf-8') as fh:
+            return [segment['file'] for segment in json.load(fh).get('segments', [])]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+
+def assemble_segments(ffmpeg_exec: str, segment_dir: Path, output_path: Path) -> bool:
+    """
+    Assembler les segments en un MP4 unique (copie, quelques secondes pour 90 min)
+
+    Args:
+        ffmpeg_exec: Exécutable FFmpeg
+        segment_dir: Dossier des segments
+        output_path: MP4 final
+
+    Returns:
+        True si le MP4 final a été produit
+    """
+    files = stream_files(segment_dir)
+    if len(files) < 2:
+        logger.error(f"❌ Aucun segment à assembler dans {segment_dir}")
+        return False
+
+    tmp_path = output_path.with_name(output_path.stem + ".assembling.mp4")
+    # Protocole concat: lecture des fichiers bout à bout (init.mp4 + segments = un seul fMP4)
+    cmd = [
+        ffmpeg_exec,
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", "concat:" + "|".join(path.name for path in files),
+        "-c", "copy",
+        "-movflags", "+faststart",
+        "-y",
+        str(tmp_path.resolve())
+    ]
+
+    logger.info(f"🧩 Assemblage de {len(files) - 1} segment(s) → {output_path}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(segment_dir))
+        if result.returncode != 0 or not tmp_path.exists():
+            logger.error(f"❌ Assemblage segments échoué: {result.stderr[-500:]}")
+            tmp_path.unlink(missing_ok=True)
+            return False
+        os.replace(tmp_path, output_path)
+        logger.info(f"✅ Segments assemblés: {output_path}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Erreur assemblage segments: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return False
+
+
+class SegmentWatcher(threading.Thread):
+    """
+    Suit la playlist écrite par FFmpeg et tient le manifeste à jour
+
+    FFmpeg n'ajoute un segment à la playlist (réécrite de façon atomique) qu'à sa
+    fermeture: tout segment listé est complet. on_segment(path) est appelé pour
+    chaque nouveau segment, dans l'ordre (upload progressif).
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        segment_dir: Path,
+        poll_interval: float = 2.0,
+        on_segment: Optional[Callable[[Path], None]] = None
+    ):
+        super().__init__(name=f"segments-{session_id}", daemon=True)
+        self.session_id = session_id
+        self.segment_dir = segment_dir
+        self.poll_interval = poll_interval
+        self.on_segment = on_segment
+        self.segments: list = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self._safe_scan()
+        # Dernier passage: FFmpeg ajoute le dernier segment à l'arrêt
+        self._safe_scan()
+
+    def _safe_scan(self):
+        """Un passage en erreur ne doit pas arrêter le suivi (nouvel essai au passage suivant)"""
+        try:
+            self._scan()
+        except Exception as e:
+            logger.error(f"❌ Suivi des segments en erreur ({self.session_id}): {e}")
+
+    def finish(self, timeout: Optional[float] = None):
+        """Arrêter le suivi après avoir relevé les derniers segments"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+    @property
+    def segment_names(self) -> List[str]:
+        return [segment['file'] for segment in self.segments]
+
+    def _scan(self):
+        playlist_path = self.segment_dir / PLAYLIST_NAME
+        if not playlist_path.exists():
+            return
+        try:
+            with open(playlist_path, 'r', encoding='utf-8') as fh:
+                lines = fh.read().splitlines()
+        except OSError as e:
+            logger.debug(f"Lecture playlist segments impossible: {e}")
+            return
+
+        listed = []
+        duration = None
+        for line in lines:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                try:
+                    duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+                except ValueError:
+                    logger.warning(f"⚠️ Durée de segment illisible ignorée ({self.session_id}): {line!r}")
+                    duration = None
+            elif line and not line.startswith('#'):
+                if duration is not None:
+                    listed.append((Path(line).name, duration))
+                duration = None
+
+        for name, duration in listed[len(self.segments):]:
+            start = self.segments[-1]['end'] if self.segments else 0.0
+            segment = {
+                'index': len(self.segments),
+                'file': name,
+                'start': start,
+                'end': start + duration
+            }
+            self.segments.append(segment)
+            write_manifest(self.segment_dir, self.session_id, self.segments, complete=False)
+            logger.info(
+                f"📦 Segment {segment['index']} terminé ({self.session_id}): "
+                f"{segment['start']:.0f}s → {segment['end']:.0f}s"
+            )
+            if self.on_segment:
+                self.on_segment(self.segment_dir / name)
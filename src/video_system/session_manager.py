@@ -5,7 +5,8 @@ Session Manager - Gestion des Sessions Caméra
 Responsabilités:
 - Créer/fermer sessions caméra
 - Valider caméras (MJPEG/RTSP)
-- Gérer URLs proxy locales
+- Gérer URLs proxy locales (abonnement au hub proxy par URL caméra)
+- Caméras RTSP enregistrées en copie directe: proxy attaché à la demande (preview)
 - Cleanup sessions orphelines
 """
 
@@ -37,9 +38,9 @@ class VideoSession:
     source_url: str
     camera_type: str  # 'mjpeg' | 'rtsp' | 'http'
     
-    # Proxy local
-    local_url: str
-    proxy_port: int
+    # Proxy local (None tant qu'il n'est pas attaché, voir SessionManager.ensure_proxy)
+    local_url: Optional[str]
+    proxy_port: Optional[int]
     proxy_process: Optional[subprocess.Popen] = None
     
     # Recording
@@ -91,6 +92,7 @@ class SessionManager:
         self.sessions: Dict[str, VideoSession] = {}
         self.proxy_manager = ProxyManager()
         self._lock = threading.Lock()
+        self._proxy_lock = threading.Lock()
         logger.info("🎬 SessionManager initialisé")
     
     def get_active_session_by_terrain(self, terrain_id: int) -> Optional[VideoSession]:
@@ -137,17 +139,13 @@ class SessionManager:
         logger.info(f"✅ Caméra validée: type={camera_type}")
         
         # Démarrer proxy universel (supporte tous les types)
-        try:
-            local_url, proxy_port, proxy_process = self.proxy_manager.start_proxy(
-                session_id=session_id,
-                camera_url=camera_url
-            )
-            
-            logger.info(f"✅ Proxy démarré: {local_url}")
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur démarrage proxy: {e}")
-            raise
+        # RTSP en mode 'auto': FFmpeg lit probablement la caméra en copie directe, le proxy
+        # (seconde connexion amont + décodage) n'est attaché qu'à la demande
+        local_url, proxy_port, proxy_process = None, None, None
+        if self._proxy_deferred(camera_type):
+            logger.info("⏸️ Proxy différé: attaché à la demande (transcodage ou preview)")
+        else:
+            local_url, proxy_port, proxy_process = self._start_proxy(session_id, camera_url)
         
         # Créer session
         session = VideoSession(
@@ -170,6 +168,40 @@ class SessionManager:
         
         return session
     
+    @staticmethod
+    def _proxy_deferred(camera_type: str) -> bool:
+        return camera_type == 'rtsp' and VideoConfig.RECORDING_MODE == 'auto'
+    
+    def _start_proxy(self, session_id: str, camera_url: str) -> Tuple[str, int, Optional[subprocess.Popen]]:
+        try:
+            local_url, proxy_port, proxy_process = self.proxy_manager.start_proxy(
+                session_id=session_id,
+                camera_url=camera_url
+            )
+            
+            logger.info(f"✅ Proxy démarré: {local_url}")
+            return local_url, proxy_port, proxy_process
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur démarrage proxy: {e}")
+            raise
+    
+    def ensure_proxy(self, session: VideoSession) -> str:
+        """
+        Attacher le proxy d'une session s'il ne l'est pas encore
+        
+        Returns:
+            URL locale du flux MJPEG (session.local_url)
+        """
+        with self._proxy_lock:
+            if session.session_id not in self.sessions:
+                raise RuntimeError(f"Session {session.session_id} fermée")
+            if not session.local_url:
+                session.local_url, session.proxy_port, session.proxy_process = self._start_proxy(
+                    session.session_id, session.source_url
+                )
+        return session.local_url
+    
     def validate_camera(self, camera_url: str) -> Tuple[bool, str]:
         """
         Valider une caméra et détecter son type
@@ -257,16 +289,17 @@ class SessionManager:
             # On continue le nettoyage même si actif pour éviter les zombies
             # raise RuntimeError("Recording still active") # DISABLED checking to prevent stuck sessions
         
-        # Arrêter le proxy
-        if session.proxy_port:
-            try:
-                self.proxy_manager.stop_proxy(session.proxy_port)
-                logger.info(f"✅ Proxy arrêté (port {session.proxy_port})")
-            except Exception as e:
-                logger.error(f"❌ Erreur arrêt proxy: {e}")
-        
-        # Supprimer de la liste
-        del self.sessions[session_id]
+        # Libérer le proxy (désabonnement hub ou arrêt du proxy dédié)
+        with self._proxy_lock:
+            if session.proxy_port:
+                try:
+                    self.proxy_manager.release_proxy(session_id, session.proxy_port)
+                    logger.info(f"✅ Proxy libéré (port {session.proxy_port})")
+                except Exception as e:
+                    logger.error(f"❌ Erreur arrêt proxy: {e}")
+            
+            # Supprimer de la liste
+            del self.sessions[session_id]
         logger.info(f"✅ Session {session_id} fermée")
     
     def list_sessions(self) -> list:
@@ -1,22 +1,32 @@
 # video_proxy_server.py
 # Python 3.10+
-# Dépendances: fastapi, uvicorn, opencv-python, numpy
-# Installation: pip install fastapi uvicorn opencv-python numpy
+# Dépendances: fastapi, uvicorn, opencv-python, numpy, requests
+# Installation: pip install fastapi uvicorn opencv-python numpy requests
+#
+# Modes de capture:
+#   passthrough : sources HTTP MJPEG, les JPEG caméra sont republiés tels quels
+#                 (découpage multipart, zéro décodage / ré-encodage)
+#   decode      : OpenCV décode puis ré-encode en JPEG (RTSP/H.264, RTMP, ...)
+#   auto        : passthrough si la source HTTP répond en multipart, sinon decode
 
 import argparse
+import asyncio
+import hashlib
 import logging
+import os
 import signal
+import socket
 import sys
 import time
 import threading
-from collections import deque
-from dataclasses import dataclass
-from typing import Deque, Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+import requests
+from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 import uvicorn
 
 
@@ -24,39 +34,193 @@ import uvicorn
 class ProxyConfig:
     source: str
     fps: int = 25
-    buffer_size: int = 50  # frames (encoded JPEG)
     jpeg_quality: int = 80
     reconnect_interval: float = 5.0  # seconds
+    mode: str = "auto"  # auto | passthrough | decode
+
+
+# Marqueurs SOF (Start Of Frame) portant les dimensions de l'image
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Lire (H, W) depuis l'en-tête JPEG sans décoder l'image."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    n = len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # octet de bourrage
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            h = int.from_bytes(data[i + 5:i + 7], "big")
+            w = int.from_bytes(data[i + 7:i + 9], "big")
+            return h, w
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+class MjpegPartParser:
+    """
+    Découpe un flux multipart/x-mixed-replace en images JPEG, sans décodage.
+
+    Utilise Content-Length quand la caméra le fournit, sinon cherche le
+    délimiteur suivant.
+    """
+
+    MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, boundary: str):
+        self._delim = b"--" + boundary.strip().strip('"').lstrip("-").encode("latin-1")
+        self._buf = bytearray()
+        self._expected: Optional[int] = None  # taille de la partie en cours (-1 = inconnue)
+
+    @staticmethod
+    def boundary_from_content_type(content_type: str) -> Optional[str]:
+        if "multipart" not in content_type.lower():
+            return None
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "boundary" and value:
+                return value
+        return None
+
+    @staticmethod
+    def _content_length(headers: bytes) -> int:
+        for line in headers.split(b"\r\n"):
+            key, _, value = line.partition(b":")
+            if key.strip().lower() == b"content-length":
+                try:
+                    return int(value.strip())
+                except ValueError:
+                    return -1
+        return -1
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        self._buf += chunk
+        frames = []
+        while True:
+            if self._expected is None:
+                start = self._buf.find(self._delim)
+                if start < 0:
+                    # Garder la fin: le délimiteur peut être coupé entre deux chunks
+                    if len(self._buf) > len(self._delim):
+                        del self._buf[:-len(self._delim)]
+                    break
+                header_end = self._buf.find(b"\r\n\r\n", start)
+                if header_end < 0:
+                    break
+                headers = bytes(self._buf[start + len(self._delim):header_end])
+                del self._buf[:header_end + 4]
+                self._expected = self._content_length(headers)
+
+            if self._expected >= 0:
+                if len(self._buf) < self._expected:
+                    break
+                frame = bytes(self._buf[:self._expected])
+                del self._buf[:self._expected]
+            else:
+                end = self._buf.find(self._delim)
+                if end < 0:
+                    if len(self._buf) > self.MAX_FRAME_BYTES:
+                        self._buf.clear()
+                        self._expected = None
+                    break
+                frame = bytes(self._buf[:end]).rstrip(b"\r\n")
+                del self._buf[:end]
+
+            self._expected = None
+            if frame[:2] == b"\xff\xd8":
+                frames.append(frame)
+        return frames
+
+
+@dataclass
+class StreamClient:
+    """Consommateur de /stream.mjpg (enregistreur, preview, live...)."""
+    client_id: int
+    name: str
+    last_seq: int = 0
+    sent: int = 0
+    dropped: int = 0  # frames caméra jamais envoyées à ce client (client lent / cadence plus basse)
+    connected_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.client_id,
+            "name": self.name,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "connected_for": round(time.time() - self.connected_at, 1),
+        }
 
 
 class VideoProxy:
+    # Sans abonné: une frame encodée par seconde (health / snapshot), le reste est seulement "grab"
+    IDLE_REFRESH_SECONDS = 1.0
+    # Snapshot demandé depuis moins longtemps: cadence normale (vignettes rafraîchies par polling)
+    SNAPSHOT_ACTIVE_SECONDS = 5.0
+    # Mode événementiel: renvoyer la dernière frame si la caméra se tait
+    KEEPALIVE_SECONDS = 1.0
+    # Vignettes: largeur demandée arrondie à l'une de ces tailles (cache borné)
+    SNAPSHOT_WIDTHS = (160, 320, 640, 960)
+    SNAPSHOT_QUALITY = 70
+
     def __init__(self, config: ProxyConfig):
         self.cfg = config
 
         # Shared state
-        self._buffer: Deque[bytes] = deque(maxlen=self.cfg.buffer_size)
         self._latest_jpeg: Optional[bytes] = None
         self._latest_raw: Optional[np.ndarray] = None
         self._latest_shape: Optional[Tuple[int, int]] = None  # (H, W)
+        self._has_real_frame = False
+        self.mode = "decode" if self.cfg.mode == "decode" or not self._is_http_source() else "passthrough"
         self._running = threading.Event()
         self._running.set()
+        self._stopped = threading.Event()
 
         self._lock = threading.Lock()
+        # Notifie les clients à chaque nouvelle frame (remplace le polling par client)
+        self._frame_cond = threading.Condition(self._lock)
+        self._frame_seq = 0
+        self._last_publish = 0.0
+        self._clients: Dict[int, StreamClient] = {}
+        self._next_client_id = 1
+        self._frames_captured = 0
+        self._frames_encoded = 0
+        self._dropped_total = 0
         self._cap: Optional[cv2.VideoCapture] = None
         self._capture_thread = threading.Thread(target=self._capture_loop, name="capture", daemon=True)
 
+        # Snapshots: ETag = instance + numéro de frame (un redémarrage du proxy change l'ETag)
+        self._instance = os.urandom(4).hex()
+        # largeur -> (numéro de frame, JPEG réduit): une réduction par frame et par taille
+        self._variants: Dict[int, Tuple[int, bytes]] = {}
+        self._variant_lock = threading.Lock()
+        self._preview_viewers = 0
+        self._last_snapshot_request = 0.0
+
     def start(self):
         logging.info("Démarrage du thread de capture…")
         self._capture_thread.start()
 
-    def stop(self):
+    def stop(self, timeout: float = 5.0):
         logging.info("Arrêt du proxy vidéo…")
         self._running.clear()
-        if self._cap is not None:
-            try:
-                self._cap.release()
-            except Exception:
-                pass
+        self._stopped.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        # La capture est libérée par son propre thread: un release() concurrent
+        # d'un read() en cours peut faire planter tout le process (hub partagé).
+        if self._capture_thread.is_alive() and threading.current_thread() is not self._capture_thread:
+            self._capture_thread.join(timeout=timeout)
 
     def _open_capture(self) -> Optional[cv2.VideoCapture]:
         logging.info(f"Connexion à la source: {self.cfg.source}")
@@ -82,11 +246,126 @@ class VideoProxy:
             logging.error(f"Erreur encodage JPEG: {e}")
             return None
 
+    def _is_http_source(self) -> bool:
+        return self.cfg.source.lower().startswith(("http://", "https://"))
+
+    def _publish(self, jpeg: bytes, shape: Optional[Tuple[int, int]], raw: Optional[np.ndarray] = None):
+        # Mettre à jour état partagé et réveiller les clients en attente
+        with self._frame_cond:
+            self._latest_raw = raw
+            if shape is not None:
+                self._latest_shape = shape
+            self._latest_jpeg = jpeg
+            self._has_real_frame = True
+            self._frame_seq += 1
+            self._last_publish = time.monotonic()
+            self._frame_cond.notify_all()
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+    def subscribe(self, name: str = "client") -> StreamClient:
+        with self._lock:
+            client = StreamClient(client_id=self._next_client_id, name=name, last_seq=self._frame_seq)
+            self._next_client_id += 1
+            self._clients[client.client_id] = client
+            count = len(self._clients)
+        logging.info(f"Client {client.client_id} ({name}) connecté — {count} abonné(s)")
+        return client
+
+    def unsubscribe(self, client: StreamClient):
+        with self._lock:
+            self._clients.pop(client.client_id, None)
+            count = len(self._clients)
+        logging.info(
+            f"Client {client.client_id} ({client.name}) déconnecté — "
+            f"{client.sent} envoyées, {client.dropped} sautées, {count} abonné(s)"
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._clients),
+                "preview_viewers": self._preview_viewers,
+                "frames_captured": self._frames_captured,
+                "frames_encoded": self._frames_encoded,
+                "dropped_frames": self._dropped_total,
+                "clients": [c.to_dict() for c in self._clients.values()],
+            }
+
+    def _idle(self) -> bool:
+        """Ni abonné, ni preview, ni snapshot récent, et frame de santé encore fraîche: inutile de décoder/encoder."""
+        now = time.monotonic()
+        with self._lock:
+            return (
+                not self._clients
+                and not self._preview_viewers
+                and now - self._last_snapshot_request >= self.SNAPSHOT_ACTIVE_SECONDS
+                and now - self._last_publish < self.IDLE_REFRESH_SECONDS
+            )
+
+    def has_video(self) -> bool:
+        with self._lock:
+            return self._has_real_frame
+
     def _capture_loop(self):
         # Placeholder noir tant que pas d'image
         self._latest_jpeg = self._black_jpeg(640, 480)
         self._latest_shape = (480, 640)
 
+        if self.mode == "passthrough":
+            self._passthrough_loop()
+
+        if self._running.is_set():
+            self._decode_loop()
+
+        logging.info("Capture loop arrêtée.")
+
+    def _passthrough_loop(self):
+        """
+        Republier les JPEG de la caméra tels quels (sources HTTP MJPEG).
+
+        Rend la main au mode decode si la source ne répond pas en multipart
+        (sauf si le mode passthrough est imposé).
+        """
+        while self._running.is_set():
+            logging.info(f"Connexion passthrough à la source: {self.cfg.source}")
+            try:
+                with requests.get(self.cfg.source, stream=True, timeout=(5, 10)) as response:
+                    boundary = None
+                    if response.status_code == 200:
+                        boundary = MjpegPartParser.boundary_from_content_type(
+                            response.headers.get("Content-Type", "")
+                        )
+                    if boundary is None:
+                        logging.warning(
+                            f"Source non MJPEG multipart (HTTP {response.status_code}, "
+                            f"{response.headers.get('Content-Type')})"
+                        )
+                        if self.cfg.mode != "passthrough":
+                            logging.info("Bascule en mode decode (OpenCV).")
+                            self.mode = "decode"
+                            return
+                        time.sleep(self.cfg.reconnect_interval)
+                        continue
+
+                    logging.info("Source vidéo connectée (passthrough).")
+                    parser = MjpegPartParser(boundary)
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        if not self._running.is_set():
+                            return
+                        for jpeg in parser.feed(chunk):
+                            self._frames_captured += 1
+                            self._publish(jpeg, jpeg_dimensions(jpeg))
+            except requests.RequestException as e:
+                logging.warning(f"Erreur flux passthrough: {e}")
+
+            if self._running.is_set():
+                logging.warning("Perte du flux. Tentative de reconnexion dans 5s…")
+                time.sleep(self.cfg.reconnect_interval)
+
+    def _decode_loop(self):
         while self._running.is_set():
             # Assurer cap ouvert
             if self._cap is None or not self._cap.isOpened():
@@ -95,8 +374,15 @@ class VideoProxy:
                     time.sleep(self.cfg.reconnect_interval)
                     continue
 
-            # Lire une image
-            ret, frame = self._cap.read()
+            # Sans abonné: grab() draine la source sans conversion ni encodage JPEG
+            if self._idle():
+                if self._cap.grab():
+                    self._frames_captured += 1
+                    continue
+                ret, frame = False, None
+            else:
+                # Lire une image
+                ret, frame = self._cap.read()
             if not ret or frame is None:
                 logging.warning("Perte du flux. Tentative de reconnexion dans 5s…")
                 try:
@@ -107,19 +393,21 @@ class VideoProxy:
                 time.sleep(self.cfg.reconnect_interval)
                 continue
 
-            # Mettre à jour état partagé
+            self._frames_captured += 1
             h, w = frame.shape[:2]
             jpeg = self._encode_jpeg(frame)
             if jpeg is None:
                 continue
+            self._frames_encoded += 1
 
-            with self._lock:
-                self._latest_raw = frame
-                self._latest_shape = (h, w)
-                self._latest_jpeg = jpeg
-                self._buffer.append(jpeg)
+            self._publish(jpeg, (h, w), raw=frame)
 
-        logging.info("Capture loop arrêtée.")
+        if self._cap is not None:
+            try:
+                self._cap.release()
+            except Exception:
+                pass
+            self._cap = None
 
     def _black_jpeg(self, w: int, h: int) -> bytes:
         frame = np.zeros((h, w, 3), dtype=np.uint8)
@@ -133,72 +421,413 @@ class VideoProxy:
         # Fallback
         return self._black_jpeg(640, 480)
 
+    def get_latest_shape(self) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            return self._latest_shape
+
     def get_latest_raw(self) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]:
         with self._lock:
             if self._latest_raw is None:
                 return None, self._latest_shape
             return self._latest_raw.copy(), self._latest_shape
 
-    def mjpeg_generator(self, fps: Optional[int] = None):
+    # ------------------------------------------------------------------
+    # Snapshots et vignettes (servis depuis la mémoire, sans connexion amont)
+
+    def _variant_width(self, width: Optional[int], shape: Optional[Tuple[int, int]]) -> int:
+        """Largeur de vignette à servir, 0 pour l'image d'origine"""
+        if not width or width <= 0:
+            return 0
+        target = next((w for w in self.SNAPSHOT_WIDTHS if w >= width), self.SNAPSHOT_WIDTHS[-1])
+        if shape is not None and target >= shape[1]:
+            return 0
+        return target
+
+    def _downscale(self, jpeg: bytes, width: int) -> Optional[bytes]:
+        try:
+            data = np.frombuffer(jpeg, dtype=np.uint8)
+            # Décodage JPEG directement réduit (1/2, 1/4, 1/8): bien moins coûteux qu'un décodage complet
+            flag = cv2.IMREAD_COLOR
+            dims = jpeg_dimensions(jpeg)
+            if dims is not None:
+                for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                        (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                    if dims[1] // factor >= width:
+                        flag = reduced
+                        break
+            frame = cv2.imdecode(data, flag)
+            if frame is None:
+                return None
+            h, w = frame.shape[:2]
+            if w > width:
+                frame = cv2.resize(frame, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.SNAPSHOT_QUALITY])
+            return buf.tobytes() if ok else None
+        except Exception as e:
+            logging.error(f"Erreur réduction snapshot: {e}")
+            return None
+
+    def snapshot(self, width: Optional[int] = None, encode: bool = True) -> Optional[Tuple[str, bytes]]:
+        """
+        (ETag, JPEG) de la dernière frame, réduite à une largeur de SNAPSHOT_WIDTHS si demandé.
+
+        La réduction est faite une seule fois par frame et par taille, quel que soit le
+        nombre de clients. encode=False: None si la vignette n'est pas déjà prête
+        (appel non bloquant depuis la boucle asyncio).
+        """
+        with self._lock:
+            jpeg, seq, shape = self._latest_jpeg, self._frame_seq, self._latest_shape
+            self._last_snapshot_request = time.monotonic()
+        if not jpeg:
+            jpeg, seq = self.get_latest_jpeg(), 0
+        target = self._variant_width(width, shape)
+        etag = f'"{self._instance}-{seq}-{target}"'
+        if not target:
+            return etag, jpeg
+
+        cached = self._variants.get(target)
+        if cached is not None and cached[0] == seq:
+            return etag, cached[1]
+        if not encode:
+            return None
+        with self._variant_lock:
+            cached = self._variants.get(target)
+            if cached is not None and cached[0] == seq:
+                return etag, cached[1]
+            data = self._downscale(jpeg, target) or jpeg
+            self._variants[target] = (seq, data)
+        return etag, data
+
+    async def snapshot_async(self, width: Optional[int] = None) -> Tuple[str, bytes]:
+        """snapshot() sans bloquer la boucle: la réduction éventuelle part dans un thread"""
+        ready = self.snapshot(width, encode=False)
+        if ready is not None:
+            return ready
+        return await asyncio.to_thread(self.snapshot, width)
+
+    async def preview_generator(self, fps: float, width: Optional[int] = None):
+        """
+        Flux multipart basse cadence pour les previews (navigateurs).
+
+        Asynchrone: un spectateur n'occupe aucun thread, seulement une tâche de la boucle;
+        tous les spectateurs d'un terrain partagent la même vignette par frame.
+        """
+        interval = 1.0 / max(0.5, min(float(fps), 15.0))
+        last_etag = None
+        last_sent = 0.0
+        with self._lock:
+            self._preview_viewers += 1
+        try:
+            while self._running.is_set():
+                etag, jpeg = await self.snapshot_async(width)
+                now = time.monotonic()
+                if etag != last_etag or now - last_sent >= self.KEEPALIVE_SECONDS:
+                    last_etag, last_sent = etag, now
+                    yield (
+                        b"--frame\r\n"
+                        b"Content-Type: image/jpeg\r\n"
+                        + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                        + jpeg
+                        + b"\r\n"
+                    )
+                await asyncio.sleep(interval)
+        finally:
+            with self._lock:
+                self._preview_viewers -= 1
+
+    def _take_frame(self, client: StreamClient) -> bytes:
+        # Appelé sous verrou: le client prend la dernière frame, les intermédiaires sont sautées
+        skipped = self._frame_seq - client.last_seq - 1
+        if skipped > 0:
+            client.dropped += skipped
+            self._dropped_total += skipped
+        client.last_seq = self._frame_seq
+        client.sent += 1
+        return self._latest_jpeg or b""
+
+    def mjpeg_generator(self, fps: Optional[int] = None, name: str = "client", live: bool = False):
+        """
+        Flux multipart pour un client.
+
+        Par défaut cadence fixe (fps) pour l'enregistreur FFmpeg: la dernière frame
+        est dupliquée si la caméra est plus lente, sautée si elle est plus rapide.
+        live=True: chaque nouvelle frame est envoyée dès sa publication.
+        Dans les deux cas un client lent ne ralentit ni la capture ni les autres clients.
+        """
         boundary = "frame"
-        interval = 1.0 / float(fps or self.cfg.fps)
-        next_t = time.perf_counter()
-        while True:
-            # Rythmer à FPS fixe
-            now = time.perf_counter()
-            if now < next_t:
-                time.sleep(next_t - now)
-            next_t += interval
-
-            jpeg = self.get_latest_jpeg()
-            yield (
-                b"--" + boundary.encode() + b"\r\n"
-                b"Content-Type: image/jpeg\r\n"
-                + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
-                + jpeg
-                + b"\r\n"
-            )
+        interval = None if live else 1.0 / float(fps or self.cfg.fps)
+        client = self.subscribe(name)
+        next_t = time.monotonic()
+        try:
+            while self._running.is_set():
+                if interval is not None:
+                    # Rythmer à FPS fixe (réveillé immédiatement à l'arrêt)
+                    remaining = next_t - time.monotonic()
+                    if remaining > 0 and self._stopped.wait(remaining):
+                        break
+                    next_t += interval
+                    now = time.monotonic()
+                    if next_t < now - interval:
+                        # Client trop lent: pas de rafale de rattrapage
+                        next_t = now
+                    with self._lock:
+                        jpeg = self._take_frame(client)
+                else:
+                    with self._frame_cond:
+                        self._frame_cond.wait_for(
+                            lambda: self._frame_seq != client.last_seq or not self._running.is_set(),
+                            timeout=self.KEEPALIVE_SECONDS,
+                        )
+                        if not self._running.is_set():
+                            break
+                        jpeg = self._take_frame(client)
+
+                if not jpeg:
+                    continue
+                yield (
+                    b"--" + boundary.encode() + b"\r\n"
+                    b"Content-Type: image/jpeg\r\n"
+                    + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                    + jpeg
+                    + b"\r\n"
+                )
+        finally:
+            self.unsubscribe(client)
+
+
+def health_payload(proxy: VideoProxy, fps: int) -> dict:
+    # Vérifier si on a reçu au moins une frame réelle (pas juste le placeholder noir)
+    shape = proxy.get_latest_shape()
+    has_real_frame = proxy.has_video()
+
+    return {
+        "status": "ok" if has_real_frame else "starting",
+        "fps": fps,
+        "has_video": has_real_frame,
+        "shape": shape,
+        "mode": proxy.mode,
+        **proxy.stats()
+    }
+
+
+async def snapshot_response(proxy: VideoProxy, request: Request, width: Optional[int]) -> Response:
+    """Dernière frame (ou vignette) avec ETag; 304 si le client l'a déjà"""
+    etag, jpeg = await proxy.snapshot_async(width)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=jpeg, media_type="image/jpeg", headers=headers)
+
+
+def preview_response(proxy: VideoProxy, fps: float, width: Optional[int]) -> StreamingResponse:
+    return StreamingResponse(
+        proxy.preview_generator(fps, width),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache, no-store, must-revalidate", "X-Accel-Buffering": "no"},
+    )
 
 
 def build_app(proxy: VideoProxy, fps: int) -> FastAPI:
     app = FastAPI(title="Video Proxy Server", version="1.0.0")
 
     @app.get("/stream.mjpg")
-    def stream_mjpg():
+    def stream_mjpg(live: bool = False, client: str = "client"):
         boundary = "frame"
         return StreamingResponse(
-            proxy.mjpeg_generator(fps=fps),
+            proxy.mjpeg_generator(fps=fps, name=client, live=live),
             media_type=f"multipart/x-mixed-replace; boundary={boundary}",
         )
 
+    @app.get("/snapshot.jpg")
+    async def snapshot(request: Request, width: Optional[int] = None):
+        return await snapshot_response(proxy, request, width)
+
+    @app.get("/preview.mjpg")
+    async def preview(fps: float = 5, width: Optional[int] = None):
+        return preview_response(proxy, fps, width)
+
+    @app.get("/health")
+    def health():
+        return health_payload(proxy, fps)
+
+    return app
+
+
+class CameraHub:
+    """
+    Hub multi-caméras: un seul process, un thread de capture par source.
+
+    Chaque source caméra est identifiée par un camera_id stable (hash de l'URL).
+    Les consommateurs (enregistrement, preview, live) s'abonnent via acquire()
+    et se désabonnent via release(); le VideoProxy est arrêté quand le dernier
+    abonné part. Une seule connexion amont par terrain quel que soit le nombre
+    de consommateurs.
+    """
+
+    def __init__(self, fps: int = 25, jpeg_quality: int = 80, mode: str = "auto"):
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+        self.mode = mode
+        self._proxies: Dict[str, VideoProxy] = {}
+        self._refs: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def camera_id_for(source: str) -> str:
+        return hashlib.sha1(source.strip().encode("utf-8")).hexdigest()[:12]
+
+    def acquire(self, source: str) -> Tuple[str, int]:
+        """Abonner un consommateur à une source. Retourne (camera_id, refs)."""
+        source = source.strip()
+        camera_id = self.camera_id_for(source)
+        with self._lock:
+            proxy = self._proxies.get(camera_id)
+            if proxy is None:
+                logging.info(f"[hub] Nouvelle source {camera_id}: {source}")
+                proxy = VideoProxy(ProxyConfig(
+                    source=source,
+                    fps=self.fps,
+                    jpeg_quality=self.jpeg_quality,
+                    mode=self.mode,
+                ))
+                proxy.start()
+                self._proxies[camera_id] = proxy
+                self._refs[camera_id] = 0
+            self._refs[camera_id] += 1
+            refs = self._refs[camera_id]
+        logging.info(f"[hub] acquire {camera_id} -> {refs} abonné(s)")
+        return camera_id, refs
+
+    def release(self, camera_id: str) -> int:
+        """Désabonner un consommateur. Retourne le nombre d'abonnés restants."""
+        proxy = None
+        with self._lock:
+            if camera_id not in self._refs:
+                return 0
+            self._refs[camera_id] -= 1
+            refs = self._refs[camera_id]
+            if refs <= 0:
+                proxy = self._proxies.pop(camera_id, None)
+                del self._refs[camera_id]
+        logging.info(f"[hub] release {camera_id} -> {max(refs, 0)} abonné(s)")
+        if proxy is not None:
+            # Arrêt en arrière-plan: un read() caméra peut bloquer plusieurs secondes
+            threading.Thread(target=proxy.stop, name=f"stop-{camera_id}", daemon=True).start()
+        return max(refs, 0)
+
+    def get(self, camera_id: str) -> Optional[VideoProxy]:
+        with self._lock:
+            return self._proxies.get(camera_id)
+
+    def list_cameras(self) -> list:
+        with self._lock:
+            items = [(cid, self._refs[cid], p) for cid, p in self._proxies.items()]
+        return [
+            {"camera_id": cid, "refs": refs, "source": p.cfg.source, **health_payload(p, self.fps)}
+            for cid, refs, p in items
+        ]
+
+    def stop_all(self):
+        with self._lock:
+            proxies = list(self._proxies.values())
+            self._proxies.clear()
+            self._refs.clear()
+        for proxy in proxies:
+            proxy.stop()
+
+
+def build_hub_app(hub: CameraHub) -> FastAPI:
+    app = FastAPI(title="Video Proxy Hub", version="1.0.0")
+
+    def _proxy_or_404(camera_id: str) -> VideoProxy:
+        proxy = hub.get(camera_id)
+        if proxy is None:
+            raise HTTPException(status_code=404, detail="camera not attached")
+        return proxy
+
     @app.get("/health")
     def health():
-        # Vérifier si on a reçu au moins une frame réelle
-        _, shape = proxy.get_latest_raw()
-        has_real_frame = shape is not None and shape != (480, 640)  # Pas juste le placeholder noir
-        
+        return {"status": "ok", "mode": "hub", "cameras": len(hub.list_cameras())}
+
+    @app.get("/cameras")
+    def list_cameras():
+        return {"cameras": hub.list_cameras()}
+
+    @app.post("/cameras")
+    def attach_camera(payload: dict = Body(...)):
+        source = (payload or {}).get("source")
+        if not source:
+            raise HTTPException(status_code=400, detail="source requis")
+        camera_id, refs = hub.acquire(source)
         return {
-            "status": "ok" if has_real_frame else "starting",
-            "fps": fps,
-            "has_video": has_real_frame,
-            "shape": shape
+            "camera_id": camera_id,
+            "refs": refs,
+            "stream_path": f"/cameras/{camera_id}/stream.mjpg",
         }
 
+    @app.delete("/cameras/{camera_id}")
+    def release_camera(camera_id: str):
+        return {"camera_id": camera_id, "refs": hub.release(camera_id)}
+
+    @app.get("/cameras/{camera_id}/stream.mjpg")
+    def camera_stream(camera_id: str, live: bool = False, client: str = "client"):
+        proxy = _proxy_or_404(camera_id)
+        return StreamingResponse(
+            proxy.mjpeg_generator(fps=hub.fps, name=client, live=live),
+            media_type="multipart/x-mixed-replace; boundary=frame",
+        )
+
+    @app.get("/cameras/{camera_id}/snapshot.jpg")
+    async def camera_snapshot(camera_id: str, request: Request, width: Optional[int] = None):
+        return await snapshot_response(_proxy_or_404(camera_id), request, width)
+
+    @app.get("/cameras/{camera_id}/preview.mjpg")
+    async def camera_preview(camera_id: str, fps: float = 5, width: Optional[int] = None):
+        return preview_response(_proxy_or_404(camera_id), fps, width)
+
+    @app.get("/cameras/{camera_id}/health")
+    def camera_health(camera_id: str):
+        return health_payload(_proxy_or_404(camera_id), hub.fps)
+
     return app
 
 
 def parse_args():
     p = argparse.ArgumentParser(description="Serveur proxy vidéo MJPEG (FastAPI + uvicorn + OpenCV).")
-    p.add_argument("--source", required=True, help="URL caméra (ex: http://.../mjpg/video.mjpg)")
+    p.add_argument("--source", help="URL caméra (ex: http://.../mjpg/video.mjpg)")
+    p.add_argument("--hub", action="store_true", help="Mode hub multi-caméras (sources attachées via POST /cameras)")
+    p.add_argument("--host", default="127.0.0.1", help="Interface d'écoute (par défaut 127.0.0.1)")
     p.add_argument("--port", type=int, default=8080, help="Port HTTP local (par défaut 8080)")
+    p.add_argument("--uds", help="Hub: socket unix supplémentaire (relais nginx), en plus du port loopback")
     p.add_argument("--fps", type=int, default=25, help="Fréquence d'images de sortie (par défaut 25)")
-    p.add_argument("--buffer", type=int, default=50, help="Taille du tampon circulaire (frames JPEG)")
     p.add_argument("--quality", type=int, default=80, help="Qualité JPEG (0-100, par défaut 80)")
+    p.add_argument("--mode", choices=["auto", "passthrough", "decode"], default="auto",
+                   help="Capture: passthrough MJPEG sans ré-encodage, decode OpenCV, ou auto (par défaut)")
     return p.parse_args()
 
 
+def _hub_sockets(host: str, port: int, uds: str) -> List[socket.socket]:
+    """Port TCP loopback (Flask, ffmpeg) + socket unix accessible au seul groupe (nginx)"""
+    tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    tcp.bind((host, port))
+
+    if os.path.exists(uds):
+        os.unlink(uds)
+    unix = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    unix.bind(uds)
+    os.chmod(uds, 0o660)
+    return [tcp, unix]
+
+
 def main():
     args = parse_args()
+    if not args.hub and not args.source:
+        raise SystemExit("--source requis (ou --hub)")
+    # POST /cameras fait ouvrir au hub n'importe quelle URL fournie: jamais exposé hors loopback
+    if args.hub and args.host not in ("127.0.0.1", "::1", "localhost"):
+        raise SystemExit("--hub n'écoute qu'en loopback (utiliser --uds pour un relais nginx)")
 
     logging.basicConfig(
         level=logging.INFO,
@@ -206,28 +835,37 @@ def main():
         datefmt="%H:%M:%S",
     )
 
-    cfg = ProxyConfig(
-        source=args.source,
-        fps=args.fps,
-        buffer_size=args.buffer,
-        jpeg_quality=args.quality,
-    )
-    proxy = VideoProxy(cfg)
-    proxy.start()
-
-    app = build_app(proxy, fps=cfg.fps)
+    if args.hub:
+        hub = CameraHub(fps=args.fps, jpeg_quality=args.quality, mode=args.mode)
+        app = build_hub_app(hub)
+        stop = hub.stop_all
+        logging.info(f"Proxy hub started on http://127.0.0.1:{args.port}/cameras")
+    else:
+        cfg = ProxyConfig(
+            source=args.source,
+            fps=args.fps,
+            jpeg_quality=args.quality,
+            mode=args.mode,
+        )
+        proxy = VideoProxy(cfg)
+        proxy.start()
+        app = build_app(proxy, fps=cfg.fps)
+        stop = proxy.stop
+        logging.info(f"Proxy server started on http://127.0.0.1:{args.port}/stream.mjpg")
 
     def shutdown(signum, frame):
         logging.info("Signal reçu, arrêt…")
-        proxy.stop()
+        stop()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, shutdown)
     signal.signal(signal.SIGTERM, shutdown)
 
-    logging.info(f"Proxy server started on http://127.0.0.1:{args.port}/stream.mjpg")
-
-    uvicorn.run(app, host="127.0.0.1", port=int(args.port), log_level="info")
+    if args.hub and args.uds:
+        server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+        server.run(sockets=_hub_sockets(args.host, int(args.port), args.uds))
+    else:
+        uvicorn.run(app, host=args.host, port=int(args.port), log_level="info")
 
 
 if __name__ == "__main__":
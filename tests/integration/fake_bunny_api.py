@@ -0,0 +1,234 @@
+"""
+Stand-in local de l'API Bunny Stream pour les tests
+Serveur HTTP en thread qui imite les endpoints utilisés par le backend:
+bibliothèque de vidéos (liste paginée, détail, création, titre, suppression, upload PUT)
+et upload TUS (longueur différée comprise).
+Compte les requêtes par type pour vérifier les accès groupés.
+"""
+
+import json
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeBunnyAPI:
+    """API Bunny Stream en mémoire (une bibliothèque)"""
+
+    def __init__(self, library_id='123', api_key='test-bunny-key'):
+        self.library_id = library_id
+        self.api_key = api_key
+        self.videos = {}  # guid -> objet vidéo Bunny
+        self.uploads = {}  # id TUS -> {'video_id', 'length' (None: différée), 'data'}
+        self.tus_extensions = 'creation,creation-defer-length'
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._clock = datetime(2026, 1, 1)
+        self._server = None
+
+    # ------------------------------------------------------------------
+    # Données
+
+    def add_video(self, guid=None, status=4, length=0, title='video'):
+        """Ajouter une vidéo (les plus récentes en tête de liste, comme orderBy=date)"""
+        with self._lock:
+            guid = guid or str(uuid.uuid4())
+            self._clock += timedelta(seconds=1)
+            self.videos[guid] = {
+                'guid': guid,
+                'videoLibraryId': int(self.library_id),
+                'title': title,
+                'status': status,
+                'length': length,
+                'dateUploaded': self._clock.isoformat()
+            }
+            return guid
+
+    def set_status(self, guid, status, length=None):
+        with self._lock:
+            self.videos[guid]['status'] = status
+            if length is not None:
+                self.videos[guid]['length'] = length
+
+    # ------------------------------------------------------------------
+    # Serveur
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def library_url(self):
+        return f"{self.base_url}/library/{self.library_id}"
+
+    @property
+    def tus_endpoint(self):
+        return f"{self.base_url}/tusupload"
+
+    def start(self):
+        api = self
+
+        class Handler(_Handler):
+            fake = api
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake: FakeBunnyAPI = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _route(self):
+        """(type de requête, identifiant) selon le chemin"""
+        path = urlparse(self.path).path.rstrip('/')
+        parts = path.strip('/').split('/')
+        if parts[:1] == ['tusupload']:
+            return 'tus', parts[1] if len(parts) > 1 else None
+        if parts[:3] == ['library', self.fake.library_id, 'videos']:
+            return 'videos', parts[3] if len(parts) > 3 else None
+        return None, None
+
+    def _authorized(self, kind):
+        if kind == 'tus':
+            return bool(self.headers.get('AuthorizationSignature'))
+        return self.headers.get('AccessKey') == self.fake.api_key
+
+    def do_GET(self):
+        kind, guid = self._route()
+        if kind != 'videos':
+            return self._send(404, {})
+        if not self._authorized(kind):
+            return self._send(401, {'Message': 'Unauthorized'})
+        fake = self.fake
+        if guid:
+            fake.requests['get_video'] += 1
+            video = fake.videos.get(guid)
+            return self._send(200, video) if video else self._send(404, {'Message': 'Not found'})
+
+        fake.requests['list_videos'] += 1
+        query = parse_qs(urlparse(self.path).query)
+        page = int(query.get('page', ['1'])[0])
+        per_page = int(query.get('itemsPerPage', ['100'])[0])
+        with fake._lock:
+            items = sorted(fake.videos.values(), key=lambda v: v['dateUploaded'], reverse=True)
+        start = (page - 1) * per_page
+        self._send(200, {
+            'totalItems': len(items),
+            'currentPage': page,
+            'itemsPerPage': per_page,
+            'items': items[start:start + per_page]
+        })
+
+    def do_OPTIONS(self):
+        self._send(204, headers={'Tus-Resumable': '1.0.0', 'Tus-Version': '1.0.0',
+                                 'Tus-Extension': self.fake.tus_extensions})
+
+    def do_POST(self):
+        kind, guid = self._route()
+        body = self._body()
+        if not self._authorized(kind):
+            return self._send(401, {'Message': 'Unauthorized'})
+        fake = self.fake
+        if kind == 'videos' and guid:
+            if guid not in fake.videos:
+                return self._send(404, {})
+            fake.requests['update_video'] += 1
+            with fake._lock:
+                fake.videos[guid]['title'] = json.loads(body or b'{}').get('title', fake.videos[guid]['title'])
+            return self._send(200, {'success': True})
+        if kind == 'videos':
+            fake.requests['create_video'] += 1
+            title = json.loads(body or b'{}').get('title', 'video')
+            guid = fake.add_video(status=0, title=title)
+            return self._send(200, fake.videos[guid])
+        if kind == 'tus':
+            fake.requests['tus_create'] += 1
+            deferred = self.headers.get('Upload-Defer-Length') == '1'
+            if deferred and 'creation-defer-length' not in fake.tus_extensions:
+                return self._send(400, {'Message': 'Upload-Defer-Length not supported'})
+            upload_id = uuid.uuid4().hex
+            fake.uploads[upload_id] = {
+                'video_id': self.headers.get('VideoId'),
+                'length': None if deferred else int(self.headers['Upload-Length']),
+                'data': b''
+            }
+            return self._send(201, headers={'Location': f'/tusupload/{upload_id}', 'Tus-Resumable': '1.0.0'})
+        self._send(404, {})
+
+    def do_HEAD(self):
+        kind, upload_id = self._route()
+        upload = self.fake.uploads.get(upload_id) if kind == 'tus' else None
+        if not upload:
+            return self._send(404)
+        headers = {'Upload-Offset': str(len(upload['data']))}
+        if upload['length'] is not None:
+            headers['Upload-Length'] = str(upload['length'])
+        self._send(200, headers=headers)
+
+    def do_PATCH(self):
+        kind, upload_id = self._route()
+        upload = self.fake.uploads.get(upload_id) if kind == 'tus' else None
+        body = self._body()
+        if not upload:
+            return self._send(404)
+        self.fake.requests['tus_patch'] += 1
+        if int(self.headers['Upload-Offset']) != len(upload['data']):
+            return self._send(409)
+        if 'Upload-Length' in self.headers:
+            upload['length'] = int(self.headers['Upload-Length'])
+        if upload['length'] is not None and len(upload['data']) + len(body) > upload['length']:
+            return self._send(413)
+        upload['data'] += body
+        if len(upload['data']) == upload['length'] and upload['video_id'] in self.fake.videos:
+            self.fake.set_status(upload['video_id'], 1)
+        self._send(204, headers={'Upload-Offset': str(len(upload['data']))})
+
+    def do_DELETE(self):
+        kind, guid = self._route()
+        if kind != 'videos' or guid not in self.fake.videos:
+            return self._send(404, {})
+        if not self._authorized(kind):
+            return self._send(401, {'Message': 'Unauthorized'})
+        self.fake.requests['delete_video'] += 1
+        with self.fake._lock:
+            del self.fake.videos[guid]
+        self._send(200, {'success': True})
+
+    def do_PUT(self):
+        kind, guid = self._route()
+        body = self._body()
+        if kind != 'videos' or guid not in self.fake.videos:
+            return self._send(404, {})
+        if not self._authorized(kind):
+            return self._send(401, {'Message': 'Unauthorized'})
+        self.fake.requests['put_video'] += 1
+        self.fake.set_status(guid, 1)
+        self._send(200, {'success': True, 'size': len(body)})
@@ -0,0 +1,194 @@
+"""
+Tests d'intégration de la réconciliation des statuts Bunny Stream
+Balayage groupé (liste paginée + UPDATE groupés) et webhook, contre l'API Bunny locale
+"""
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from src.models.database import db
+from src.models.user import User, Video, UserClip, HighlightVideo
+from src.models.notification import Notification
+from src.routes.bunny_webhook import bunny_webhook_bp
+from src.services import bunny_status_updater as updater_module
+from src.services.bunny_status_updater import BunnyStatusUpdater
+
+from fake_bunny_api import FakeBunnyAPI
+
+WEBHOOK_SECRET = 'test-webhook-secret'
+
+
+@pytest.fixture
+def fake_bunny():
+    api = FakeBunnyAPI().start()
+    yield api
+    api.stop()
+
+
+@pytest.fixture
+def bunny_app(fake_bunny, monkeypatch):
+    monkeypatch.setenv('BUNNY_WEBHOOK_SECRET', WEBHOOK_SECRET)
+    monkeypatch.setenv('BUNNY_LIBRARY_ID', fake_bunny.library_id)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    app.register_blueprint(bunny_webhook_bp)
+
+    updater = BunnyStatusUpdater(fake_bunny.api_key, fake_bunny.library_id, app,
+                                 api_base_url=fake_bunny.library_url)
+    monkeypatch.setattr(updater_module, '_bunny_status_updater', updater)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='player@test.com', name='Player', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        app.config['TEST_USER_ID'] = user.id
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_video(app, guid, status='processing'):
+    video = Video(user_id=app.config['TEST_USER_ID'], title=f'Match {guid[:6]}',
+                  bunny_video_id=guid, processing_status=status)
+    db.session.add(video)
+    db.session.commit()
+    return video
+
+
+def _count_updates(app):
+    """Compter les UPDATE émis (un par statut et par table attendu)"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('UPDATE'):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', before_execute)
+
+
+@pytest.mark.integration
+class TestBunnyReconciler:
+    """Balayage périodique groupé"""
+
+    def test_sweep_uses_list_pages_and_bulk_updates(self, bunny_app, fake_bunny):
+        """150 vidéos en attente: 2 pages de liste, aucun GET unitaire, un UPDATE par statut modifié"""
+        expected = {}
+        for i in range(150):
+            status = (4, 3, 5)[i % 3]
+            guid = fake_bunny.add_video(status=status, length=600 + i)
+            _add_video(bunny_app, guid)
+            expected[guid] = {4: 'ready', 3: 'processing', 5: 'failed'}[status]
+        # Vidéos plus récentes sans rapport avec nos lignes
+        for _ in range(20):
+            fake_bunny.add_video(status=4)
+
+        statements, stop_counting = _count_updates(bunny_app)
+        try:
+            updater_module._bunny_status_updater._check_and_update_videos()
+        finally:
+            stop_counting()
+
+        assert fake_bunny.requests['list_videos'] == 2
+        assert fake_bunny.requests['get_video'] == 0
+        # 'processing' déjà en base: seuls ready et failed sont écrits
+        assert len(statements) == 2
+
+        db.session.expire_all()
+        for video in Video.query.all():
+            assert video.processing_status == expected[video.bunny_video_id]
+            if expected[video.bunny_video_id] == 'ready':
+                assert video.duration == fake_bunny.videos[video.bunny_video_id]['length']
+        assert Notification.query.count() == 50
+
+    def test_missing_from_list_is_fetched_individually(self, bunny_app, fake_bunny):
+        """Vidéo hors des pages listées: GET unitaire; supprimée chez Bunny: échec"""
+        updater = updater_module._bunny_status_updater
+        updater.max_list_pages = 1
+        updater.items_per_page = 10
+        old_guid = fake_bunny.add_video(status=4, length=42)
+        for _ in range(15):
+            fake_bunny.add_video(status=4)
+        _add_video(bunny_app, old_guid, status='uploading')
+        _add_video(bunny_app, 'deleted-on-bunny')
+
+        updater._check_and_update_videos()
+
+        assert fake_bunny.requests['list_videos'] == 1
+        assert fake_bunny.requests['get_video'] == 2
+        db.session.expire_all()
+        statuses = {v.bunny_video_id: (v.processing_status, v.duration) for v in Video.query.all()}
+        assert statuses[old_guid] == ('ready', 42)
+        assert statuses['deleted-on-bunny'][0] == 'failed'
+
+    def test_sweep_is_idempotent(self, bunny_app, fake_bunny):
+        """Un second balayage ne réécrit rien et ne renotifie pas"""
+        guid = fake_bunny.add_video(status=4, length=90)
+        _add_video(bunny_app, guid)
+        updater = updater_module._bunny_status_updater
+
+        updater._check_and_update_videos()
+        updater._check_and_update_videos()
+
+        assert Notification.query.count() == 1
+        # Plus rien en attente: le second balayage n'appelle même pas Bunny
+        assert fake_bunny.requests['list_videos'] == 1
+
+
+@pytest.mark.integration
+class TestBunnyWebhook:
+    """Statuts poussés par Bunny"""
+
+    def test_webhook_completes_clip_and_highlight(self, bunny_app, fake_bunny):
+        guid = fake_bunny.add_video(status=4, length=30)
+        video = _add_video(bunny_app, 'source-video', status='ready')
+        clip = UserClip(video_id=video.id, user_id=video.user_id, title='Smash',
+                        start_time=10, end_time=40, bunny_video_id=guid, status='processing')
+        highlight = HighlightVideo(original_video_id=video.id, bunny_video_id=guid, generation_status='uploading')
+        db.session.add_all([clip, highlight])
+        db.session.commit()
+
+        response = bunny_app.test_client().post(
+            f'/api/webhooks/bunny?token={WEBHOOK_SECRET}',
+            json={'VideoLibraryId': int(fake_bunny.library_id), 'VideoGuid': guid, 'Status': 3}
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['updated'] == {'clip': 1, 'highlight': 1}
+        db.session.expire_all()
+        assert UserClip.query.get(clip.id).status == 'completed'
+        assert UserClip.query.get(clip.id).completed_at is not None
+        assert HighlightVideo.query.get(highlight.id).generation_status == 'completed'
+        assert Notification.query.count() == 1
+
+    def test_webhook_failure_status(self, bunny_app, fake_bunny):
+        video = _add_video(bunny_app, 'failing-guid')
+
+        response = bunny_app.test_client().post(
+            f'/api/webhooks/bunny?token={WEBHOOK_SECRET}',
+            json={'VideoLibraryId': int(fake_bunny.library_id), 'VideoGuid': 'failing-guid', 'Status': 5}
+        )
+
+        assert response.status_code == 200
+        db.session.expire_all()
+        assert Video.query.get(video.id).processing_status == 'failed'
+        assert fake_bunny.requests['get_video'] == 0
+
+    def test_webhook_rejects_bad_token_and_foreign_library(self, bunny_app, fake_bunny):
+        video = _add_video(bunny_app, 'guarded-guid')
+        client = bunny_app.test_client()
+
+        response = client.post('/api/webhooks/bunny?token=wrong',
+                               json={'VideoGuid': 'guarded-guid', 'Status': 3})
+        assert response.status_code == 403
+
+        response = client.post(f'/api/webhooks/bunny?token={WEBHOOK_SECRET}',
+                               json={'VideoLibraryId': 999, 'VideoGuid': 'guarded-guid', 'Status': 3})
+        assert response.get_json()['status'] == 'ignored'
+
+        db.session.expire_all()
+        assert Video.query.get(video.id).processing_status == 'processing'
@@ -0,0 +1,233 @@
+"""
+Extraction de clips par plage (fenêtre de GOP + smart cut)
+La fenêtre lue part de la keyframe précédant le début du clip; seul le GOP partiel de
+tête est ré-encodé (paramètres de la source), le corps est copié en Annex B
+Sans source exploitable, le traitement du clip retombe sur le téléchargement complet
+FFmpeg/ffprobe sont simulés: on vérifie les commandes construites
+"""
+import json
+import os
+import subprocess
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from src.models.database import db
+from src.models.user import User, UserClip, Video
+from src.services import manual_clip_service as clip_service_module
+from src.services.clip_extractor import ClipExtractionError, ClipExtractor, ClipSource
+from src.services.source_video_cache import SourceVideoCache
+
+# Fenêtre lue: commence à la keyframe 98 s (GOP de 4 s)
+WINDOW_START = 98.0
+
+
+def _probe_output(keyframes, codec='h264', profile='High', level=41):
+    return json.dumps({
+        'format': {'start_time': str(WINDOW_START)},
+        'streams': [{'codec_name': codec, 'profile': profile, 'level': level,
+                     'pix_fmt': 'yuv420p', 'width': 1920, 'height': 1080}],
+        'packets': [{'pts_time': str(k), 'flags': 'K_'} for k in keyframes]
+    })
+
+
+class FakeFFmpeg:
+    """Remplace ClipExtractor._run: enregistre les commandes et crée les fichiers de sortie"""
+
+    def __init__(self, keyframes, **probe):
+        self.commands = []
+        self.probe = _probe_output(keyframes, **probe)
+
+    def __call__(self, cmd, step):
+        self.commands.append((step, cmd))
+        if cmd[0].endswith('ffprobe'):
+            return subprocess.CompletedProcess(cmd, 0, stdout=self.probe, stderr='')
+        with open(cmd[-1], 'wb') as f:
+            f.write(b'\0' * 2048)
+        return subprocess.CompletedProcess(cmd, 0, stdout='', stderr='')
+
+    def command(self, step):
+        return next(cmd for name, cmd in self.commands if name == step)
+
+    def steps(self):
+        return [name for name, _ in self.commands]
+
+
+def _arg(cmd, option):
+    return cmd[cmd.index(option) + 1]
+
+
+@pytest.fixture
+def extractor(tmp_path):
+    extractor = ClipExtractor(temp_dir=str(tmp_path))
+    extractor._decodes_cleanly = lambda path: True
+    return extractor
+
+
+def _extract(extractor, fake, start=100.0, end=130.0, sources=None):
+    extractor._run = fake
+    result = extractor.extract(sources or [ClipSource(url='/videos/match.mp4', label='fichier local')], start, end)
+    assert os.path.exists(result.path)
+    return result
+
+
+@pytest.mark.integration
+class TestClipWindow:
+
+    def test_window_starts_at_clip_start_and_covers_clip(self, extractor):
+        fake = FakeFFmpeg([98.0, 102.0, 106.0, 110.0, 114.0, 118.0, 122.0, 126.0, 130.0])
+        _extract(extractor, fake)
+
+        fetch = fake.command("lecture de la fenêtre")
+        # -ss avant -i: positionnement par l'index sur la keyframe précédente
+        assert fetch.index('-ss') < fetch.index('-i')
+        assert _arg(fetch, '-ss') == '100.000'
+        assert _arg(fetch, '-t') == '31.000'
+        assert '-copyts' in fetch and _arg(fetch, '-c') == 'copy'
+
+    def test_head_reencoded_until_next_keyframe_with_source_parameters(self, extractor):
+        fake = FakeFFmpeg([98.0, 102.0, 106.0, 110.0])
+        result = _extract(extractor, fake)
+
+        assert result.smart_cut is True
+        head = fake.command("ré-encodage du GOP de tête")
+        # Chronologie de la fenêtre: début demandé (100 s) → keyframe suivante (102 s)
+        assert (_arg(head, '-ss'), _arg(head, '-t')) == ('2.000', '2.000')
+        assert _arg(head, '-c:v') == 'libx264'
+        assert _arg(head, '-profile:v') == 'high'
+        assert _arg(head, '-level:v') == '4.1'
+        assert _arg(head, '-pix_fmt') == 'yuv420p'
+
+        body = fake.command("copie du corps du clip")
+        assert float(_arg(body, '-ss')) == pytest.approx(4.0, abs=0.001)
+        assert _arg(body, '-t') == '28.000'
+        assert _arg(body, '-c') == 'copy'
+        assert _arg(body, '-bsf:v') == 'h264_mp4toannexb'
+        assert _arg(body, '-f') == 'mpegts'
+
+    def test_hevc_head_keeps_source_level(self, extractor):
+        fake = FakeFFmpeg([98.0, 102.0, 106.0], codec='hevc', profile='Main', level=123)
+        _extract(extractor, fake)
+
+        head = fake.command("ré-encodage du GOP de tête")
+        assert _arg(head, '-c:v') == 'libx265'
+        assert _arg(head, '-x265-params') == 'level-idc=4.1'
+        assert _arg(fake.command("copie du corps du clip"), '-bsf:v') == 'hevc_mp4toannexb'
+        assert _arg(fake.command("assemblage du clip"), '-tag:v') == 'hvc1'
+
+    def test_clip_starting_on_keyframe_is_copied_without_head(self, extractor):
+        fake = FakeFFmpeg([98.0, 100.0, 104.0, 108.0])
+        result = _extract(extractor, fake)
+
+        assert result.smart_cut is True
+        assert "ré-encodage du GOP de tête" not in fake.steps()
+        assert float(_arg(fake.command("copie du corps du clip"), '-ss')) == pytest.approx(2.0, abs=0.001)
+
+    def test_clip_inside_single_gop_is_reencoded(self, extractor):
+        fake = FakeFFmpeg([98.0, 140.0])
+        result = _extract(extractor, fake)
+
+        assert result.smart_cut is False
+        assert "copie du corps du clip" not in fake.steps()
+        reencode = fake.command("ré-encodage du clip")
+        assert (_arg(reencode, '-ss'), _arg(reencode, '-t')) == ('2.000', '30.000')
+
+    def test_unsupported_codec_is_reencoded(self, extractor):
+        fake = FakeFFmpeg([98.0, 102.0, 106.0], codec='vp9', profile='Profile 0')
+        assert _extract(extractor, fake).smart_cut is False
+        assert "ré-encodage du clip" in fake.steps()
+
+    def test_undecodable_smart_cut_falls_back_to_reencode(self, extractor):
+        extractor._decodes_cleanly = lambda path: False
+        fake = FakeFFmpeg([98.0, 102.0, 106.0])
+        result = _extract(extractor, fake)
+
+        assert result.smart_cut is False
+        assert fake.steps()[-1] == "ré-encodage du clip"
+
+
+@pytest.mark.integration
+class TestClipSources:
+
+    def test_source_without_range_support_is_skipped(self, extractor, monkeypatch):
+        monkeypatch.setattr(extractor, '_supports_range', lambda source: 'cdn' in source.url)
+        fake = FakeFFmpeg([98.0, 102.0, 106.0])
+        result = _extract(extractor, fake, sources=[
+            ClipSource(url='https://api.example/original.mp4', label='original'),
+            ClipSource(url='https://cdn.example/play_720p.mp4', label='mp4 720p'),
+        ])
+
+        assert result.source == 'mp4 720p'
+        assert fake.steps().count("lecture de la fenêtre") == 1
+        assert _arg(fake.command("lecture de la fenêtre"), '-i') == 'https://cdn.example/play_720p.mp4'
+
+    def test_all_sources_failing_raises(self, extractor):
+        def failing(cmd, step):
+            raise ClipExtractionError(f"{step}: 403 Forbidden")
+        extractor._run = failing
+
+        with pytest.raises(ClipExtractionError) as excinfo:
+            extractor.extract([ClipSource(url='/a.mp4', label='a'), ClipSource(url='/b.mp4', label='b')], 10, 20)
+        assert 'a:' in str(excinfo.value) and 'b:' in str(excinfo.value)
+
+
+@pytest.fixture
+def clip_app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    monkeypatch.setattr(clip_service_module, 'source_video_cache', SourceVideoCache(str(tmp_path / 'cache'), 10 ** 9))
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='joueur@example.com', name='Joueur')
+        db.session.add(user)
+        db.session.flush()
+        video = Video(user_id=user.id, title='Match', bunny_video_id='bunny-abc')
+        db.session.add(video)
+        db.session.flush()
+        clip = UserClip(video_id=video.id, user_id=user.id, title='Point', start_time=100.0, end_time=130.0)
+        db.session.add(clip)
+        db.session.commit()
+        app.clip_id = clip.id
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.mark.integration
+def test_clip_falls_back_to_full_download_when_extraction_fails(clip_app, tmp_path, monkeypatch):
+    class FailingExtractor:
+        def extract(self, sources, start_time, end_time):
+            raise ClipExtractionError("original: 403; mp4 1080p: pas de Range")
+
+    service = clip_service_module.ManualClipService()
+    calls = []
+    clip_file = tmp_path / 'cut.mp4'
+    clip_file.write_bytes(b'\0' * 2048)
+
+    @contextmanager
+    def full_source(video):
+        calls.append(('download', video.bunny_video_id))
+        yield str(tmp_path / 'source.mp4')
+
+    def cut(source_path, start, end):
+        calls.append(('cut', source_path, start, end))
+        return str(clip_file)
+
+    monkeypatch.setattr(clip_service_module, 'clip_extractor', FailingExtractor())
+    monkeypatch.setattr(service, '_get_bunny_config',
+                        lambda: {'library_id': '1', 'api_key': 'k', 'cdn_hostname': 'cdn.example'})
+    monkeypatch.setattr(service, 'source_video', full_source)
+    monkeypatch.setattr(service, '_cut_video_local', cut)
+    monkeypatch.setattr(service, '_get_video_resolution', lambda path: (1920, 1080))
+    monkeypatch.setattr(service, '_upload_to_bunny', lambda path, name: ('https://cdn.example/clip/playlist.m3u8', 'clip-1'))
+    monkeypatch.setattr(service, '_cleanup_files', lambda paths: None)
+
+    assert service.process_clip(clip_app.clip_id) is True
+    assert calls == [('download', 'bunny-abc'), ('cut', str(tmp_path / 'source.mp4'), 100.0, 130.0)]
+    clip = UserClip.query.get(clip_app.clip_id)
+    assert clip.bunny_video_id == 'clip-1'
+    assert clip.status == 'processing'
@@ -0,0 +1,166 @@
+"""
+Grand livre des crédits sous concurrence
+Des débits parallèles sur un même compte ne doivent jamais le faire passer sous zéro,
+et la somme des mouvements du grand livre doit toujours égaler le solde
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import func
+
+from src.extensions import cache
+from src.models.credit_ledger import ACCOUNT_CLUB, ACCOUNT_USER, CreditBalanceSnapshot, CreditLedgerEntry
+from src.models.database import db
+from src.models.user import Club, User, UserRole
+from src.routes.players import players_bp
+from src.services import credit_ledger
+from src.services.credit_ledger import InsufficientCredits
+
+WORKERS = 16
+
+
+@pytest.fixture
+def ledger_app(tmp_path):
+    app = Flask(__name__)
+    # Base fichier: chaque thread a sa propre connexion (transactions réellement concurrentes)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'ledger.db'}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+    app.register_blueprint(players_bp, url_prefix='/api/players')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _ledger_sum(account_type, account_id):
+    return db.session.query(func.coalesce(func.sum(CreditLedgerEntry.delta), 0)).filter(
+        CreditLedgerEntry.account_type == account_type,
+        CreditLedgerEntry.account_id == account_id
+    ).scalar()
+
+
+def _run_parallel(app, count, action):
+    """Exécuter action() count fois sur WORKERS threads, chacun dans son contexte applicatif"""
+    def attempt(i):
+        with app.app_context():
+            try:
+                action(i)
+                db.session.commit()
+                return True
+            except InsufficientCredits:
+                db.session.rollback()
+                return False
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(attempt, range(count)))
+
+
+@pytest.mark.integration
+class TestCreditLedgerConcurrency:
+
+    def test_parallel_debits_never_overdraw(self, ledger_app):
+        """100 débits parallèles sur 50 crédits: exactement 50 réussissent, solde final 0"""
+        player = User(email='p@test.com', name='Joueur', role=UserRole.PLAYER, credits_balance=50)
+        db.session.add(player)
+        db.session.commit()
+        player_id = player.id
+
+        def spend(i):
+            credit_ledger.debit(db.session.get(User, player_id), 1, 'recording', reference=f"recording:{i}")
+
+        results = _run_parallel(ledger_app, 100, spend)
+
+        db.session.expire_all()
+        assert results.count(True) == 50
+        assert db.session.get(User, player_id).credits_balance == 0
+        assert _ledger_sum(ACCOUNT_USER, player_id) == 0
+        debits = CreditLedgerEntry.query.filter_by(account_id=player_id, reason='recording').all()
+        assert len(debits) == 50
+        # Chaque débit a vu un solde distinct: aucun mouvement perdu
+        assert sorted(e.balance_after for e in debits) == list(range(50))
+
+    def test_parallel_transfers_keep_total(self, ledger_app):
+        """Transferts club -> joueurs concurrents: le club ne passe pas sous zéro, rien n'est créé ni perdu"""
+        club = Club(name='Club', credits_balance=30)
+        db.session.add(club)
+        db.session.flush()
+        players = [User(email=f'p{i}@test.com', name=f'Joueur {i}', role=UserRole.PLAYER,
+                        club_id=club.id, credits_balance=0) for i in range(4)]
+        db.session.add_all(players)
+        db.session.commit()
+        club_id, player_ids = club.id, [p.id for p in players]
+
+        def give(i):
+            credit_ledger.transfer(db.session.get(Club, club_id), db.session.get(User, player_ids[i % 4]),
+                                   2, 'club_grant', reference=f"club:{club_id}")
+
+        results = _run_parallel(ledger_app, 40, give)
+
+        db.session.expire_all()
+        assert results.count(True) == 15
+        assert db.session.get(Club, club_id).credits_balance == 0
+        assert sum(db.session.get(User, pid).credits_balance for pid in player_ids) == 30
+        assert _ledger_sum(ACCOUNT_CLUB, club_id) == 0
+        for pid in player_ids:
+            assert _ledger_sum(ACCOUNT_USER, pid) == db.session.get(User, pid).credits_balance
+
+    def test_snapshot_and_history_from_ledger(self, ledger_app):
+        """Instantané sans dérive et historique servi par le grand livre"""
+        player = User(email='h@test.com', name='Joueur', role=UserRole.PLAYER, credits_balance=5)
+        db.session.add(player)
+        db.session.commit()
+        credit_ledger.credit(player, 10, 'purchase')
+        credit_ledger.debit(player, 3, 'unlock_video', reference='video:1')
+        db.session.commit()
+
+        assert credit_ledger.snapshot_balances(settle_seconds=0) == {'accounts': 1, 'drifting': 0}
+        snapshot = CreditBalanceSnapshot.query.filter_by(account_id=player.id).one()
+        assert (snapshot.balance, snapshot.total_credited, snapshot.total_debited) == (12, 15, 3)
+
+        credit_ledger.debit(player, 2, 'recording')
+        db.session.commit()
+        assert credit_ledger.totals(ACCOUNT_USER, player.id) == {'total_credited': 15, 'total_debited': 5}
+
+        client = ledger_app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = player.id
+        response = client.get('/api/players/credits/history')
+        assert response.status_code == 200
+        history = response.get_json()['history']
+        assert [h['action_type'] for h in history] == ['start_recording', 'unlock_video', 'buy_credits', 'opening_balance']
+        assert json.loads(history[2]['details'])['credits_purchased'] == 10
+        assert response.get_json()['current_balance'] == 10
+
+    def test_snapshot_leaves_recent_movements_for_the_next_one(self, ledger_app):
+        """Un mouvement encore dans la fenêtre de décantation n'est pas figé; l'instantané suivant le reprend"""
+        player = User(email='s@test.com', name='Joueur', role=UserRole.PLAYER, credits_balance=0)
+        db.session.add(player)
+        db.session.commit()
+        credit_ledger.credit(player, 10, 'purchase')
+        db.session.flush()
+        CreditLedgerEntry.query.filter_by(account_id=player.id).update(
+            {'created_at': datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+        credit_ledger.debit(player, 4, 'unlock_video')
+        db.session.commit()
+
+        assert credit_ledger.snapshot_balances() == {'accounts': 1, 'drifting': 0}
+        snapshot = CreditBalanceSnapshot.query.filter_by(account_id=player.id).one()
+        assert (snapshot.balance, snapshot.total_credited, snapshot.total_debited) == (10, 10, 0)
+        assert credit_ledger.totals(ACCOUNT_USER, player.id) == {'total_credited': 10, 'total_debited': 4}
+
+        assert credit_ledger.snapshot_balances(settle_seconds=0) == {'accounts': 1, 'drifting': 0}
+        latest = CreditBalanceSnapshot.query.filter_by(account_id=player.id).order_by(CreditBalanceSnapshot.id.desc()).first()
+        assert (latest.balance, latest.total_credited, latest.total_debited) == (6, 10, 4)
+        assert credit_ledger.totals(ACCOUNT_USER, player.id) == {'total_credited': 10, 'total_debited': 4}
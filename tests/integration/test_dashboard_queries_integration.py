@@ -0,0 +1,194 @@
+"""
+Budget de requêtes SQL des tableaux de bord joueur et club
+Le nombre de requêtes d'un endpoint doit rester fixe quand le volume de données grandit
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from src.extensions import cache
+from src.models.credit_ledger import ACCOUNT_USER, CreditLedgerEntry
+from src.models.database import db
+from src.models.user import (
+    User, UserRole, Club, ClubOverlay, Court, Video, ClubActionHistory, RecordingSession
+)
+from src.routes.players import players_bp
+from src.routes.clubs import clubs_bp
+
+# Requêtes maximales par endpoint, indépendamment du volume
+PLAYER_DASHBOARD_BUDGET = 10
+CLUB_DASHBOARD_BUDGET = 10
+# Nettoyage des sessions expirées: UPDATE groupés (sessions, terrains), quel que soit leur nombre
+EXPIRED_CLEANUP_QUERIES = 3
+
+
+@pytest.fixture
+def dashboard_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+    app.register_blueprint(players_bp, url_prefix='/api/players')
+    app.register_blueprint(clubs_bp, url_prefix='/api/clubs')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class QueryCounter:
+    """Compter les requêtes SQL émises pendant le bloc"""
+
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _seed(scale):
+    """Club du joueur + `scale` clubs tiers, terrains, vidéos, sessions et historique"""
+    home = Club(name='Club principal', email='home@test.com')
+    db.session.add(home)
+    db.session.flush()
+    db.session.add(ClubOverlay(club_id=home.id, image_url='/logo.png'))
+
+    manager = User(email='club@test.com', name='Club', role=UserRole.CLUB, club_id=home.id)
+    player = User(email='player@test.com', name='Joueur', role=UserRole.PLAYER, club_id=home.id)
+    db.session.add_all([manager, player])
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for i in range(scale):
+        other = Club(name=f'Club {i}')
+        db.session.add(other)
+        db.session.flush()
+        db.session.add(ClubOverlay(club_id=other.id, image_url=f'/logo{i}.png'))
+        fan = User(email=f'fan{i}@test.com', name=f'Fan {i}', club_id=home.id)
+        fan.followed_clubs.append(other)
+        db.session.add(fan)
+        db.session.flush()
+
+        for club in (home, other):
+            court = Court(name=f'Terrain {club.id}-{i}', qr_code=f'qr-{club.id}-{i}',
+                          camera_url='rtsp://camera', club_id=club.id)
+            db.session.add(court)
+            db.session.flush()
+            db.session.add(Video(title=f'Match {i}', user_id=player.id, court_id=court.id, duration=60))
+            db.session.add(RecordingSession(
+                recording_id=f'rec-{club.id}-{i}', user_id=fan.id, court_id=court.id, club_id=club.id,
+                planned_duration=90 if i % 2 else 1,
+                start_time=now - timedelta(minutes=10)
+            ))
+        db.session.add(ClubActionHistory(
+            user_id=player.id, club_id=other.id, performed_by_id=manager.id,
+            action_type='add_credits', action_details=json.dumps({'credits_added': 2})
+        ))
+        db.session.add(CreditLedgerEntry(
+            account_type=ACCOUNT_USER, account_id=player.id, delta=2, balance_after=2 * (i + 1),
+            reason='club_grant', reference=f'club:{other.id}'
+        ))
+    db.session.commit()
+    return player, manager
+
+
+def _seed_more(app, scale):
+    """Ajouter des données au jeu existant (mêmes joueur et club)"""
+    player = User.query.filter_by(email='player@test.com').one()
+    manager = User.query.filter_by(email='club@test.com').one()
+    home = Club.query.filter_by(name='Club principal').one()
+    now = datetime.utcnow()
+    for i in range(scale):
+        other = Club(name=f'Club extra {i}')
+        db.session.add(other)
+        db.session.flush()
+        fan = User(email=f'extra{i}@test.com', name=f'Extra {i}', club_id=home.id)
+        fan.followed_clubs.append(other)
+        db.session.add(fan)
+        db.session.flush()
+        for club in (home, other):
+            court = Court(name=f'Terrain extra {club.id}-{i}', qr_code=f'qr-extra-{club.id}-{i}',
+                          camera_url='rtsp://camera', club_id=club.id)
+            db.session.add(court)
+            db.session.flush()
+            db.session.add(Video(title=f'Match extra {i}', user_id=player.id, court_id=court.id))
+            db.session.add(RecordingSession(
+                recording_id=f'rec-extra-{club.id}-{i}', user_id=fan.id, court_id=court.id,
+                club_id=club.id, planned_duration=90, start_time=now
+            ))
+        db.session.add(ClubActionHistory(
+            user_id=player.id, club_id=other.id, performed_by_id=manager.id,
+            action_type='add_credits', action_details=json.dumps({'credits_added': 1})
+        ))
+        db.session.add(CreditLedgerEntry(
+            account_type=ACCOUNT_USER, account_id=player.id, delta=1, balance_after=10 + i + 1,
+            reason='club_grant', reference=f'club:{other.id}'
+        ))
+    db.session.commit()
+
+def _count_queries(app, user_id, url):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    db.session.expire_all()
+    with QueryCounter() as counter:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return counter.count, response.get_json()
+
+
+@pytest.mark.integration
+class TestDashboardQueryBudget:
+    """Le nombre de requêtes ne dépend pas du volume de données"""
+
+    def test_player_dashboard_is_constant(self, dashboard_app):
+        player, _ = _seed(5)
+        small, data = _count_queries(dashboard_app, player.id, '/api/players/dashboard')
+        assert data['videos_statistics']['total_videos'] == 10
+        assert data['credits_statistics']['credits_earned_this_month'] == 10
+        assert len(data['recommended_clubs']) == 5
+        assert data['recent_activity'][0]['club_name'].startswith('Club ')
+
+        _seed_more(dashboard_app, 15)
+        large, data = _count_queries(dashboard_app, player.id, '/api/players/dashboard')
+        assert data['videos_statistics']['total_videos'] == 40
+
+        assert small <= PLAYER_DASHBOARD_BUDGET
+        assert large == small
+
+    def test_club_dashboard_is_constant(self, dashboard_app):
+        _, manager = _seed(5)
+        small, data = _count_queries(dashboard_app, manager.id, '/api/clubs/dashboard')
+        assert data['stats']['total_courts'] == 5
+        assert data['stats']['total_videos'] == 5
+        # Sessions de 1 minute démarrées il y a 10 minutes: expirées et libérées
+        assert sum(court['is_occupied'] for court in data['courts']) == 2
+        assert all(video['club_name'] == 'Club principal' for video in data['videos'])
+
+        _seed_more(dashboard_app, 15)
+        large, data = _count_queries(dashboard_app, manager.id, '/api/clubs/dashboard?per_page=10')
+        assert data['stats']['total_videos'] == 20
+        assert len(data['videos']) == 10
+        assert data['videos_pagination']['has_more'] is True
+
+        assert small <= CLUB_DASHBOARD_BUDGET + EXPIRED_CLEANUP_QUERIES
+        assert large <= CLUB_DASHBOARD_BUDGET
+
@@ -0,0 +1,155 @@
+"""
+Flux d'événements temps réel (SSE)
+Publication après commit (jamais après rollback) et livraison aux flux abonnés
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from src.models.database import db
+from src.models.notification import Notification, NotificationType
+from src.models.user import UserRole
+from src.routes import events
+from src.services.event_bus import event_bus, user_channel
+
+
+@pytest.fixture
+def events_app(monkeypatch):
+    # Diffusion locale au processus (sans Redis)
+    monkeypatch.setattr(event_bus, 'redis_url', None)
+    monkeypatch.setattr(event_bus, '_redis', None)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    app.register_blueprint(events.events_bp)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _notify(user_id: int):
+    db.session.add(Notification(
+        user_id=user_id,
+        notification_type=NotificationType.VIDEO_READY,
+        title='Vidéo prête',
+        message='Votre vidéo est prête'
+    ))
+
+
+@pytest.mark.integration
+class TestEventBus:
+
+    def test_notification_published_after_commit(self, events_app):
+        subscription = event_bus.subscribe({user_channel(7)})
+        try:
+            _notify(7)
+            db.session.flush()
+            assert subscription.get(timeout=0) is None  # pas avant le commit
+
+            db.session.commit()
+            message = subscription.get(timeout=1)
+            assert message['event'] == 'notification'
+            assert message['data']['notification']['user_id'] == 7
+            assert message['data']['unread_delta'] == 1
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    def test_rollback_publishes_nothing(self, events_app):
+        subscription = event_bus.subscribe({user_channel(7)})
+        try:
+            _notify(7)
+            db.session.flush()
+            db.session.rollback()
+            assert subscription.get(timeout=0.2) is None
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    def test_other_users_do_not_receive_the_event(self, events_app):
+        subscription = event_bus.subscribe({user_channel(8)})
+        try:
+            _notify(7)
+            db.session.commit()
+            assert subscription.get(timeout=0.2) is None
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    def test_stream_delivers_committed_notification(self, events_app, monkeypatch):
+        user = SimpleNamespace(id=7, role=UserRole.PLAYER, club_id=None)
+        monkeypatch.setattr(events, 'current_user_snapshot', lambda: user)
+        monkeypatch.setattr(events.Notification, 'get_unread_count', staticmethod(lambda user_id: 0))
+
+        response = events_app.test_client().get('/api/events/stream', buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert event_bus.subscriber_count() == 1
+
+        _notify(7)
+        db.session.commit()
+
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry: ')
+        assert b'event: hello' in next(chunks)
+        chunk = next(chunks).decode()
+        assert 'event: notification' in chunk
+        assert '"user_id": 7' in chunk
+
+        response.close()
+        assert event_bus.subscriber_count() == 0
+
+
+@pytest.fixture
+def redis_bus(monkeypatch):
+    """Bus relié à un Redis simulé; mémorise les options de chaque connexion"""
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    from src.services.event_bus import EventBus
+
+    server = fakeredis.FakeServer()
+    connections = []
+
+    def from_url(url, **kwargs):
+        connections.append(kwargs)
+        return fakeredis.FakeRedis(server=server, **kwargs)
+
+    monkeypatch.setattr(redis, 'from_url', from_url)
+    bus = EventBus('redis://events.test:6379/0')
+    bus.connections = connections
+    return bus
+
+
+@pytest.mark.integration
+class TestRedisEventBus:
+
+    def test_listener_connection_has_no_read_timeout(self, redis_bus):
+        subscription = redis_bus.subscribe([user_channel(7)])
+        deadline = time.time() + 5
+        while len(redis_bus.connections) < 2 and time.time() < deadline:
+            time.sleep(0.02)
+
+        publisher, listener = redis_bus.connections[:2]
+        assert publisher['socket_timeout'] == 5
+        # Canal silencieux: listen() ne doit pas échouer toutes les 5 s
+        assert listener['socket_timeout'] is None
+        assert listener['socket_keepalive'] is True
+        assert listener['health_check_interval'] > 0
+        redis_bus.unsubscribe(subscription)
+
+    def test_event_delivered_through_redis(self, redis_bus):
+        subscription = redis_bus.subscribe([user_channel(7)])
+        message = None
+        deadline = time.time() + 5
+        while message is None and time.time() < deadline:
+            # Le psubscribe du listener peut arriver après la première publication
+            redis_bus.publish([user_channel(7)], 'notification', {'user_id': 7})
+            message = subscription.get(timeout=0.2)
+
+        assert message['event'] == 'notification'
+        assert message['data'] == {'user_id': 7}
+        redis_bus.unsubscribe(subscription)
@@ -0,0 +1,219 @@
+"""
+Idempotence des requêtes critiques (header Idempotency-Key)
+Une même clé n'exécute la vue qu'une fois et rejoue sa réponse; un échec n'est pas
+mémorisé; une clé réutilisée pour un autre contenu est refusée
+Avec Redis: réservation SET NX, un doublon concurrent attend puis rejoue la réponse,
+un échec libère la clé; sans Redis, la table idempotency_key sert de repli
+"""
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+from src.middleware import idempotence
+from src.middleware.idempotence import KEY_PREFIX, IdempotencyStore, _scoped_key, idempotent
+from src.models.database import db
+from src.models.user import IdempotencyKey
+
+
+def _build_app(monkeypatch, store):
+    monkeypatch.setattr(idempotence, 'idempotency_store', store)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    app.calls = []
+    app.before_view = lambda: None
+
+    @app.route('/start', methods=['POST'])
+    @idempotent()
+    def start():
+        app.calls.append('start')
+        app.before_view()
+        return jsonify({'session': len(app.calls)}), 201
+
+    @app.route('/fail', methods=['POST'])
+    @idempotent()
+    def fail():
+        app.calls.append('fail')
+        app.before_view()
+        return jsonify({'error': 'Crédits insuffisants'}), 400
+
+    return app
+
+
+@pytest.fixture
+def idempotent_app(monkeypatch):
+    app = _build_app(monkeypatch, IdempotencyStore(redis_url=None))
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def redis_app(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # scripts Lua _COMPLETE/_RELEASE
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    store = IdempotencyStore(redis_url='redis://fake')
+    store.audit_enabled = False
+    store.wait_seconds = 5
+    app = _build_app(monkeypatch, store)
+    app.store = store
+    app.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _post(client, path, key=None, body=None):
+    headers = {'Idempotency-Key': key} if key else {}
+    return client.post(path, json=body or {'court_id': 1}, headers=headers)
+
+
+def _redis_key(path, key):
+    return KEY_PREFIX + _scoped_key(None, 'POST:' + path.strip('/'), key)
+
+
+def _post_in_thread(app, path, key, results):
+    def send():
+        with app.app_context():
+            results.append(_post(app.test_client(), path, key))
+    thread = threading.Thread(target=send)
+    thread.start()
+    return thread
+
+
+def _hold_first_call(app):
+    """Bloquer la première exécution de la vue jusqu'à release.set()"""
+    entered, release = threading.Event(), threading.Event()
+
+    def before_view():
+        if len(app.calls) == 1:
+            entered.set()
+            assert release.wait(5)
+    app.before_view = before_view
+    return entered, release
+
+
+@pytest.mark.integration
+class TestIdempotency:
+
+    def test_same_key_runs_once_and_replays(self, idempotent_app):
+        client = idempotent_app.test_client()
+        first = _post(client, '/start', 'abc')
+        second = _post(client, '/start', 'abc')
+
+        assert idempotent_app.calls == ['start']
+        assert (second.status_code, second.get_json()) == (201, first.get_json())
+        assert second.headers['X-Idempotent'] == 'true'
+        assert IdempotencyKey.query.count() == 1
+
+    def test_without_key_or_with_new_key_runs_again(self, idempotent_app):
+        client = idempotent_app.test_client()
+        _post(client, '/start')
+        _post(client, '/start')
+        _post(client, '/start', 'k1')
+        _post(client, '/start', 'k2')
+        assert len(idempotent_app.calls) == 4
+
+    def test_failure_is_not_stored(self, idempotent_app):
+        client = idempotent_app.test_client()
+        assert _post(client, '/fail', 'abc').status_code == 400
+        assert _post(client, '/fail', 'abc').status_code == 400
+        assert idempotent_app.calls == ['fail', 'fail']
+        assert IdempotencyKey.query.count() == 0
+
+    def test_key_reused_for_other_content_is_rejected(self, idempotent_app):
+        client = idempotent_app.test_client()
+        _post(client, '/start', 'abc', {'court_id': 1})
+        response = _post(client, '/start', 'abc', {'court_id': 2})
+        assert response.status_code == 422
+        assert idempotent_app.calls == ['start']
+
+
+@pytest.mark.integration
+class TestIdempotencyRedis:
+
+    def test_concurrent_duplicate_waits_and_replays(self, redis_app):
+        entered, release = _hold_first_call(redis_app)
+        results = []
+        first = _post_in_thread(redis_app, '/start', 'abc', results)
+        assert entered.wait(5)
+        assert redis_app.redis.get(_redis_key('/start', 'abc')).startswith('pending:')
+
+        duplicate = _post_in_thread(redis_app, '/start', 'abc', results)
+        time.sleep(0.2)
+        assert len(results) == 0  # le doublon attend la fin du premier
+        release.set()
+        first.join(5)
+        duplicate.join(5)
+
+        assert redis_app.calls == ['start']
+        assert sorted(r.status_code for r in results) == [201, 201]
+        assert results[0].get_json() == results[1].get_json()
+        assert sorted(r.headers.get('X-Idempotent', '') for r in results) == ['', 'true']
+        assert _post(redis_app.test_client(), '/start', 'abc').headers['X-Idempotent'] == 'true'
+        assert redis_app.calls == ['start']
+
+    def test_duplicate_gives_up_after_wait(self, redis_app):
+        redis_app.store.wait_seconds = 0.2
+        entered, release = _hold_first_call(redis_app)
+        results = []
+        first = _post_in_thread(redis_app, '/start', 'abc', results)
+        assert entered.wait(5)
+
+        response = _post(redis_app.test_client(), '/start', 'abc')
+        release.set()
+        first.join(5)
+        assert response.status_code == 409
+        assert response.headers['Retry-After'] == '1'
+        assert redis_app.calls == ['start']
+
+    def test_failed_first_attempt_releases_key(self, redis_app):
+        entered, release = _hold_first_call(redis_app)
+        results = []
+        first = _post_in_thread(redis_app, '/fail', 'abc', results)
+        assert entered.wait(5)
+        duplicate = _post_in_thread(redis_app, '/fail', 'abc', results)
+        time.sleep(0.2)
+        release.set()
+        first.join(5)
+        duplicate.join(5)
+
+        # Le doublon en attente est invité à réessayer; la clé est libérée
+        assert sorted(r.status_code for r in results) == [400, 409]
+        assert redis_app.redis.get(_redis_key('/fail', 'abc')) is None
+        assert _post(redis_app.test_client(), '/fail', 'abc').status_code == 400
+        assert redis_app.calls == ['fail', 'fail']
+
+    def test_expired_lock_of_a_dead_worker_is_reclaimed(self, redis_app):
+        redis_app.store.wait_seconds = 0
+        redis_key = _redis_key('/start', 'abc')
+        redis_app.redis.set(redis_key, 'pending:dead-worker', px=300)
+
+        assert _post(redis_app.test_client(), '/start', 'abc').status_code == 409
+        time.sleep(0.4)
+        assert _post(redis_app.test_client(), '/start', 'abc').status_code == 201
+        assert redis_app.calls == ['start']
+
+    def test_expired_claim_is_not_overwritten_by_the_late_worker(self, redis_app):
+        """Réservation expirée puis reprise par un autre worker: ni _COMPLETE ni _RELEASE n'y touchent"""
+        redis_key = _redis_key('/start', 'abc')
+        redis_app.before_view = lambda: redis_app.redis.set(redis_key, 'pending:other-worker')
+        assert _post(redis_app.test_client(), '/start', 'abc').status_code == 201
+        assert redis_app.redis.get(redis_key) == 'pending:other-worker'
+
+        redis_key = _redis_key('/fail', 'abc')
+        redis_app.before_view = lambda: redis_app.redis.set(redis_key, 'pending:other-worker')
+        assert _post(redis_app.test_client(), '/fail', 'abc').status_code == 400
+        assert redis_app.redis.get(redis_key) == 'pending:other-worker'
@@ -0,0 +1,75 @@
+"""
+Plan d'encodage des lives HLS (services.live_hls)
+Échelle ABR limitée à la résolution de la caméra: pas de rendus en double,
+budget CPU calculé sur les rendus réellement encodés
+"""
+import os
+import stat
+
+import pytest
+
+from src.services import live_hls
+from src.services.live_hls import MODE_ABR, MODE_SINGLE, build_command, plan_live, probe_source_height
+
+
+@pytest.fixture
+def ladder(monkeypatch):
+    monkeypatch.setenv('LIVE_HLS_LADDER', '1080,720,480,360')
+    monkeypatch.setattr(live_hls, 'CPU_PER_COURT', 8.0)
+    monkeypatch.setattr(live_hls, 'CPU_TOTAL', 8.0)
+
+
+def _fake_ffmpeg(tmp_path, script):
+    """FFmpeg factice: seul le ffprobe voisin est exécuté"""
+    probe = tmp_path / 'ffprobe'
+    probe.write_text('#!/bin/sh\n' + script)
+    probe.chmod(probe.stat().st_mode | stat.S_IEXEC)
+    return str(tmp_path / 'ffmpeg')
+
+
+@pytest.mark.integration
+class TestLadderAgainstSource:
+
+    def test_rungs_taller_than_camera_are_dropped(self, ladder):
+        plan = plan_live(MODE_ABR, 0, source_height=720)
+
+        assert plan.to_dict()['renditions'] == ['720p', '480p', '360p']
+        assert plan.cpu_cost == pytest.approx(live_hls.DECODE_COST + 0.8 + 0.4 + 0.25)
+
+    def test_camera_between_rungs_keeps_only_lower_rungs(self, ladder):
+        plan = plan_live(MODE_ABR, 0, source_height=600)
+        assert [r.height for r in plan.renditions] == [480, 360]
+
+    def test_single_rung_left_falls_back_to_single_encode(self, ladder):
+        plan = plan_live(MODE_ABR, 0, source_height=400)
+        assert plan.mode == MODE_SINGLE
+
+    def test_unknown_source_keeps_configured_ladder(self, ladder):
+        plan = plan_live(MODE_ABR, 0)
+        assert [r.height for r in plan.renditions] == [1080, 720, 480, 360]
+
+    def test_command_scales_to_rung_height_without_clamp(self, ladder, tmp_path):
+        plan = plan_live(MODE_ABR, 0, source_height=720)
+        cmd = build_command('ffmpeg', 'rtsp://camera', str(tmp_path), plan)
+        graph = cmd[cmd.index('-filter_complex') + 1]
+
+        assert 'min(ih' not in graph
+        assert graph.endswith('[s0]scale=-2:720[v0];[s1]scale=-2:480[v1];[s2]scale=-2:360[v2]')
+        assert cmd[cmd.index('-var_stream_map') + 1] == 'v:0,name:720p v:1,name:480p v:2,name:360p'
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(os.name == 'nt', reason='ffprobe factice en script shell')
+class TestProbeSourceHeight:
+
+    def test_height_read_from_ffprobe_next_to_ffmpeg(self, tmp_path):
+        ffmpeg = _fake_ffmpeg(tmp_path, 'echo 720\n')
+        assert probe_source_height(ffmpeg, 'rtsp://camera') == 720
+
+    def test_unreadable_stream_gives_unknown_height(self, tmp_path):
+        ffmpeg = _fake_ffmpeg(tmp_path, 'echo "Connection refused" >&2\nexit 1\n')
+        assert probe_source_height(ffmpeg, 'rtsp://camera') is None
+
+    def test_probe_timeout_gives_unknown_height(self, tmp_path):
+        ffmpeg = _fake_ffmpeg(tmp_path, 'sleep 5\n')
+        assert probe_source_height(ffmpeg, 'rtsp://camera', timeout=0.2) is None
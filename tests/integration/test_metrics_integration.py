@@ -0,0 +1,64 @@
+"""
+Métriques Prometheus (/metrics)
+Latence, compteurs par code de statut et exceptions par endpoint; le scrape ne fait
+que lire les séries (aucun health check)
+"""
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+from flask import Flask
+
+from src.services import metrics
+
+
+def _samples(client):
+    text = client.get('/metrics').get_data(as_text=True)
+    return [line for line in text.splitlines() if line and not line.startswith('#')]
+
+
+@pytest.fixture
+def metrics_app(monkeypatch):
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/api/items/<int:item_id>')
+    def get_item(item_id):
+        if item_id == 0:
+            raise RuntimeError('boom')
+        return {'id': item_id}
+
+    return app
+
+
+@pytest.mark.integration
+class TestMetrics:
+
+    def test_requests_are_labelled_by_endpoint(self, metrics_app):
+        client = metrics_app.test_client()
+        before = _samples(client)
+        for item_id in range(1, 4):
+            client.get(f'/api/items/{item_id}')
+        client.get('/api/items/0')
+        after = _samples(client)
+
+        def value(samples, prefix):
+            return sum(float(line.rsplit(' ', 1)[1]) for line in samples if line.startswith(prefix))
+
+        ok = 'flask_http_request_total{endpoint="get_item",method="GET",status="200"}'
+        failed = 'flask_http_request_total{endpoint="get_item",method="GET",status="500"}'
+        count = 'flask_http_request_duration_seconds_count{endpoint="get_item",method="GET"}'
+        exceptions = 'flask_http_request_exceptions_total{endpoint="get_item",method="GET"}'
+        assert value(after, ok) - value(before, ok) == 3
+        assert value(after, failed) - value(before, failed) == 1
+        assert value(after, count) - value(before, count) == 4
+        assert value(after, exceptions) - value(before, exceptions) == 1
+        # Une série par règle Flask, pas par URL
+        assert not any('/api/items/' in line for line in after)
+
+    def test_recorder_progress(self, metrics_app):
+        metrics.set_recorder_progress(1, 3, 25.0, 0.98)
+        samples = _samples(metrics_app.test_client())
+        assert 'padelvar_recorder_fps{club_id="1",court_id="3"} 25.0' in samples
+        assert 'padelvar_recorder_speed_ratio{club_id="1",court_id="3"} 0.98' in samples
@@ -0,0 +1,153 @@
+"""
+Compteurs de notifications non lues adossés à Redis
+Chaque opération (création, lecture, tout lire, archivage, suppression) garde le
+compteur égal au comptage en base; un rollback n'applique aucune variation
+"""
+import pytest
+from flask import Flask
+
+from src.extensions import cache
+from src.models.database import db
+from src.models.notification import Notification, NotificationType
+from src.models.user import User, UserRole
+from src.routes.notifications import notifications_bp
+from src.services import notification_counters
+from src.services.event_bus import event_bus
+from src.services.notification_counters import HASH_KEY, unread_counters
+
+
+@pytest.fixture
+def counters_app(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # scripts Lua _APPLY_DELTAS/_FILL
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(unread_counters, '_redis', client)
+    monkeypatch.setattr(unread_counters, '_apply_script', client.register_script(notification_counters._APPLY_DELTAS))
+    monkeypatch.setattr(unread_counters, '_fill_script', client.register_script(notification_counters._FILL))
+    # Diffusion des événements locale au processus (sans Redis)
+    monkeypatch.setattr(event_bus, 'redis_url', None)
+    monkeypatch.setattr(event_bus, '_redis', None)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+    app.register_blueprint(notifications_bp)
+    app.redis = client
+
+    with app.app_context():
+        db.create_all()
+        player = User(email='player@test.com', name='Joueur', role=UserRole.PLAYER)
+        other = User(email='other@test.com', name='Autre', role=UserRole.PLAYER)
+        db.session.add_all([player, other])
+        db.session.commit()
+        app.config['PLAYER_ID'], app.config['OTHER_ID'] = player.id, other.id
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _notify(user_id, count=1):
+    notifications = [
+        Notification.create_notification(user_id, NotificationType.VIDEO_READY, 'Vidéo prête', f'Vidéo {i}')
+        for i in range(count)
+    ]
+    db.session.commit()
+    return [n.id for n in notifications]
+
+
+def _client(app):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = app.config['PLAYER_ID']
+    return client
+
+
+def _assert_counter(app, user_id, expected, cached=True):
+    """Badge == comptage en base; cached: servi par le hash (delta appliqué, pas recompté)"""
+    if cached:
+        assert app.redis.hget(HASH_KEY, user_id) == str(expected)
+    assert unread_counters.get(user_id) == expected
+    assert unread_counters.count_from_db(user_id) == expected
+
+
+@pytest.mark.integration
+class TestUnreadCounters:
+
+    def test_create_increments_known_counter(self, counters_app):
+        user_id = counters_app.config['PLAYER_ID']
+        _assert_counter(counters_app, user_id, 0, cached=False)  # premier accès: recompté puis mémorisé
+
+        _notify(user_id, 3)
+        _assert_counter(counters_app, user_id, 3)
+        # Compteur inconnu: pas de valeur partielle créée par un delta
+        _notify(counters_app.config['OTHER_ID'])
+        assert counters_app.redis.hget(HASH_KEY, counters_app.config['OTHER_ID']) is None
+
+    def test_mark_read_decrements(self, counters_app):
+        user_id = counters_app.config['PLAYER_ID']
+        unread_counters.get(user_id)
+        first, _ = _notify(user_id, 2)
+        client = _client(counters_app)
+
+        assert client.post(f'/api/notifications/{first}/mark-read').get_json()['status'] == 'marked_read'
+        _assert_counter(counters_app, user_id, 1)
+        assert client.post(f'/api/notifications/{first}/mark-read').get_json()['status'] == 'already_read'
+        _assert_counter(counters_app, user_id, 1)
+
+    def test_mark_all_read_invalidates_only_this_user(self, counters_app):
+        user_id, other_id = counters_app.config['PLAYER_ID'], counters_app.config['OTHER_ID']
+        unread_counters.get(user_id)
+        unread_counters.get(other_id)
+        _notify(user_id, 4)
+        _notify(other_id, 2)
+
+        response = _client(counters_app).post('/api/notifications/mark-all-read')
+        assert response.get_json()['marked_count'] == 4
+        # UPDATE groupé: champ supprimé, recompté à la lecture suivante
+        assert counters_app.redis.hget(HASH_KEY, user_id) is None
+        _assert_counter(counters_app, user_id, 0, cached=False)
+        _assert_counter(counters_app, other_id, 2)
+
+    def test_archive_decrements(self, counters_app):
+        user_id = counters_app.config['PLAYER_ID']
+        unread_counters.get(user_id)
+        first, _ = _notify(user_id, 2)
+
+        assert _client(counters_app).post(f'/api/notifications/{first}/archive').status_code == 200
+        _assert_counter(counters_app, user_id, 1)
+
+    def test_delete_decrements_only_unread(self, counters_app):
+        user_id = counters_app.config['PLAYER_ID']
+        unread_counters.get(user_id)
+        first, second, _ = _notify(user_id, 3)
+        client = _client(counters_app)
+        client.post(f'/api/notifications/{first}/mark-read')
+        _assert_counter(counters_app, user_id, 2)
+
+        assert client.delete(f'/api/notifications/{first}').status_code == 200  # déjà lue
+        _assert_counter(counters_app, user_id, 2)
+        assert client.delete(f'/api/notifications/{second}').status_code == 200
+        _assert_counter(counters_app, user_id, 1)
+
+    def test_rollback_discards_deltas(self, counters_app):
+        user_id = counters_app.config['PLAYER_ID']
+        unread_counters.get(user_id)
+        first, = _notify(user_id)
+
+        Notification.create_notification(user_id, NotificationType.VIDEO_READY, 'Annulée', 'Annulée')
+        db.session.flush()
+        db.session.rollback()
+        _assert_counter(counters_app, user_id, 1)
+
+        notification = db.session.get(Notification, first)
+        notification.is_read = True
+        db.session.flush()
+        Notification.query.filter_by(user_id=user_id).update({'is_read': True}, synchronize_session=False)
+        unread_counters.invalidate_after_commit(db.session, [user_id])
+        db.session.rollback()
+        # Ni delta ni invalidation en attente au commit suivant
+        _notify(counters_app.config['OTHER_ID'])
+        _assert_counter(counters_app, user_id, 1)
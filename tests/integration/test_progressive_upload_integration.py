@@ -0,0 +1,207 @@
+"""
+Tests d'intégration de l'upload progressif des segments vers Bunny Stream
+Segments CMAF relevés dans la playlist FFmpeg et envoyés pendant l'enregistrement
+(TUS à longueur différée), contre l'API Bunny locale
+"""
+import os
+import time
+
+import pytest
+
+from src.video_system import segments as seg
+from src.video_system.progressive_upload import ProgressiveUpload, finish_stream, stream_upload_id
+
+from fake_bunny_api import FakeBunnyAPI
+
+RECORDING_ID = 'rec_42'
+
+
+@pytest.fixture
+def fake_bunny():
+    api = FakeBunnyAPI().start()
+    yield api
+    api.stop()
+
+
+@pytest.fixture
+def bunny_env(fake_bunny, tmp_path, monkeypatch):
+    monkeypatch.setenv('BUNNY_API_KEY', fake_bunny.api_key)
+    monkeypatch.setenv('BUNNY_LIBRARY_ID', fake_bunny.library_id)
+    monkeypatch.setenv('BUNNY_CDN_HOSTNAME', 'vz-test.b-cdn.net')
+    monkeypatch.setenv('BUNNY_UPLOAD_JOURNAL_DIR', str(tmp_path / 'journal'))
+    from src.services import bunny_storage_service as module
+    module.bunny_storage_service.shutdown()
+    services = []
+
+    def make_service():
+        service = module.BunnyStorageService()
+        service.config.api_base_url = fake_bunny.library_url
+        service.config.tus_endpoint = fake_bunny.tus_endpoint
+        service.config.chunk_size = 4096  # plusieurs PATCH par segment
+        monkeypatch.setattr(module, 'bunny_storage_service', service)
+        services.append(service)
+        return service
+
+    yield make_service
+    for service in services:
+        service.shutdown()
+
+
+@pytest.fixture
+def segment_dir(tmp_path):
+    path = tmp_path / 'segments'
+    path.mkdir()
+    (path / seg.INIT_NAME).write_bytes(os.urandom(1500))
+    return path
+
+
+def _close_segment(segment_dir, index, size=10000, duration=60.0):
+    """Imiter FFmpeg: segment renommé depuis .tmp puis ajouté à la playlist"""
+    name = seg.SEGMENT_PATTERN % index
+    (segment_dir / name).write_bytes(os.urandom(size))
+    playlist = segment_dir / seg.PLAYLIST_NAME
+    lines = playlist.read_text().splitlines() if playlist.exists() else [
+        '#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-PLAYLIST-TYPE:EVENT', f'#EXT-X-MAP:URI="{seg.INIT_NAME}"'
+    ]
+    lines += [f'#EXTINF:{duration:.6f},', name]
+    playlist.write_text('\n'.join(lines) + '\n')
+
+
+def _stream_bytes(segment_dir):
+    return b''.join(path.read_bytes() for path in seg.stream_files(segment_dir))
+
+
+def _only_upload(fake_bunny):
+    assert len(fake_bunny.uploads) == 1
+    return next(iter(fake_bunny.uploads.values()))
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.mark.integration
+class TestSegmentWatcher:
+    """Relevé des segments fermés dans la playlist FFmpeg"""
+
+    def test_new_segments_reported_in_order_with_timeline(self, segment_dir):
+        closed = []
+        watcher = seg.SegmentWatcher(RECORDING_ID, segment_dir, on_segment=closed.append)
+        _close_segment(segment_dir, 0, duration=60.0)
+        watcher._scan()
+        _close_segment(segment_dir, 1, duration=60.0)
+        _close_segment(segment_dir, 2, duration=12.5)
+        (segment_dir / ((seg.SEGMENT_PATTERN % 3) + '.tmp')).write_bytes(b'partiel')
+        watcher._scan()
+        watcher._scan()
+
+        assert [p.name for p in closed] == ['seg_00000.m4s', 'seg_00001.m4s', 'seg_00002.m4s']
+        assert [(s['start'], s['end']) for s in watcher.segments] == [(0.0, 60.0), (60.0, 120.0), (120.0, 132.5)]
+        assert seg.read_manifest_segments(segment_dir) == watcher.segment_names
+
+
+@pytest.mark.integration
+class TestProgressiveUpload:
+    """Segments envoyés pendant l'enregistrement, seul le dernier à l'arrêt"""
+
+    def test_segments_shipped_before_stop_and_stream_completed_at_finish(self, bunny_env, fake_bunny, segment_dir):
+        service = bunny_env()
+        uploader = ProgressiveUpload(RECORDING_ID, segment_dir, 'Enregistrement rec_42')
+        watcher = seg.SegmentWatcher(RECORDING_ID, segment_dir, on_segment=uploader.segment_closed)
+        uploader.start()
+
+        _close_segment(segment_dir, 0)
+        _close_segment(segment_dir, 1)
+        watcher._scan()
+        shipped = _stream_bytes(segment_dir)
+        assert _wait_for(lambda: fake_bunny.uploads and _only_upload(fake_bunny)['data'] == shipped)
+        upload = _only_upload(fake_bunny)
+        assert upload['length'] is None  # longueur différée pendant le match
+
+        _close_segment(segment_dir, 2, size=3000, duration=20.0)
+        watcher._scan()
+        patches_before_stop = fake_bunny.requests['tus_patch']
+        assert uploader.finish(timeout=5)
+
+        assert upload['data'] == _stream_bytes(segment_dir)
+        assert upload['length'] == len(upload['data'])
+        # Au plus le dernier segment et la déclaration de longueur restent pour l'arrêt
+        assert fake_bunny.requests['tus_patch'] - patches_before_stop <= 3000 // 4096 + 2
+        status = service.get_upload_status(stream_upload_id(RECORDING_ID))
+        assert status['status'] == 'completed'
+        assert fake_bunny.videos[status['bunny_video_id']]['status'] == 1
+        assert fake_bunny.requests['tus_create'] == 1
+
+    def test_finish_after_restart_resumes_from_journal(self, bunny_env, fake_bunny, segment_dir):
+        first = bunny_env()
+        upload_id = stream_upload_id(RECORDING_ID)
+        watcher = seg.SegmentWatcher(RECORDING_ID, segment_dir)
+        assert first.open_stream_upload(upload_id, str(segment_dir), 'Enregistrement rec_42') == upload_id
+        _close_segment(segment_dir, 0)
+        watcher._scan()
+        assert first.append_stream_upload(upload_id, [str(p) for p in seg.stream_files(segment_dir)])
+        _close_segment(segment_dir, 1, size=5000)
+        watcher._scan()
+        first.shutdown()
+
+        # Nouveau processus: segments relevés depuis le manifeste
+        bunny_env()
+        assert finish_stream(RECORDING_ID, segment_dir)
+        upload = _only_upload(fake_bunny)
+        assert upload['data'] == _stream_bytes(segment_dir)
+        assert upload['length'] == len(upload['data'])
+        assert fake_bunny.requests['create_video'] == 1
+
+    def test_partial_last_segment_aborts_stream(self, bunny_env, fake_bunny, segment_dir):
+        service = bunny_env()
+        upload_id = stream_upload_id(RECORDING_ID)
+        watcher = seg.SegmentWatcher(RECORDING_ID, segment_dir)
+        service.open_stream_upload(upload_id, str(segment_dir), 'Enregistrement rec_42')
+        _close_segment(segment_dir, 0)
+        watcher._scan()
+        service.append_stream_upload(upload_id, [str(p) for p in seg.stream_files(segment_dir)])
+        (segment_dir / ((seg.SEGMENT_PATTERN % 1) + '.tmp')).write_bytes(os.urandom(800))  # FFmpeg tué
+
+        assert not finish_stream(RECORDING_ID, segment_dir)
+        status = service.get_upload_status(upload_id)
+        assert status['status'] == 'failed'
+        assert fake_bunny.videos == {}  # vidéo partielle supprimée: le MP4 assemblé sera envoyé
+
+    def test_rewritten_segment_fails_stream(self, bunny_env, fake_bunny, segment_dir):
+        service = bunny_env()
+        upload_id = stream_upload_id(RECORDING_ID)
+        service.open_stream_upload(upload_id, str(segment_dir), 'Enregistrement rec_42')
+        _close_segment(segment_dir, 0)
+        assert service.append_stream_upload(upload_id, [str(p) for p in seg.stream_files(segment_dir)])
+        (segment_dir / 'seg_00000.m4s').write_bytes(os.urandom(9000))
+
+        assert not service.append_stream_upload(upload_id, [str(p) for p in seg.stream_files(segment_dir)], final=True)
+        assert service.get_upload_status(upload_id)['status'] == 'failed'
+
+    def test_server_without_defer_length_disables_progressive_upload(self, bunny_env, fake_bunny, segment_dir):
+        fake_bunny.tus_extensions = 'creation'
+        bunny_env()
+        uploader = ProgressiveUpload(RECORDING_ID, segment_dir, 'Enregistrement rec_42')
+        uploader.start()
+        uploader.join(timeout=5)
+
+        assert not uploader.enabled
+        assert not uploader.finish()
+        assert not finish_stream(RECORDING_ID, segment_dir)
+        assert fake_bunny.requests['create_video'] == 0
+
+    def test_video_renamed_once_title_known(self, bunny_env, fake_bunny, segment_dir):
+        service = bunny_env()
+        upload_id = stream_upload_id(RECORDING_ID)
+        service.open_stream_upload(upload_id, str(segment_dir), 'Enregistrement rec_42')
+        _close_segment(segment_dir, 0)
+        service.append_stream_upload(upload_id, [str(p) for p in seg.stream_files(segment_dir)], final=True)
+        guid = service.get_upload_status(upload_id)['bunny_video_id']
+
+        assert service.set_video_title(guid, 'Match du 16/10')
+        assert fake_bunny.videos[guid]['title'] == 'Match du 16/10'
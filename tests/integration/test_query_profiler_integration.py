@@ -0,0 +1,110 @@
+"""
+Profilage SQL par requête HTTP et endpoint d'admin /api/system/db-profile
+Agrégats par endpoint (nombre de requêtes, N+1 probables), requêtes en erreur
+non comptées, remise à zéro et accès réservé aux administrateurs
+"""
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from src.extensions import cache
+from src.models.database import db
+from src.models.user import User, UserRole
+from src.routes.system import system_bp
+from src.services.query_profiler import query_profiler
+
+REPEATED = 6
+
+
+@pytest.fixture
+def profiler_app(monkeypatch):
+    monkeypatch.setattr(query_profiler, 'enabled', True)
+    monkeypatch.setattr(query_profiler, 'duplicate_threshold', 5)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+    query_profiler.init_app(app)
+    app.register_blueprint(system_bp, url_prefix='/api/system')
+
+    @app.route('/api/test/n-plus-one')
+    def n_plus_one():
+        for i in range(REPEATED):
+            db.session.execute(text('SELECT :i'), {'i': i})
+        try:
+            db.session.execute(text('SELECT * FROM missing_table'))
+        except OperationalError:
+            db.session.rollback()
+        return jsonify({'status': 'ok'})
+
+    with app.app_context():
+        db.create_all()
+        admin = User(email='admin@test.com', name='Admin', role=UserRole.SUPER_ADMIN)
+        player = User(email='player@test.com', name='Joueur', role=UserRole.PLAYER)
+        db.session.add_all([admin, player])
+        db.session.commit()
+        app.config['ADMIN_ID'], app.config['PLAYER_ID'] = admin.id, player.id
+        query_profiler.reset()
+        yield app
+        query_profiler.reset()
+        db.session.remove()
+        db.drop_all()
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+
+@pytest.mark.integration
+class TestDbProfile:
+
+    def test_endpoint_aggregates_count_and_repeated_statements(self, profiler_app):
+        client = _client(profiler_app, profiler_app.config['ADMIN_ID'])
+        for _ in range(3):
+            assert client.get('/api/test/n-plus-one').status_code == 200
+
+        profile = client.get('/api/system/db-profile').get_json()
+        assert profile['duplicate_threshold'] == 5
+        stats = profile['endpoints']['n_plus_one']
+        assert stats['requests'] == 3
+        # Requête en erreur non comptée, et sans effet sur les mesures suivantes
+        assert stats['queries'] == {'p50': REPEATED, 'p95': REPEATED, 'p99': REPEATED, 'max': REPEATED}
+        assert stats['repeated_statements'] == [{'statement': 'SELECT ?', 'requests': 3}]
+        assert stats['slowest_query']['statement'] == 'SELECT ?'
+        assert 0 <= stats['db_time_ms']['max'] <= stats['total_time_ms']['max']
+
+    def test_statement_after_failure_is_timed_on_its_own(self, profiler_app):
+        client = _client(profiler_app, profiler_app.config['ADMIN_ID'])
+        client.get('/api/test/n-plus-one')
+        with db.engine.connect() as conn:
+            assert not any(key.startswith('_query') for key in conn.info)
+
+        client.get('/api/test/n-plus-one')
+        stats = client.get('/api/system/db-profile').get_json()['endpoints']['n_plus_one']
+        assert stats['requests'] == 2
+        assert stats['queries']['max'] == REPEATED
+
+    def test_delete_resets_and_limit_truncates(self, profiler_app):
+        client = _client(profiler_app, profiler_app.config['ADMIN_ID'])
+        client.get('/api/test/n-plus-one')
+        client.get('/api/system/db-profile')
+
+        limited = client.get('/api/system/db-profile?sort=requests&limit=1').get_json()
+        assert len(limited['endpoints']) == 1
+
+        assert client.delete('/api/system/db-profile').get_json()['status'] == 'success'
+        # Seule la requête DELETE elle-même a été profilée depuis la remise à zéro
+        endpoints = client.get('/api/system/db-profile').get_json()['endpoints']
+        assert 'n_plus_one' not in endpoints
+
+    def test_non_admin_is_refused(self, profiler_app):
+        client = _client(profiler_app, profiler_app.config['PLAYER_ID'])
+        assert client.get('/api/system/db-profile').status_code == 403
+        assert profiler_app.test_client().get('/api/system/db-profile').status_code == 401
@@ -0,0 +1,151 @@
+"""
+Rate limiting GCRA
+Chaque requête est comptée (même plusieurs dans la même seconde), une requête refusée
+ne consomme rien, et le repli mémoire reste borné quel que soit le nombre de clients
+Le benchmark affiche le débit et la mémoire du repli local pour 10 000 clients distincts
+"""
+import time
+import tracemalloc
+
+import pytest
+from flask import Flask, jsonify
+
+from src.middleware.rate_limiting import RateLimiter, RateLimitMiddleware
+
+CLIENTS = 10_000
+
+
+@pytest.fixture
+def limited_app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    RateLimitMiddleware(app, limiter=RateLimiter())
+
+    @app.route('/api/auth/login', methods=['POST'])
+    def login():
+        return jsonify({'ok': True})
+
+    return app
+
+
+@pytest.mark.integration
+class TestRateLimiting:
+
+    def test_same_second_hits_are_counted(self):
+        """5 requêtes par heure: la 6e de la même seconde est refusée, nouvel essai après ~12 min"""
+        limiter = RateLimiter()
+        results = [limiter.hit([('k', 5, 3600)]) for _ in range(6)]
+        assert results[:5] == [None] * 5
+        index, retry_after = results[5]
+        assert index == 0
+        assert 719 < retry_after <= 720
+
+    def test_denied_request_consumes_nothing(self):
+        """Limite stricte dépassée: la limite large n'est pas entamée"""
+        limiter = RateLimiter()
+        limiter.hit([('strict', 1, 60)])
+        assert limiter.hit([('wide', 2, 60), ('strict', 1, 60)])[0] == 1
+        assert limiter.hit([('wide', 2, 60)]) is None
+        assert limiter.hit([('wide', 2, 60)]) is None
+        assert limiter.hit([('wide', 2, 60)]) is not None
+
+    def test_middleware_returns_retry_after(self, limited_app):
+        """10 connexions par 15 min: la 11e reçoit 429 avec le délai réel"""
+        client = limited_app.test_client()
+        statuses = [client.post('/api/auth/login').status_code for _ in range(11)]
+        assert statuses == [200] * 10 + [429]
+        response = client.post('/api/auth/login')
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) == 90
+
+    def test_local_store_is_bounded_and_compacted(self):
+        """LRU: au plus max_local_keys clés; les clés revenues au repos sont purgées"""
+        limiter = RateLimiter(max_local_keys=100, compact_every=50)
+        for i in range(1000):
+            limiter.hit([(f'client:{i}', 10, 3600)])
+        assert limiter.local_size() == 100
+        # Le client le plus récent est conservé, le plus ancien évincé
+        assert 'client:999' in limiter._local and 'client:0' not in limiter._local
+
+        limiter = RateLimiter(max_local_keys=100, compact_every=10)
+        for i in range(9):
+            limiter.hit([(f'short:{i}', 1000, 1)])  # TAT à +1 ms
+        time.sleep(0.01)
+        limiter.hit([('last', 10, 3600)])
+        assert limiter.local_size() == 1
+
+    def test_benchmark_local_fallback(self):
+        """Débit et mémoire du repli local pour 10 000 clients distincts (3 limites par requête)"""
+        limiter = RateLimiter(max_local_keys=3 * CLIENTS)
+        checks = [
+            [(f'rate_limit:global:10.0.{i // 256}.{i % 256}', 1000, 3600),
+             (f'rate_limit:method_GET:10.0.{i // 256}.{i % 256}', 500, 3600),
+             (f'rate_limit:endpoint_/api/videos:10.0.{i // 256}.{i % 256}', 100, 60)]
+            for i in range(CLIENTS)
+        ]
+
+        started = time.perf_counter()
+        rounds = 5
+        for _ in range(rounds):
+            for client_checks in checks:
+                limiter.hit(client_checks)
+        rate = rounds * CLIENTS / (time.perf_counter() - started)
+        # Les clés dont le budget est revenu plein (fenêtre courte) ont pu être compactées
+        assert 2 * CLIENTS <= limiter.local_size() <= 3 * CLIENTS
+
+        # Mémoire: toutes les clés conservées (pas de compaction pendant la mesure)
+        limiter = RateLimiter(max_local_keys=3 * CLIENTS, compact_every=10 * CLIENTS)
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+        for client_checks in checks:
+            limiter.hit(client_checks)
+        stats = tracemalloc.take_snapshot().compare_to(baseline, 'filename')
+        tracemalloc.stop()
+
+        memory = sum(stat.size_diff for stat in stats)
+        print(f"\n{rate:,.0f} requêtes/s, {limiter.local_size()} clés, "
+              f"{memory / 1024 / 1024:.1f} Mo ({memory / limiter.local_size():.0f} o/clé)")
+        assert limiter.local_size() == 3 * CLIENTS
+        assert memory < 10 * 1024 * 1024
+
+
+@pytest.fixture
+def redis_limiter():
+    """Limiteur adossé à un Redis simulé (script Lua exécuté par lupa)"""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    client = fakeredis.FakeRedis(decode_responses=True)
+    return RateLimiter(redis_client=client), client
+
+
+@pytest.mark.integration
+class TestRateLimitingRedis:
+    """Script Lua _GCRA: un aller-retour par requête, toutes limites comprises"""
+
+    def test_burst_then_denied_with_retry_after(self, redis_limiter):
+        limiter, _ = redis_limiter
+        results = [limiter.hit([('rate_limit:login:1.2.3.4', 5, 60)]) for _ in range(6)]
+        assert results[:5] == [None] * 5
+        index, retry_after = results[5]
+        assert index == 0
+        assert 11 < retry_after <= 12  # une requête toutes les 60/5 s
+
+    def test_key_expires_after_window(self, redis_limiter):
+        limiter, client = redis_limiter
+        limiter.hit([('one', 5, 60)])
+        assert 11_000 < client.pttl('one') <= 12_000  # TAT: une requête consommée
+        for _ in range(4):
+            limiter.hit([('one', 5, 60)])
+        # Rafale épuisée: la clé vit le temps de regagner tout le budget, soit la fenêtre
+        assert 59_000 < client.pttl('one') <= 60_000
+
+    def test_combined_denial_consumes_nothing(self, redis_limiter):
+        limiter, client = redis_limiter
+        assert limiter.hit([('strict', 1, 60)]) is None
+        assert limiter.hit([('wide', 10, 60)]) is None
+        wide_tat, wide_ttl = client.get('wide'), client.pttl('wide')
+
+        assert limiter.hit([('wide', 10, 60), ('strict', 1, 60), ('fresh', 10, 60)])[0] == 1
+        assert client.get('wide') == wide_tat
+        assert client.pttl('wide') <= wide_ttl
+        assert client.exists('fresh') == 0
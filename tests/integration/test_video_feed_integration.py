@@ -0,0 +1,142 @@
+"""
+Fil "mes vidéos" (/api/videos/my-videos)
+Pagination par curseur continue à travers l'union vidéos possédées / partagées,
+taille de page bornée, 304 sur ETag inchangé, projection fields= sans calcul superflu
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from src.extensions import cache
+from src.models.database import db
+from src.models.user import User, UserRole, Club, Court, Video, SharedVideo
+from src.routes.videos import videos_bp
+
+BASE = datetime(2026, 10, 1, 12, 0)
+
+
+@pytest.fixture
+def feed_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test'
+    db.init_app(app)
+    cache.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+    app.register_blueprint(videos_bp, url_prefix='/api/videos')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _seed(owned=7, shared=5):
+    """Vidéos possédées et partagées entrelacées, dont des dates identiques entre les deux sources"""
+    club = Club(name='Club', email='club@test.com')
+    db.session.add(club)
+    db.session.flush()
+    court = Court(name='Terrain 1', qr_code='qr-1', camera_url='rtsp://camera', club_id=club.id)
+    player = User(email='player@test.com', name='Joueur', role=UserRole.PLAYER)
+    friend = User(email='friend@test.com', name='Ami', role=UserRole.PLAYER)
+    db.session.add_all([court, player, friend])
+    db.session.flush()
+
+    for i in range(owned):
+        db.session.add(Video(title=f'Match {i}', user_id=player.id, court_id=court.id,
+                             recorded_at=BASE + timedelta(hours=i // 2)))
+    for i in range(shared):
+        video = Video(title=f'Match ami {i}', user_id=friend.id, court_id=court.id, recorded_at=BASE)
+        db.session.add(video)
+        db.session.flush()
+        db.session.add(SharedVideo(video_id=video.id, owner_user_id=friend.id, shared_with_user_id=player.id,
+                                   shared_at=BASE + timedelta(hours=i), message=f'Partage {i}'))
+    db.session.commit()
+    return player
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+
+def _key(item):
+    return (item['is_shared'], item.get('shared_video_id') or item['id'])
+
+
+@pytest.mark.integration
+class TestVideoFeed:
+
+    def test_cursor_pages_cover_owned_and_shared_union(self, feed_app):
+        player = _seed()
+        client = _client(feed_app, player.id)
+        full = client.get('/api/videos/my-videos').get_json()['videos']
+        assert len(full) == 12
+
+        paged, cursor = [], None
+        while True:
+            url = '/api/videos/my-videos?limit=3' + (f'&cursor={cursor}' if cursor else '')
+            page = client.get(url).get_json()
+            assert len(page['videos']) <= 3
+            paged.extend(page['videos'])
+            if not page['has_more']:
+                assert page['next_cursor'] is None
+                break
+            cursor = page['next_cursor']
+
+        # Ni doublon ni trou, même ordre que le fil complet (dates égales comprises)
+        assert [_key(item) for item in paged] == [_key(item) for item in full]
+        assert len({_key(item) for item in paged}) == 12
+        sort_at = [item['shared_at'] if item['is_shared'] else item['recorded_at'] for item in paged]
+        assert sort_at == sorted(sort_at, reverse=True)
+
+    def test_limit_is_capped(self, feed_app):
+        player = _seed(owned=105, shared=0)
+        page = _client(feed_app, player.id).get('/api/videos/my-videos?limit=500').get_json()
+
+        assert len(page['videos']) == 100
+        assert page['has_more'] is True
+
+    def test_unchanged_page_is_304(self, feed_app):
+        player = _seed()
+        client = _client(feed_app, player.id)
+        first = client.get('/api/videos/my-videos?limit=5')
+        etag = first.headers['ETag']
+
+        again = client.get('/api/videos/my-videos?limit=5', headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.get_data() == b''
+
+        db.session.add(Video(title='Nouveau match', user_id=player.id, recorded_at=BASE + timedelta(days=1)))
+        db.session.commit()
+        changed = client.get('/api/videos/my-videos?limit=5', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.get_json()['videos'][0]['title'] == 'Nouveau match'
+
+    def test_fields_projection_computes_only_requested_fields(self, feed_app, monkeypatch):
+        player = _seed()
+
+        def not_requested(video):
+            raise AssertionError('champ non demandé calculé')
+
+        for name in ('club_name', 'court_name', 'is_expired', 'deletion_status'):
+            monkeypatch.setitem(Video.SERIALIZERS, name, not_requested)
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            page = _client(feed_app, player.id).get('/api/videos/my-videos?limit=4&fields=title,shared_by').get_json()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        owned = next(item for item in page['videos'] if not item.get('shared_by'))
+        shared = next(item for item in page['videos'] if item.get('shared_by'))
+        assert set(owned) == {'id', 'title'}
+        assert set(shared) == {'id', 'title', 'shared_by'}
+        # Terrain et club non lus: pas de jointure
+        assert not any('JOIN court' in statement for statement in statements)
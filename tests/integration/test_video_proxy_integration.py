@@ -0,0 +1,97 @@
+"""
+Tests d'intégration du hub vidéo (video_proxy_server)
+Cadence de décodage selon les consommateurs: abonnés MJPEG, previews, snapshots
+"""
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from src.video_system.video_proxy_server import ProxyConfig, VideoProxy
+
+CAMERA_FPS = 25
+
+
+class FakeCapture:
+    """Caméra RTSP simulée à CAMERA_FPS (grab/read bloquent jusqu'à la frame suivante)"""
+
+    def __init__(self):
+        self.next_frame = time.monotonic()
+        self.reads = 0
+
+    def isOpened(self):
+        return True
+
+    def _wait(self):
+        delay = self.next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_frame += 1.0 / CAMERA_FPS
+
+    def grab(self):
+        self._wait()
+        return True
+
+    def read(self):
+        self._wait()
+        self.reads += 1
+        return True, np.full((72, 128, 3), self.reads % 255, dtype=np.uint8)
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def proxy(monkeypatch):
+    capture = FakeCapture()
+    proxy = VideoProxy(ProxyConfig(source='rtsp://camera.test/stream', mode='decode'))
+    monkeypatch.setattr(proxy, '_open_capture', lambda: capture)
+    proxy.capture = capture
+    proxy.start()
+    yield proxy
+    proxy.stop()
+
+
+def _collect_preview(proxy, fps, seconds, width=None):
+    """Parties multipart reçues par un spectateur de preview pendant seconds"""
+    async def run():
+        parts = []
+        generator = proxy.preview_generator(fps, width)
+        deadline = time.monotonic() + seconds
+        async for part in generator:
+            parts.append(part)
+            if time.monotonic() >= deadline:
+                break
+        await generator.aclose()
+        return parts
+    return asyncio.run(run())
+
+
+@pytest.mark.integration
+class TestDecodeCadence:
+    """Le décodage ne ralentit que si personne ne regarde"""
+
+    def test_without_consumer_only_health_frames_are_encoded(self, proxy):
+        time.sleep(1.1 + VideoProxy.IDLE_REFRESH_SECONDS)
+        # Au plus une frame encodée par IDLE_REFRESH_SECONDS (plus la première)
+        assert proxy.capture.reads <= 4
+
+    def test_preview_only_viewer_gets_requested_rate(self, proxy):
+        time.sleep(0.2)
+        parts = _collect_preview(proxy, fps=5, seconds=2.0)
+
+        # 5 fps demandés sur 2 s: ~10 frames distinctes, pas une par seconde
+        assert len(set(parts)) >= 8
+        assert proxy.stats()['preview_viewers'] == 0
+
+    def test_recent_snapshot_keeps_frames_fresh(self, proxy):
+        time.sleep(0.2)
+        etags = set()
+        for _ in range(10):
+            etag, _ = proxy.snapshot()
+            etags.add(etag)
+            time.sleep(0.2)
+
+        # Polling à 5 Hz pendant 2 s: chaque snapshot voit une nouvelle frame
+        assert len(etags) >= 8